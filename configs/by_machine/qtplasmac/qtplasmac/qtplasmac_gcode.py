@@ -24,7 +24,9 @@ import os
 import sys
 import linuxcnc
 import math
+import re
 import shutil
+import tempfile
 import time
 import hal
 from PyQt5 import QtCore
@@ -56,7 +58,6 @@ else:
     ocLength = 0.157
     unitsPerMm = 0.03937
 unitMultiplier = 1
-gcodeList = []
 newMaterial = []
 firstMaterial = ''
 line = ''
@@ -83,6 +84,47 @@ feedWarning = False
 zSetup = False
 zBypass = False
 
+# the filtered program is written to a temporary file as each line is made
+# so memory use does not grow with the size of the program, it is only
+# copied to stdout at the end as any error replaces the whole program
+class FilterOutput:
+    def __init__(self, size=4096):
+        self.file = tempfile.TemporaryFile('w+')
+        self.lines = []
+        self.size = size
+
+    def append(self, text):
+        self.lines.append(text)
+        if len(self.lines) >= self.size:
+            self.flush()
+
+    def flush(self):
+        self.lines.append('')
+        self.file.write('\n'.join(self.lines))
+        self.lines = []
+
+    def copy_to(self, outFile):
+        self.flush()
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, outFile)
+
+gcodeOut = FilterOutput()
+
+# report progress to the gui, one line per percent read
+class FilterProgress:
+    def __init__(self, fileName):
+        self.enabled = 'AXIS_PROGRESS_BAR' in os.environ
+        self.size = max(1, os.path.getsize(fileName))
+        self.done = 0
+        self.next = 0
+
+    def update(self, count):
+        self.done += count
+        if self.enabled and self.done >= self.next:
+            percent = min(100, self.done * 100 // self.size)
+            print('FILTER_PROGRESS={}'.format(percent), file=sys.stderr, flush=True)
+            self.next = (percent + 1) * self.size / 100
+
 # feedback dialog
 def dialog_box(title, text):
     app = QApplication(sys.argv)
@@ -111,25 +153,25 @@ def set_hole_type():
         holeEnable = True
         overCut = False
         arcEnable = False
-        gcodeList.append('(velocity reduction for small holes)')
+        gcodeOut.append('(velocity reduction for small holes)')
     elif holeType == '2':
         holeEnable = overCut = True
         arcEnable = False
-        gcodeList.append('(velocity reduction for small holes)')
+        gcodeOut.append('(velocity reduction for small holes)')
         lineNum += 1
-        gcodeList.append('(overcut for small holes)')
+        gcodeOut.append('(overcut for small holes)')
     elif holeType == '3':
         holeEnable = arcEnable = True
         overCut = False
-        gcodeList.append('(velocity reduction for small holes and arcs)')
+        gcodeOut.append('(velocity reduction for small holes and arcs)')
     elif holeType == '4':
         holeEnable = arcEnable = overCut = True
-        gcodeList.append('(velocity reduction for small holes and arcs)')
+        gcodeOut.append('(velocity reduction for small holes and arcs)')
         lineNum += 1
-        gcodeList.append('(overcut for small holes)')
+        gcodeOut.append('(overcut for small holes)')
     else:
         holeEnable = arcEnable = overCut = False
-        gcodeList.append('(disable small hole sensing)')
+        gcodeOut.append('(disable small hole sensing)')
 
 # check if arc is a hole
 def check_if_hole():
@@ -142,7 +184,7 @@ def check_if_hole():
     if lastX == endX and lastY == endY:
         isHole = True
     radius = get_hole_radius(I, J, isHole)
-    gcodeList.append(line)
+    gcodeOut.append(line)
     if isHole and overCut and radius <= (minDiameter / 2):
         overburn(I, J, radius)
         return
@@ -163,13 +205,13 @@ def get_hole_radius(I, J, isHole):
         if offsetG41:
             lineNum += 1
             codeWarn = True
-            gcodeList.append(';m67 e3 q0 (inactive due to g41)')
+            gcodeOut.append(';m67 e3 q0 (inactive due to g41)')
             dlg  = '\nCannot reduce velocity with cutter compensation active.\n'
             dlg += '\nWarning for line #{}.\n'.format(lineNum)
             dialog_box('WARNING', dlg)
         elif not holeActive:
             lineNum += 1
-            gcodeList.append('m67 e3 q{0} (diameter:{1:0.3f}, velocity:{0}%)'.format(holeVelocity, radius * 2))
+            gcodeOut.append('m67 e3 q{0} (diameter:{1:0.3f}, velocity:{0}%)'.format(holeVelocity, radius * 2))
             holeActive = True
         if line.startswith('g2') and isHole:
             codeWarn = True
@@ -181,7 +223,7 @@ def get_hole_radius(I, J, isHole):
     else:
         if holeActive:
             lineNum += 1
-            gcodeList.append('m67 e3 q0 (arc complete, velocity 100%)')
+            gcodeOut.append('m67 e3 q0 (arc complete, velocity 100%)')
             holeActive = False
     return radius
 
@@ -197,12 +239,12 @@ def overburn(I, J, radius):
     lineNum += 1
     if offsetG41:
         codeWarn = True
-        gcodeList.append(';m62 p3 (inactive due to g41)')
+        gcodeOut.append(';m62 p3 (inactive due to g41)')
         dlg  = '\nCannot enable/disable torch with cutter compensation active.\n'
         dlg += '\nWarning for line #{}.\n'.format(lineNum)
         dialog_box('WARNING', dlg)
     else:
-        gcodeList.append('m62 p3 (disable torch)')
+        gcodeOut.append('m62 p3 (disable torch)')
         torchEnable = False
     #clockwise arc
     if line.startswith('g2'):
@@ -215,41 +257,35 @@ def overburn(I, J, radius):
         endY = centerY + radius * ((sinB * cosA) + (cosB * sinA))
         dir = '3'
     lineNum += 1
-    gcodeList.append('g{0} x{1:0.{5}f} y{2:0.{5}f} i{3:0.{5}f} j{4:0.{5}f}'.format(dir, endX, endY, I, J, precision))
+    gcodeOut.append('g{0} x{1:0.{5}f} y{2:0.{5}f} i{3:0.{5}f} j{4:0.{5}f}'.format(dir, endX, endY, I, J, precision))
     lastX = endX
     lastY = endY
 
 # get axis position
+numberRe = re.compile(r'[0-9. -]*')
 def get_position(axis):
-    tmp1 = line.split(axis)[1].replace(' ','')
-    if not tmp1[0].isdigit() and not tmp1[0] == '.' and not tmp1[0] == '-':
+    # the number after the first occurrence of axis, spaces ignored
+    number = numberRe.match(line, line.index(axis) + 1).group().replace(' ','')
+    if not number:
         return None
-    n = 0
-    tmp2 = ''
-    while 1:
-        if tmp1[n].isdigit() or tmp1[n] == '.' or tmp1[n] == '-':
-            tmp2 += tmp1[n]
-            n += 1
-        else:
-            break
-        if n >= len(tmp1):
-            break
-    return float(tmp2)
+    return float(number)
 
 # set the last X and Y positions
 def set_last_position(Xpos, Ypos):
-    if line[0] in ['g','x','y']:
+    if line[0] in 'gxy':
         if 'x' in line:
-            if get_position('x') is not None:
-                Xpos = get_position('x')
+            position = get_position('x')
+            if position is not None:
+                Xpos = position
         if 'y' in line:
-            if get_position('y') is not None:
-                Ypos = get_position('y')
+            position = get_position('y')
+            if position is not None:
+                Ypos = position
     return Xpos, Ypos
 
 # comment out all Z commands
 def comment_out_z_commands():
-    global holeActive
+    global holeActive, lineNum
     newline = ''
     newz = ''
     removing = 0
@@ -277,15 +313,14 @@ def comment_out_z_commands():
             newline += bit
     if holeActive:
         lineNum += 1
-        gcodeList.append('m67 e3 q0 (arc complete, velocity 100%)')
+        gcodeOut.append('m67 e3 q0 (arc complete, velocity 100%)')
         holeActive = False
     return '{} {})'.format(newline, newz)
 
 # check if math used or explicit values
 def check_math(axis):
     global codeError
-    tmp1 = line.split(axis)[1]
-    if tmp1.startswith('[') or tmp1.startswith('#'):
+    if line.startswith(('[', '#'), line.index(axis) + 1):
         codeError = True
         dlg  = '\nPlasmaC G-Code parser requires explicit values.\n'
         dlg += '\nError near line #{}.\n'.format(lineNum)
@@ -320,15 +355,15 @@ def do_material_change():
             dlg += '\nEdit the G-Code file outside of QtPlasmaC to reference an existing material and then reload the G-Code file.\n'
         dialog_box('ERROR', dlg)
 
-#        gcodeList.append(line)
-#        gcodeList.append('m5\nm2')
+#        gcodeOut.append(line)
+#        gcodeOut.append('m5\nm2')
 #        quit()
 
 
     hal.set_p('qtplasmac.material_change_number', '{}'.format(material[0]))
     if not firstMaterial:
         firstMaterial = material[0]
-    gcodeList.append(line)
+    gcodeOut.append(line)
 
 # check if material edit required
 def check_material_edit():
@@ -574,9 +609,11 @@ def check_f_word(inFeed):
 
 # start processing the gcode file
 get_materials()
+progress = FilterProgress(inCode)
 with open(inCode, 'r') as fRead:
     for line in fRead:
         lineNum += 1
+        progress.update(len(line))
         # remove whitespace
         line = line.strip()
         # remove line numbers
@@ -591,13 +628,13 @@ with open(inCode, 'r') as fRead:
             check_material_edit()
             # add material change for temporay material
             if line.startswith('(o=0'):
-                gcodeList.append('m190 p{} ({})'.format(tmpMatNum, tmpMatNam))
-                gcodeList.append('m66 p3 l3 q1')
+                gcodeOut.append('m190 p{} ({})'.format(tmpMatNum, tmpMatNam))
+                gcodeOut.append('m66 p3 l3 q1')
                 tmpMatNum += 1
             continue
-        # if line is a comment then gcodeList.append it and get next line
+        # if line is a comment then gcodeOut.append it and get next line
         if line.startswith(';') or line.startswith('('):
-            gcodeList.append(line)
+            gcodeOut.append(line)
             continue
         # if a ; comment at end of line, convert line to lower case and remove spaces, preserve comment as is
         elif ';' in line:
@@ -619,13 +656,15 @@ with open(inCode, 'r') as fRead:
                     line = line[:1] + line[2:]
                 else:
                     break
+        # the leading letter of the block, so the tests for other codes can be skipped
+        code = line[:1]
         # if z motion is to be kept
-        if line.startswith('#<keep-z-motion>'):
+        if code == '#' and line.startswith('#<keep-z-motion>'):
             if line.split('=')[1][0] == '1':
                 zBypass = True
             else:
                 zBypass = False
-            gcodeList.append(line)
+            gcodeOut.append(line)
             continue
         # remove any additional z max moves
         if '[#<_ini[axis_z]max_limit>' in line and zSetup:
@@ -635,9 +674,10 @@ with open(inCode, 'r') as fRead:
             offsetTopZ = (zMaxOffset * unitsPerMm * unitMultiplier)
             moveTopZ = 'g53 g0 z[#<_ini[axis_z]max_limit> * {} - {:.3f}] (Z just below max height)'.format(unitMultiplier, offsetTopZ)
             if not '[#<_ini[axis_z]max_limit>' in line:
-                gcodeList.append(moveTopZ)
+                gcodeOut.append(moveTopZ)
             else:
                 line = moveTopZ
+                code = 'g'
             zSetup = True
         # set default units
         if 'g21' in line:
@@ -661,7 +701,7 @@ with open(inCode, 'r') as fRead:
         elif 'g40' in line:
             offsetG41 = False
         # are we scribing
-        if line.startswith('m3$1s'):
+        if code == 'm' and line.startswith('m3$1s'):
             if pierceOnly:
                 codeWarn = True
                 dlg  = '\nScribe is invalid for pierce only mode.\n'
@@ -671,14 +711,14 @@ with open(inCode, 'r') as fRead:
                 scribing = False
             else:
                 scribing = True
-                gcodeList.append(line)
+                gcodeOut.append(line)
                 continue
         # if pierce only mode
         if pierceOnly:
             # Don't pierce spotting operations
             if line.startswith('m3$2'):
                 spotting = True
-                gcodeList.append('(Ignoring spotting operation as pierce-only is active)')
+                gcodeOut.append('(Ignoring spotting operation as pierce-only is active)')
                 continue
             # Ignore spotting blocks when pierceOnly
             if spotting:
@@ -690,19 +730,19 @@ with open(inCode, 'r') as fRead:
                 continue
             if line.startswith('m3') and not line.startswith('m3$1'):
                 pierces += 1
-                gcodeList.append('\n(Pierce #{})'.format(pierces))
-                gcodeList.append(rapidLine)
-                gcodeList.append('M3 $0 S1')
-                gcodeList.append('G91')
-                gcodeList.append('G1 X.000001')
-                gcodeList.append('G90\nM5 $0')
+                gcodeOut.append('\n(Pierce #{})'.format(pierces))
+                gcodeOut.append(rapidLine)
+                gcodeOut.append('M3 $0 S1')
+                gcodeOut.append('G91')
+                gcodeOut.append('G1 X.000001')
+                gcodeOut.append('G90\nM5 $0')
                 rapidLine = ''
                 continue
             if not pierces or line.startswith('o') or line.startswith('#'):
-                gcodeList.append(line)
+                gcodeOut.append(line)
             continue
         # test for pierce only mode
-        if (line.startswith('#<pierce-only>') and line.split('=')[1][0] == '1') or (not pierceOnly and cutType == 1):
+        if (code == '#' and line.startswith('#<pierce-only>') and line.split('=')[1][0] == '1') or (not pierceOnly and cutType == 1):
             if scribing:
                 codeWarn = True
                 dlg  = '\nPierce only mode is invalid while scribing.\n'
@@ -713,20 +753,20 @@ with open(inCode, 'r') as fRead:
                 pierceOnly = True
                 pierces = 0
                 rapidLine = ''
-                gcodeList.append('(pierce only mode)')
+                gcodeOut.append('(pierce only mode)')
             if not cutType == 1:
                 continue
-        if line.startswith('#<oclength>'):
+        if code == '#' and line.startswith('#<oclength>'):
             ocLength = float(line.split('=')[1])
             customLen = True
-            gcodeList.append('(overcut length = {})'.format(ocLength))
+            gcodeOut.append('(overcut length = {})'.format(ocLength))
             continue
         # if hole sensing code
-        if line.startswith('#<holes>'):
+        if code == '#' and line.startswith('#<holes>'):
             set_hole_type()
             continue
         # if hole diameter command
-        if line.startswith('#<h_diameter>') or line.startswith('#<m_diameter>') or line.startswith('#<i_diameter>'):
+        if code == '#' and line.startswith(('#<h_diameter>', '#<m_diameter>', '#<i_diameter>')):
             if (';') in line:
                 minDiameter = float(line.split('=')[1].split(';')[0])
                 customDia = True
@@ -736,7 +776,7 @@ with open(inCode, 'r') as fRead:
             else:
                 minDiameter = float(line.split('=')[1])
                 customDia = True
-            gcodeList.append('(small hole diameter = {})'.format(minDiameter))
+            gcodeOut.append('(small hole diameter = {})'.format(minDiameter))
             if '#<m_d' in line:
                 dlg = '\n#<m_diameter> is deprecated in favour of #<h_diameter>\n'
             if '#<i_d' in line:
@@ -747,12 +787,12 @@ with open(inCode, 'r') as fRead:
                 dialog_box('WARNING', dlg)
             continue
         # if hole velocity command
-        if line.startswith('#<h_velocity>'):
+        if code == '#' and line.startswith('#<h_velocity>'):
             holeVelocity = float(line.split('=')[1].split(';')[0])
-            gcodeList.append('(small hole velocity = {})'.format(holeVelocity))
+            gcodeOut.append('(small hole velocity = {})'.format(holeVelocity))
             continue
         # if material change
-        if line.startswith('m190'):
+        if code == 'm' and line.startswith('m190'):
             do_material_change()
             if not 'm66' in line:
                 continue
@@ -764,7 +804,7 @@ with open(inCode, 'r') as fRead:
                 dlg += '\nError near line #{}.\n'.format(lineNum)
                 dlg += '\nEdit G-Code file to suit.\n'
                 dialog_box('ERROR', dlg)
-            gcodeList.append(line)
+            gcodeOut.append(line)
             continue
         # check if unsupported distance mode
         if holeEnable and 'g91' in line and not 'g91.1' in line:
@@ -792,73 +832,73 @@ with open(inCode, 'r') as fRead:
                 # if no other axes comment it
                 if 1 not in [c in line for c in 'xybcuvw']:
                     if '(' in line:
-                        gcodeList.append('({} {}'.format(line.split('(')[0], line.split('(')[1]))
+                        gcodeOut.append('({} {}'.format(line.split('(')[0], line.split('(')[1]))
                     elif ';' in line:
-                        gcodeList.append('({} {}'.format(line.split(';')[0], line.split(';')[1]))
+                        gcodeOut.append('({} {}'.format(line.split(';')[0], line.split(';')[1]))
                     else:
-                        gcodeList.append('({})'.format(line))
+                        gcodeOut.append('({})'.format(line))
                     continue
                 # other axes in line, comment out the Z axis
                 if not '(z' in line:
                     if holeEnable:
                         lastX, lastY = set_last_position(lastX, lastY)
                     result = comment_out_z_commands()
-                    gcodeList.append(result)
+                    gcodeOut.append(result)
                     continue
         # if an arc command
-        if (line.startswith('g2') or line.startswith('g3')) and line[2].isalpha():
+        if code == 'g' and line.startswith(('g2', 'g3')) and line[2].isalpha():
             if holeEnable:
                 check_if_hole()
             else:
-                gcodeList.append(line)
+                gcodeOut.append(line)
             continue
-        # if torch off, flag it then gcodeList.append it
-        if line.startswith('m62p3') or line.startswith('m64p3'):
+        # if torch off, flag it then gcodeOut.append it
+        if code == 'm' and line.startswith(('m62p3', 'm64p3')):
             torchEnable = False
-            gcodeList.append(line)
+            gcodeOut.append(line)
             continue
-        # if torch on, flag it then gcodeList.append it
-        if line.startswith('m63p3') or line.startswith('m65p3'):
+        # if torch on, flag it then gcodeOut.append it
+        if code == 'm' and line.startswith(('m63p3', 'm65p3')):
             torchEnable = True
-            gcodeList.append(line)
+            gcodeOut.append(line)
             continue
         # if spindle off
-        if line.startswith('m5'):
+        if code == 'm' and line.startswith('m5'):
             if len(line) == 2 or (len(line) > 2 and not line[2].isdigit()):
-                gcodeList.append(line)
+                gcodeOut.append(line)
                 # restore velocity if required
                 if holeActive:
                     lineNum += 1
-                    gcodeList.append('m68 e3 q0 (arc complete, velocity 100%)')
+                    gcodeOut.append('m68 e3 q0 (arc complete, velocity 100%)')
                     holeActive = False
                 # if torch off, allow torch on
                 if not torchEnable:
                     lineNum += 1
-                    gcodeList.append('m65 p3 (enable torch)')
+                    gcodeOut.append('m65 p3 (enable torch)')
                     torchEnable = True
             else:
-                gcodeList.append(line)
+                gcodeOut.append(line)
             continue
         # if program end
-        if line.startswith('m2') or line.startswith('m30') or line.startswith('%'):
+        if (code == 'm' and line.startswith(('m2', 'm30'))) or code == '%':
             # restore velocity if required
             if holeActive:
                 lineNum += 1
-                gcodeList.append('m68 e3 q0 (arc complete, velocity 100%)')
+                gcodeOut.append('m68 e3 q0 (arc complete, velocity 100%)')
                 holeActive = False
             # if torch off, allow torch on
             if not torchEnable:
                 lineNum += 1
-                gcodeList.append('m65 p3 (enable torch)')
+                gcodeOut.append('m65 p3 (enable torch)')
                 torchEnable = True
             # restore hole sensing to default
             if holeEnable:
                 lineNum += 1
-                gcodeList.append('(disable hole sensing)')
+                gcodeOut.append('(disable hole sensing)')
                 holeEnable = False
             if firstMaterial:
                 hal.set_p('qtplasmac.material_change_number', '{}'.format(firstMaterial))
-            gcodeList.append(line)
+            gcodeOut.append(line)
             # if codeError:
             #     dlg  = '\nThis G-Code file has one or more errors that will affect the quality of the process.\n'
             #     dlg += '\nIt is recommended that all errors are fixed before running this file.'
@@ -872,17 +912,17 @@ with open(inCode, 'r') as fRead:
         # restore velocity if required
         if holeActive:
             lineNum += 1
-            gcodeList.append('m67 e3 q0 (arc complete, velocity 100%)')
+            gcodeOut.append('m67 e3 q0 (arc complete, velocity 100%)')
             holeActive = False
         # set last X/Y position
         if holeEnable and len(line):
             lastX, lastY = set_last_position(lastX, lastY)
-        gcodeList.append(line)
+        gcodeOut.append(line)
 if pierceOnly:
-    gcodeList.append('')
+    gcodeOut.append('')
     if rapidLine:
-        gcodeList.append('{}'.format(rapidLine))
-    gcodeList.append('M2 (END)')
+        gcodeOut.append('{}'.format(rapidLine))
+    gcodeOut.append('M2 (END)')
 if codeError:
     print('(The original G-Code file)')
     print('(has one or more errors)')
@@ -890,5 +930,4 @@ if codeError:
     print('(before reloading the file)')
     print('\nM2')
 else:
-    for line in gcodeList:
-        print(line)
+    gcodeOut.copy_to(sys.stdout)
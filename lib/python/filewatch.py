@@ -0,0 +1,253 @@
+#    Notice changes to files that LinuxCNC and its GUIs share
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# One FileWatch, from service(), serves every widget in the process.  The
+# directories of the watched files are watched with inotify, so files
+# replaced by renaming (as LinuxCNC does with the var file) are still
+# followed; where inotify can't be used the files are stat()ed once a
+# second instead.  Events are gathered for a moment before the files are
+# read, and a file's subscribers are only called when its contents really
+# changed, once per change however many events it took to make it.
+#
+# VarFile keeps the parameters of a var file.  On a change only the lines
+# that differ from the last reading are parsed, and its subscribers get
+# just the parameters whose values changed.
+#
+# Both run in the GLib main loop, which qtvcp's Qt loop also runs.
+
+import os
+import struct
+import ctypes, ctypes.util
+
+from gi.repository import GLib
+
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+EVENT = struct.Struct('iIII')
+
+def _inotify():
+    "An inotify file descriptor and a function adding a watch to it, or None"
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    def add(directory):
+        return libc.inotify_add_watch(fd, os.fsencode(directory),
+            IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE)
+    return fd, add
+
+def _read(filename):
+    try:
+        with open(filename, 'rb') as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+def _signature(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class _File(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self.callbacks = []
+        self.data = _read(filename)
+        self.signature = _signature(filename)
+
+
+class FileWatch(object):
+    def __init__(self, interval=1000, delay=50):
+        # how often files are stat()ed without inotify, and how long
+        # events are gathered for, in ms
+        self.interval = interval
+        self.delay = delay
+        self.files = {}
+        self.directories = {}
+        self.polled = set()
+        self.pending = set()
+        self.flushing = None
+        self.polling = None
+        self.inotify = _inotify()
+        if self.inotify is not None:
+            GLib.io_add_watch(self.inotify[0], GLib.PRIORITY_DEFAULT, GLib.IO_IN,
+                              self._events)
+
+    def subscribe(self, filename, callback):
+        """Call callback(filename) whenever the contents of filename change,
+        including it appearing or going away"""
+        filename = os.path.abspath(filename)
+        f = self.files.get(filename)
+        if f is None:
+            f = self.files[filename] = _File(filename)
+            self._watch(filename)
+        f.callbacks.append(callback)
+
+    def unsubscribe(self, filename, callback):
+        f = self.files.get(os.path.abspath(filename))
+        if f is not None and callback in f.callbacks:
+            f.callbacks.remove(callback)
+
+    def _watch(self, filename):
+        directory, name = os.path.split(filename)
+        if self.inotify is not None:
+            if directory not in self.directories.values():
+                wd = self.inotify[1](directory)
+                if wd >= 0:
+                    self.directories[wd] = directory
+            if directory in self.directories.values():
+                return
+        self.polled.add(filename)
+        if self.polling is None:
+            self.polling = GLib.timeout_add(self.interval, self._poll)
+
+    def _events(self, fd, condition):
+        while True:
+            try:
+                data = os.read(fd, 4096)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+                name = data[offset + EVENT.size:offset + EVENT.size + length].rstrip(b'\0')
+                offset += EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    self.pending.update(self.files)
+                elif mask & IN_IGNORED:
+                    # the directory went away; stat its files from now on
+                    directory = self.directories.pop(wd, None)
+                    for filename in self.files:
+                        if os.path.dirname(filename) == directory:
+                            self._watch(filename)
+                elif wd in self.directories:
+                    filename = os.path.join(self.directories[wd], os.fsdecode(name))
+                    if filename in self.files:
+                        self.pending.add(filename)
+        if self.pending and self.flushing is None:
+            self.flushing = GLib.timeout_add(self.delay, self._flush)
+        return True
+
+    def _poll(self):
+        for filename in self.polled:
+            if _signature(filename) != self.files[filename].signature:
+                self.pending.add(filename)
+        self._flush()
+        return True
+
+    def _flush(self):
+        self.flushing = None
+        pending, self.pending = self.pending, set()
+        for filename in sorted(pending):
+            self.check(filename)
+        return False
+
+    def check(self, filename):
+        "Read filename now, calling its subscribers if it changed"
+        f = self.files.get(os.path.abspath(filename))
+        if f is None:
+            return False
+        f.signature = _signature(f.filename)
+        data = _read(f.filename)
+        if data == f.data:
+            return False
+        f.data = data
+        for callback in list(f.callbacks):
+            callback(f.filename)
+        return True
+
+_service = None
+
+def service():
+    "The FileWatch shared by the whole process"
+    global _service
+    if _service is None:
+        _service = FileWatch()
+    return _service
+
+
+class VarFile(object):
+    "The parameters of a var file, kept up to date"
+    def __init__(self, filename):
+        self.filename = os.path.abspath(filename)
+        self.params = {}
+        self.lines = set()
+        self.callbacks = []
+        self._update()
+        service().subscribe(self.filename, self._changed)
+
+    def get(self, param, default=0.):
+        return self.params.get(param, default)
+
+    def subscribe(self, callback):
+        "Call callback(changed) with a dict of the changed parameters' new values"
+        self.callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    def _parse(self, line):
+        words = line.split()
+        try:
+            return int(words[0]), float(words[1])
+        except (IndexError, ValueError):
+            return None, None
+
+    def _update(self):
+        "Reread the file, returning the parameters that changed"
+        data = _read(self.filename)
+        lines = set(data.decode('utf-8', 'replace').splitlines()) if data else set()
+        before = {}
+        for line in self.lines - lines:
+            param, value = self._parse(line)
+            if param is not None:
+                before.setdefault(param, self.params.pop(param, None))
+        for line in lines - self.lines:
+            param, value = self._parse(line)
+            if param is not None:
+                before.setdefault(param, self.params.get(param))
+                self.params[param] = value
+        self.lines = lines
+        return dict((param, self.params.get(param)) for param, value in before.items()
+                    if self.params.get(param) != value)
+
+    def _changed(self, filename):
+        changed = self._update()
+        if changed:
+            for callback in list(self.callbacks):
+                callback(changed)
+
+_var_files = {}
+
+def var_file(filename):
+    "The VarFile of filename, shared by the whole process"
+    filename = os.path.abspath(filename)
+    if filename not in _var_files:
+        _var_files[filename] = VarFile(filename)
+    return _var_files[filename]
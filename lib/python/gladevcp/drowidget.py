@@ -17,6 +17,7 @@
 import sys,os
 import math
 import linuxcnc
+import status_broadcast
 
 import gi
 gi.require_version("Gtk","3.0")
@@ -56,7 +57,7 @@ class HAL_DRO(Gtk.Label):
     def __init__(self, *a, **kw):
         Gtk.Label.__init__(self, *a, **kw)
         self.emc = linuxcnc
-        self.status = self.emc.stat()
+        self.status = status_broadcast.stat()
         self.display_units_mm=0
         self.machine_units_mm=0
         self.unit_convert=[1]*9
@@ -105,7 +106,7 @@ class HAL_DRO(Gtk.Label):
 
     def periodic(self):
         try:
-            self.status.poll()
+            status_broadcast.receive(self.status)
             absolute,relative,dtg = self.position()
         except:
             sys = 0
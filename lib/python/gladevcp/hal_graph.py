@@ -22,14 +22,23 @@ from gi.repository import GLib
 import cairo
 import math
 import time
-from collections import deque
+import numpy as np
 
 if __name__ == "__main__":
     from hal_widgets import _HalWidgetBase, hal
+    from sample_ring import SampleRing, downsample
 else:
     from .hal_widgets import _HalWidgetBase, hal
+    from .sample_ring import SampleRing, downsample
 
 MAX_INT = 0x7fffffff
+MAX_PINS = 8
+# samples kept per pin, whatever the period and tick
+MAX_SAMPLES = 2000000
+
+# colors of the pins after the first, which uses fg_color
+PIN_COLORS = [(0, 0, 0.8), (0, 0.6, 0), (0.8, 0.5, 0), (0.6, 0, 0.6),
+              (0, 0.6, 0.6), (0.5, 0.3, 0.1), (0.4, 0.4, 0.4)]
 
 def Gdk_color_tuple(c):
     if not c:
@@ -58,7 +67,11 @@ class HAL_Graph(Gtk.DrawingArea, _HalWidgetBase):
         'period'  : ( GObject.TYPE_FLOAT, 'Period', 'TIme period to display',
                     -MAX_INT, MAX_INT, 60, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
         'tick'  : ( GObject.TYPE_INT, 'Tick period', 'Data acquarison pariod in ms',
-                    100, 10000, 500, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+                    1, 10000, 500, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'redraw'  : ( GObject.TYPE_INT, 'Redraw period', 'Time between redraws in ms, independent of the tick period',
+                    10, 10000, 100, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
+        'pins'  : ( GObject.TYPE_INT, 'Pins', 'Number of HAL pins plotted: <name>, then <name>-1, <name>-2 ...',
+                    1, MAX_PINS, 1, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
         'zero' : ( GObject.TYPE_FLOAT, 'Zero', 'Zero value',
                     -MAX_INT, MAX_INT, 0, GObject.ParamFlags.READWRITE | GObject.ParamFlags.CONSTRUCT),
         'value' : ( GObject.TYPE_FLOAT, 'Value', 'Current meter value (for glade testing)',
@@ -87,15 +100,22 @@ class HAL_Graph(Gtk.DrawingArea, _HalWidgetBase):
     }
     __gproperties = __gproperties__
 
+    # until the properties are set
+    period = 60
+    tick = 500
+    redraw = 100
+    pins = 1
+    value = 0
+
     def __init__(self):
         super(HAL_Graph, self).__init__()
 
-        self.bg_color = Gdk.Color.parse('white')
-        self.fg_color = Gdk.Color.parse('red')
+        self.bg_color = Gdk.Color.parse('white')[1]
+        self.fg_color = Gdk.Color.parse('red')[1]
 
         self.force_radius = None
-        self.ticks = deque()
-        self.ticks_saved = []
+        self.samples = SampleRing(1, 2)
+        self.saved = None
         self.time_strings = {}
         self.tick_period = 0.1
 
@@ -103,36 +123,54 @@ class HAL_Graph(Gtk.DrawingArea, _HalWidgetBase):
         self.connect("draw", self.expose)
         self.add_events(Gdk.EventMask.BUTTON_PRESS_MASK)
 
-        self.tick = 500
-        self.tick_idx = 0
+        self.hal_pins = []
         self.hal_pin = 0
+        self.sampling = self.drawing = None
 
-        GLib.timeout_add(self.tick, self.tick_poll, self.tick_idx)
+        self.configure()
 
     def _hal_init(self):
         _HalWidgetBase._hal_init(self)
         self.hal_pin = self.hal.newpin(self.hal_name, hal.HAL_FLOAT, hal.HAL_IN)
+        self.hal_pins = [self.hal_pin]
+        for i in range(1, self.pins):
+            self.hal_pins.append(self.hal.newpin('%s-%d' % (self.hal_name, i), hal.HAL_FLOAT, hal.HAL_IN))
+
+    def configure(self):
+        """Size the samples to the period at the tick rate and (re)start
+        sampling and drawing, each on its own timer"""
+        if not hasattr(self, 'samples'):
+            return
+        length = min(int(math.ceil(self.period * 1000. / self.tick)) + 2, MAX_SAMPLES)
+        if self.samples.channels != self.pins:
+            self.samples = SampleRing(self.pins, length)
+        elif self.samples.length != length:
+            self.samples.resize(length)
+        for source in self.sampling, self.drawing:
+            if source is not None:
+                GLib.source_remove(source)
+        self.sampling = GLib.timeout_add(self.tick, self.tick_poll)
+        self.drawing = GLib.timeout_add(self.redraw, self.redraw_poll)
+
+    def tick_poll(self):
+        if self.hal_pins:
+            values = [p.get() for p in self.hal_pins]
+        else:
+            values = self.value
+        self.samples.add(time.time(), values)
+        return True
 
-    def tick_poll(self, idx):
-        if self.tick_idx != idx:
-            return False
-        v = self.hal_pin and self.hal_pin.get()
-        now = time.time()
-        for (t,_) in list(self.ticks):
-            if t >= now - self.period:
-                break
-            self.ticks.popleft()
-        self.ticks.append((now, v))
+    def redraw_poll(self):
         self.queue_draw()
         return True
 
     def snapshot(self, widget, event):
         if event.button != 1:
             return
-        if self.ticks_saved:
-            self.ticks_saved = []
-        else:
-            self.ticks_saved = list(self.ticks)
+        if self.saved:
+            self.saved = None
+        elif len(self.samples):
+            self.saved = tuple(a.copy() for a in self.samples.samples())
 
     def expose(self, widget, event):
         w = self.get_allocated_width()
@@ -166,15 +204,15 @@ class HAL_Graph(Gtk.DrawingArea, _HalWidgetBase):
         w, h = w - 2, h - 2
 
         cr.set_line_width(1)
-        cr.set_source_color(self.bg_color)
+        cr.set_source_rgb(*Gdk_color_tuple(self.bg_color))
         cr.rectangle(0, 0, w, h)
         cr.stroke_preserve()
         cr.fill()
 
         #tw = self.tick_period * w / self.period
         tnow = now = time.time()
-        if self.ticks_saved:
-            now = max(map(lambda x: x[0], self.ticks_saved))
+        if self.saved:
+            now = self.saved[0][-1]
 
         cr.set_source_rgb(0, 0, 0)
 
@@ -188,12 +226,21 @@ class HAL_Graph(Gtk.DrawingArea, _HalWidgetBase):
         font_large = max(h/10, 20)
         cr.set_font_size(font_small)
 
+        # what is on screen, at most two samples a pixel
+        times, values = self.samples.window(tnow - self.period, tnow)
+        shown = [downsample(times, values, tnow - self.period, tnow, w)]
+        if self.saved:
+            times, values = self.saved
+            i = max(np.searchsorted(times, now - self.period) - 1, 0)
+            shown.insert(0, downsample(times[i:], values[i:], now - self.period, now, w))
+
         ymin, ymax = self.min, self.max
         yticks = self.yticks
         if self.autoscale:
-            tv = map(lambda x: x[1], self.ticks_saved + list(self.ticks))
+            tv = [values for times, values in shown if len(values)]
             if tv:
-                ymin, ymax = min(tv), max(tv)
+                ymin = min(values.min() for values in tv)
+                ymax = max(values.max() for values in tv)
                 ymin -= abs(ymin) * 0.1
                 ymax += abs(ymax) * 0.1
             else:
@@ -217,13 +264,17 @@ class HAL_Graph(Gtk.DrawingArea, _HalWidgetBase):
         cr.set_font_size(font_small)
         self.text_at(cr, self.sublabel, w/2, 2.5 * font_large, yalign='top')
 
-        cr.set_source_color(self.fg_color)
-
-        if self.ticks_saved:
-            self.draw_graph(cr, w, h, ymin, ymax, self.ticks_saved, t2x)
-            cr.set_source_rgba(*(Gdk_color_tuple(self.fg_color) + (0.3,)))
+        colors = [Gdk_color_tuple(self.fg_color)] + PIN_COLORS
+        if self.saved:
+            times, values = shown.pop(0)
+            for pin in range(values.shape[1]):
+                cr.set_source_rgba(*(colors[pin] + (0.3,)))
+                self.draw_graph(cr, w, h, ymin, ymax, times, values[:, pin], now)
 
-        self.draw_graph(cr, w, h, ymin, ymax, self.ticks, lambda t: t2x(t, tnow))
+        times, values = shown[0]
+        for pin in range(values.shape[1]):
+            cr.set_source_rgb(*colors[pin])
+            self.draw_graph(cr, w, h, ymin, ymax, times, values[:, pin], tnow)
 
         if not self.is_sensitive():
             cr.set_source_rgba(0, 0, 0, 0.3)
@@ -248,21 +299,14 @@ class HAL_Graph(Gtk.DrawingArea, _HalWidgetBase):
         cr.move_to(x, y)
         cr.show_text(text)
 
-    def draw_graph(self, cr, w, h, ymin, ymax, ticks, t2x):
-        move = True
-        for (t, v) in ticks:
-            if v is None:
-                move = True
-                continue
-            v = min(max(v, ymin), ymax)
-            x = t2x(t)
-            if x is None:
-                move = True
-                continue
-            y = h * (1 - (v - ymin)/(ymax - ymin))
-            if move:
-                cr.move_to(x, y)
-                move = False
+    def draw_graph(self, cr, w, h, ymin, ymax, times, values, now):
+        if len(times) < 2:
+            return
+        xs = (times - (now - self.period)) * (w / self.period)
+        ys = h * (1 - (np.clip(values, ymin, ymax) - ymin) / (ymax - ymin))
+        xs, ys = xs.tolist(), ys.tolist()
+        cr.move_to(xs[0], ys[0])
+        for x, y in zip(xs, ys):
             cr.line_to(x, y)
         cr.stroke()
 
@@ -326,9 +370,6 @@ class HAL_Graph(Gtk.DrawingArea, _HalWidgetBase):
     def do_set_property(self, property, value):
         name = property.name.replace('-', '_')
 
-        if name == 'tick':
-            self.tick_idx += 1
-            GLib.timeout_add(value, self.tick_poll, self.tick_idx)
         if name in ['bg_color', 'fg_color']:
             if not value:
                 return False
@@ -339,6 +380,9 @@ class HAL_Graph(Gtk.DrawingArea, _HalWidgetBase):
         else:
             raise AttributeError('unknown property %s' % property.name)
 
+        if name in ['tick', 'redraw', 'period', 'pins']:
+            self.configure()
+
         if name in ['force_size', 'force_size']:
             #print "Forcing size request %s" % name
             self.set_size_request(self.force_size, self.force_size)
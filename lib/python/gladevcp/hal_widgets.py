@@ -19,6 +19,7 @@ from gi.repository import Gtk
 from gi.repository import GObject
 
 import hal
+from hal_glib import GPin
 
 hal_pin_changed_signal = ('hal-pin-changed', (GObject.SignalFlags.RUN_FIRST, GObject.TYPE_NONE, (GObject.TYPE_OBJECT,)))
 
@@ -37,6 +38,11 @@ class _HalWidgetBase:
         """ Update HAL state """
         pass
 
+    def hal_update_rate(self, pin, rate):
+        """ Poll an input pin every rate ms """
+        if isinstance(pin, GPin):
+            pin.set_update_rate(rate)
+
 class _HalToggleBase(_HalWidgetBase):
     def _hal_init(self):
         self.set_active(False)
@@ -356,6 +362,8 @@ class HAL_Label(Gtk.Label, _HalWidgetBase):
         if pin_type is None:
             raise TypeError("%s: Invalid pin type: %s" % (self.hal_name, self.label_pin_type))
         self.hal_pin = self.hal.newpin(self.hal_name, pin_type, hal.HAL_IN)
+        # text is not read any faster than this
+        self.hal_update_rate(self.hal_pin, GPin.SLOW_RATE)
         self.hal_pin.connect('value-changed',
                             lambda p: self.set_text(self.text_template % p.value))
         self.hal_pin.connect('value-changed', lambda s: self.emit('hal-pin-changed', s))
@@ -7,6 +7,7 @@ from gi.repository import Gdk
 from gi.repository import GLib
 import cairo
 import math
+from hal_glib import GPin
 
 # This creates the custom LED widget
 
@@ -384,6 +385,8 @@ class HAL_LED(Gtk.DrawingArea, _HalSensitiveBase):
     def _hal_init(self):
         if self.has_hal_pin:
             _HalSensitiveBase._hal_init(self)
+            # catch short pulses
+            self.hal_update_rate(self.hal_pin, GPin.FAST_RATE)
         self.set_color('on',  self.pick_color_on or self.on_color)
         self.set_color('off', self.pick_color_off or self.off_color)
         self.set_color('blink', self.pick_color_blink or self.blink_color)
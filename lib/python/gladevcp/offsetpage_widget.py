@@ -23,6 +23,7 @@
 
 import sys, os, linuxcnc
 from hal_glib import GStat
+import filewatch
 datadir = os.path.abspath(os.path.dirname(__file__))
 AXISLIST = ['offset', 'X', 'Y', 'Z', 'A', 'B', 'C', 'U', 'V', 'W', 'name']
 # we need to know if linuxcnc isn't running when using the GLADE editor
@@ -84,6 +85,7 @@ class OffsetPage(Gtk.VBox):
         super(OffsetPage, self).__init__()
         self.gstat = GStat()
         self.filename = filename
+        self.var_file = None
         self.linuxcnc = linuxcnc
         self.status = linuxcnc.stat()
         self.cmd = linuxcnc.command()
@@ -218,51 +220,24 @@ class OffsetPage(Gtk.VBox):
         self.filename = filename
         self.reload_offsets()
 
-    # We read the var file directly
-    # and pull out the info we need
-    # if anything goes wrong we set all the info to 0
+    # The var file is kept by filewatch, which rereads it when it changes
+    # and calls us if any parameter did.
+    # We pull out the info we need
     def read_file(self):
-        try:
-            g54 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g55 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g56 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g57 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g58 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g59 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g59_1 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g59_2 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g59_3 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            if self.filename == None:
-                return g54, g55, g56, g57, g58, g59, g59_1, g59_2, g59_3
-            if not os.path.exists(self.filename):
-                return g54, g55, g56, g57, g58, g59, g59_1, g59_2, g59_3
-            logfile = open(self.filename, "r").readlines()
-            for line in logfile:
-                temp = line.split()
-                param = int(temp[0])
-                data = float(temp[1])
-
-                if 5229 >= param >= 5221:
-                    g54[param - 5221] = data
-                elif 5249 >= param >= 5241:
-                    g55[param - 5241] = data
-                elif 5269 >= param >= 5261:
-                    g56[param - 5261] = data
-                elif 5289 >= param >= 5281:
-                    g57[param - 5281] = data
-                elif 5309 >= param >= 5301:
-                    g58[param - 5301] = data
-                elif 5329 >= param >= 5321:
-                    g59[param - 5321] = data
-                elif 5349 >= param >= 5341:
-                    g59_1[param - 5341] = data
-                elif 5369 >= param >= 5361:
-                    g59_2[param - 5361] = data
-                elif 5389 >= param >= 5381:
-                    g59_3[param - 5381] = data
-            return g54, g55, g56, g57, g58, g59, g59_1, g59_2, g59_3
-        except:
-            return None, None, None, None, None, None, None, None, None
+        if self.filename == None:
+            return [[0] * 9 for i in range(9)]
+        if self.var_file is None or self.var_file.filename != os.path.abspath(self.filename):
+            if self.var_file is not None:
+                self.var_file.unsubscribe(self._var_file_changed)
+            self.var_file = filewatch.var_file(self.filename)
+            self.var_file.subscribe(self._var_file_changed)
+        # G54 to G59.3, 20 parameters apart starting at 5221
+        return [[self.var_file.get(start + axis, 0) for axis in range(9)]
+                for start in range(5221, 5382, 20)]
+
+    def _var_file_changed(self, changed):
+        if not self.editing_mode:
+            self.reload_offsets()
 
     # This allows hiding or showing columns from a text string of columnns
     # eg list ='ab'
@@ -445,6 +420,8 @@ class OffsetPage(Gtk.VBox):
             self.current_system = "G54"
             lncnc_running = False
 
+        # the var file rows come from memory, this keeps the
+        # rows from linuxcnc's status current
         if self.filename and not self.editing_mode:
             self.reload_offsets()
         return True
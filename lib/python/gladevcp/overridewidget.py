@@ -16,6 +16,7 @@
 
 import sys,os
 import linuxcnc
+import status_broadcast
 
 import gi
 gi.require_version('Gtk', '3.0')
@@ -36,7 +37,7 @@ class Override(Gtk.HScale):
     def __init__(self, *a, **kw):
         Gtk.HScale.__init__(self, *a, **kw)
         self.emc = linuxcnc
-        self.status = self.emc.stat()
+        self.status = status_broadcast.stat()
         self.cmd = linuxcnc.command()
         self.override_type = 0
         self.override = 1.0
@@ -105,7 +106,7 @@ class Override(Gtk.HScale):
     # scale will track it.
     def periodic(self):
         try:
-            self.status.poll()
+            status_broadcast.receive(self.status)
             if self.override_type == 0:
                 self.override = self.status.feedrate
             elif self.override_type == 1:
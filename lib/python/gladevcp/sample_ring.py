@@ -0,0 +1,95 @@
+# vim: sts=4 sw=4 et
+# GladeVcp Widgets
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# The samples HAL_Graph plots, kept in preallocated arrays.  Every sample
+# is written twice, at its place in the ring and again one ring length
+# further on, so the newest samples are always one contiguous run of the
+# arrays and a time window of them is a slice, found by bisecting the
+# times.
+#
+# downsample() reduces a window with more samples than there are pixels
+# to the lowest and highest value in each pixel column, so a long period
+# is drawn with a few points per column and spikes still show.
+
+import numpy as np
+
+class SampleRing:
+    def __init__(self, channels=1, length=1000):
+        self.channels = channels
+        self.resize(length)
+
+    def __len__(self):
+        return self.count
+
+    def resize(self, length):
+        "Keep up to length samples, dropping the oldest if there are more"
+        length = max(2, int(length))
+        if hasattr(self, 'times'):
+            times, values = self.samples()
+            times, values = times[-length:].copy(), values[-length:].copy()
+        else:
+            times = values = ()
+        self.length = length
+        self.times = np.zeros(2 * length)
+        self.values = np.zeros((2 * length, self.channels))
+        self.clear()
+        for t, v in zip(times, values):
+            self.add(t, v)
+
+    def clear(self):
+        self.count = 0
+        self.end = 0
+
+    def add(self, t, values):
+        "Add the values of all channels, sampled at time t"
+        end = self.end
+        self.times[end] = self.times[end + self.length] = t
+        self.values[end] = self.values[end + self.length] = values
+        self.end = (end + 1) % self.length
+        if self.count < self.length:
+            self.count += 1
+
+    def samples(self):
+        "The times and values of all samples, oldest first"
+        start = (self.end - self.count) % self.length
+        return (self.times[start:start + self.count],
+                self.values[start:start + self.count])
+
+    def window(self, t0, t1):
+        "The times and values of the samples from time t0 to t1"
+        times, values = self.samples()
+        i, j = np.searchsorted(times, (t0, t1), 'right')
+        # and the one before t0, so the line reaches the edge
+        i = max(i - 1, 0)
+        return times[i:j], values[i:j]
+
+
+def downsample(times, values, t0, t1, columns):
+    """Reduce samples between t0 and t1 to at most two per column of
+    columns across that time, the lowest and the highest, in the order
+    the line passes them.  The times of both are the middle of their
+    column.  Samples that fit already are returned as they are."""
+    if len(times) <= 2 * columns or t1 <= t0:
+        return times, values
+    column = ((times - t0) * (columns / (t1 - t0))).astype(np.intp)
+    # the samples of a column are a run, the times being in order
+    starts = np.flatnonzero(np.diff(column, prepend=column[0] - 1))
+    ends = np.append(starts[1:], len(times)) - 1
+    low = np.minimum.reduceat(values, starts)
+    high = np.maximum.reduceat(values, starts)
+    rising = values[ends] >= values[starts]
+    points = np.empty((2 * len(starts), values.shape[1]))
+    points[0::2] = np.where(rising, low, high)
+    points[1::2] = np.where(rising, high, low)
+    middle = t0 + (column[starts] + 0.5) * ((t1 - t0) / columns)
+    return np.repeat(middle, 2), points
@@ -15,6 +15,7 @@
 # GNU General Public License for more details.
 
 import sys, os, linuxcnc, hashlib
+import filewatch
 datadir = os.path.abspath(os.path.dirname(__file__))
 KEYWORDS = ['S','T', 'P', 'X', 'Y', 'Z', 'A', 'B', 'C', 'U', 'V', 'W', 'D', 'I', 'J', 'Q', ';']
 
@@ -57,6 +58,7 @@ class ToolEdit(Gtk.VBox):
         self.hash_check = None 
         self.lathe_display_type = True
         self.toolfile = toolfile
+        self.watched_toolfile = None
         self.num_of_col = 1
         self.font="sans 12"
         self.hide_columns =''
@@ -238,6 +240,7 @@ class ToolEdit(Gtk.VBox):
         # Reload the tool file into display
     def reload(self,widget):
         self.hash_code = self.md5sum(self.toolfile)
+        self.watch_toolfile()
         # clear the current liststore, search the tool file, and add each tool
         if self.toolfile == None:return
         self.model.clear()
@@ -447,7 +450,6 @@ class ToolEdit(Gtk.VBox):
         model[path][0] = not model[path][0]
 
         # check for linnuxcnc ON and IDLE which is the only safe time to edit the tool file.
-        # check to see if the tool file is current
     def periodic_check(self):
         try:
             self.emcstat.poll()
@@ -456,10 +458,21 @@ class ToolEdit(Gtk.VBox):
             self.apply.set_sensitive(bool(on and idle))
         except:
             pass
-        if self.toolfile:
-            self.file_current_check()
         return True
 
+        # have filewatch tell us when the tool file changes
+        # instead of checking it all the time
+    def watch_toolfile(self):
+        if self.watched_toolfile == self.toolfile: return
+        if self.watched_toolfile:
+            filewatch.service().unsubscribe(self.watched_toolfile, self.toolfile_changed)
+        self.watched_toolfile = self.toolfile
+        if self.toolfile:
+            filewatch.service().subscribe(self.toolfile, self.toolfile_changed)
+
+    def toolfile_changed(self, filename):
+        self.file_current_check()
+
         # create a hash code
     def md5sum(self,filename):
         try:
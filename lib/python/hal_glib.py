@@ -3,8 +3,11 @@
 
 import _hal, hal
 import linuxcnc
+import status_broadcast
 import os
 import math
+import time
+import numpy
 
 from gi.repository import GObject
 from gi.repository import GLib
@@ -31,41 +34,156 @@ try:
         CYCLE_TIME = int(ct)
 except:
     CYCLE_TIME = 100
+try:
+    # only merge the status fields that connected handlers report
+    LAZY_STATUS = bool(int(inifile.find('DISPLAY', 'LAZY_STATUS') or 0))
+except:
+    LAZY_STATUS = False
+
+class _PinGroup:
+    '''The GPins polled at one rate.  Their values are read into an array
+    in one call and compared with the previous values all at once'''
+    def __init__(self, rate):
+        self.rate = rate
+        self.pins = []
+        self.items = []
+        self.values = numpy.zeros(16)
+        self.prev = numpy.zeros(16)
+        self.timer = None
+
+    def add(self, pin, prev=numpy.nan):
+        i = len(self.pins)
+        if i == len(self.values):
+            self.values = numpy.zeros(2 * i)
+            self.prev = numpy.resize(self.prev, 2 * i)
+        # NaN differs from every value, so the first poll reports the pin
+        self.prev[i] = prev
+        self.pins.append(pin)
+        self.items.append(pin._hal_item)
+        pin._group, pin._index = self, i
+
+    def remove(self, pin):
+        # move the last pin into the freed slot
+        i = pin._index
+        last = self.pins.pop()
+        item = self.items.pop()
+        if last is not pin:
+            n = len(self.pins)
+            self.pins[i] = last
+            self.items[i] = item
+            self.prev[i] = self.prev[n]
+            last._index = i
+        pin._group = None
+
+    def update(self):
+        n = len(self.pins)
+        if not n:
+            return
+        values = self.values[:n]
+        try:
+            _hal.read_values(self.items, values)
+        except Exception:
+            values = self.read_each()
+            n = len(values)
+        changed = numpy.flatnonzero(values != self.prev[:n])
+        if not len(changed):
+            return
+        self.prev[:n] = values
+        kill = []
+        for p in [self.pins[i] for i in changed.tolist()]:
+            try:
+                p.emit('value-changed')
+            except:
+                kill.append(p)
+                print("Error updating pin %s; Removing" % p)
+        for p in kill:
+            p.update_remove()
+
+    def read_each(self):
+        """Read the pins one at a time, when reading them together failed,
+        and stop polling the ones that cannot be read"""
+        for p in list(self.pins):
+            try:
+                value = p.get()
+            except:
+                print("Error updating pin %s; Removing" % p)
+                p.update_remove()
+            else:
+                # a removal may have moved the pin to another slot
+                self.values[p._index] = value
+        return self.values[:len(self.pins)]
+
+    def tick(self):
+        if GPin.UPDATE:
+            self.update()
+        else:
+            self.timer = None
+        return GPin.UPDATE
+
+    def start(self):
+        if self.timer is None:
+            self.timer = GLib.timeout_add(self.rate, self.tick)
 
 class GPin(GObject.Object, hal.Pin):
     __gtype_name__ = 'GPin'
     __gsignals__ = {'value-changed': (GObject.SignalFlags.RUN_FIRST , GObject.TYPE_NONE, ())}
 
-    REGISTRY = []
+    # pins are polled in groups by update rate (ms)
+    GROUPS = {}
     UPDATE = False
+    RATE = 100
+    # suggested rates for pins shown by LEDs and by text
+    FAST_RATE = 50
+    SLOW_RATE = 250
 
     def __init__(self, *a, **kw):
         GObject.Object.__init__(self)
         hal.Pin.__init__(self, *a, **kw)
         self._item_wrap(self._item)
-        self._prev = None
-        self.REGISTRY.append(self)
+        # the _hal.item under any hal.Pin wrappers, for _hal.read_values
+        item = self._item
+        while not isinstance(item, _hal.item):
+            item = item._item
+        self._hal_item = item
+        self._group = None
+        self._pin_group(self.RATE).add(self)
         self.update_start()
 
+    @classmethod
+    def _pin_group(self, rate):
+        group = GPin.GROUPS.get(rate)
+        if group is None:
+            group = GPin.GROUPS[rate] = _PinGroup(rate)
+            if GPin.UPDATE:
+                group.start()
+        return group
+
     def update(self):
+        group, i = self._group, self._index
         tmp = self.get()
-        if tmp != self._prev:
+        if tmp != group.prev[i]:
+            group.prev[i] = tmp
             self.emit('value-changed')
-        self._prev = tmp
+
+    def set_update_rate(self, rate):
+        '''Poll this pin every rate ms'''
+        if self._group is None or self._group.rate == rate:
+            return
+        prev = self._group.prev[self._index]
+        self._group.remove(self)
+        self._pin_group(rate).add(self, prev)
+
+    def update_remove(self):
+        '''Stop polling this pin'''
+        if self._group is not None:
+            self._group.remove(self)
 
     @classmethod
     def update_all(self):
         if not self.UPDATE:
             return
-        kill = []
-        for p in self.REGISTRY:
-            try:
-                p.update()
-            except:
-                kill.append(p)
-                print("Error updating pin %s; Removing" % p)
-        for p in kill:
-            self.REGISTRY.remove(p)
+        for group in list(GPin.GROUPS.values()):
+            group.update()
         return self.UPDATE
 
     @classmethod
@@ -73,7 +191,9 @@ class GPin(GObject.Object, hal.Pin):
         if GPin.UPDATE:
             return
         GPin.UPDATE = True
-        GLib.timeout_add(timeout, self.update_all)
+        GPin.RATE = timeout
+        for group in list(GPin.GROUPS.values()):
+            group.start()
 
     @classmethod
     def update_stop(self, timeout=100):
@@ -227,11 +347,16 @@ class _GStat(GObject.GObject):
              , linuxcnc.INTERP_IDLE: 'interp-idle'
              }
 
-    def __init__(self, stat = None):
+    def __init__(self, stat = None, lazy = None):
         GObject.Object.__init__(self)
-        self.stat = stat or linuxcnc.stat()
+        self.stat = stat or status_broadcast.stat()
         self.cmd = linuxcnc.command()
         self._status_active = False
+        self.lazy = LAZY_STATUS if lazy is None else lazy
+        self._wanted = set()
+        self._stale = set()
+        self._raw = {}
+        self.reset_cycle_cost()
         self.old = {}
         self.old['tool-prep-number'] = 0
         try:
@@ -256,7 +381,94 @@ class _GStat(GObject.GObject):
     def set_timer(self):
         GLib.timeout_add(CYCLE_TIME, self.update)
 
+    # Status fields are merged and compared in groups.  Each group lists
+    # the signals reporting its fields and whether it is merged even when
+    # nothing is connected to them, because helpers like machine_is_on()
+    # read its fields or they are cheap.
+    # With LAZY_STATUS the other groups are only merged while a handler
+    # is connected to one of their signals.
+    # Groups with a _raw_<group> method are skipped when the raw status
+    # values returned by it are unchanged since the last merge.
+    GROUPS = (
+        ('task', True, ('command-running', 'command-stopped', 'command-error',
+            'state-estop', 'state-estop-reset', 'state-on', 'state-off',
+            'mode-manual', 'mode-auto', 'mode-mdi', 'interp-run',
+            'interp-idle', 'interp-paused', 'interp-reading', 'interp-waiting',
+            'program-pause-changed', 'block-delete-changed',
+            'optional-stop-changed', 'file-loaded', 'line-changed',
+            'tool-in-spindle-changed', 'motion-mode-changed', 'homed',
+            'unhomed', 'all-homed', 'not-all-homed')),
+        ('tool-prep', False, ('tool-prep-changed',)),
+        ('limits', False, ('override-limits-changed', 'hard-limits-tripped')),
+        ('position', False, ('current-feed-rate', 'current-x-rel-position',
+            'current-position')),
+        ('spindle', False, ('spindle-control-changed',
+            'requested-spindle-speed-changed', 'actual-spindle-speed-changed',
+            'spindle-override-changed')),
+        ('overrides', True, ('feed-override-changed', 'rapid-override-changed',
+            'max-velocity-override-changed', 'feed-hold-enabled-changed',
+            'mist-changed', 'flood-changed', 'current-z-rotation',
+            'current-tool-offset')),
+        ('modes', False, ('g-code-changed', 'metric-mode-changed',
+            'user-system-changed', 'g90-mode', 'g91-mode', 'itime-mode',
+            'fpm-mode', 'fpr-mode', 'css-mode', 'rpm-mode', 'radius-mode',
+            'diameter-mode')),
+        ('mcodes', False, ('m-code-changed',)),
+        ('tool-info', False, ('tool-info-changed',)),
+        ('settings', False, ('f-code-changed', 'blend-code-changed')),
+        )
+
+    SIGNAL_GROUPS = dict((signal, group)
+                         for group, always, signals in GROUPS
+                         for signal in signals)
+
+    def connect(self, detailed_signal, handler, *args):
+        self._want(detailed_signal)
+        return GObject.Object.connect(self, detailed_signal, handler, *args)
+
+    def connect_after(self, detailed_signal, handler, *args):
+        self._want(detailed_signal)
+        return GObject.Object.connect_after(self, detailed_signal, handler, *args)
+
+    def _want(self, detailed_signal):
+        group = self.SIGNAL_GROUPS.get(detailed_signal.split('::')[0])
+        if group is None or group in self._wanted:
+            return
+        self._wanted.add(group)
+        # bring the group up to date without signals, so the next update
+        # only reports what changed from now on, as if it had been merged
+        # all along
+        self._fresh(group)
+
+    def _fresh(self, group):
+        if group not in self._stale:
+            return
+        try:
+            self._merge_group(group)
+        except:
+            return
+        self._stale.discard(group)
+
+    def _merge_group(self, group):
+        name = group.replace('-', '_')
+        raw = getattr(self, '_raw_' + name, None)
+        if raw is not None:
+            self._raw[group] = raw()
+        getattr(self, '_merge_' + name)()
+
     def merge(self):
+        for group, always, signals in self.GROUPS:
+            self._merge_group(group)
+        self._stale.clear()
+
+    def _raw_task(self):
+        s = self.stat
+        return (s.state, s.task_state, s.task_mode, s.interp_state,
+                s.call_level, s.file, s.paused, s.motion_line, s.homed,
+                s.tool_in_spindle, s.motion_mode, s.block_delete,
+                s.optional_stop)
+
+    def _merge_task(self):
         self.old['command-state'] = self.stat.state
         self.old['state'] = self.stat.task_state
         self.old['mode']  = self.stat.task_mode
@@ -270,45 +482,31 @@ class _GStat(GObject.GObject):
         self.old['line']  = self.stat.motion_line
         self.old['homed'] = self.stat.homed
         self.old['tool-in-spindle'] = self.stat.tool_in_spindle
-        try:
-            if hal.get_value('iocontrol.0.tool-prepare'):
-                self.old['tool-prep-number'] = hal.get_value('iocontrol.0.tool-prep-number')
-        except RuntimeError:
-             self.old['tool-prep-number'] = -1
         self.old['motion-mode'] = self.stat.motion_mode
-        self.old['spindle-or'] = self.stat.spindle[0]['override']
-        self.old['feed-or'] = self.stat.feedrate
-        self.old['rapid-or'] = self.stat.rapidrate
-        self.old['max-velocity-or'] = self.stat.max_velocity
-        self.old['feed-hold']  = self.stat.feed_hold_enabled
-        self.old['g5x-index']  = self.stat.g5x_index
-        self.old['spindle-enabled']  = self.stat.spindle[0]['enabled']
-        self.old['spindle-direction']  = self.stat.spindle[0]['direction']
         self.old['block-delete']= self.stat.block_delete
         self.old['optional-stop']= self.stat.optional_stop
+
+    def _merge_tool_prep(self):
         try:
-            self.old['actual-spindle-speed'] = hal.get_value('spindle.0.speed-in') * 60
-        except RuntimeError:
-             self.old['actual-spindle-speed'] = 0
-        try:
-            self.old['spindle-at-speed'] = hal.get_value('spindle.0.at-speed')
+            if hal.get_value('iocontrol.0.tool-prepare'):
+                self.old['tool-prep-number'] = hal.get_value('iocontrol.0.tool-prep-number')
         except RuntimeError:
-            self.old['spindle-at-speed'] = False
-        self.old['flood']= self.stat.flood
-        self.old['mist']= self.stat.mist
-        self.old['current-z-rotation'] = self.stat.rotation_xy
-        self.old['current-tool-offset'] = self.stat.tool_offset
+             self.old['tool-prep-number'] = -1
 
+    def _merge_limits(self):
         # override limits / hard limits
         or_limit_list=[]
         hard_limit_list = []
         hard_limit = False
         or_limit_set = False
+        # stat.joint builds a dict for every joint each time it is read
+        joints = self.stat.joint
         for j in range(0, self.stat.joints):
-            or_limit_list.append( self.stat.joint[j]['override_limits'])
-            or_limit_set = or_limit_set or self.stat.joint[j]['override_limits']
-            min_hard_limit = self.stat.joint[j]['min_hard_limit']
-            max_hard_limit = self.stat.joint[j]['max_hard_limit']
+            joint = joints[j]
+            or_limit_list.append(joint['override_limits'])
+            or_limit_set = or_limit_set or joint['override_limits']
+            min_hard_limit = joint['min_hard_limit']
+            max_hard_limit = joint['max_hard_limit']
             hard_limit = hard_limit or min_hard_limit or max_hard_limit
             hard_limit_list.append([min_hard_limit,max_hard_limit])
         self.old['override-limits'] = or_limit_list
@@ -316,6 +514,52 @@ class _GStat(GObject.GObject):
         self.old['hard-limits-tripped'] = bool(hard_limit)
         self.old['hard-limits-list'] = hard_limit_list
 
+    def _merge_position(self):
+        # reported every cycle, nothing to keep
+        pass
+
+    def _merge_spindle(self):
+        spindle = self.stat.spindle[0]
+        self.old['spindle-or'] = spindle['override']
+        self.old['spindle-enabled']  = spindle['enabled']
+        self.old['spindle-direction']  = spindle['direction']
+        try:
+            self.old['actual-spindle-speed'] = hal.get_value('spindle.0.speed-in') * 60
+        except RuntimeError:
+             self.old['actual-spindle-speed'] = 0
+        try:
+            self.old['spindle-at-speed'] = hal.get_value('spindle.0.at-speed')
+        except RuntimeError:
+            self.old['spindle-at-speed'] = False
+        # G96 - constant surface speed
+        if 960 in self.stat.gcodes[1:]:
+            try:
+                self.old['spindle-speed']= hal.get_value('spindle.0.speed-out')
+            except RuntimeError:
+                self.old['spindle-speed']= spindle['speed']
+        else:
+            self.old['spindle-speed']= spindle['speed']
+
+    def _raw_overrides(self):
+        s = self.stat
+        return (s.feedrate, s.rapidrate, s.max_velocity, s.feed_hold_enabled,
+                s.flood, s.mist, s.rotation_xy, s.tool_offset)
+
+    def _merge_overrides(self):
+        self.old['feed-or'] = self.stat.feedrate
+        self.old['rapid-or'] = self.stat.rapidrate
+        self.old['max-velocity-or'] = self.stat.max_velocity
+        self.old['feed-hold']  = self.stat.feed_hold_enabled
+        self.old['flood']= self.stat.flood
+        self.old['mist']= self.stat.mist
+        self.old['current-z-rotation'] = self.stat.rotation_xy
+        self.old['current-tool-offset'] = self.stat.tool_offset
+
+    def _raw_modes(self):
+        return self.stat.gcodes, self.stat.g5x_index
+
+    def _merge_modes(self):
+        self.old['g5x-index']  = self.stat.g5x_index
         # active G codes
         active_gcodes = []
         codes =''
@@ -352,14 +596,11 @@ class _GStat(GObject.GObject):
         self.old['metric'] = metric
         self.old['radius'] = radius
         self.old['diameter'] = diameter
-        if css:
-            try:
-                self.old['spindle-speed']= hal.get_value('spindle.0.speed-out')
-            except RuntimeError:
-                self.old['spindle-speed']= self.stat.spindle[0]['speed']
-        else:
-            self.old['spindle-speed']= self.stat.spindle[0]['speed']
 
+    def _raw_mcodes(self):
+        return self.stat.mcodes
+
+    def _merge_mcodes(self):
         # active M codes
         active_mcodes = []
         mcodes = ''
@@ -368,17 +609,45 @@ class _GStat(GObject.GObject):
             active_mcodes.append("M%d"%i )
         for i in active_mcodes:
             mcodes = mcodes + ("%s "%i)
-            #active_mcodes.append("M%s "%i)
         self.old['m-code'] = mcodes
+
+    def _merge_tool_info(self):
+        # stat.tool_table builds the whole tool table each time it is read
         self.old['tool-info']  = self.stat.tool_table[0]
+
+    def _raw_settings(self):
+        return self.stat.settings
+
+    def _merge_settings(self):
         settings = self.stat.settings
         self.old['f-code'] = settings[1]
         self.old['blend-tolerance-code'] = settings[3]
         self.old['nativecam-tolerance-code'] = settings[4]
 
     def update(self):
+        start = time.thread_time()
         try:
-            self.stat.poll()
+            return self._update()
+        finally:
+            cost = time.thread_time() - start
+            self._cycle_last = cost
+            self._cycle_total += cost
+            self._cycle_count += 1
+            self._cycle_max = max(self._cycle_max, cost)
+
+    def get_cycle_cost(self):
+        '''CPU time in ms spent per update cycle, signal handlers included:
+        (last cycle, average, maximum)'''
+        average = self._cycle_total / self._cycle_count if self._cycle_count else 0
+        return (self._cycle_last * 1000, average * 1000, self._cycle_max * 1000)
+
+    def reset_cycle_cost(self):
+        self._cycle_last = self._cycle_total = self._cycle_max = 0
+        self._cycle_count = 0
+
+    def _update(self):
+        try:
+            status_broadcast.receive(self.stat)
         except:
             self._status_active = False
             # some things might not need linuxcnc status but do need periodic
@@ -386,8 +655,32 @@ class _GStat(GObject.GObject):
             # Reschedule
             return True
         self._status_active = True
+        # merge every group before any signal, so handlers reading
+        # self.old or the helpers see this cycle's status throughout
         old = dict(self.old)
-        self.merge()
+        merged = []
+        for group, always, signals in self.GROUPS:
+            if self.lazy and not always and group not in self._wanted:
+                self._stale.add(group)
+                continue
+            name = group.replace('-', '_')
+            raw = getattr(self, '_raw_' + name, None)
+            if raw is not None:
+                raw = raw()
+                if group not in self._stale and raw == self._raw.get(group):
+                    continue
+                self._raw[group] = raw
+            self._stale.discard(group)
+            getattr(self, '_merge_' + name)()
+            merged.append(name)
+        for name in merged:
+            getattr(self, '_changed_' + name)(old)
+
+        # AND DONE... Return true to continue timeout
+        self.emit('periodic')
+        return True
+
+    def _changed_task(self, old):
         cmd_state_old = old.get('command-state')
         cmd_state_new = self.old['command-state']
         if cmd_state_new != cmd_state_old:
@@ -476,10 +769,6 @@ class _GStat(GObject.GObject):
         tool_new = self.old['tool-in-spindle']
         if tool_new != tool_old:
             self.emit('tool-in-spindle-changed', tool_new)
-        tool_num_old = old.get('tool-prep-number')
-        tool_num_new = self.old['tool-prep-number']
-        if tool_num_new != tool_num_old:
-            self.emit('tool-prep-changed', tool_num_new)
 
         motion_mode_old = old.get('motion-mode', None)
         motion_mode_new = self.old['motion-mode']
@@ -510,6 +799,13 @@ class _GStat(GObject.GObject):
                 self._is_all_homed = False
                 self.emit('not-all-homed', unhomed_joints)
 
+    def _changed_tool_prep(self, old):
+        tool_num_old = old.get('tool-prep-number')
+        tool_num_new = self.old['tool-prep-number']
+        if tool_num_new != tool_num_old:
+            self.emit('tool-prep-changed', tool_num_new)
+
+    def _changed_limits(self, old):
         # override limits
         or_limits_old = old.get('override-limits', None)
         or_limits_new = self.old['override-limits']
@@ -522,6 +818,8 @@ class _GStat(GObject.GObject):
         if t_list_new != t_list_old:
             hard_limits_tripped_new = self.old['hard-limits-tripped']
             self.emit('hard-limits-tripped',hard_limits_tripped_new, t_list_new)
+
+    def _changed_position(self, old):
         # current velocity
         self.emit('current-feed-rate',self.stat.current_vel * 60.0)
         # X relative position
@@ -535,6 +833,7 @@ class _GStat(GObject.GObject):
         p,rel_p,dtg = self.get_position()
         self.emit('current-position',p, rel_p, dtg, self.stat.joint_actual_position)
 
+    def _changed_spindle(self, old):
         # spindle control
         spindle_enabled_old = old.get('spindle-enabled', None)
         spindle_enabled_new = self.old['spindle-enabled']
@@ -561,6 +860,8 @@ class _GStat(GObject.GObject):
         spindle_or_new = self.old['spindle-or']
         if spindle_or_new != spindle_or_old:
             self.emit('spindle-override-changed',spindle_or_new * 100)
+
+    def _changed_overrides(self, old):
         # feed override
         feed_or_old = old.get('feed-or', None)
         feed_or_new = self.old['feed-or']
@@ -601,9 +902,8 @@ class _GStat(GObject.GObject):
         tool_off_new = self.old['current-tool-offset']
         if tool_off_new != tool_off_old:
                self.emit('current-tool-offset',tool_off_new)
-        #############################
-        # Gcodes
-        #############################
+
+    def _changed_modes(self, old):
         # G codes
         g_code_old = old.get('g-code', None)
         g_code_new = self.old['g-code']
@@ -667,22 +967,21 @@ class _GStat(GObject.GObject):
         diam_new = self.old['diameter']
         if diam_new != diam_old:
             self.emit('diameter-mode',diam_new)
-        ####################################
-        # Mcodes
-        ####################################
+
+    def _changed_mcodes(self, old):
         # M codes
         m_code_old = old.get('m-code', None)
         m_code_new = self.old['m-code']
         if m_code_new != m_code_old:
             self.emit('m-code-changed',m_code_new)
+
+    def _changed_tool_info(self, old):
         tool_info_old = old.get('tool-info', None)
         tool_info_new = self.old['tool-info']
         if tool_info_new != tool_info_old:
             self.emit('tool-info-changed', tool_info_new)
 
-        #####################################
-        # settings
-        #####################################
+    def _changed_settings(self, old):
         # feed code
         f_code_old = old.get('f-code', None)
         f_code_new = self.old['f-code']
@@ -696,13 +995,9 @@ class _GStat(GObject.GObject):
         cam_code_new = self.old['nativecam-tolerance-code']
 
         if blend_code_new != blend_code_old or \
-           blend_code_new != blend_code_old:
+           cam_code_new != cam_code_old:
                 self.emit('blend-code-changed',blend_code_new, cam_code_new)
 
-        # AND DONE... Return true to continue timeout
-        self.emit('periodic')
-        return True
-
     def forced_update(self):
         try:
             self.stat.poll()
@@ -1039,6 +1334,7 @@ class _GStat(GObject.GObject):
             return False
 
     def is_metric_mode(self):
+        self._fresh('modes')
         return self.old['metric']
 
     def is_spindle_on(self, num = 0):
@@ -1060,9 +1356,11 @@ class _GStat(GObject.GObject):
         return self._status_active
 
     def is_limits_override_set(self):
+        self._fresh('limits')
         return self.old['override-limits-set']
 
     def is_hard_limits_tripped(self):
+        self._fresh('limits')
         return self.old['hard-limits-tripped']
 
     def get_current_tool(self):
@@ -57,7 +57,15 @@ def get_bits(f, o=0):
     return ret
 
 def get_keys(f):
+    "The names of the keys held down, named as get_bits names them"
+    sz = (max(KEYBTN_invert) + 8) // 8
+    a = fcntl.ioctl(f, SZ(EVIOCGKEY, sz), '\0' * sz)
     ret = set()
+    for j, ch in enumerate(a):
+        for i in range(8):
+            if ch & (1<<i):
+                ret.add(decode(KEYBTN_invert, 'KEY', j*8+i))
+    return ret
 
 class InputId:
     format = "HHHH"
@@ -867,6 +875,7 @@ class InputDevice:
 
     def get_bits(self, arg): return get_bits(self.f, arg)
     def get_absinfo(self, arg): return AbsInfo.get(self.f, arg)
+    def get_keys(self): return get_keys(self.f)
     def read_event(self):
         e = Event.read(self.f)
         if e.type == 'EV_KEY': e.code = decode(KEYBTN_invert, 'KEY', e.code)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+#    Styling of G code for the qtvcp GcodeEditor lexer
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+# Outside of comments the style of a character depends only on the
+# character, so a range of text is styled with one bytes.translate, one
+# style byte per byte of text, ready for SCI_SETSTYLINGEX.  Comments are
+# then found with a regular expression and restyled.  A comment ends at
+# the first ')' or at the end of its line, so any range of whole lines
+# can be styled without looking at the lines before it.
+#
+# Kept free of Qt so it can be used and measured without a display.
+
+import re
+
+DEFAULT, COMMENT, KEY, ASSIGNMENT, VALUE = range(5)
+
+def _table(default, *styles):
+    table = bytearray([default]) * 256
+    for chars, style in styles:
+        for c in chars:
+            table[c] = style
+    return bytes(table)
+
+_CODE = _table(DEFAULT,
+    (b'%<>#=', ASSIGNMENT),
+    (b'[]', VALUE),
+    (b'()', COMMENT),
+    (b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ', KEY),
+    # the bytes of non-ascii characters, taken as letters
+    (range(0x80, 0x100), KEY))
+
+# In lines with MSG or DEBUG, these letters in comments are highlighted
+# up to the first comma
+_MESSAGE = _table(COMMENT, (b'msgdebuMSGDEBU,', ASSIGNMENT))
+
+_COMMENT = re.compile(rb'\([^)\r\n]*(?:\)|\r\n|[\r\n])?|\)')
+_END_OF_LINE = re.compile(rb'[\r\n]|$')
+
+def styles(source):
+    "Return the style of each byte of source, bytes holding whole lines"
+    result = bytearray(source.translate(_CODE))
+    line_end = last = 0
+    for m in _COMMENT.finditer(source):
+        start, end = m.span()
+        if start >= line_end:
+            # first comment on its line, which starts after the last one
+            line_start = max(source.rfind(b'\n', last, start),
+                             source.rfind(b'\r', last, start), last - 1) + 1
+            line_end = _END_OF_LINE.search(source, start).start()
+            lower = source[line_start:line_end].lower()
+            message = b'msg' in lower or b'debug' in lower
+        stop = start
+        if message:
+            comma = source.find(b',', start, end)
+            stop = end if comma < 0 else comma + 1
+            result[start:stop] = source[start:stop].translate(_MESSAGE)
+            message = comma < 0
+        result[stop:end] = bytes((COMMENT,)) * (end - stop)
+        last = end
+    return bytes(result)
@@ -2,6 +2,7 @@ import itertools
 import OpenGL.GL as GL
 from OpenGL import GLU
 import hal
+import vismach_mesh
 
 
 #################################################
@@ -794,107 +795,24 @@ class Color(Collection):
 
 
 class AsciiSTL:
+    "A triangle mesh from an STL file, text or binary"
     def __init__(self, filename=None, data=None):
-        if data is None:
-            data = open(filename, "r")
-        elif isinstance(data, str):
-            data = data.split("\n")
-        self.list = None
-        t = []
-        n = [0, 0, 0]
-        self.d = d = []
-        for line in data:
-            if line.find("normal") != -1:
-                line = line.split()
-                x, y, z = list(map(float, line[-3:]))
-                n = [x, y, z]
-            elif line.find("vertex") != -1:
-                line = line.split()
-                x, y, z = list(map(float, line[-3:]))
-                t.append([x, y, z])
-                if len(t) == 3:
-                    if n == [0, 0, 0]:
-                        dx1 = t[1][0] - t[0][0]
-                        dy1 = t[1][1] - t[0][1]
-                        dz1 = t[1][2] - t[0][2]
-                        dx2 = t[2][0] - t[0][0]
-                        dy2 = t[2][1] - t[0][1]
-                        dz2 = t[2][2] - t[0][2]
-                        n = [dy1 * dz2 - dy2 * dz1, dz1 * dx2 - dz2 * dx1, dy1 * dx2 - dy2 * dx1]
-                    d.append((n, t))
-                    t = []
-                    n = [0, 0, 0]
+        self.mesh = vismach_mesh.Mesh("stl", filename, data)
 
     def draw(self):
-        if self.list is None:
-            # OpenGL isn't ready yet in __init__ so the display list
-            # is created during the first draw
-            self.list = GL.glGenLists(1)
-            GL.glNewList(self.list, GL.GL_COMPILE)
-            GL.glBegin(GL.GL_TRIANGLES)
-            for n, t in self.d:
-                GL.glNormal3f(*n)
-                GL.glVertex3f(*t[0])
-                GL.glVertex3f(*t[1])
-                GL.glVertex3f(*t[2])
-            GL.glEnd()
-            GL.glEndList()
-            del self.d
-        GL.glCallList(self.list)
+        self.mesh.draw()
+
+    def shape(self):
+        return "mesh", self.mesh.triangles()
 
 
 class AsciiOBJ:
     def __init__(self, filename=None, data=None):
-        if data is None:
-            data = open(filename, "r")
-        elif isinstance(data, str):
-            data = data.split("\n")
-
-        self.v = v = []
-        self.vn = vn = []
-        self.f = f = []
-        for line in data:
-            if line.startswith("#"): continue
-            if line.startswith("vn"):
-                vn.append([float(w) for w in line.split()[1:]])
-            elif line.startswith("v"):
-                v.append([float(w) for w in line.split()[1:]])
-            elif line.startswith("f"):
-                f.append(self.parse_face(line))
-
-        #        print v[:5]
-        #        print vn[:5]
-        #        print f[:5]
-
-        self.list = None
-
-    def parse_int(self, i):
-        if i == '': return None
-        return int(i)
-
-    def parse_slash(self, word):
-        return [self.parse_int(i) for i in word.split("/")]
-
-    def parse_face(self, line):
-        return [self.parse_slash(w) for w in line.split()[1:]]
+        self.mesh = vismach_mesh.Mesh("obj", filename, data)
 
     def draw(self):
-        if self.list is None:
-            # OpenGL isn't ready yet in __init__ so the display list
-            # is created during the first draw
-            self.list = GL.glGenLists(1)
-            GL.glNewList(self.list, GL.GL_COMPILE)
-            GL.glDisable(GL.GL_CULL_FACE)
-            GL.glBegin(GL.GL_TRIANGLES)
-            # print "obj", len(self.f)
-            for f in self.f:
-                for v, t, n in f:
-                    if n:
-                        GL.glNormal3f(*self.vn[n - 1])
-                    GL.glVertex3f(*self.v[v - 1])
-            GL.glEnd()
-            GL.glEndList()
-            del self.v
-            del self.vn
-            del self.f
-        GL.glCallList(self.list)
+        GL.glDisable(GL.GL_CULL_FACE)
+        self.mesh.draw()
+
+    def shape(self):
+        return "mesh", self.mesh.triangles()
@@ -9,6 +9,8 @@ from PyQt5.QtWidgets import (QApplication, QHBoxLayout, QOpenGLWidget, QSlider,
 
 import OpenGL.GL as GL
 from OpenGL import GLU
+import hal
+import vismach_backplot
 from .primitives import *
 
 
@@ -82,8 +84,7 @@ class GLWidget(QOpenGLWidget):
 
         self.r_back = self.g_back = self.b_back = 0
 
-        self.plotdata = []
-        self.plotlen = 16000
+        self.backplot = vismach_backplot.Backplot()
 
         # Where we are centering.
         self.xcenter = 0.0
@@ -278,11 +279,7 @@ class GLWidget(QOpenGLWidget):
         wz = tx * view2work[2] + ty * view2work[6] + tz * view2work[10] + view2work[14]
         # wx, wy, wz are the values to use for backplot
         # so we save them in a buffer
-        if len(self.plotdata) == self.plotlen:
-            del self.plotdata[:self.plotlen / 10]
-        point = [wx, wy, wz]
-        if not self.plotdata or point != self.plotdata[-1]:
-            self.plotdata.append(point)
+        self.backplot.add(wx, wy, wz)
 
         # now lets draw something in the tool coordinate system
         # GL.glPushMatrix()
@@ -321,10 +318,7 @@ class GLWidget(QOpenGLWidget):
         GL.glLineWidth(2)
         GL.glColor3f(1.0, 0.5, 0.5)
 
-        GL.glBegin(GL.GL_LINE_STRIP)
-        for p in self.plotdata:
-            GL.glVertex3f(*p)
-        GL.glEnd()
+        self.backplot.draw()
 
         GL.glEnable(GL.GL_LIGHTING)
         GL.glColor3f(1, 1, 1)
@@ -336,7 +330,25 @@ class GLWidget(QOpenGLWidget):
         GL.glPopMatrix()
 
     def plotclear(self):
-        del self.plotdata[:self.plotlen]
+        self.backplot.clear()
+
+    def make_plot_pins(self, comp):
+        """Make the plot-length and plot-decimation pins of the Tk vismach
+        on comp, the panel's component"""
+        length = comp.newpin('plot-length', hal.HAL_U32, hal.HAL_IN)
+        decimation = comp.newpin('plot-decimation', hal.HAL_FLOAT, hal.HAL_IN)
+        length.set(self.backplot.length)
+        decimation.set(self.backplot.decimation)
+        length.value_changed.connect(self.set_plot_length)
+        decimation.value_changed.connect(self.set_plot_decimation)
+
+    def set_plot_length(self, length):
+        length = max(2, length)
+        if length != self.backplot.length:
+            self.backplot.resize(length)
+
+    def set_plot_decimation(self, decimation):
+        self.backplot.decimation = decimation
 
     def resizeGL(self, width, height):
         side = min(width, height)
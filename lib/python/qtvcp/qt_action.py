@@ -832,11 +832,13 @@ class FilterProgram:
         import subprocess
         outfile = open(outfilename, "w")
         infilename_q = infilename.replace("'", "'\\''")
-
+        env = dict(os.environ)
+        env['AXIS_PROGRESS_BAR'] = '1'
         p = subprocess.Popen(["sh", "-c", "%s '%s'" % (program_filter, infilename_q)],
                              stdin=subprocess.PIPE,
                              stdout=outfile,
-                             stderr=subprocess.PIPE)
+                             stderr=subprocess.PIPE,
+                             env=env)
         p.stdin.close()  # No input for you
 
         self.p = p
@@ -855,23 +857,23 @@ class FilterProgram:
             self.finish()
             STATUS.disconnect(self.gid)
             return False
-        # check if there is something to read or pass
-        r, w, x = select.select([self.p.stderr], [], [], 0)
-        if not r:
-            return True
-        # process message from standard error
-        stderr_line = self.p.stderr.readline()
-        if sys.version_info.major > 2:
-            stderr_line = stderr_line.decode("utf-8")
-        # compare to pre compiled re string
-        # if true : update progress
-        # else add it too error message string for later
-        m = progress_re.match(stderr_line)
-        if m:
-            self.progress.update(int(m.group(1)), 1)
-        else:
-            self.stderr_text.append(stderr_line)
-            sys.stderr.write(stderr_line)
+        # process every message waiting on standard error, so progress
+        # reports do not queue up behind the periodic update
+        while select.select([self.p.stderr], [], [], 0)[0]:
+            stderr_line = self.p.stderr.readline()
+            if not stderr_line:
+                break
+            if sys.version_info.major > 2:
+                stderr_line = stderr_line.decode("utf-8")
+            # compare to pre compiled re string
+            # if true : update progress
+            # else add it too error message string for later
+            m = progress_re.match(stderr_line)
+            if m:
+                self.progress.update(int(m.group(1)), 1)
+            else:
+                self.stderr_text.append(stderr_line)
+                sys.stderr.write(stderr_line)
         return True
 
     def finish(self):
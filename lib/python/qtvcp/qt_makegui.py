@@ -2,9 +2,11 @@ import os
 import sys
 import subprocess
 
-from PyQt5 import QtGui, QtCore, QtWidgets, uic
+from PyQt5 import QtGui, QtCore, QtWidgets
 import traceback
 from qtvcp.widgets.widget_baseclass import _HalWidgetBase
+from qtvcp import qt_startup
+from qtvcp.qt_startup import PROFILE
 # Set up logging
 from . import logger
 
@@ -131,6 +133,11 @@ class _VCPWindow(QtWidgets.QMainWindow):
     def load_resources(self):
         def qrccompile(qrcname, qrcpy):
             log.info('Compiling qrc: {} to \n {}'.format(qrcname, qrcpy))
+            done = qt_startup.compile_qrc(qrcname, qrcpy)
+            if done:
+                return
+            if done is False:
+                log.warning('Compiling {} in process failed, trying pyrcc5'.format(qrcname))
             try:
                 subprocess.call(["pyrcc5", "-o", "{}".format(qrcpy), "{}".format(qrcname)])
             except OSError as e:
@@ -156,11 +163,9 @@ class _VCPWindow(QtWidgets.QMainWindow):
 
         # Is there a qrc file in directory?
         if qrcname is not None:
-            qrcTime = os.stat(qrcname).st_mtime
             if qrcpy is not None and os.path.isfile(qrcpy):
-                pyTime = os.stat(qrcpy).st_mtime
-                # is py older then qrc file?
-                if pyTime < qrcTime:
+                # is py older then qrc file or the files it lists?
+                if qt_startup.qrc_stale(qrcname, qrcpy):
                     qrccompile(qrcname, qrcpy)
             # there is a qrc file but no resources.py file...compile it
             else:
@@ -187,11 +192,21 @@ class _VCPWindow(QtWidgets.QMainWindow):
 
     def instance(self):
         self.load_resources()
+        PROFILE.mark('resources')
         try:
-            instance = uic.loadUi(self.filename, self)
+            compiled = qt_startup.compiled_ui(self.PATHS)
+            if compiled is not None:
+                qt_startup.setup_ui(compiled, self)
+            else:
+                from PyQt5 import uic
+                instance = uic.loadUi(self.filename, self)
         except AttributeError as e:
             formatted_lines = traceback.format_exc().splitlines()
-            if 'slotname' in formatted_lines[-2]:
+            # loadUi fails in its slot connecting code, compiled ui files
+            # on the connect line itself (newer pythons add a line of ^
+            # under the failing line)
+            failed = ' '.join(formatted_lines[-3:-1])
+            if 'slotname' in failed or '.connect(' in failed:
                 log.critical('Missing slot name in handler file {}'.format(e))
                 message = '''A widget in the ui file, was assigned a signal \
 call to a missing function name in the handler file?\n
@@ -201,6 +216,7 @@ Python Error:\n {}'''.format(str(e))
             else:
                 log.critical(e)
                 raise
+        PROFILE.mark('ui')
 
     def apply_styles(self, fname=None):
         if self.PATHS.IS_SCREEN:
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# Qtvcp startup
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+###############################################################################
+
+# Things done once per screen rather than on every launch:
+#
+# The .ui file is compiled to a python module with uic.compileUi and kept,
+# with its bytecode, in a cache folder under a name made from the ui file's
+# path, size and modification time, so building the window is running that
+# code instead of parsing the XML.  For a screen the cache folder is
+# qtvcp/cache in the config folder, for a panel (or if that can't be
+# written) it is ~/.cache/linuxcnc/qtvcp.
+#
+# The qrc file is compiled to resources.py in this process rather than by
+# running pyrcc5, and only when the qrc file or one of the files it lists
+# is newer than resources.py.
+#
+# PROFILE records how long each phase of startup took, for qtvcp's
+# --profile-startup option.
+
+import os
+import sys
+import time
+import glob
+import marshal
+import hashlib
+import xml.etree.ElementTree as ET
+from io import StringIO
+
+from PyQt5 import QtCore
+
+# Set up logging
+from . import logger
+
+LOG = logger.getLogger(__name__)
+
+# Force the log level for this module
+# LOG.setLevel(logger.DEBUG) # One of DEBUG, INFO, WARNING, ERROR, CRITICAL
+
+# Bump when the way cache entries are made changes
+VERSION = 1
+
+
+class _Profile(object):
+    def __init__(self):
+        self.start = self.last = time.time()
+        self.phases = []
+        self.notes = []
+
+    def begin(self, start):
+        "Count from start, a time.time() taken earlier"
+        self.start = self.last = start
+
+    def mark(self, phase):
+        "Record the time since the last mark as phase"
+        now = time.time()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def note(self, text):
+        self.notes.append(text)
+
+    def report(self):
+        total = self.last - self.start
+        lines = ['Startup time by phase:']
+        for phase, t in self.phases:
+            lines.append('  {:<24} {:8.1f} ms {:5.1f}%'.format(phase, t * 1000,
+                         100 * t / total if total else 0))
+        lines.append('  {:<24} {:8.1f} ms'.format('total', total * 1000))
+        for text in self.notes:
+            lines.append('  ' + text)
+        return '\n'.join(lines)
+
+PROFILE = _Profile()
+
+
+def cache_dirs(paths):
+    "Where cached files for the screen or panel may go, in order of preference"
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    user = os.path.join(base, 'linuxcnc', 'qtvcp')
+    if paths.IS_SCREEN:
+        return [os.path.join(paths.CONFIGPATH, 'qtvcp', 'cache'), user]
+    return [user]
+
+def _stamp(*filenames):
+    "A key that changes whenever one of filenames does"
+    parts = [str(VERSION), QtCore.PYQT_VERSION_STR, sys.implementation.cache_tag]
+    for name in filenames:
+        st = os.stat(name)
+        parts += [os.path.abspath(name), str(st.st_size), str(st.st_mtime_ns)]
+    return hashlib.sha1('\0'.join(parts).encode('utf-8', 'surrogateescape')).hexdigest()[:16]
+
+def _store(directory, name, data, stale):
+    "Write data to directory/name, removing the files matching stale"
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    for old in glob.glob(os.path.join(directory, stale)):
+        if old != path:
+            try:
+                os.unlink(old)
+            except OSError:
+                pass
+    return path
+
+def compile_ui(uifile):
+    """Return the python source uic makes of uifile.  Resource files named
+    in the ui file are left out, qtvcp loads its own"""
+    from PyQt5 import uic
+    tree = ET.parse(uifile)
+    root = tree.getroot()
+    for resources in root.findall('resources'):
+        root.remove(resources)
+    source = StringIO()
+    source.write(ET.tostring(root, encoding='unicode'))
+    source.seek(0)
+    out = StringIO()
+    uic.compileUi(source, out)
+    return out.getvalue()
+
+def _load_code(path):
+    "The code object marshalled next to the module at path, or None"
+    try:
+        with open(path[:-3] + '.code', 'rb') as f:
+            return marshal.load(f)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+
+def compiled_ui(paths):
+    """Return the code of the module compiled from the ui file, compiling it
+    if there is none for the file as it is now, or None if that failed"""
+    uifile = paths.XML
+    name = '{}_ui_{}.py'.format(paths.BASENAME, _stamp(uifile))
+    dirs = cache_dirs(paths)
+    for directory in dirs:
+        path = os.path.join(directory, name)
+        code = _load_code(path) if os.path.isfile(path) else None
+        if code is not None:
+            PROFILE.note('ui: cached {}'.format(path))
+            return code
+    try:
+        text = compile_ui(uifile)
+    except Exception as e:
+        LOG.warning('Could not compile {}: {}'.format(uifile, e))
+        return None
+    text = '# compiled from {} by qtvcp\n{}'.format(uifile, text)
+    for directory in dirs:
+        try:
+            path = _store(directory, name, text, '{}_ui_*.py'.format(paths.BASENAME))
+            # the source is kept for tracebacks, the code to skip compiling
+            # it, whether or not python may write its own bytecode caches
+            code = compile(text, path, 'exec')
+            _store(directory, name[:-3] + '.code', marshal.dumps(code),
+                   '{}_ui_*.code'.format(paths.BASENAME))
+        except (IOError, OSError) as e:
+            LOG.debug('Could not write ui cache in {}: {}'.format(directory, e))
+            continue
+        LOG.info('Compiled ui file to yellow<{}>'.format(path))
+        PROFILE.note('ui: compiled to {}'.format(path))
+        return code
+    LOG.warning('No writable folder for the compiled ui file of {}'.format(uifile))
+    return None
+
+def setup_ui(code, window):
+    """Build the widgets of the compiled ui code into window, as
+    uic.loadUi(uifile, window) would: every named object is an attribute
+    of window"""
+    module = {'__name__': 'qtvcp_ui'}
+    exec(code, module)
+    cls = [v for n, v in module.items() if n.startswith('Ui_')][0]
+    # the methods of the Ui_ class are run with window as their self
+    window.retranslateUi = cls.retranslateUi.__get__(window)
+    cls.setupUi(window, window)
+
+def qrc_files(qrcname):
+    "The qrc file and the files it lists"
+    files = [qrcname]
+    base = os.path.dirname(qrcname)
+    try:
+        for f in ET.parse(qrcname).getroot().iter('file'):
+            files.append(os.path.join(base, f.text.strip()))
+    except (ET.ParseError, IOError, OSError) as e:
+        LOG.debug('Could not read {}: {}'.format(qrcname, e))
+    return files
+
+def qrc_stale(qrcname, qrcpy):
+    "Whether qrcpy is missing or older than the qrc file or one of its files"
+    try:
+        built = os.stat(qrcpy).st_mtime
+    except OSError:
+        return True
+    for name in qrc_files(qrcname):
+        try:
+            if os.stat(name).st_mtime > built:
+                return True
+        except OSError:
+            pass
+    return False
+
+def compile_qrc(qrcname, qrcpy):
+    """Compile qrcname to qrcpy with PyQt's resource compiler in this
+    process.  Returns False if it failed, None if it isn't available"""
+    try:
+        from PyQt5 import pyrcc_main
+    except ImportError:
+        return None
+    return bool(pyrcc_main.processResourceFile([qrcname], qrcpy, False))
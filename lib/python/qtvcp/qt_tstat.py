@@ -18,7 +18,8 @@
 from __future__ import print_function
 
 import os
-import hashlib
+
+import filewatch
 
 from qtvcp.core import Status, Info, Action
 # Set up logging
@@ -41,8 +42,6 @@ class _TStat(object):
         if self.__class__._instanceNum >= 1:
             return
         self.__class__._instanceNum += 1
-        self._delay = 0
-        self._hash_code = None
         self.NUM = 0
         self.POCKET = 1
         self.X = 2
@@ -64,7 +63,9 @@ class _TStat(object):
         self.tool_wear_info = None
         self.current_tool_num = -1
         self.toolinfo = None
-        STATUS.connect('periodic', self.periodic_check)
+        # tell the widgets when the tool file changes, whoever changed it
+        if self.toolfile is not None:
+            filewatch.service().subscribe(self.toolfile, lambda f: self.emit_update())
         STATUS.connect('forced-update', lambda o: self.emit_update())
 
     def GET_TOOL_INFO(self, toolnum):
@@ -335,6 +336,7 @@ class _TStat(object):
         # That would make linuxcnc and the widget to be out of synch leading to odd errors
         file.flush()
         os.fsync(file.fileno())
+        file.close()
         # tell linuxcnc we changed the tool table entries
         try:
             ACTION.RELOAD_TOOLTABLE()
@@ -342,32 +344,8 @@ class _TStat(object):
             LOG.error("reloading of tool table into linuxcnc: {}".format(self.toolfile))
             return True
 
-        # create a hash code
-
-    def md5sum(self, filename):
-        try:
-            f = open(filename, "rb")
-        except:
-            return None
-        else:
-            return hashlib.md5(f.read()).hexdigest()
-
     # push the update to whoever using STATUS
     def emit_update(self):
         data = self.GET_TOOL_MODELS()
         if data is not None:
             STATUS.emit('toolfile-stale', data)
-
-    # check the hash code on the toolfile against
-    # the saved hash code when last reloaded.
-    def periodic_check(self, w):
-        if self._delay < 9:
-            self._delay += 1
-            return
-        if STATUS.is_status_valid() == False:
-            return
-        self._delay = 0
-        m1 = self.md5sum(self.toolfile)
-        if m1 and self._hash_code != m1:
-            self._hash_code = m1
-            self.emit_update()
@@ -37,6 +37,7 @@ from PyQt5.QtWidgets import QMainWindow, QWidget, QPushButton, QAction,\
             QFileDialog, QFrame, QLabel, QStyleOption
 
 from qtvcp.widgets.widget_baseclass import _HalWidgetBase
+from qtvcp.lib import gcode_styles
 from qtvcp.core import Status, Info, Action
 from qtvcp import logger
 
@@ -114,72 +115,18 @@ class GcodeLexer(QsciLexerCustom):
         # scintilla works with encoded bytes, not decoded characters.
         # this matters if the source contains non-ascii characters and
         # a multi-byte encoding is used (e.g. utf-8)
-        source = ''
         if end > editor.length():
             end = editor.length()
-        if end > start:
-            if sys.hexversion >= 0x02060000:
-                # faster when styling big files, but needs python 2.6
-                source = bytearray(end - start)
-                editor.SendScintilla(
-                    editor.SCI_GETTEXTRANGE, start, end, source)
-            else:
-                source = str(editor.text())[start:end]
-        if not source:
+        if end <= start:
             return
+        source = bytearray(end - start)
+        editor.SendScintilla(editor.SCI_GETTEXTRANGE, start, end, source)
 
-        # the line index will also be needed to implement folding
-        index = editor.SendScintilla(editor.SCI_LINEFROMPOSITION, start)
-        if index > 0:
-            # the previous state may be needed for multi-line styling
-            pos = editor.SendScintilla(
-                      editor.SCI_GETLINEENDPOSITION, index - 1)
-            state = editor.SendScintilla(editor.SCI_GETSTYLEAT, pos)
-        else:
-            state = self.Default
-
-        set_style = self.setStyling
+        # scintilla always asks to style whole lines, and each line is
+        # styled on its own, so all of them can be set in one go
+        styles = gcode_styles.styles(bytes(source))
         self.startStyling(start, 0x1f)
-        try:
-            # scintilla always asks to style whole lines
-            for line in source.splitlines(True):
-                #print (line.decode('utf-8'))
-                graymode = False
-                line = line.decode('utf-8')
-                msg = ('msg' in line.lower() or 'debug' in line.lower())
-                for char in line:
-                    #print (char,msg)
-                    if char == ('('):
-                        graymode = True
-                        set_style(1, self.Comment)
-                        continue
-                    elif char == (')'):
-                        graymode = False
-                        set_style(1, self.Comment)
-                        continue
-                    elif graymode:
-                        if (msg and char.lower() in ('m', 's', 'g', ',', 'd', 'e', 'b', 'u')):
-                            set_style(1, self.Assignment)
-                            if char == ',': msg = False
-                        else:
-                            set_style(1, self.Comment)
-                        continue
-                    elif char in ('%', '<', '>', '#', '='):
-                        state = self.Assignment
-                    elif char in ('[', ']'):
-                        state = self.Value
-                    elif char.isalpha():
-                        state = self.Key
-                    elif char.isdigit():
-                        state = self.Default
-                    else:
-                        state = self.Default
-                    set_style(1, state)
-
-                # folding implementation goes here
-                index += 1
-        except Exception as e:
-            print(e)
+        editor.SendScintilla(editor.SCI_SETSTYLINGEX, len(styles), styles)
 
 
 ##########################################################
@@ -253,6 +200,12 @@ class EditorBase(QsciScintilla):
         self.SendScintilla(QsciScintilla.SCI_SETSCROLLWIDTH,700)
         self.SendScintilla(QsciScintilla.SCI_SETSCROLLWIDTHTRACKING)
 
+        # In long programs style the lines shown first, and the lines
+        # before them in idle time (needs scintilla 3.7)
+        if hasattr(QsciScintilla, 'SCI_SETIDLESTYLING'):
+            self.SendScintilla(QsciScintilla.SCI_SETIDLESTYLING,
+                               QsciScintilla.SC_IDLESTYLING_TOVISIBLE)
+
         # default gray background
         self.set_background_color('#C0C0C0')
         self._stylebackgroundColor = '#C0C0C0'
@@ -337,11 +290,20 @@ class EditorBase(QsciScintilla):
     def new_text(self):
         self.setText('')
 
+    # read a file in chunks, so a long program is never held as one
+    # string in python, then again as a QString and as bytes
+    def read_file(self, filepath, chunk=1 << 20):
+        self.setText('')
+        with open(os.path.expanduser(filepath)) as f:
+            self.SendScintilla(QsciScintilla.SCI_ALLOCATE,
+                               os.fstat(f.fileno()).st_size + 1)
+            for text in iter(lambda: f.read(chunk), ''):
+                self.append(text)
+
     def load_text(self, filepath):
         self.filepath = filepath
         try:
-            fp = os.path.expanduser(filepath)
-            self.setText(open(fp).read())
+            self.read_file(filepath)
         except:
             LOG.error('File path is not valid: {}'.format(filepath))
             self.setText('')
@@ -539,8 +501,7 @@ class GcodeDisplay(EditorBase, _HalWidgetBase):
     def load_text(self, filename):
         if filename:
             try:
-                fp = os.path.expanduser(filename)
-                self.setText(open(fp).read())
+                self.read_file(filename)
                 self.last_line = 0
                 self.ensureCursorVisible()
                 self.SendScintilla(QsciScintilla.SCI_VERTICALCENTRECARET)
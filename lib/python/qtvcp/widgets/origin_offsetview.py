@@ -22,6 +22,7 @@ from PyQt5.QtCore import Qt, QAbstractTableModel, QVariant, pyqtProperty
 from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import QTableView, QAbstractItemView
 import linuxcnc
+import filewatch
 
 from qtvcp.widgets.widget_baseclass import _HalWidgetBase
 from qtvcp.core import Status, Action, Info
@@ -51,6 +52,7 @@ class OriginOffsetView(QTableView, _HalWidgetBase):
         self.setAlternatingRowColors(True)
 
         self.filename = INFO.PARAMETER_FILE
+        self.var_file = None
         self.axisletters = ["x", "y", "z", "a", "b", "c", "u", "v", "w"]
         self.current_system = None
         self._system_int = 1
@@ -272,52 +274,25 @@ class OriginOffsetView(QTableView, _HalWidgetBase):
                     self.tabledata[row][column] = locale.format(tmpl, i[column])
         self.tablemodel.layoutChanged.emit()
 
-    # We read the var file directly
-    # and pull out the info we need
-    # if anything goes wrong we set all the info to 0
+    # The var file is kept by filewatch, which rereads it when it changes
+    # and calls us if any parameter did.
+    # We pull out the info we need
     def read_file(self):
-        try:
-            g54 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g55 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g56 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g57 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g58 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g59 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g59_1 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g59_2 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            g59_3 = [0, 0, 0, 0, 0, 0, 0, 0, 0]
-            if self.filename is None:
-                return g54, g55, g56, g57, g58, g59, g59_1, g59_2, g59_3
+        if self.filename is None:
+            return [[0] * 9 for i in range(9)]
+        if self.var_file is None or self.var_file.filename != os.path.abspath(self.filename):
             if not os.path.exists(self.filename):
                 LOG.error('File does not exist: yellow<{}>'.format(self.filename))
-                return g54, g55, g56, g57, g58, g59, g59_1, g59_2, g59_3
-            logfile = open(self.filename, "r").readlines()
-            for line in logfile:
-                temp = line.split()
-                param = int(temp[0])
-                data = float(temp[1])
-
-                if 5229 >= param >= 5221:
-                    g54[param - 5221] = data
-                elif 5249 >= param >= 5241:
-                    g55[param - 5241] = data
-                elif 5269 >= param >= 5261:
-                    g56[param - 5261] = data
-                elif 5289 >= param >= 5281:
-                    g57[param - 5281] = data
-                elif 5309 >= param >= 5301:
-                    g58[param - 5301] = data
-                elif 5329 >= param >= 5321:
-                    g59[param - 5321] = data
-                elif 5349 >= param >= 5341:
-                    g59_1[param - 5341] = data
-                elif 5369 >= param >= 5361:
-                    g59_2[param - 5361] = data
-                elif 5389 >= param >= 5381:
-                    g59_3[param - 5381] = data
-            return g54, g55, g56, g57, g58, g59, g59_1, g59_2, g59_3
-        except:
-            return None, None, None, None, None, None, None, None, None
+            if self.var_file is not None:
+                self.var_file.unsubscribe(self._var_file_changed)
+            self.var_file = filewatch.var_file(self.filename)
+            self.var_file.subscribe(self._var_file_changed)
+        # G54 to G59.3, 20 parameters apart starting at 5221
+        return [[self.var_file.get(start + axis, 0) for axis in range(9)]
+                for start in range(5221, 5382, 20)]
+
+    def _var_file_changed(self, changed):
+        self.reload_offsets()
 
     def dataChanged(self, new, old, x):
         row = new.row()
@@ -364,6 +339,8 @@ class OriginOffsetView(QTableView, _HalWidgetBase):
             self.reload_offsets()
 
     # only update every 10th time periodic calls
+    # the rows from the var file only change when it does, this
+    # keeps the rows from linuxcnc's status current
     def periodic_check(self, w):
         if self.delay < 9:
             self.delay += 1
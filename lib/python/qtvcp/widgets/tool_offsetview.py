@@ -18,10 +18,12 @@ import sys
 import os
 import locale
 import operator
+import difflib
+from array import array
 
-from PyQt5.QtCore import Qt, QAbstractTableModel, QVariant, pyqtProperty, QSize
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant, pyqtProperty, QSize
 from PyQt5.QtGui import QColor, QIcon
-from PyQt5.QtWidgets import (QTableView, QAbstractItemView, QCheckBox,
+from PyQt5.QtWidgets import (QTableView, QAbstractItemView,
 QItemEditorFactory,QDoubleSpinBox,QSpinBox,QStyledItemDelegate)
 from qtvcp.widgets.widget_baseclass import _HalWidgetBase
 from qtvcp.core import Status, Action, Info, Tool
@@ -138,8 +140,10 @@ class ToolOffsetView(QTableView, _HalWidgetBase):
 
         # set horizontal header properties
         hh = self.horizontalHeader()
-        # auto adjust to contents
+        # auto adjust to contents, of the rows on screen only
+        # (measuring a thousand tools after every change is slow)
         hh.setSectionResizeMode(3)
+        hh.setResizeContentsPrecision(0)
         
         hh.setStretchLastSection(True)
         hh.setSortIndicator(1,Qt.AscendingOrder)
@@ -173,8 +177,8 @@ class ToolOffsetView(QTableView, _HalWidgetBase):
 
     # alphanumerical
     def callTextDialog(self, text,item):
-        text = self.tablemodel.arraydata[item.row()][19]
-        tool = self.tablemodel.arraydata[item.row()][1]
+        text = self.tablemodel.value(item.row(), 19)
+        tool = self.tablemodel.value(item.row(), 1)
         mess = {'NAME':self.text_dialog_code,'ID':'%s__' % self.objectName(),
                 'PRELOAD':text, 'TITLE':'Tool {} Description Entry'.format(tool),
                 'ITEM':item}
@@ -184,7 +188,7 @@ class ToolOffsetView(QTableView, _HalWidgetBase):
     # numerical only
     def callDialog(self, text,item):
         axis = self.tablemodel.headerdata[item.column()]
-        tool = self.tablemodel.arraydata[item.row()][1]
+        tool = self.tablemodel.value(item.row(), 1)
         mess = {'NAME':self.dialog_code,'ID':'%s__' % self.objectName(),
                 'PRELOAD':float(text), 'TITLE':'Tool {} Offset of {},{}'.format(tool, axis,text),
                 'ITEM':item}
@@ -207,7 +211,11 @@ class ToolOffsetView(QTableView, _HalWidgetBase):
 
     #############################################################
 
-    def dataChanged(self, new, old, roles):
+    def dataChanged(self, new, old, roles=[]):
+        # rows changed by the tool file only need repainting
+        if self.tablemodel.reloading:
+            super(ToolOffsetView, self).dataChanged(new, old, roles)
+            return
         self.editing_flag = True
         row = new.row()
         col = new.column()
@@ -284,18 +292,22 @@ class ToolOffsetView(QTableView, _HalWidgetBase):
 
     def setmetrictemplate(self, data):
         self.tablemodel.metric_text_template = data
+        self.tablemodel.invalidate()
     def getmetrictemplate(self):
         return self.tablemodel.metric_text_template
     def resetmetrictemplate(self):
         self.tablemodel.metric_text_template =  '%10.3f'
+        self.tablemodel.invalidate()
     metric_template = pyqtProperty(str, getmetrictemplate, setmetrictemplate, resetmetrictemplate)
 
     def setimperialtexttemplate(self, data):
         self.tablemodel.imperial_text_template = data
+        self.tablemodel.invalidate()
     def getimperialtexttemplate(self):
         return self.tablemodel.imperial_text_template
     def resetimperialtexttemplate(self):
         self.tablemodel.imperial_text_template =  '%9.4f'
+        self.tablemodel.invalidate()
     imperial_template = pyqtProperty(str, getimperialtexttemplate, setimperialtexttemplate, resetimperialtexttemplate)
 
     def getColorHighlight(self):
@@ -315,13 +327,37 @@ class ToolOffsetView(QTableView, _HalWidgetBase):
 #########################################
 # custom model
 #########################################
+
+# The model keeps one sequence per column: whether the row is checked,
+# integers for tool, pocket and orientation, the comment as text and
+# floats for the rest.  Display strings are made when a row is first
+# painted and kept for each units and diameter mode, until the row changes.
+CHECK_COLUMN = 0
+INTEGER_COLUMNS = (1, 2, 18)
+COMMENT_COLUMN = 19
+FLOAT_COLUMNS = tuple(range(3, 18))
+COLUMNS = 20
+NO_TOOL = [False, 0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0, 'No Tool']
+
+def _take(column, rows):
+    "The values of column at rows, in a sequence of the same kind"
+    values = [column[r] for r in rows]
+    if isinstance(column, array):
+        return array(column.typecode, values)
+    return type(column)(values)
+
+def _runs(rows):
+    "(first, last) of each run of consecutive numbers in sorted rows"
+    runs = []
+    for r in rows:
+        if runs and runs[-1][1] == r - 1:
+            runs[-1][1] = r
+        else:
+            runs.append([r, r])
+    return runs
+
 class MyTableModel(QAbstractTableModel):
     def __init__(self, parent=None):
-        """
-        Args:
-            datain: a list of lists\n
-            headerdata: a list of strings
-        """
         super(MyTableModel, self).__init__(parent)
         self.text_template = '%.4f'
         self.metric_text_template = '%10.3f'
@@ -336,42 +372,145 @@ class MyTableModel(QAbstractTableModel):
         if INFO.MACHINE_IS_LATHE:
             self.headerdata[2] = 'Stn'
         self.vheaderdata = []
-        self.arraydata = [[0, 0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0, 0,'No Tool']]
+        # True while rows are updated from the tool file rather than edited
+        self.reloading = False
+        self._sort = (1, Qt.AscendingOrder)
+        self._icons = {}
+        self._colors = {}
+        self._columns = self._new_columns([])
+        self._texts = {}
+        self._use_texts()
+        self._label_x()
         STATUS.connect('toolfile-stale',lambda o, d: self.update(d))
         self.update(None)
 
     def metricDisplay(self, state):
         self.metric_display = state
+        self._use_texts()
         self.layoutChanged.emit()
 
     def diameterDisplay(self, state):
         self.diameter_display = state
+        self._use_texts()
+        self._label_x()
+        self.layoutChanged.emit()
+
+    # call after changing a text template
+    def invalidate(self):
+        self._texts = {}
+        self._use_texts()
         self.layoutChanged.emit()
 
+    def _use_texts(self):
+        "Switch to the display strings of the current units and diameter mode"
+        key = (self.metric_display, self.diameter_display)
+        if key not in self._texts:
+            self._texts[key] = [None] * len(self._columns[1])
+        self._text = self._texts[key]
+
+    def _label_x(self):
+        mode = 'D' if self.diameter_display else 'R'
+        self.headerdata[3] = 'X ' + mode
+        self.headerdata[4] = 'X Wear ' + mode
+        self.headerDataChanged.emit(Qt.Horizontal, 3, 4)
+
+    # the value in one cell, in machine units
+    def value(self, row, col):
+        return self._columns[col][row]
+
+    # the rows as lists, as CONVERT_TO_STANDARD_TYPE takes them
+    @property
+    def arraydata(self):
+        rows = [list(values) for values in zip(*self._columns)]
+        for row in rows:
+            row[CHECK_COLUMN] = bool(row[CHECK_COLUMN])
+        return rows
+
     # make a list of all the checked tools
     def listCheckedTools(self):
-        checkedlist = []
-        for row in self.arraydata:
-            if row[0].isChecked():
-                checkedlist.append(row[1])
-        return checkedlist
+        return [tool for tool, checked in zip(self._columns[1], self._columns[CHECK_COLUMN])
+                if checked]
 
     def uncheckAllTools(self):
-        for row in self.arraydata:
-            if row[0].isChecked():
-                row[0].setChecked(False)
+        checked = self._columns[CHECK_COLUMN]
+        checked[:] = bytearray(len(checked))
+
+    def _new_columns(self, rows):
+        "The column sequences holding rows"
+        columns = []
+        for col in range(COLUMNS):
+            values = [row[col] for row in rows]
+            if col == CHECK_COLUMN:
+                columns.append(bytearray(bool(v) for v in values))
+            elif col in INTEGER_COLUMNS:
+                columns.append(array('q', [int(v) for v in values]))
+            elif col == COMMENT_COLUMN:
+                columns.append([str(v) for v in values])
+            else:
+                columns.append(array('d', [float(v) for v in values]))
+        return columns
 
     # update the internal array from STATUS's toolfile read array
-    # we make sure the first array is switched to a QCheckbox widget
+    # Rows of tools that are still there are kept (checked or not) and
+    # only repainted if they changed; rows of tools that came or went are
+    # inserted or removed.
     def update(self, models):
         data = TOOL.CONVERT_TO_WEAR_TYPE(models)
         if data in (None, []):
-            data = [[QCheckBox(),0, 0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0, 0,'No Tool']]
-        for line in data:
-                if line[0] != QCheckBox:
-                    line[0] = QCheckBox()
-        self.arraydata = data
-        self.layoutChanged.emit()
+            data = [list(NO_TOOL)]
+        col, order = self._sort
+        if col == CHECK_COLUMN:
+            # the rows carry no check marks, the model does: by tool number,
+            # then by the tool's mark in the model, as sort() left them
+            checked = set(self.listCheckedTools())
+            data = sorted(data, key=operator.itemgetter(1))
+            data.sort(key=lambda row: row[1] in checked, reverse=order == Qt.DescendingOrder)
+        else:
+            data = sorted(data, key=operator.itemgetter(col), reverse=order == Qt.DescendingOrder)
+        new = self._new_columns(data)
+        old_tools, new_tools = self._columns[1], new[1]
+        if old_tools == new_tools:
+            opcodes = [('equal', 0, len(old_tools), 0, len(new_tools))]
+        else:
+            opcodes = difflib.SequenceMatcher(None, old_tools, new_tools,
+                                              autojunk=False).get_opcodes()
+        self.reloading = True
+        try:
+            # from the end, so the rows before each change keep their number
+            for tag, i1, i2, j1, j2 in reversed(opcodes):
+                if tag == 'equal':
+                    self._refresh(i1, i2, new, j1)
+                    continue
+                if i2 > i1:
+                    self.beginRemoveRows(QModelIndex(), i1, i2 - 1)
+                    for column in self._columns:
+                        del column[i1:i2]
+                    for text in self._texts.values():
+                        del text[i1:i2]
+                    self.endRemoveRows()
+                if j2 > j1:
+                    self.beginInsertRows(QModelIndex(), i1, i1 + j2 - j1 - 1)
+                    for column, values in zip(self._columns, new):
+                        column[i1:i1] = values[j1:j2]
+                    for text in self._texts.values():
+                        text[i1:i1] = [None] * (j2 - j1)
+                    self.endInsertRows()
+        finally:
+            self.reloading = False
+
+    def _refresh(self, i1, i2, new, j1):
+        "Set rows i1 to i2 to the rows of new from j1, repainting those that changed"
+        changed = set()
+        for col in range(1, COLUMNS):
+            column, values = self._columns[col], new[col][j1:j1 + i2 - i1]
+            if column[i1:i2] != values:
+                changed.update(i1 + r for r, v in enumerate(values) if column[i1 + r] != v)
+                column[i1:i2] = values
+        for row in changed:
+            for text in self._texts.values():
+                text[row] = None
+        for first, last in _runs(sorted(changed)):
+            self.dataChanged.emit(self.index(first, 0), self.index(last, COLUMNS - 1))
 
     # Returns the number of rows under the given parent.
     # When the parent is valid it means that rowCount is
@@ -380,79 +519,83 @@ class MyTableModel(QAbstractTableModel):
     # Note: When implementing a table based model, rowCount() 
     # should return 0 when the parent is valid.
     def rowCount(self, parent):
-        return len(self.arraydata)
+        return len(self._columns[1])
 
     # Returns the number of columns for the children of the given parent.
     # Note: When implementing a table based model, columnCount() should 
     # return 0 when the parent is valid.
     def columnCount(self, parent):
-        if len(self.arraydata) > 0:
-            return len(self.arraydata[0])
-        return 0
+        return COLUMNS
+
+    def _format(self, row):
+        "The display strings of the float columns of row"
+        text = [None] * COLUMNS
+        if self.metric_display:
+            tmpl = self.metric_text_template
+        else:
+            tmpl = self.imperial_text_template
+        convert = self.metric_display != INFO.MACHINE_IS_METRIC
+        for col in FLOAT_COLUMNS:
+            value = self._columns[col][row]
+            if value == 0.0:
+                text[col] = self.zero_text_template % value
+            elif col in (16, 17):
+                text[col] = self.degree_text_template % value
+            else:
+                if convert:
+                    value = INFO.convert_units(value)
+                if col in (3, 4) and self.diameter_display:
+                    value *= 2
+                text[col] = tmpl % value
+        return text
+
+    def _color(self, name):
+        color = self._colors.get(name)
+        if color is None:
+            color = self._colors[name] = QColor(name)
+        return color
 
     # Returns the data stored under the given role for the item referred to by the index.
     def data(self, index, role=Qt.DisplayRole):
-        if role == Qt.EditRole:
-            return self.arraydata[index.row()][index.column()]
-        elif role == Qt.DecorationRole and index.column() == 18:
-            value = self.arraydata[index.row()][index.column()]
-            return QIcon(os.path.join(ICONPATH, "tool_pos_{}.png".format(value)))
-        elif role == Qt.DisplayRole:
-            value = self.arraydata[index.row()][index.column()]
-            col = index.column()
-            if isinstance(value, float):
-                if value == 0.0:
-                    tmpl = lambda s: self.zero_text_template % s
-                    return tmpl(value)
-                elif col in(16,17):
-                    tmpl = lambda s: self.degree_text_template % s
-                    return tmpl(value)
-                elif self.metric_display:
-                    tmpl = lambda s: self.metric_text_template % s
-                else:
-                    tmpl = lambda s: self.imperial_text_template % s
-                if self.metric_display != INFO.MACHINE_IS_METRIC:
-                    value = INFO.convert_units(value)
-                if col in(3,4):
-                    if self.diameter_display:
-                        value *=2
-                        self.headerdata[3] = 'X D'
-                        self.headerdata[4] = 'X Wear D'
-                    else:
-                        self.headerdata[3] = 'X R'
-                        self.headerdata[4] = 'X Wear R'
-                return tmpl(value)
-
-            if isinstance(value, str):
-                return '%s' % value
-            # Default (anything not captured above: e.g. int)
-            return value
+        row = index.row()
+        col = index.column()
+        if role == Qt.DisplayRole:
+            if col == CHECK_COLUMN:
+                return QVariant()
+            if col in INTEGER_COLUMNS or col == COMMENT_COLUMN:
+                return self._columns[col][row]
+            text = self._text[row]
+            if text is None:
+                text = self._text[row] = self._format(row)
+            return text[col]
+
+        elif role == Qt.EditRole:
+            return self._columns[col][row]
+
+        elif role == Qt.DecorationRole and col == 18:
+            value = self._columns[col][row]
+            icon = self._icons.get(value)
+            if icon is None:
+                icon = self._icons[value] = QIcon(os.path.join(ICONPATH, "tool_pos_{}.png".format(value)))
+            return icon
 
         elif role == Qt.BackgroundRole:
-            value = self.arraydata[index.row()][index.column()]
-            if (isinstance(value, int) or isinstance(value, float) or
-                  isinstance(value, str)):
-                if self.arraydata[index.row()][1] == self.parent().current_tool:
-                    return QColor(self._highlightcolor)
-                elif self.arraydata[index.row()][0].isChecked():
-                    return QColor(self._selectedcolor)
-                else:
-                    return QVariant()
-            
+            if col != CHECK_COLUMN:
+                if self._columns[1][row] == self.parent().current_tool:
+                    return self._color(self._highlightcolor)
+                elif self._columns[CHECK_COLUMN][row]:
+                    return self._color(self._selectedcolor)
+
         elif role == Qt.CheckStateRole:
-            if index.column() == 0:
-                # print(">>> data() row,col = %d, %d" % (index.row(), index.column()))
-                if self.arraydata[index.row()][index.column()].isChecked():
+            if col == CHECK_COLUMN:
+                if self._columns[col][row]:
                     return Qt.Checked
                 else:
                     return Qt.Unchecked
 
         elif role == Qt.ForegroundRole:
-            value = self.arraydata[index.row()][index.column()]
-
-            if ((isinstance(value, int) or isinstance(value, float))
-                and value < 0 ):
-                return QColor('red')
+            if col != CHECK_COLUMN and col != COMMENT_COLUMN and self._columns[col][row] < 0:
+                return self._color('red')
 
         return QVariant()
 
@@ -476,19 +619,12 @@ class MyTableModel(QAbstractTableModel):
         if not index.isValid():
             LOG.error(">>> index not valid {}".format(index))
             return False
-        LOG.debug("original value:{}".format(self.arraydata[index.row()][col]))
+        row = index.row()
+        LOG.debug("original value:{}".format(self._columns[col][row]))
         LOG.debug(">>> setData() role = {}".format(role))
         LOG.debug(">>> setData() column() = {}".format(col))
-        if role == Qt.CheckStateRole and index.column() == 0:
-            #print(">>> setData() role = ", role)
-            #print(">>> setData() index.column() = ", index.column())
-            if value == Qt.Checked:
-                self.arraydata[index.row()][index.column()].setChecked(True)
-                #self.arraydata[index.row()][index.column()].setText("Delete")
-                #print 'selected',self.arraydata[index.row()][1]
-            else:
-                self.arraydata[index.row()][index.column()].setChecked(False)
-                #self.arraydata[index.row()][index.column()].setText("Un")
+        if role == Qt.CheckStateRole and col == 0:
+            self._columns[col][row] = value == Qt.Checked
             # don't emit dataChanged - return right away
             self.parent().reset()
             return True
@@ -506,10 +642,12 @@ class MyTableModel(QAbstractTableModel):
                     v = INFO.convert_imperial_to_machine(value)
                 if col in(3,4) and self.diameter_display:
                     v /=2
-            self.arraydata[index.row()][col] = v
+            self._columns[col][row] = v
         except:
-            LOG.error("Invaliad data type in row {} column:{} ".format(index.row(), col))
+            LOG.error("Invaliad data type in row {} column:{} ".format(row, col))
             return False
+        for text in self._texts.values():
+            text[row] = None
         LOG.debug(">>> setData() value = {} ".format(value))
         self.dataChanged.emit(index, index)
         return True
@@ -525,14 +663,23 @@ class MyTableModel(QAbstractTableModel):
         return QVariant()
 
     # Sorts the model by column in the given order.
+    # Updates from the tool file keep to the same order.
     def sort(self, Ncol, order):
         """
         Sort table by given column number.
         """
         self.layoutAboutToBeChanged.emit()
-        self.arraydata = sorted(self.arraydata, key=operator.itemgetter(Ncol))
-        if order == Qt.DescendingOrder:
-            self.arraydata.reverse()
+        self._sort = (Ncol, order)
+        rows = range(len(self._columns[1]))
+        if Ncol == CHECK_COLUMN:
+            # by tool number among those marked alike, as update() sorts
+            rows = sorted(rows, key=self._columns[1].__getitem__)
+        rows = sorted(rows, key=self._columns[Ncol].__getitem__,
+                      reverse=order == Qt.DescendingOrder)
+        self._columns = [_take(column, rows) for column in self._columns]
+        for key, text in self._texts.items():
+            self._texts[key] = _take(text, rows)
+        self._text = self._texts[(self.metric_display, self.diameter_display)]
         self.layoutChanged.emit()
 
 if __name__ == "__main__":
@@ -16,6 +16,7 @@
 #    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 import sys, math
+import numpy
 
 def dist_lseg(l1, l2, p):
     "Compute the 3D distance from the line segment l1..l2 to the point p."
@@ -174,6 +175,116 @@ def arc_fmt(plane, c1, c2, p1):
     if plane == 18: return "I%.4f K%.4f" % (c1-x, c2-z)
     if plane == 19: return "J%.4f K%.4f" % (c1-y, c2-z)
 
+# coordinates of the arc plane in a point
+_PLANE_AXES = {17: (0, 1), 18: (0, 2), 19: (1, 2)}
+
+# parts of a path with fewer points than this are worked on point by point,
+# longer ones as arrays
+_SHORT = 48
+
+def _farthest_short(st, a, b, plane):
+    "The same as _farthest, point by point"
+    worst = a
+    worst_dist = 0
+    max_arc = -1
+    min_rad = sys.maxsize
+    ps = st[a]
+    pe = st[b]
+    for i in range(a + 1, b):
+        p = st[i]
+        dist = dist_lseg(ps, pe, p)
+        if dist > worst_dist:
+            worst = i
+            worst_dist = dist
+            rad = arc_rad(plane, ps, p, pe)
+            if rad < min_rad:
+                max_arc = i
+                min_rad = rad
+    return worst, worst_dist, max_arc, min_rad
+
+def _farthest(pts, a, b, plane):
+    """Return the point of a..b farthest from the line from a to b and its
+    distance, and of the points farther than all before them, the one
+    making the tightest arc with a and b and its radius"""
+    xs, ys, zs = pts
+    x0, y0, z0 = xs[a], ys[a], zs[a]
+    dx = xs[b] - x0
+    dy = ys[b] - y0
+    dz = zs[b] - z0
+    d2 = dx*dx + dy*dy + dz*dz
+    if d2 == 0:
+        return a, 0, -1, sys.maxsize
+    vx = xs[a+1:b] - x0
+    vy = ys[a+1:b] - y0
+    vz = zs[a+1:b] - z0
+    t = (dx * vx + dy * vy + dz * vz) / d2
+    numpy.clip(t, 0, 1, out=t)
+    vx -= t * dx
+    vy -= t * dy
+    vz -= t * dz
+    dist = numpy.sqrt(vx * vx + vy * vy + vz * vz)
+
+    farthest = numpy.maximum.accumulate(dist)
+    records = numpy.flatnonzero(dist[1:] > farthest[:-1]) + 1
+    if dist[0] > 0:
+        records = numpy.concatenate(([0], records))
+    if not len(records):
+        return a, 0, -1, sys.maxsize
+    worst = a + 1 + records[-1]
+    worst_dist = dist[records[-1]]
+    if plane not in _PLANE_AXES:
+        return worst, worst_dist, -1, sys.maxsize
+
+    i, j = _PLANE_AXES[plane]
+    u, w = pts[i], pts[j]
+    p = a + 1 + records
+    u12 = u[a] - u[p]; w12 = w[a] - w[p]
+    u23 = u[p] - u[b]; w23 = w[p] - w[b]
+    den = abs(u12 * w23 - u23 * w12)
+    arc = den >= 1e-5
+    rad = numpy.full(len(den), numpy.inf)
+    rad[arc] = (numpy.hypot(u12[arc], w12[arc])
+                * numpy.hypot(u23[arc], w23[arc])
+                * math.hypot(u[b] - u[a], w[b] - w[a]) / 2 / den[arc])
+    k = rad.argmin()
+    if rad[k] == numpy.inf:
+        return worst, worst_dist, -1, sys.maxsize
+    return worst, worst_dist, a + 1 + records[k], rad[k]
+
+def _douglas_step(pts, st, a, b, tolerance, plane):
+    """Decide how to output the points a..b of a path, given as the list st
+    and as the arrays of its coordinates pts.  Returns ("G2" or "G3",
+    arc_fmt) for an arc, the index of the point to split the path at, or
+    None when the line from a to b is close enough to all of them."""
+    if b - a < _SHORT:
+        worst, worst_dist, max_arc, min_rad = _farthest_short(st, a, b, plane)
+    else:
+        worst, worst_dist, max_arc, min_rad = _farthest(pts, a, b, plane)
+
+    worst_arc_dist = sys.maxsize
+    if min_rad != sys.maxsize:
+        ps, pm, pe = st[a], st[max_arc], st[b]
+        c1, c2 = arc_center(plane, ps, pm, pe)
+        if one_quadrant(plane, (c1, c2), ps, pm, pe):
+            i, j = _PLANE_AXES[plane]
+            if b - a < _SHORT:
+                worst_arc_dist = 0
+                for k in range(a, b + 1):
+                    p = st[k]
+                    dist = abs(math.hypot(c1 - p[i], c2 - p[j]) - min_rad)
+                    if dist > worst_arc_dist: worst_arc_dist = dist
+            else:
+                worst_arc_dist = max(0, numpy.abs(numpy.hypot(
+                    c1 - pts[i][a:b+1], c2 - pts[j][a:b+1]) - min_rad).max())
+
+    if worst_arc_dist < tolerance and worst_arc_dist < worst_dist:
+        ccw = arc_dir(plane, (c1, c2), ps, pm, pe)
+        if plane == 18: ccw = not ccw # wtf?
+        return "G3" if ccw else "G2", arc_fmt(plane, c1, c2, ps)
+    if worst_dist > tolerance:
+        return worst
+    return None
+
 def douglas(st, tolerance=.001, plane=None, _first=True):
     """\
 Perform Douglas-Peucker simplification on the path 'st' with the specified
@@ -186,92 +297,58 @@ If 'plane' is specified as 17, 18, or 19, it may find helical arcs in the given
 plane in addition to lines.  Note that if there is movement in the plane
 perpendicular to the arc, it will be distorted, so 'plane' should usually
 be specified only when there is only movement on 2 axes
+
+The path is split with an explicit stack rather than by recursion, and the
+distances of all points of a part of the path are computed at once, so
+long paths need neither deep recursion nor copies of the path.
 """
     if len(st) == 1:
         yield "G1", st[0], None
         return
 
-    l1 = st[0]
-    l2 = st[-1]
-    
-    worst_dist = 0
-    worst = 0
-    min_rad = sys.maxsize
-    max_arc = -1
-
-    ps = st[0]
-    pe = st[-1]
-
-    for i, p in enumerate(st): 
-        if p is l1 or p is l2: continue
-        dist = dist_lseg(l1, l2, p)
-        if dist > worst_dist:
-            worst = i
-            worst_dist = dist
-            rad = arc_rad(plane, ps, p, pe)
-            #print >>sys.stderr, "rad", rad, max_arc, min_rad
-            if rad < min_rad:
-                max_arc = i
-                min_rad = rad
-
-    worst_arc_dist = 0
-    if min_rad != sys.maxsize:
-        c1, c2 = arc_center(plane, ps, st[max_arc], pe)
-        lx, ly, lz = st[0]
-        if one_quadrant(plane, (c1, c2), ps, st[max_arc], pe):
-            for i, (x,y,z) in enumerate(st):
-                if plane == 17: dist = abs(math.hypot(c1-x, c2-y) - min_rad)
-                elif plane == 18: dist = abs(math.hypot(c1-x, c2-z) - min_rad)
-                elif plane == 19: dist = abs(math.hypot(c1-y, c2-z) - min_rad)
-                else: dist = sys.maxsize
-                #print >>sys.stderr, "wad", dist, worst_arc_dist
-                if dist > worst_arc_dist: worst_arc_dist = dist
-
-                mx = (x+lx)/2
-                my = (y+ly)/2
-                mz = (z+lz)/2
-                if plane == 17: dist = abs(math.hypot(c1-mx, c2-my) - min_rad)
-                elif plane == 18: dist = abs(math.hypot(c1-mx, c2-mz) - min_rad)
-                elif plane == 19: dist = abs(math.hypot(c1-my, c2-mz) - min_rad)
-                else: dist = sys.maxsize
-                #if dist > worst_arc_dist: worst_arc_dist = dist
-
-                lx, ly, lz = x, y, z
-        else:
-            worst_arc_dist = sys.maxsize
-
-    else:
-        worst_arc_dist = sys.maxsize
+    # the x, y and z coordinates of the points
+    pts = numpy.array(st, dtype=float).reshape(len(st), 3).T.copy()
+    last = len(st) - 1
+    step = _douglas_step(pts, st, 0, last, tolerance, plane)
+    if isinstance(step, tuple):
+        yield "G1", st[0], None
+        yield step[0], st[-1], step[1]
+        return
 
-    #if worst_arc_dist != sys.maxint:
-        #print >>sys.stderr, "douglas", len(st), "\n\t", st[0], "\n\t", st[max_arc], "\n\t", st[-1]
-        #print >>sys.stderr, "\t", worst_arc_dist, worst_dist
-        #print >>sys.stderr, "\t", c1, c2
-    if worst_arc_dist < tolerance and worst_arc_dist < worst_dist:
-        ccw = arc_dir(plane, (c1, c2), ps, st[max_arc], pe)
-        if plane == 18: ccw = not ccw # wtf?
-        yield "G1", ps, None
-        if ccw:
-            yield "G3", st[-1], arc_fmt(plane, c1, c2, ps)
-        else:
-            yield "G2", st[-1], arc_fmt(plane, c1, c2, ps)
-    elif worst_dist > tolerance:
-        if _first: yield "G1", st[0], None
-        for i in douglas(st[:worst+1], tolerance, plane, False):
-            yield i
-        yield "G1", st[worst], None
-        for i in douglas(st[worst:], tolerance, plane, False):
-            yield i
-        if _first: yield "G1", st[-1], None
-    else:
-        if _first: yield "G1", st[0], None
-        if _first: yield "G1", st[-1], None
+    if _first: yield "G1", st[0], None
+    # entries are parts of the path (a, b, step) still to be output and
+    # single points (indices) between them
+    stack = []
+    if step is not None:
+        stack.append((0, last, step))
+    while stack:
+        item = stack.pop()
+        if not isinstance(item, tuple):
+            yield "G1", st[item], None
+            continue
+        a, b, step = item
+        if isinstance(step, tuple):
+            yield "G1", st[a], None
+            yield step[0], st[b], step[1]
+        elif step is not None:
+            right = _douglas_step(pts, st, step, b, tolerance, plane)
+            left = _douglas_step(pts, st, a, step, tolerance, plane)
+            if right is not None: stack.append((step, b, right))
+            stack.append(step)
+            if left is not None: stack.append((a, step, left))
+    if _first: yield "G1", st[-1], None
 
 class Gcode:
-    "For creating rs274ngc files"
+    """\
+For creating rs274ngc files
+
+Lines are passed to 'target', a function taking one line or a file object
+to write them to.  'cut' moves are stored up until 'flush'; if 'max_cuts'
+is nonzero they are also flushed whenever that many are stored, so that
+memory use stays bounded however long a run of cuts is."""
     def __init__(self, homeheight = 1.5, safetyheight = 0.04, tolerance=0.001,
             spindle_speed=1000, units="G20",
-            target=lambda s: sys.stdout.write(s + "\n")):
+            target=lambda s: sys.stdout.write(s + "\n"), max_cuts=0):
         self.lastx = self.lasty = self.lastz = self.lasta = None
         self.lastgcode = self.lastfeed = None
         self.homeheight = homeheight
@@ -279,6 +356,10 @@ class Gcode:
         self.tolerance = tolerance
         self.units = units
         self.cuts = []
+        self.max_cuts = max_cuts
+        if hasattr(target, 'write'):
+            write = target.write
+            target = lambda s: write(s + "\n")
         self.write = target
         self.time = 0
         self.spindle_speed = spindle_speed
@@ -392,6 +473,8 @@ the simplification algorithm may still skip over specified points."""
         if y is None: y = lasty
         if z is None: z = lastz
         self.cuts.append([x,y,z])
+        if len(self.cuts) == self.max_cuts:
+            self.flush()
 
     def home(self):
         "Go to the 'home' height at rapid speed"
@@ -0,0 +1,116 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# Dilation of a height map by a tool shape, as used by image-to-gcode.
+#
+# The height of the tool touching the map at a position is the largest of
+# (map - tool) over the tool's footprint.  Rather than taking that maximum
+# once per position, it is taken once per point of the tool, over all
+# positions at a time, as whole array operations.
+#
+# Where a row of the tool is flat, as for an end mill, the points of the
+# row are handled together: the maximum over a window of any width is the
+# larger of two overlapping power of two windows, and the maxima over
+# windows of 1, 2, 4, ... are made once for all rows of the tool.
+#
+# The map is worked on in tiles of whole rows, which bounds the memory
+# used and lets several threads share the work: numpy releases the GIL
+# while working on arrays.
+
+import os
+import numpy
+from concurrent.futures import ThreadPoolExecutor
+
+def _plan(tool):
+    """Return one (row, first column, width, height) for each flat run of
+    each row of tool, and the widest run"""
+    plan = []
+    widest = 1
+    for a, row in enumerate(tool):
+        b = 0
+        while b < len(row):
+            if not numpy.isfinite(row[b]):
+                b += 1
+                continue
+            e = b + 1
+            while e < len(row) and row[e] == row[b]:
+                e += 1
+            plan.append((a, b, e - b, row[b]))
+            widest = max(widest, e - b)
+            b = e
+    return plan, widest
+
+def _dilate_tile(image, plan, widest, out, y0, y1, th, tw):
+    rows = y1 - y0
+    width = out.shape[1]
+    # window maxima of width 1, 2, 4, ... over the rows this tile reads
+    levels = [image[y0:y1 + th - 1]]
+    while 2 << (len(levels) - 1) <= widest:
+        last = levels[-1]
+        half = 1 << (len(levels) - 1)
+        levels.append(numpy.maximum(last[:, :-half], last[:, half:]))
+    result = out[y0:y1]
+    result.fill(-numpy.inf)
+    scratch = numpy.empty_like(result)
+    for a, b, n, z in plan:
+        level = n.bit_length() - 1
+        source = levels[level][a:a + rows]
+        if n == 1 << level:
+            window = source[:, b:b + width]
+        else:
+            c = b + n - (1 << level)
+            window = numpy.maximum(source[:, b:b + width],
+                source[:, c:c + width], out=scratch)
+        numpy.subtract(window, z, out=scratch)
+        numpy.maximum(result, scratch, out=result)
+
+def dilate(image, tool, tile=1 << 18, threads=None, progress=None):
+    """Return the height of tool touching image at each position where it
+    fits: result[y, x] is the largest of image[y:y+th, x:x+tw] - tool.
+
+    tool is +inf outside of its footprint.  tile is the number of positions
+    worked on at a time, by threads threads (the number of processors if
+    None).  progress is called with the number of rows done and the total
+    after each tile."""
+    image = numpy.asarray(image, dtype=numpy.float32)
+    tool = numpy.asarray(tool, dtype=numpy.float32)
+    th, tw = tool.shape
+    h = image.shape[0] - th + 1
+    w = image.shape[1] - tw + 1
+    out = numpy.empty((max(h, 0), max(w, 0)), dtype=numpy.float32)
+    if h <= 0 or w <= 0:
+        return out
+    plan, widest = _plan(tool)
+    step = max(1, tile // w)
+    tiles = [(y0, min(y0 + step, h)) for y0 in range(0, h, step)]
+    def work(t):
+        _dilate_tile(image, plan, widest, out, t[0], t[1], th, tw)
+        return t[1] - t[0]
+    if threads is None:
+        threads = os.cpu_count() or 1
+    done = 0
+    if threads > 1 and len(tiles) > 1:
+        with ThreadPoolExecutor(threads) as pool:
+            for n in pool.map(work, tiles):
+                done += n
+                if progress: progress(done, h)
+    else:
+        for t in tiles:
+            done += work(t)
+            if progress: progress(done, h)
+    return out
+
+# vim:ts=8:sts=4:sw=4:et:
@@ -16,6 +16,7 @@
 #    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 from rs274 import Translated, ArcsToSegmentsMixin, OpenGLTk
+from rs274 import segments, previewindex, previewloader, previewlod
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import itertools
@@ -28,6 +29,7 @@ import gcode
 import os
 import re
 import sys
+import time
 from functools import reduce
 
 def minmax(*args):
@@ -82,15 +84,28 @@ limiticon = array.array('B',
 
 class GLCanon(Translated, ArcsToSegmentsMixin):
     lineno = -1
-    def __init__(self, colors, geometry, is_foam=0):
+    def __init__(self, colors, geometry, is_foam=0, compact=0):
+        # With compact set, the three move lists below are
+        # segments.SegmentStore column arrays holding the same fields
+        self.compact = compact
+        if compact:
+            self.traverse = segments.SegmentStore(has_feed=False)
+            self.feed = segments.SegmentStore()
+            self.arcfeed = segments.SegmentStore()
+        else:
+            self.traverse = []; self.feed = []; self.arcfeed = []
         # traverse list - [line number, [start position], [end position], [tlo x, tlo y, tlo z]]
-        self.traverse = []; self.traverse_append = self.traverse.append
+        self.traverse_append = self.traverse.append
         # feed list - [line number, [start position], [end position], feedrate, [tlo x, tlo y, tlo z]]
-        self.feed = []; self.feed_append = self.feed.append
+        self.feed_append = self.feed.append
         # arcfeed list - [line number, [start position], [end position], feedrate, [tlo x, tlo y, tlo z]]
-        self.arcfeed = []; self.arcfeed_append = self.arcfeed.append
+        self.arcfeed_append = self.arcfeed.append
         # dwell list - [line number, color, pos x, pos y, pos z, plane]
         self.dwells = []; self.dwells_append = self.dwells.append
+        # line number and pick index, built by build_index once loaded
+        self.index = None
+        # draw only every draw_step'th move, for a quick look while loading
+        self.draw_step = 1
         self.choice = None
         self.feedrate = 1
         self.lo = (0,) * 9
@@ -169,6 +184,11 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         self.lineno = self.state.sequence_number
 
     def draw_lines(self, lines, for_selection, j=0, geometry=None):
+        if isinstance(lines, segments.SegmentStore):
+            # draw_lines only takes lists, so hand it one chunk at a time
+            for chunk in lines.chunks():
+                linuxcnc.draw_lines(geometry or self.geometry, chunk, for_selection)
+            return
         return linuxcnc.draw_lines(geometry or self.geometry, lines, for_selection)
 
     def colored_lines(self, color, lines, for_selection, j=0):
@@ -194,7 +214,10 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         return linuxcnc.draw_dwells(self.geometry, dwells, alpha, for_selection, self.is_lathe())
 
     def calc_extents(self):
-        self.min_extents, self.max_extents, self.min_extents_notool, self.max_extents_notool = gcode.calc_extents(self.arcfeed, self.feed, self.traverse)
+        if self.compact:
+            self.min_extents, self.max_extents, self.min_extents_notool, self.max_extents_notool = segments.calc_extents(self.arcfeed, self.feed, self.traverse)
+        else:
+            self.min_extents, self.max_extents, self.min_extents_notool, self.max_extents_notool = gcode.calc_extents(self.arcfeed, self.feed, self.traverse)
         if self.is_foam:
             min_z = min(self.foam_z, self.foam_w)
             max_z = max(self.foam_z, self.foam_w)
@@ -248,12 +271,33 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         self.first_move = False
         self.in_arc = True
         try:
-            ArcsToSegmentsMixin.arc_feed(self, *args)
+            if self.compact or self.arc_tolerance:
+                self.planned_arc_feed(*args)
+            else:
+                ArcsToSegmentsMixin.arc_feed(self, *args)
         finally:
             self.in_arc = False
 
+    def planned_arc_feed(self, *args):
+        self.lo = tuple(self.lo)
+        plan = segments.arc_plan(self, *args,
+            max_segments=self.arcdivision, tolerance=self.arc_tolerance)
+        if self.compact:
+            # split into segments later, together with the arcs around it
+            self.arcfeed.append_arc(plan)
+            self.lo = tuple(plan[segments.ARC_END])
+        else:
+            points, counts = segments.arc_points(plan)
+            self.straight_arcsegments([tuple(l) for l in points.tolist()])
+
     def straight_arcsegments(self, segs):
         self.first_move = False
+        if self.compact:
+            if segs:
+                self.arcfeed.extend_path(self.lineno, self.lo, segs,
+                    self.feedrate, [self.xo, self.yo, self.zo])
+                self.lo = segs[-1]
+            return
         lo = self.lo
         lineno = self.lineno
         feedrate = self.feedrate
@@ -290,24 +334,13 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
         glColor3f(*c)
         glBegin(GL_LINES)
         coords = []
-        for line in self.traverse:
-            if line[0] != lineno: continue
-            linuxcnc.line9(geometry, line[1], line[2])
-            coords.append(line[1][:3])
-            coords.append(line[2][:3])
-        for line in self.arcfeed:
-            if line[0] != lineno: continue
-            linuxcnc.line9(geometry, line[1], line[2])
-            coords.append(line[1][:3])
-            coords.append(line[2][:3])
-        for line in self.feed:
-            if line[0] != lineno: continue
-            linuxcnc.line9(geometry, line[1], line[2])
-            coords.append(line[1][:3])
-            coords.append(line[2][:3])
+        for name in 'traverse', 'arcfeed', 'feed':
+            for line in self.lines_for(name, lineno):
+                linuxcnc.line9(geometry, line[1], line[2])
+                coords.append(line[1][:3])
+                coords.append(line[2][:3])
         glEnd()
-        for line in self.dwells:
-            if line[0] != lineno: continue
+        for line in self.lines_for('dwells', lineno):
             self.draw_dwells([(line[0], c) + line[2:]], 2, 0)
             coords.append(line[2:5])
         glLineWidth(1)
@@ -321,20 +354,56 @@ class GLCanon(Translated, ArcsToSegmentsMixin):
             z = (self.min_extents[2] + self.max_extents[2])/2
         return x, y, z
 
+    def build_index(self):
+        if self.compact:
+            # Loading is complete by the time the index is built
+            for store in self.arcfeed, self.feed, self.traverse:
+                store.trim()
+        self.index = previewindex.PreviewIndex(self)
+
+    def add_moves(self, moves):
+        # moves: lists of rows for some of traverse, feed, arcfeed and dwells
+        for name, rows in moves.items():
+            getattr(self, name).extend(rows)
+
+    def coarse_lines(self, lines):
+        step = self.draw_step
+        if step <= 1: return lines
+        if isinstance(lines, segments.SegmentStore):
+            return lines.strided(step)
+        n = len(lines)
+        return [lines[i][:2] + (lines[min(i+step, n)-1][2],) + lines[i][3:]
+                for i in range(0, n, step)]
+
+    def lines_for(self, name, lineno):
+        lines = getattr(self, name)
+        if self.index is not None:
+            idx = self.index.line_rows(name, lineno)
+        elif isinstance(lines, segments.SegmentStore):
+            idx = lines.line_rows(lineno)
+        else:
+            return [line for line in lines if line[0] == lineno]
+        if isinstance(lines, segments.SegmentStore):
+            return zip(idx, lines.start[idx].tolist(), lines.end[idx].tolist())
+        return [lines[i] for i in idx]
+
     def color_with_alpha(self, name):
         glColor4f(*(self.colors[name] + (self.colors.get(name+'_alpha', 1/3.),)))
     def color(self, name):
         glColor3f(*self.colors[name])
 
     def draw(self, for_selection=0, no_traverse=True):
+        traverse = self.coarse_lines(self.traverse)
+        feed = self.coarse_lines(self.feed)
+        arcfeed = self.coarse_lines(self.arcfeed)
         if not no_traverse:
             glEnable(GL_LINE_STIPPLE)
-            self.colored_lines('traverse', self.traverse, for_selection)
+            self.colored_lines('traverse', traverse, for_selection)
             glDisable(GL_LINE_STIPPLE)
         else:
-            self.colored_lines('straight_feed', self.feed, for_selection, len(self.traverse))
+            self.colored_lines('straight_feed', feed, for_selection, len(traverse))
 
-            self.colored_lines('arc_feed', self.arcfeed, for_selection, len(self.traverse) + len(self.feed))
+            self.colored_lines('arc_feed', arcfeed, for_selection, len(traverse) + len(feed))
 
             glLineWidth(2)
             self.draw_dwells(self.dwells, int(self.colors.get('dwell_alpha', 1/3.)), for_selection, len(self.traverse) + len(self.feed) + len(self.arcfeed))
@@ -420,6 +489,12 @@ class GlCanonDraw:
         self.lp = lp
         self.canon = g
         self._dlists = {}
+        self.preview_loader = None
+        self.preview_done = None
+        self.preview_cancelled = None
+        self.preview_shown = 0
+        self.preview_key = None
+        self.program_lod = None
         self.select_buffer_size = 100
         self.cached_tool = -1
         self.initialised = 0
@@ -507,6 +582,7 @@ class GlCanonDraw:
 
     def select(self, x, y):
         if self.canon is None: return
+        if self.select_index(x, y): return
         pmatrix = glGetDoublev(GL_PROJECTION_MATRIX)
         pmatrix = [i for i in itertools.chain(*pmatrix.tolist())]
         glMatrixMode(GL_PROJECTION)
@@ -547,6 +623,27 @@ class GlCanonDraw:
         glPopMatrix()
         glMatrixMode(GL_MODELVIEW)
 
+    def pick_matrix(self):
+        # The spatial index can stand in for GL_SELECT only when program
+        # coordinates map to the display without rotations
+        if self.is_foam(): return None
+        return previewindex.geometry_matrix(self.get_geometry(),
+                                            self.trajcoordinates)
+
+    def select_index(self, x, y):
+        # Answer the pick from the canon's spatial index when possible;
+        # returns False to fall back to a GL_SELECT pass
+        index = self.canon.index
+        if index is None: return False
+        matrix = self.pick_matrix()
+        if matrix is None: return False
+        line = index.pick(x, y, glGetDoublev(GL_MODELVIEW_MATRIX),
+                          glGetDoublev(GL_PROJECTION_MATRIX),
+                          glGetIntegerv(GL_VIEWPORT), matrix,
+                          self.get_show_rapids())
+        self.set_highlight_line(line)
+        return True
+
     def dlist(self, name, n=1, gen=lambda n: None):
         if name not in self._dlists:
             base = glGenLists(n)
@@ -1134,9 +1231,7 @@ class GlCanonDraw:
                 glEnable(GL_BLEND)
                 glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
-            if self.get_show_rapids():
-                glCallList(self.dlist('program_rapids', gen=self.make_main_list))
-            glCallList(self.dlist('program_norapids', gen=self.make_main_list))
+            self.draw_program()
             glCallList(self.dlist('highlight'))
 
             if self.get_program_alpha():
@@ -1846,6 +1941,48 @@ class GlCanonDraw:
         if self.canon: self.canon.draw(1, True)
         glEndList()
 
+    # Draw the program from vertex buffers at a level of detail that suits
+    # the zoom (see previewlod), instead of from display lists
+    lod_preview = 0
+    # Largest error allowed by the level of detail, in pixels
+    lod_pixels = .5
+
+    def get_program_lod(self):
+        if not self.lod_preview or self.canon is None: return None
+        # While loading in the background the program is still changing
+        if self.preview_loader is not None or self.canon.is_foam: return None
+        if self.program_lod is None:
+            matrix = self.pick_matrix()
+            if matrix is None: return None
+            try:
+                self.program_lod = previewlod.ProgramLOD(self.canon, matrix)
+            except GLError as e:
+                # No vertex buffer objects; keep to display lists
+                print("preview: level of detail disabled:", e, file=sys.stderr)
+                self.lod_preview = 0
+                return None
+        return self.program_lod
+
+    def draw_program(self):
+        lod = self.get_program_lod()
+        if lod is None:
+            if self.get_show_rapids():
+                glCallList(self.dlist('program_rapids', gen=self.make_main_list))
+            glCallList(self.dlist('program_norapids', gen=self.make_main_list))
+            return
+        lod.draw(self.canon, self.get_show_rapids(), self.lod_pixels)
+        glCallList(self.dlist('program_dwells', gen=self.make_dwells_list))
+
+    def make_dwells_list(self, unused=None):
+        dwells = self.dlist('program_dwells')
+        glNewList(dwells, GL_COMPILE)
+        if self.canon:
+            glLineWidth(2)
+            self.canon.draw_dwells(self.canon.dwells,
+                int(self.canon.colors.get('dwell_alpha', 1/3.)), 0)
+            glLineWidth(1)
+        glEndList()
+
     def make_main_list(self, unused=None):
         program = self.dlist('program_norapids')
         rapids = self.dlist('program_rapids')
@@ -1857,20 +1994,123 @@ class GlCanonDraw:
         if self.canon: self.canon.draw(0, False)
         glEndList()
 
+    # A previewcache.PreviewCache, if programs are to be cached on disk
+    preview_cache = None
+
+    def cached_preview(self, f, canon, args):
+        """Fill canon from the preview cache if it holds f, returning
+        (result, seq), or None if f has to be interpreted"""
+        self.preview_key = None
+        if self.preview_cache is None: return None
+        self.preview_key = self.preview_cache.key(f, canon, args)
+        return self.preview_cache.load(self.preview_key, canon)
+
+    def cache_preview(self, canon, result, seq):
+        key, self.preview_key = self.preview_key, None
+        if key is None or getattr(canon, 'aborted', False): return
+        self.preview_cache.store(key, canon, result, seq)
+
     def load_preview(self, f, canon, *args):
+        self.cancel_preview()
         self.set_canon(canon)
-        result, seq = gcode.parse(f, canon, *args)
+        cached = self.cached_preview(f, canon, args)
+        if cached:
+            result, seq = cached
+        else:
+            result, seq = gcode.parse(f, canon, *args)
+            self.cache_preview(canon, result, seq)
 
         if result <= gcode.MIN_ERROR:
             self.canon.progress.nextphase(1)
-            canon.calc_extents()
-            self.stale_dlist('program_rapids')
-            self.stale_dlist('program_norapids')
-            self.stale_dlist('select_rapids')
-            self.stale_dlist('select_norapids')
+            self.finish_preview(canon)
 
         return result, seq
 
+    def finish_preview(self, canon):
+        canon.calc_extents()
+        canon.build_index()
+        matrix = self.pick_matrix()
+        if matrix is not None:
+            canon.index.spatial(matrix)
+        self.stale_program()
+
+    def stale_program(self):
+        if self.program_lod is not None:
+            self.program_lod.delete()
+            self.program_lod = None
+        self.stale_dlist('program_rapids')
+        self.stale_dlist('program_norapids')
+        self.stale_dlist('program_dwells')
+        self.stale_dlist('select_rapids')
+        self.stale_dlist('select_norapids')
+
+    # While a background load is running, the partial program is redrawn
+    # at most this often, and thinned to about this many moves
+    preview_refresh = .5
+    preview_coarse_moves = 100000
+
+    def load_preview_async(self, f, canon, *args, **kw):
+        """Like load_preview, but interpret f in a separate process.
+
+        Returns at once; the caller must then call poll_preview
+        periodically.  When loading is complete, done(result, seq) is
+        called if it was given; if it is cancelled instead, by another
+        load or cancel_preview, cancelled() is."""
+        self.cancel_preview()
+        self.set_canon(canon)
+        cached = self.cached_preview(f, canon, args)
+        if cached:
+            result, seq = cached
+            if result <= gcode.MIN_ERROR:
+                self.finish_preview(canon)
+            else:
+                self.stale_program()
+            if kw.get('done'): kw['done'](result, seq)
+            return
+        self.preview_done = kw.get('done')
+        self.preview_cancelled = kw.get('cancelled')
+        self.preview_loader = previewloader.PreviewLoader(canon, f, *args)
+        self.preview_loader.start()
+        self.preview_shown = 0
+        self.stale_program()
+
+    def cancel_preview(self):
+        if self.preview_loader is None: return
+        self.preview_loader.cancel()
+        self.preview_loader = None
+        self.preview_key = None
+        self.preview_done = None
+        cancelled, self.preview_cancelled = self.preview_cancelled, None
+        if cancelled: cancelled()
+
+    def poll_preview(self):
+        """Take in moves from a background load, returning True if the
+        display needs to be redrawn"""
+        loader = self.preview_loader
+        if loader is None or not loader.poll(): return False
+        canon = loader.canon
+        if loader.finished:
+            self.preview_loader = None
+            done, self.preview_done = self.preview_done, None
+            self.preview_cancelled = None
+            canon.draw_step = 1
+            result, seq = loader.result
+            self.cache_preview(canon, result, seq)
+            if result <= gcode.MIN_ERROR:
+                self.finish_preview(canon)
+            else:
+                self.stale_program()
+            if done: done(result, seq)
+            return True
+        if time.time() - self.preview_shown < self.preview_refresh:
+            return False
+        self.preview_shown = time.time()
+        moves = len(canon.traverse) + len(canon.feed) + len(canon.arcfeed)
+        canon.draw_step = max(1, moves // self.preview_coarse_moves)
+        canon.calc_extents()
+        self.stale_program()
+        return True
+
     def from_internal_units(self, pos, unit=None):
         if unit is None:
             unit = self.stat.linear_units
@@ -87,6 +87,10 @@ class Translated:
 class ArcsToSegmentsMixin:
     plane = 1
     arcdivision = 64
+    # Largest distance allowed between an arc and the segments shown for
+    # it, in inches like the moves (see rs274.segments.arc_plan); 0 splits
+    # arcs by arcdivision alone
+    arc_tolerance = 0
 
     def set_plane(self, plane):
         self.plane = plane
@@ -165,6 +169,10 @@ class StatMixin:
     def get_external_length_units(self):
         return self.s.linear_units or 1.0
 
+    def set_arc_tolerance(self, tolerance):
+        "Set arc_tolerance from [DISPLAY]ARC_TOLERANCE, in machine units"
+        self.arc_tolerance = tolerance / (25.4 * self.get_external_length_units())
+
     def get_axis_mask(self):
         return self.s.axis_mask
 
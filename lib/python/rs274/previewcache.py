@@ -0,0 +1,190 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# On-disk cache of interpreted preview geometry.
+#
+# Reopening a program re-runs the interpreter over the whole file even when
+# nothing that affects the result has changed.  PreviewCache stores the
+# moves GLCanon collected, one .npy file per column, in a directory named
+# after a hash of everything the interpretation depends on:
+#   - the program text
+#   - the startup codes and interpreter arguments passed to gcode.parse
+#   - the canon setup (geometry, arcdivision, tool table, units, ...)
+#   - the parameter (var) file, so changed offsets cause a re-parse
+#   - the INI file, and the names, sizes and times of the files in the
+#     subroutine directories
+# On a hit the columns are memory mapped straight into SegmentStores.
+# Entries are evicted least recently used first once the cache grows past
+# its size limit.
+
+import os, sys, shutil, pickle, hashlib
+import numpy as np
+from rs274 import segments, previewloader
+
+# Bump when the layout of an entry changes
+VERSION = 1
+
+GROUPS = 'traverse', 'feed', 'arcfeed'
+
+def default_directory():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'linuxcnc', 'preview')
+
+def from_ini(inifile):
+    "Return the PreviewCache configured in [DISPLAY], or None if disabled"
+    size = float(inifile.find("DISPLAY", "PREVIEW_CACHE_SIZE") or 0)
+    if size <= 0: return None
+    directory = inifile.find("DISPLAY", "PREVIEW_CACHE_DIR") or None
+    if directory: directory = os.path.expanduser(directory)
+    search = []
+    ini_dir = os.path.dirname(os.environ.get('INI_FILE_NAME', ''))
+    for d in (inifile.find("RS274NGC", "SUBROUTINE_PATH") or "").split(":"):
+        if d: search.append(os.path.join(ini_dir, os.path.expanduser(d)))
+    prefix = inifile.find("DISPLAY", "PROGRAM_PREFIX")
+    if prefix: search.append(os.path.join(ini_dir, os.path.expanduser(prefix)))
+    return PreviewCache(directory, int(size * 1048576), search)
+
+def _hash_file(h, path):
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    except (IOError, OSError):
+        h.update(b'-')
+
+class PreviewCache:
+    def __init__(self, directory=None, size=256 << 20, search=()):
+        self.directory = directory or default_directory()
+        self.size = size
+        self.search = list(search)
+
+    def key(self, filename, canon, args):
+        "Return the cache key for interpreting filename into canon with args"
+        h = hashlib.sha256()
+        h.update(repr(VERSION).encode())
+        _hash_file(h, filename)
+        h.update(repr(args).encode())
+        config = previewloader.canon_config(canon)
+        # The parameter file is a fresh temporary copy for every load, so
+        # its contents count but its name does not
+        _hash_file(h, config.pop('parameter_file'))
+        h.update(repr(sorted(config.items())).encode())
+        ini = os.environ.get('INI_FILE_NAME')
+        if ini: _hash_file(h, ini)
+        for d in self.search:
+            try:
+                names = sorted(os.listdir(d))
+            except OSError:
+                continue
+            for name in names:
+                try:
+                    st = os.stat(os.path.join(d, name))
+                except OSError:
+                    continue
+                h.update(repr((d, name, st.st_size, st.st_mtime_ns)).encode())
+        return h.hexdigest()
+
+    def load(self, key, canon):
+        """Fill canon from the entry for key.  Returns (result, seq) like
+        gcode.parse, or None if there is no usable entry."""
+        path = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(path, 'meta.pickle'), 'rb') as f:
+                meta = pickle.load(f)
+            stores = {}
+            for name in GROUPS:
+                columns = dict((column, np.load(
+                        os.path.join(path, '%s.%s.npy' % (name, column)),
+                        mmap_mode='r'))
+                    for column in meta['columns'][name])
+                stores[name] = segments.SegmentStore.from_columns(**columns)
+            # Mark the entry as recently used
+            os.utime(path)
+        except (IOError, OSError, EOFError, ValueError, KeyError,
+                pickle.UnpicklingError):
+            return None
+        for name in GROUPS:
+            store = stores[name]
+            if not canon.compact: store = store.rows()
+            setattr(canon, name, store)
+            setattr(canon, name + '_append', store.append)
+        canon.dwells = list(meta['dwells'])
+        canon.dwells_append = canon.dwells.append
+        for k, v in meta['state'].items():
+            setattr(canon, k, v)
+        return meta['result'], meta['seq']
+
+    def store(self, key, canon, result, seq):
+        "Save the moves in canon under key, then evict old entries"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = os.path.join(self.directory,
+                '.tmp-%d-%s' % (os.getpid(), key))
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.mkdir(tmp)
+            meta = {'result': result, 'seq': seq, 'columns': {},
+                'dwells': list(canon.dwells),
+                'state': dict((k, getattr(canon, k)) for k in previewloader.STATE)}
+            for name in GROUPS:
+                lines = getattr(canon, name)
+                if not isinstance(lines, segments.SegmentStore):
+                    store = segments.SegmentStore(has_feed=name != 'traverse')
+                    store.extend(lines)
+                    lines = store
+                columns = ['lineno', 'start', 'end', 'tlo']
+                if lines.has_feed: columns.append('feedrate')
+                meta['columns'][name] = columns
+                for column in columns:
+                    np.save(os.path.join(tmp, '%s.%s.npy' % (name, column)),
+                        getattr(lines, column))
+            with open(os.path.join(tmp, 'meta.pickle'), 'wb') as f:
+                pickle.dump(meta, f, -1)
+            path = os.path.join(self.directory, key)
+            try:
+                os.rename(tmp, path)
+            except OSError:
+                # Another instance stored the same entry meanwhile
+                shutil.rmtree(tmp, ignore_errors=True)
+            self.evict()
+        except (IOError, OSError) as e:
+            print("preview cache: %s" % e, file=sys.stderr)
+
+    def entries(self):
+        "Return (last use, size, path) for each entry, oldest first"
+        result = []
+        for name in os.listdir(self.directory):
+            if name.startswith('.'): continue
+            path = os.path.join(self.directory, name)
+            try:
+                used = os.stat(path).st_mtime
+                size = sum(os.stat(os.path.join(path, f)).st_size
+                    for f in os.listdir(path))
+            except OSError:
+                continue
+            result.append((used, size, path))
+        result.sort()
+        return result
+
+    def evict(self):
+        "Remove least recently used entries until the cache fits its size"
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        for used, size, path in entries:
+            if total <= self.size: break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+# vim:ts=8:sts=4:sw=4:et:
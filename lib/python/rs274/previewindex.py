@@ -0,0 +1,206 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# Lookup structures over the moves collected by rs274.glcanon.GLCanon.
+#
+# The line number index is built once after a program is loaded and maps a
+# source line to the rows it generated in traverse, arcfeed, feed and dwells,
+# so highlighting a line no longer scans the whole program.
+#
+# The spatial index answers "which line is under the mouse" without an
+# OpenGL GL_SELECT pass.  Segments are bucketed into a coarse grid by their
+# midpoint, and each bucket remembers the bounding box of what it holds.
+# A pick projects the bucket boxes to the screen, and only segments in
+# buckets near the mouse are tested exactly.  It is only available when the
+# GEOMETRY maps positions to the screen without rotations.
+
+import numpy as np
+from rs274 import segments
+
+GROUPS = 'traverse', 'arcfeed', 'feed', 'dwells'
+
+def geometry_matrix(geometry, coordinates="XYZABCUVW"):
+    """Return the 3x9 matrix equivalent to vertex9 for this GEOMETRY string,
+    or None if it includes a rotation that vertex9 would apply."""
+    m = np.zeros((3, 9))
+    sign = 1
+    for ch in geometry.upper():
+        # as in vertex9, only an axis letter uses up a '-'
+        if ch == '-':
+            sign = -1
+        elif ch in "XYZUVW":
+            i = "XYZABCUVW".index(ch)
+            m[i % 3, i] += sign
+            sign = 1
+        elif ch in "ABC":
+            if ch in coordinates.upper():
+                return None
+            sign = 1
+    return m
+
+def _columns(lines):
+    "Return lineno, start, end arrays for a move list or SegmentStore"
+    if isinstance(lines, segments.SegmentStore):
+        return lines.lineno, lines.start, lines.end
+    n = len(lines)
+    lineno = np.fromiter((l[0] for l in lines), np.int32, n)
+    start = np.array([l[1] for l in lines], np.float64).reshape(n, 9)
+    end = np.array([l[2] for l in lines], np.float64).reshape(n, 9)
+    return lineno, start, end
+
+class PreviewIndex:
+    def __init__(self, canon):
+        self.canon = canon
+        self.order = {}
+        self.sorted_lineno = {}
+        for name in GROUPS:
+            lines = getattr(canon, name)
+            if isinstance(lines, segments.SegmentStore):
+                lineno = lines.lineno
+            else:
+                lineno = np.fromiter((l[0] for l in lines), np.int32, len(lines))
+            order = np.argsort(lineno, kind='mergesort')
+            self.order[name] = order
+            self.sorted_lineno[name] = lineno[order]
+        self._spatial = None
+        self._spatial_key = None
+
+    def line_rows(self, name, lineno):
+        "Return the row numbers in canon.<name> that came from this line"
+        sl = self.sorted_lineno[name]
+        first = np.searchsorted(sl, lineno, 'left')
+        last = np.searchsorted(sl, lineno, 'right')
+        return np.sort(self.order[name][first:last])
+
+    def spatial(self, matrix):
+        "Return the bucketed segments for the given geometry matrix"
+        key = matrix.tobytes()
+        if self._spatial_key != key:
+            self._spatial = _SpatialIndex(self.canon, matrix)
+            self._spatial_key = key
+        return self._spatial
+
+    def pick(self, x, y, modelview, projection, viewport, matrix,
+            rapids=True, radius=3):
+        """Return the line number drawn closest to window position x, y
+        (within radius pixels), or None"""
+        return self.spatial(matrix).pick(x, y, modelview, projection,
+            viewport, rapids, radius)
+
+class _SpatialIndex:
+    def __init__(self, canon, matrix):
+        kinds = []; linenos = []; p1s = []; p2s = []
+        for kind, name in enumerate(GROUPS[:3]):
+            lineno, start, end = _columns(getattr(canon, name))
+            if not len(lineno): continue
+            kinds.append(np.full(len(lineno), kind, np.int8))
+            linenos.append(lineno)
+            p1s.append(start.dot(matrix.T))
+            p2s.append(end.dot(matrix.T))
+        dwells = canon.dwells
+        if dwells:
+            kinds.append(np.full(len(dwells), 3, np.int8))
+            linenos.append(np.array([d[0] for d in dwells], np.int32))
+            p = np.array([d[2:5] for d in dwells], np.float64)
+            p1s.append(p); p2s.append(p)
+        if not kinds:
+            self.n = 0
+            return
+        kind = np.concatenate(kinds)
+        lineno = np.concatenate(linenos)
+        p1 = np.concatenate(p1s)
+        p2 = np.concatenate(p2s)
+        self.n = n = len(kind)
+
+        # Bucket by segment midpoint into a grid of about 64 segments per cell
+        lo = np.minimum(p1, p2)
+        hi = np.maximum(p1, p2)
+        mid = (lo + hi) / 2
+        cells = int(min(32, max(1, round((n / 64.) ** (1/3.)))))
+        gmin = mid.min(axis=0)
+        span = mid.max(axis=0) - gmin
+        span[span == 0] = 1
+        ijk = np.minimum(((mid - gmin) / span * cells).astype(np.int32), cells - 1)
+        cell = (ijk[:, 0] * cells + ijk[:, 1]) * cells + ijk[:, 2]
+        order = np.argsort(cell, kind='mergesort')
+        cell = cell[order]
+        starts = np.flatnonzero(np.r_[True, cell[1:] != cell[:-1]])
+
+        self.kind = kind[order]
+        self.lineno = lineno[order]
+        self.p1 = p1[order]
+        self.p2 = p2[order]
+        self.starts = starts
+        self.stops = np.r_[starts[1:], n]
+        self.box_lo = np.minimum.reduceat(lo[order], starts)
+        self.box_hi = np.maximum.reduceat(hi[order], starts)
+
+    @staticmethod
+    def project(p, mvp, viewport):
+        "Window coordinates and clip w of points p (n x 3)"
+        clip = np.c_[p, np.ones(len(p))].dot(mvp)
+        w = clip[:, 3]
+        safe = np.where(w > 0, w, 1)
+        wx = viewport[0] + (clip[:, 0] / safe + 1) * viewport[2] / 2.
+        wy = viewport[1] + (clip[:, 1] / safe + 1) * viewport[3] / 2.
+        wz = clip[:, 2] / safe
+        return wx, wy, wz, w
+
+    def pick(self, x, y, modelview, projection, viewport, rapids, radius):
+        if not self.n: return None
+        # OpenGL hands back column-major matrices, so for row vectors
+        # the combined transform is p . MV . P
+        mvp = np.asarray(modelview, np.float64).reshape(4, 4).dot(
+                np.asarray(projection, np.float64).reshape(4, 4))
+        viewport = [float(v) for v in viewport]
+        x = float(x); y = viewport[3] - float(y)
+
+        # Cull buckets whose projected box is away from the mouse
+        lo = self.box_lo; hi = self.box_hi
+        corners = np.stack([np.c_[
+            lo[:, 0] if i & 1 else hi[:, 0],
+            lo[:, 1] if i & 2 else hi[:, 1],
+            lo[:, 2] if i & 4 else hi[:, 2]] for i in range(8)], axis=1)
+        wx, wy, wz, w = self.project(corners.reshape(-1, 3), mvp, viewport)
+        wx = wx.reshape(-1, 8); wy = wy.reshape(-1, 8); w = w.reshape(-1, 8)
+        behind = (w <= 0).any(axis=1)
+        near = ((wx.min(axis=1) - radius <= x) & (wx.max(axis=1) + radius >= x)
+              & (wy.min(axis=1) - radius <= y) & (wy.max(axis=1) + radius >= y))
+        hit = np.flatnonzero(near | behind)
+        if not len(hit): return None
+        rows = np.concatenate([np.arange(self.starts[i], self.stops[i])
+            for i in hit])
+        if not rapids:
+            rows = rows[self.kind[rows] != 0]
+            if not len(rows): return None
+
+        # Exact screen-space distance from the mouse to each candidate
+        ax, ay, az, aw = self.project(self.p1[rows], mvp, viewport)
+        bx, by, bz, bw = self.project(self.p2[rows], mvp, viewport)
+        dx = bx - ax; dy = by - ay
+        d2 = dx * dx + dy * dy
+        t = np.where(d2 > 0, ((x - ax) * dx + (y - ay) * dy) / np.where(d2 > 0, d2, 1), 0)
+        t = np.clip(t, 0, 1)
+        ex = ax + t * dx - x; ey = ay + t * dy - y
+        dist2 = ex * ex + ey * ey
+        ok = (aw > 0) & (bw > 0) & (dist2 <= radius * radius)
+        if not ok.any(): return None
+        depth = az + t * (bz - az)
+        cand = np.flatnonzero(ok)
+        best = cand[np.lexsort((depth[cand], dist2[cand]))[0]]
+        return int(self.lineno[rows[best]])
+
+# vim:ts=8:sts=4:sw=4:et:
@@ -0,0 +1,236 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# Interpret a program for the preview in a separate process.
+#
+# PreviewLoader starts "python3 -m rs274.previewloader", which runs
+# gcode.parse with a plain GLCanon configured like the GUI's canon.  The
+# worker sends the moves back in batches over a pipe while it interprets,
+# and the GUI calls poll() from its usual timer to append them to its own
+# canon, so the display, jogging and E-stop stay live during a long load.
+# The GUI canon's progress is updated as the moves arrive, and the
+# (AXIS,notify) comments met are passed to its add_notification.
+#
+# Every message on the pipe is one pickle:
+#   ('moves', {'traverse': [...], 'feed': [...], 'arcfeed': [...],
+#              'dwells': [...]}, lineno, [(AXIS,notify) message, ...])
+#   ('done', result, seq, {attribute: value, ...})
+#   ('error', text)
+
+import os, sys, time, pickle, queue, threading, subprocess, traceback
+
+# Final canon attributes copied back from the worker
+STATE = 'dwell_time', 'foam_z', 'foam_w'
+
+def canon_config(canon):
+    "Collect what the worker needs to build a canon equivalent to canon"
+    config = {
+        'colors': canon.colors,
+        'geometry': canon.geometry,
+        'is_foam': canon.is_foam,
+        'arcdivision': canon.arcdivision,
+        'arc_tolerance': canon.arc_tolerance,
+        'parameter_file': getattr(canon, 'parameter_file', ''),
+        'lathe': bool(canon.is_lathe()) if hasattr(canon, 'is_lathe') else False,
+    }
+    s = getattr(canon, 's', None)
+    if s is not None:
+        config['stat'] = {
+            'tool_table': [tuple(t) for t in s.tool_table],
+            'angular_units': s.angular_units,
+            'linear_units': s.linear_units,
+            'axis_mask': s.axis_mask,
+            'block_delete': s.block_delete,
+        }
+        config['random'] = canon.random
+    return config
+
+class PreviewLoader:
+    # Time poll() may spend adding moves to the canon before returning
+    poll_budget = .05
+
+    def __init__(self, canon, filename, *args):
+        self.canon = canon
+        self.filename = filename
+        self.args = args
+        self.process = None
+        self.messages = queue.Queue()
+        self.finished = False
+        self.result = None
+        self.lineno = 0
+
+    def start(self):
+        r, w = os.pipe()
+        # The GUI may have extended sys.path at startup; pass that on
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "rs274.previewloader", str(w)],
+            stdin=subprocess.PIPE, pass_fds=(w,), env=env)
+        os.close(w)
+        pickle.dump((canon_config(self.canon), self.filename, self.args),
+            self.process.stdin)
+        self.process.stdin.close()
+        reader = threading.Thread(target=self._read, args=(os.fdopen(r, 'rb'),))
+        reader.daemon = True
+        reader.start()
+
+    def _read(self, f):
+        with f:
+            while True:
+                try:
+                    message = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError, OSError):
+                    break
+                self.messages.put(message)
+                if message[0] != 'moves': return
+        self.messages.put(('error', 'preview process exited unexpectedly'))
+
+    def poll(self):
+        """Apply what the worker has sent so far to the canon.
+
+        Returns True if anything changed.  Once the worker is done,
+        finished is set and result holds (result, seq) like gcode.parse."""
+        if self.finished: return False
+        changed = False
+        t0 = time.time()
+        while time.time() - t0 < self.poll_budget:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            changed = True
+            kind = message[0]
+            if kind == 'moves':
+                self.canon.add_moves(message[1])
+                self.lineno = message[2]
+                progress = getattr(self.canon, 'progress', None)
+                if hasattr(progress, 'update'):
+                    progress.update(self.lineno)
+                if hasattr(self.canon, 'add_notification'):
+                    for text in message[3]:
+                        self.canon.add_notification(text)
+            elif kind == 'done':
+                for k, v in message[3].items():
+                    setattr(self.canon, k, v)
+                self._finish(message[1], message[2])
+                break
+            else:
+                print("preview: %s" % message[1], file=sys.stderr)
+                import gcode
+                self._finish(gcode.MIN_ERROR + 1, self.lineno)
+                break
+        return changed
+
+    def _finish(self, result, seq):
+        self.finished = True
+        self.result = result, seq
+        if self.process is not None:
+            self.process.wait()
+
+    def cancel(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.finished = True
+        if self.result is None: self.result = 0, 0
+
+def worker_canon_class():
+    from rs274 import glcanon, interpret
+
+    class WorkerCanon(glcanon.GLCanon):
+        # moves or seconds between batches sent to the GUI
+        batch = 20000
+        interval = .25
+
+        def __init__(self, conn, config):
+            glcanon.GLCanon.__init__(self, config['colors'],
+                config['geometry'], config['is_foam'])
+            self.conn = conn
+            self.arcdivision = config['arcdivision']
+            self.arc_tolerance = config['arc_tolerance']
+            self.parameter_file = config['parameter_file']
+            self.lathe = config['lathe']
+            self.notifications = []
+            self.last_send = time.time()
+
+        def is_lathe(self): return self.lathe
+
+        def next_line(self, st):
+            glcanon.GLCanon.next_line(self, st)
+            if self.notify:
+                self.notifications.append(self.notify_message)
+                self.notify = 0
+            count = (len(self.traverse) + len(self.feed)
+                + len(self.arcfeed) + len(self.dwells))
+            if count >= self.batch or ((count or self.notifications) and
+                    time.time() - self.last_send > self.interval):
+                self.send()
+
+        def send(self):
+            moves = {'traverse': self.traverse, 'feed': self.feed,
+                'arcfeed': self.arcfeed, 'dwells': self.dwells}
+            pickle.dump(('moves', moves, self.lineno, self.notifications),
+                self.conn, -1)
+            self.conn.flush()
+            self.notifications = []
+            self.traverse = []; self.traverse_append = self.traverse.append
+            self.feed = []; self.feed_append = self.feed.append
+            self.arcfeed = []; self.arcfeed_append = self.arcfeed.append
+            self.dwells = []; self.dwells_append = self.dwells.append
+            self.last_send = time.time()
+
+    class WorkerStatCanon(WorkerCanon, interpret.StatMixin):
+        def __init__(self, conn, config):
+            WorkerCanon.__init__(self, conn, config)
+            interpret.StatMixin.__init__(self,
+                _Stat(config['stat']), config['random'])
+
+        def change_tool(self, pocket):
+            WorkerCanon.change_tool(self, pocket)
+            interpret.StatMixin.change_tool(self, pocket)
+
+    return WorkerCanon, WorkerStatCanon
+
+class _Stat:
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+def worker(fd):
+    import gcode
+    conn = os.fdopen(fd, 'wb')
+    try:
+        config, filename, args = pickle.load(sys.stdin.buffer)
+        WorkerCanon, WorkerStatCanon = worker_canon_class()
+        if 'stat' in config:
+            canon = WorkerStatCanon(conn, config)
+        else:
+            canon = WorkerCanon(conn, config)
+        try:
+            result, seq = gcode.parse(filename, canon, *args)
+        except KeyboardInterrupt:
+            result, seq = 0, 0
+        canon.send()
+        state = dict((k, getattr(canon, k)) for k in STATE)
+        pickle.dump(('done', result, seq, state), conn, -1)
+    except Exception:
+        pickle.dump(('error', traceback.format_exc()), conn, -1)
+    conn.close()
+
+if __name__ == '__main__':
+    worker(int(sys.argv[1]))
+
+# vim:ts=8:sts=4:sw=4:et:
@@ -0,0 +1,222 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# Level of detail drawing of the preview toolpath from vertex buffers.
+#
+# The moves of each kind (traverse, feed, arcfeed) are joined into
+# polylines wherever one move starts exactly where the previous one ended,
+# the way linuxcnc.draw_lines joins them into line strips.  The vertices
+# are uploaded once into a vertex buffer.  Each level of detail is an
+# index buffer of GL_LINES over those vertices, made by Douglas-Peucker
+# simplification of the polylines with a tolerance that grows four times
+# per level.
+#
+# The tolerances are distances in the 3D preview, so a level is valid
+# whichever way the view is turned.  Before each frame the size of a
+# screen pixel at the centre of the program is measured, and the coarsest
+# level whose tolerance is below a fraction of a pixel is drawn.
+#
+# This only applies when the GEOMETRY maps positions to the preview
+# without rotations (see previewindex.geometry_matrix).
+
+import numpy as np
+from OpenGL.GL import *
+from rs274 import previewindex
+
+GROUPS = (
+    ('traverse', 'traverse'),
+    ('feed', 'straight_feed'),
+    ('arcfeed', 'arc_feed'),
+)
+
+def douglas_peucker(points, starts, tolerance, piece=1024):
+    """Simplify polylines, returning a boolean mask of the points to keep.
+
+    points is an n x 3 array holding the polylines one after the other;
+    starts holds the index of the first point of each.  Every polyline is
+    split at its farthest point from the chord until all points are within
+    tolerance, working on all pending spans at once.
+
+    Long polylines are first cut into pieces of at most piece points:
+    a back and forth path can otherwise take as many passes as it has
+    turns, each over most of the points."""
+    n = len(points)
+    keep = np.zeros(n, bool)
+    if not n: return keep
+    starts = np.union1d(starts, np.arange(0, n, piece)).astype(np.intp)
+    ends = np.r_[starts[1:], n] - 1
+    keep[starts] = True
+    keep[ends] = True
+    a = starts; b = ends
+    tol2 = tolerance * tolerance
+    while True:
+        more = b - a > 1
+        a = a[more]; b = b[more]
+        if not len(a): break
+        inner = b - a - 1
+        offset = np.cumsum(inner) - inner
+        span = np.repeat(np.arange(len(a)), inner)
+        idx = np.arange(inner.sum()) - offset[span] + a[span] + 1
+
+        # Squared distance of each inner point from its span's chord
+        pa = points[a][span]
+        d = points[b][span] - pa
+        v = points[idx] - pa
+        dd = (d * d).sum(axis=1)
+        t = np.clip((v * d).sum(axis=1) / np.where(dd > 0, dd, 1), 0, 1)
+        e = v - t[:, None] * d
+        dist = (e * e).sum(axis=1)
+
+        # Farthest point of each span (spans are contiguous in idx)
+        far_dist = np.maximum.reduceat(dist, offset)
+        split = far_dist > tol2
+        hits = np.flatnonzero((dist == far_dist[span]) & split[span])
+        first_hit = np.r_[True, span[hits[1:]] != span[hits[:-1]]][:len(hits)]
+        m = idx[hits[first_hit]]
+        keep[m] = True
+        a, b = np.r_[a[split], m], np.r_[m, b[split]]
+    return keep
+
+def polylines(start, end):
+    """Join moves into polylines.  Returns the vertices and the index of
+    the first vertex of each polyline."""
+    n = len(start)
+    if not n: return np.zeros((0, 3)), np.zeros(0, np.intp)
+    breaks = np.flatnonzero(np.r_[True, (start[1:] != end[:-1]).any(axis=1)])
+    first = breaks + np.arange(len(breaks))
+    vertices = np.empty((n + len(breaks), 3))
+    vertices[first] = start[breaks]
+    # each move's end follows its start, shifted by the breaks before it
+    vertices[np.arange(n) + np.searchsorted(breaks, np.arange(n), 'right')] = end
+    return vertices, first
+
+class _Group:
+    "The vertex buffer and per level index buffers for one kind of move"
+    def __init__(self, vertices, levels):
+        self.vertices = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertices)
+        glBufferData(GL_ARRAY_BUFFER, vertices, GL_STATIC_DRAW)
+        self.levels = []
+        for indices in levels:
+            buffer = glGenBuffers(1)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, buffer)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices, GL_STATIC_DRAW)
+            self.levels.append((buffer, len(indices)))
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def draw(self, level):
+        buffer, count = self.levels[min(level, len(self.levels) - 1)]
+        if not count: return
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertices)
+        glVertexPointer(3, GL_FLOAT, 0, None)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, buffer)
+        glDrawElements(GL_LINES, count, GL_UNSIGNED_INT, None)
+
+    def delete(self):
+        glDeleteBuffers(len(self.levels) + 1,
+            [self.vertices] + [b for b, c in self.levels])
+
+def line_indices(keep, first):
+    "GL_LINES index pairs joining consecutive kept vertices of each polyline"
+    kept = np.flatnonzero(keep)
+    if len(kept) < 2: return np.zeros(0, np.uint32)
+    # no line from the last vertex of one polyline to the next one's first
+    join = ~np.isin(kept[1:], first)
+    pairs = np.c_[kept[:-1][join], kept[1:][join]]
+    return pairs.astype(np.uint32).ravel()
+
+class ProgramLOD:
+    # tolerance of the finest simplified level, as a fraction of the
+    # size of the program, and the number of simplified levels
+    finest = 1 / 16384.
+    count = 5
+
+    def __init__(self, canon, matrix):
+        self.groups = {}
+        self.stats = {}
+        sizes = np.array(canon.max_extents) - np.array(canon.min_extents)
+        size = float(np.sqrt((np.maximum(sizes, 0) ** 2).sum())) or 1.
+        self.center = (np.array(canon.max_extents) + np.array(canon.min_extents)) / 2
+        self.tolerances = [0] + [size * self.finest * 4 ** i
+                                  for i in range(self.count)]
+        for name, color in GROUPS:
+            lineno, start, end = previewindex._columns(getattr(canon, name))
+            if not len(lineno):
+                continue
+            vertices, first = polylines(start.dot(matrix.T), end.dot(matrix.T))
+            levels = []
+            keep = np.ones(len(vertices), bool)
+            for tolerance in self.tolerances:
+                if tolerance:
+                    # simplify the previous level rather than the original;
+                    # the errors add up to at most 4/3 of this tolerance
+                    sub = np.flatnonzero(keep)
+                    sub_first = np.searchsorted(sub, first)
+                    keep = np.zeros(len(vertices), bool)
+                    keep[sub[douglas_peucker(vertices[sub],
+                        sub_first, tolerance * .75)]] = True
+                levels.append(line_indices(keep, first))
+            self.stats[name] = [len(l) // 2 for l in levels]
+            self.groups[name] = _Group(vertices.astype(np.float32), levels)
+
+    def pixel_size(self):
+        "Distance in the preview covered by one pixel, near the program centre"
+        modelview = np.asarray(glGetDoublev(GL_MODELVIEW_MATRIX), np.float64).reshape(4, 4)
+        projection = np.asarray(glGetDoublev(GL_PROJECTION_MATRIX), np.float64).reshape(4, 4)
+        viewport = glGetIntegerv(GL_VIEWPORT)
+        mvp = modelview.dot(projection)
+        p = np.r_[[self.center], self.center + np.eye(3)]
+        clip = np.c_[p, np.ones(4)].dot(mvp)
+        w = clip[:, 3]
+        if (w <= 0).any(): return 0
+        screen = clip[:, :2] / w[:, None] * [viewport[2] / 2., viewport[3] / 2.]
+        per_unit = np.hypot(*(screen[1:] - screen[0]).T).max()
+        return 1 / per_unit if per_unit > 0 else 0
+
+    def choose_level(self, pixels):
+        "The coarsest level whose error stays below pixels screen pixels"
+        limit = self.pixel_size() * pixels
+        level = 0
+        for i, tolerance in enumerate(self.tolerances):
+            if tolerance <= limit: level = i
+        return level
+
+    def draw(self, canon, rapids, pixels=.5):
+        level = self.choose_level(pixels)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        try:
+            for name, color in GROUPS:
+                if name not in self.groups: continue
+                if name == 'traverse':
+                    if not rapids: continue
+                    glEnable(GL_LINE_STIPPLE)
+                canon.color_with_alpha(color)
+                self.groups[name].draw(level)
+                if name == 'traverse':
+                    glDisable(GL_LINE_STIPPLE)
+        finally:
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+            glDisableClientState(GL_VERTEX_ARRAY)
+        return level
+
+    def delete(self):
+        for group in self.groups.values():
+            group.delete()
+        self.groups = {}
+
+# vim:ts=8:sts=4:sw=4:et:
@@ -0,0 +1,373 @@
+#    This is a component of AXIS, a front-end for emc
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# Compact storage for the preview geometry collected by rs274.glcanon.
+#
+# GLCanon normally keeps each move as a tuple
+#   (line number, [start position], [end position], feedrate, [tlo x, tlo y, tlo z])
+# (traverses have no feedrate).  For very long programs the per-move Python
+# objects cost far more than the numbers they hold, so SegmentStore keeps the
+# same information in contiguous column arrays instead.  It still behaves
+# enough like the list it replaces (len, iteration, indexing, append) that
+# code which walks canon.feed etc. keeps working unchanged.
+#
+# Arcs can also be queued with append_arc.  They are split into segments
+# in batches, with one set of array operations for many arcs, the next
+# time the store is read.
+
+import math
+import numpy as np
+
+class SegmentStore:
+    chunk = 65536
+    # appends are staged in a plain list and converted this many at a time
+    batch = 4096
+    # queued arcs are split into segments this many at a time
+    arc_batch = 1024
+
+    def __init__(self, has_feed=True, chunk=None):
+        self.has_feed = has_feed
+        if chunk is not None: self.chunk = chunk
+        self.n = 0
+        self.capacity = 0
+        self.pending = []
+        self.pending_arcs = []
+        self.pending_steps = 0
+        self._lineno = np.zeros(0, np.int32)
+        self._start = np.zeros((0, 9), np.float64)
+        self._end = np.zeros((0, 9), np.float64)
+        self._feedrate = np.zeros(0, np.float64)
+        self._tlo = np.zeros((0, 3), np.float64)
+
+    @classmethod
+    def from_columns(cls, lineno, start, end, feedrate=None, tlo=None):
+        """Make a store holding the given column arrays without copying them
+        (they may be read-only memory maps; appending makes a copy)"""
+        store = cls(has_feed=feedrate is not None)
+        store.n = store.capacity = len(lineno)
+        store._lineno = lineno
+        store._start = start
+        store._end = end
+        if feedrate is not None:
+            store._feedrate = feedrate
+        store._tlo = tlo if tlo is not None else np.zeros((store.n, 3))
+        return store
+
+    def _resize(self, capacity):
+        def grow(a):
+            b = np.zeros((capacity,) + a.shape[1:], a.dtype)
+            b[:self.n] = a[:self.n]
+            return b
+        self._lineno = grow(self._lineno)
+        self._start = grow(self._start)
+        self._end = grow(self._end)
+        if self.has_feed:
+            self._feedrate = grow(self._feedrate)
+        self._tlo = grow(self._tlo)
+        self.capacity = capacity
+
+    def reserve(self, count):
+        need = self.n + count
+        if need <= self.capacity: return
+        # Grow geometrically, in whole chunks, so appends stay amortized O(1)
+        capacity = max(need, self.capacity + self.capacity // 2)
+        capacity = -(-capacity // self.chunk) * self.chunk
+        self._resize(capacity)
+
+    def flush(self):
+        "Move staged appends into the column arrays"
+        if self.pending_arcs: self.flush_arcs()
+        pending = self.pending
+        if not pending: return
+        self.pending = []
+        count = len(pending)
+        self.reserve(count)
+        n = self.n
+        m = n + count
+        columns = list(zip(*pending))
+        self._lineno[n:m] = columns[0]
+        self._start[n:m] = columns[1]
+        self._end[n:m] = columns[2]
+        if self.has_feed:
+            self._feedrate[n:m] = columns[3]
+        self._tlo[n:m] = columns[-1]
+        self.n = m
+
+    def flush_arcs(self):
+        "Split the queued arcs into segments"
+        plans = np.array(self.pending_arcs)
+        self.pending_arcs = []
+        self.pending_steps = 0
+        points, counts = arc_points(plans)
+        count = len(points)
+        self.reserve(count)
+        n = self.n
+        m = n + count
+        first = np.r_[0, np.cumsum(counts)[:-1]]
+        self._end[n:m] = points
+        self._start[n+1:m] = points[:-1]
+        self._start[n + first] = plans[:, ARC_LO]
+        self._lineno[n:m] = np.repeat(plans[:, ARC_LINENO], counts)
+        if self.has_feed:
+            self._feedrate[n:m] = np.repeat(plans[:, ARC_FEEDRATE], counts)
+        self._tlo[n:m] = np.repeat(plans[:, ARC_TLO], counts, axis=0)
+        self.n = m
+
+    def trim(self):
+        "Release the unused tail of the column arrays"
+        self.flush()
+        if self.capacity > self.n:
+            self._resize(self.n)
+
+    def _column(name):
+        def get(self):
+            if self.pending or self.pending_arcs: self.flush()
+            return getattr(self, name)[:self.n]
+        return property(get)
+
+    # Column views, limited to the rows actually in use
+    lineno = _column('_lineno')
+    start = _column('_start')
+    end = _column('_end')
+    feedrate = _column('_feedrate')
+    tlo = _column('_tlo')
+    del _column
+
+    def append(self, item):
+        if self.pending_arcs: self.flush_arcs()
+        pending = self.pending
+        pending.append(item)
+        if len(pending) >= self.batch: self.flush()
+
+    def append_arc(self, plan):
+        "Queue an arc described by arc_plan"
+        if self.pending: self.flush()
+        pending = self.pending_arcs
+        pending.append(plan)
+        self.pending_steps += int(plan[ARC_STEPS])
+        if len(pending) >= self.arc_batch or self.pending_steps >= self.batch * 16:
+            self.flush_arcs()
+
+    def extend(self, rows):
+        if self.pending_arcs: self.flush_arcs()
+        self.pending.extend(rows)
+        self.flush()
+
+    def extend_path(self, lineno, lo, points, feedrate, tlo):
+        "Append the connected path lo -> points[0] -> points[1] -> ..."
+        count = len(points)
+        if not count: return
+        if self.pending or self.pending_arcs: self.flush()
+        self.reserve(count)
+        n = self.n
+        m = n + count
+        self._end[n:m] = points
+        self._start[n] = lo
+        self._start[n+1:m] = self._end[n:m-1]
+        self._lineno[n:m] = lineno
+        if self.has_feed:
+            self._feedrate[n:m] = feedrate
+        self._tlo[n:m] = tlo
+        self.n = m
+
+    def rows(self, first=0, last=None):
+        "Return rows first..last in the list-of-tuples layout"
+        if self.pending or self.pending_arcs: self.flush()
+        if last is None or last > self.n: last = self.n
+        columns = [self._lineno[first:last].tolist(),
+                   self._start[first:last].tolist(),
+                   self._end[first:last].tolist()]
+        if self.has_feed:
+            columns.append(self._feedrate[first:last].tolist())
+        columns.append(self._tlo[first:last].tolist())
+        return list(zip(*columns))
+
+    def strided(self, step):
+        "Return every step-th row, each extended to cover the rows skipped"
+        if self.pending or self.pending_arcs: self.flush()
+        first = np.arange(0, self.n, step)
+        last = np.minimum(first + step, self.n) - 1
+        columns = [self._lineno[first].tolist(),
+                   self._start[first].tolist(),
+                   self._end[last].tolist()]
+        if self.has_feed:
+            columns.append(self._feedrate[first].tolist())
+        columns.append(self._tlo[first].tolist())
+        return list(zip(*columns))
+
+    def chunks(self, size=None):
+        "Yield the rows as successive lists of at most size tuples"
+        if self.pending or self.pending_arcs: self.flush()
+        size = size or self.chunk
+        for first in range(0, self.n, size):
+            yield self.rows(first, first + size)
+
+    def __len__(self):
+        return self.n + len(self.pending) + self.pending_steps
+
+    def __iter__(self):
+        for rows in self.chunks():
+            for row in rows: yield row
+
+    def __getitem__(self, i):
+        if self.pending or self.pending_arcs: self.flush()
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.n))]
+        if i < 0: i += self.n
+        if i < 0 or i >= self.n: raise IndexError("segment index out of range")
+        return self.rows(i, i+1)[0]
+
+    def line_rows(self, lineno):
+        "Return the indices of all rows generated by the given line"
+        return np.flatnonzero(self.lineno == lineno)
+
+    def nbytes(self):
+        return (self._lineno.nbytes + self._start.nbytes + self._end.nbytes
+                + self._feedrate.nbytes + self._tlo.nbytes)
+
+# Layout of the rows made by arc_plan
+ARC_LINENO = 0
+ARC_FEEDRATE = 1
+ARC_TLO = slice(2, 5)
+ARC_LO = slice(5, 14)       # start point, as drawn
+ARC_O = slice(14, 23)       # start point, program coordinates
+ARC_D = slice(23, 32)       # end - start, program coordinates
+ARC_CX, ARC_CY, ARC_X, ARC_Y = 32, 33, 34, 35
+ARC_THETA, ARC_SWEEP, ARC_RADIUS, ARC_STEPS = 36, 37, 38, 39
+ARC_G92 = slice(40, 49)
+ARC_G5X = slice(49, 58)
+ARC_ROTATION = slice(58, 60)
+ARC_END = slice(60, 69)     # end point, as drawn
+
+CIRCLE_FUZZ = 1e-6
+
+def arc_plan(canon, x1, y1, cx, cy, rot, z1, a, b, c, u, v, w,
+        max_segments=128, tolerance=0):
+    """Describe an arc_feed call from the interpreter as one row of floats,
+    to be split into segments by arc_points.
+
+    The segments match gcode.arc_to_segments.  With a tolerance, the arc
+    gets the fewest segments (at least 3, and never more than without
+    one) that keep every chord within tolerance of the arc."""
+    if canon.plane == 1:
+        X, Y, Z = 0, 1, 2
+    elif canon.plane == 3:
+        X, Y, Z = 2, 0, 1
+    else:
+        X, Y, Z = 1, 2, 0
+    g5x = [canon.g5x_offset_x, canon.g5x_offset_y, canon.g5x_offset_z,
+        canon.g5x_offset_a, canon.g5x_offset_b, canon.g5x_offset_c,
+        canon.g5x_offset_u, canon.g5x_offset_v, canon.g5x_offset_w]
+    g92 = [canon.g92_offset_x, canon.g92_offset_y, canon.g92_offset_z,
+        canon.g92_offset_a, canon.g92_offset_b, canon.g92_offset_c,
+        canon.g92_offset_u, canon.g92_offset_v, canon.g92_offset_w]
+    if canon.rotation_xy:
+        rc, rs = canon.rotation_cos, canon.rotation_sin
+    else:
+        rc, rs = 1., 0.
+
+    # Start point back in program coordinates
+    lo = list(canon.lo)
+    o = [p - g for p, g in zip(lo, g5x)]
+    o[0], o[1] = o[0] * rc + o[1] * rs, -o[0] * rs + o[1] * rc
+    o = [p - g for p, g in zip(o, g92)]
+    n = [0., 0., 0., a, b, c, u, v, w]
+    n[X] = x1; n[Y] = y1; n[Z] = z1
+
+    theta1 = math.atan2(o[Y] - cy, o[X] - cx)
+    theta2 = math.atan2(n[Y] - cy, n[X] - cx)
+    if rot < 0:
+        while theta2 - theta1 > -CIRCLE_FUZZ: theta2 -= 2 * math.pi
+    else:
+        while theta2 - theta1 < CIRCLE_FUZZ: theta2 += 2 * math.pi
+    # if multi-turn, add the right number of full circles
+    if rot < -1: theta2 += 2 * math.pi * (rot + 1)
+    if rot > 1: theta2 += 2 * math.pi * (rot - 1)
+
+    sweep = theta2 - theta1
+    radius = math.hypot(o[X] - cx, o[Y] - cy)
+    steps = max(3, int(max_segments * abs(sweep) / math.pi))
+    if tolerance > 0:
+        if radius > tolerance:
+            # a chord spanning angle t is radius * (1 - cos(t/2)) from the arc
+            angle = 2 * math.acos(1 - tolerance / radius)
+            steps = max(3, min(steps, int(math.ceil(abs(sweep) / angle))))
+        else:
+            steps = 3
+
+    end = [p + g for p, g in zip(n, g92)]
+    end[0], end[1] = end[0] * rc - end[1] * rs, end[0] * rs + end[1] * rc
+    end = [p + g for p, g in zip(end, g5x)]
+    return ([canon.lineno, canon.feedrate, canon.xo, canon.yo, canon.zo]
+        + lo + o + [e - s for e, s in zip(n, o)]
+        + [cx, cy, X, Y, theta1, sweep, radius, steps]
+        + g92 + g5x + [rc, rs] + end)
+
+def arc_points(plans):
+    """Split arcs described by arc_plan rows into segments.
+
+    Returns the segment end points of all the arcs, one after the other,
+    and the number of segments of each arc."""
+    plans = np.asarray(plans, np.float64).reshape(-1, ARC_END.stop)
+    counts = plans[:, ARC_STEPS].astype(np.intp)
+    total = counts.sum()
+    arc = np.repeat(np.arange(len(plans)), counts)
+    first = np.cumsum(counts) - counts
+    f = (np.arange(1, total + 1) - first[arc]) / plans[arc, ARC_STEPS]
+
+    # Every axis moves linearly except the two in the plane of the arc.
+    # Work per arc where possible, and only gather what each point needs.
+    g92 = plans[:, ARC_G92]
+    points = (plans[:, ARC_O] + g92)[arc]
+    points += f[:, None] * plans[arc, ARC_D]
+    t = plans[arc, ARC_THETA] + plans[arc, ARC_SWEEP] * f
+    radius = plans[arc, ARC_RADIUS]
+    rows = np.arange(total)
+    cols = np.arange(len(plans))
+    X = plans[:, ARC_X].astype(np.intp); Y = plans[:, ARC_Y].astype(np.intp)
+    points[rows, X[arc]] = (plans[:, ARC_CX] + g92[cols, X])[arc] + radius * np.cos(t)
+    points[rows, Y[arc]] = (plans[:, ARC_CY] + g92[cols, Y])[arc] + radius * np.sin(t)
+
+    rotation = plans[:, ARC_ROTATION]
+    if rotation[:, 1].any():
+        rc = rotation[arc, 0]; rs = rotation[arc, 1]
+        x = points[:, 0].copy()
+        points[:, 0] = x * rc - points[:, 1] * rs
+        points[:, 1] = x * rs + points[:, 1] * rc
+    points += plans[arc, ARC_G5X]
+    # End exactly where the interpreter said, as gcode.arc_to_segments does
+    points[first + counts - 1] = plans[:, ARC_END]
+    return points, counts
+
+def calc_extents(*stores):
+    """Compute the same extents as gcode.calc_extents, from SegmentStores
+
+    Returns min_extents, max_extents, min_extents_notool, max_extents_notool
+    """
+    min_e = np.full(3, 9e99); max_e = np.full(3, -9e99)
+    min_t = np.full(3, 9e99); max_t = np.full(3, -9e99)
+    for s in stores:
+        if not len(s): continue
+        tlo = s.tlo
+        for p in (s.start[:, :3], s.end[:, :3]):
+            min_e = np.minimum(min_e, p.min(axis=0))
+            max_e = np.maximum(max_e, p.max(axis=0))
+            pt = p + tlo
+            min_t = np.minimum(min_t, pt.min(axis=0))
+            max_t = np.maximum(max_t, pt.max(axis=0))
+    return min_e.tolist(), max_e.tolist(), min_t.tolist(), max_t.tolist()
+
+# vim:ts=8:sts=4:sw=4:et:
@@ -0,0 +1,409 @@
+#    Share one poll of the LinuxCNC status between user interfaces
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# A Server (run by linuxcncstatd) polls linuxcnc.stat once a cycle and
+# sends the fields that changed to every process connected to its unix
+# socket.  A new subscriber is sent the whole status first.
+#
+# Stat is the subscriber's side and stands in for linuxcnc.stat, the
+# status fields being plain attributes.  receive() takes in the changes
+# sent since it was last called without waiting, the values being those
+# of the server's last poll, up to one server cycle old.  It is for user
+# interfaces polling periodically.  poll() has the server poll the
+# status at once and waits for it, so the values are as fresh as
+# linuxcnc.stat's, for code that polls just after sending a command.  If
+# the server goes away, Stat polls linuxcnc.stat itself from then on.
+#
+# stat() returns a Stat when a server is running and linuxcnc.stat()
+# when none is, and receive(stat) polls either periodically.
+#
+# The socket is in a directory only its user can enter, and Stat only
+# takes the status from a server run by the same user.
+#
+# A subscriber sends a byte to ask for a poll.  The server sends it
+# messages of a 4 byte length followed by a pickle of one of
+#   ('status', fields, error)   the whole status, on connecting
+#   ('changes', fields)         the fields that changed
+#   ('error', message)          polling failed, with linuxcnc.error's message
+#   ('polled',)                 the poll it asked for is done
+# The entries of tool_table are sent as tuples and made linuxcnc.tool
+# again by Stat, so the pickles hold no classes and none are unpickled.
+
+import io
+import os
+import sys
+import time
+import errno
+import operator
+import pickle
+import select
+import socket
+import struct
+
+import linuxcnc
+
+HEADER = struct.Struct('!I')
+# SO_PEERCRED's struct ucred
+CREDENTIALS = struct.Struct('3i')
+# bytes a subscriber may fall behind by before it is dropped
+MAX_BACKLOG = 4 << 20
+
+def socket_path():
+    "The socket of the server, the same for the server and subscribers"
+    path = os.environ.get('LINUXCNC_STATUS_SOCKET')
+    if path:
+        return path
+    directory = os.environ.get('XDG_RUNTIME_DIR') or '/tmp/linuxcnc-%d' % os.getuid()
+    return os.path.join(directory, 'linuxcnc-status')
+
+def _private_directory(directory):
+    "Make directory if needed, and check that only this user can enter it"
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(directory)
+    if (not os.path.isdir(directory) or os.path.islink(directory)
+            or st.st_uid != os.getuid() or st.st_mode & 0o077):
+        raise OSError(errno.EACCES, 'not a directory private to this user', directory)
+
+def _message(message):
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    return HEADER.pack(len(data)) + data
+
+class _Unpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError('%s.%s is not a status value' % (module, name))
+
+def status_fields(stat):
+    "The names of the status fields of a linuxcnc.stat"
+    return [name for name in dir(stat)
+            if not name.startswith('_') and not callable(getattr(stat, name))]
+
+
+class Server(object):
+    def __init__(self, path=None, cycle=0.05, stat=None):
+        self.path = path or socket_path()
+        self.cycle = cycle
+        self.stat = stat if stat is not None else linuxcnc.stat()
+        self.fields = status_fields(self.stat)
+        self.read = operator.attrgetter(*self.fields)
+        self.last = None
+        self.unpicklable = set()
+        self.values = {}
+        self.error = None
+        self.clients = {}
+        self.polls = 0
+        self.sent = 0
+        self.listener = self._listen()
+        # a subscriber gets the whole status from the moment it can connect
+        self.step()
+        os.rename(self.path + '.new', self.path)
+
+    def _listen(self):
+        _private_directory(os.path.dirname(os.path.abspath(self.path)))
+        if os.path.exists(self.path):
+            # left behind by a server that died, or in use by a live one
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)
+            else:
+                raise OSError(errno.EADDRINUSE, 'status broadcast already running', self.path)
+            finally:
+                probe.close()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # only the user running LinuxCNC may connect
+        umask = os.umask(0o177)
+        try:
+            if os.path.exists(self.path + '.new'):
+                os.unlink(self.path + '.new')
+            listener.bind(self.path + '.new')
+        finally:
+            os.umask(umask)
+        listener.listen(16)
+        listener.setblocking(False)
+        # renamed to self.path once it can serve, for those waiting for it
+        return listener
+
+    def close(self):
+        for client in list(self.clients):
+            self._drop(client)
+        self.listener.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def step(self):
+        "Poll the status once and send the fields that changed to the subscribers"
+        self.polls += 1
+        try:
+            self.stat.poll()
+        except linuxcnc.error as e:
+            if self.error != str(e):
+                self.error = str(e)
+                self._send(('error', self.error))
+            return
+        last, self.last = self.last, self.read(self.stat)
+        if last is None:
+            changed = dict(zip(self.fields, self.last))
+        elif last == self.last:
+            changed = {}
+        else:
+            changed = dict((name, new) for name, old, new in zip(self.fields, last, self.last)
+                           if old != new)
+        if 'tool_table' in changed:
+            # linuxcnc.tool can't be pickled
+            changed['tool_table'] = tuple(map(tuple, changed['tool_table']))
+        for name in self.unpicklable.intersection(changed):
+            del changed[name]
+        self.values.update(changed)
+        if changed or self.error is not None:
+            self.error = None
+            try:
+                self._send(('changes', changed))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                self._send(('changes', self._picklable(changed)))
+
+    def _picklable(self, changed):
+        "Leave out the fields that can't be pickled from now on"
+        for name, value in list(changed.items()):
+            try:
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                print('linuxcncstatd: not sending %s: %s' % (name, e), file=sys.stderr)
+                self.unpicklable.add(name)
+                del changed[name]
+                self.values.pop(name, None)
+        return changed
+
+    def _accept(self):
+        try:
+            client, address = self.listener.accept()
+        except OSError:
+            return
+        client.setblocking(False)
+        self.clients[client] = bytearray(_message(('status', self.values, self.error)))
+        self._flush(client)
+
+    def _send(self, message, clients=None):
+        data = _message(message)
+        self.sent += 1
+        for client in list(self.clients if clients is None else clients):
+            if client in self.clients:
+                self.clients[client] += data
+                self._flush(client)
+
+    def _flush(self, client):
+        backlog = self.clients[client]
+        try:
+            sent = client.send(backlog)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(client)
+            return
+        del backlog[:sent]
+        if len(backlog) > MAX_BACKLOG:
+            # from then on it polls the status itself
+            self._drop(client)
+
+    def _drop(self, client):
+        self.clients.pop(client, None)
+        client.close()
+
+    def serve(self):
+        "Poll every cycle seconds and serve the subscribers, until killed"
+        next_poll = time.monotonic()
+        while True:
+            asked = []
+            waiting = [c for c, backlog in self.clients.items() if backlog]
+            timeout = max(0, next_poll - time.monotonic())
+            readable, writable, _ = select.select([self.listener] + list(self.clients),
+                                                  waiting, [], timeout)
+            for s in readable:
+                if s is self.listener:
+                    self._accept()
+                elif s in self.clients:
+                    # a byte from Stat.poll(), or nothing when it goes away
+                    try:
+                        data = s.recv(4096)
+                    except OSError:
+                        data = b''
+                    if data:
+                        asked.append(s)
+                    else:
+                        self._drop(s)
+            for s in writable:
+                if s in self.clients:
+                    self._flush(s)
+            now = time.monotonic()
+            if asked or now >= next_poll:
+                self.step()
+                self._send(('polled',), asked)
+            if now >= next_poll:
+                next_poll += self.cycle
+                if next_poll < now:
+                    next_poll = now + self.cycle
+
+
+class Stat(object):
+    """linuxcnc.stat for a subscriber to a status broadcast.  Raises
+    OSError if no server of this user can be reached, and linuxcnc.error
+    if the server could not poll the status at all"""
+    def __init__(self, path=None, timeout=1.):
+        self._direct = None
+        self._fields = set()
+        self._error = None
+        self._polled = False
+        self._timeout = timeout
+        self._buffer = bytearray()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._socket.settimeout(timeout)
+            self._socket.connect(path or socket_path())
+            credentials = self._socket.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                                  CREDENTIALS.size)
+            pid, uid, gid = CREDENTIALS.unpack(credentials)
+            if uid != os.getuid():
+                raise OSError(errno.EACCES, 'status broadcast of another user')
+            # wait for the whole status, so the fields are there before poll()
+            while not self._receive():
+                data = self._socket.recv(65536)
+                if not data:
+                    raise OSError(errno.ECONNRESET, 'status broadcast closed')
+                self._buffer += data
+            if not self._fields:
+                raise linuxcnc.error(self._error or 'status broadcast sent no status')
+            self._socket.setblocking(False)
+        except:
+            self._socket.close()
+            raise
+
+    def __getattr__(self, name):
+        # only reached without the broadcast, for linuxcnc.stat's fields
+        direct = self.__dict__.get('_direct')
+        if direct is None or name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(direct, name)
+
+    def _receive(self):
+        "Take in the complete messages received, returning how many there were"
+        buffer = self._buffer
+        count = 0
+        while len(buffer) >= HEADER.size:
+            length, = HEADER.unpack_from(buffer)
+            end = HEADER.size + length
+            if len(buffer) < end:
+                break
+            message = _Unpickler(io.BytesIO(buffer[HEADER.size:end])).load()
+            del buffer[:end]
+            count += 1
+            if message[0] == 'changes':
+                self._update(message[1])
+                self._error = None
+            elif message[0] == 'error':
+                self._error = message[1]
+            elif message[0] == 'polled':
+                self._polled = True
+            elif message[0] == 'status':
+                self._forget()
+                self._update(message[1])
+                self._error = message[2]
+        return count
+
+    def _update(self, fields):
+        if 'tool_table' in fields:
+            fields['tool_table'] = tuple(map(linuxcnc.tool, fields['tool_table']))
+        self.__dict__.update(fields)
+        self._fields.update(fields)
+
+    def _forget(self):
+        for name in self._fields:
+            self.__dict__.pop(name, None)
+        self._fields = set()
+
+    def _lost(self):
+        "The server went away: poll without it"
+        self._socket.close()
+        self._forget()
+        self._direct = linuxcnc.stat()
+
+    def _check(self):
+        if self._error is not None:
+            raise linuxcnc.error(self._error)
+
+    def receive(self):
+        "Take in the changes sent so far, without waiting"
+        if self._direct is None:
+            try:
+                while True:
+                    data = self._socket.recv(65536)
+                    if not data:
+                        raise EOFError
+                    self._buffer += data
+            except BlockingIOError:
+                # all that was sent so far
+                self._receive()
+                self._check()
+                return
+            except (EOFError, OSError):
+                self._lost()
+        self._direct.poll()
+
+    def poll(self):
+        "Have the server poll the status now and take in the result"
+        if self._direct is None:
+            self._polled = False
+            try:
+                self._socket.settimeout(self._timeout)
+                self._socket.sendall(b'p')
+                while not self._polled:
+                    data = self._socket.recv(65536)
+                    if not data:
+                        raise EOFError
+                    self._buffer += data
+                    self._receive()
+                self._socket.setblocking(False)
+            except (EOFError, OSError):
+                # including a server that did not answer in time
+                self._lost()
+            else:
+                self._check()
+                return
+        self._direct.poll()
+
+    def fileno(self):
+        "The socket, readable when changes have arrived"
+        return self._socket.fileno()
+
+
+def stat(path=None):
+    "A Stat if a status broadcast is running, otherwise a linuxcnc.stat"
+    try:
+        return Stat(path)
+    except (OSError, linuxcnc.error):
+        return linuxcnc.stat()
+
+def receive(stat):
+    """Poll what stat() returned periodically: a Stat takes in what the
+    server sent without waiting, the values up to a server cycle old"""
+    if isinstance(stat, Stat):
+        stat.receive()
+    else:
+        stat.poll()
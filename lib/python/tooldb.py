@@ -1,4 +1,6 @@
 import sys
+import select
+import sqlite3
 
 # A python interface for LinuxCNC tool database usage
 
@@ -19,6 +21,75 @@ def tooldb_tools(tool_list):
     global tools
     tools = tool_list
 
+# Or provide a ToolStore, which serves as both
+def tooldb_store(store):
+    global thestore
+    tooldb_callbacks(store.get_tool,store.put_tool)
+    tooldb_tools(store)
+    thestore = store
+
+#-----------------------------------------------------------
+# Tool data kept in memory, indexed by tool number
+def line_toolno(toolline):
+    return int(toolline.split()[0].upper().strip("T"))
+
+class ToolStore(object):
+    # put_tool() only marks a tool as changed; the changed tools are
+    # written together by save(), which tooldb_loop() calls once the
+    # host has been quiet for SAVE_DELAY seconds
+
+    def __init__(self, toollines=()):
+        self.lines = dict()
+        self.dirty = set()
+        for toolline in toollines:
+            self.lines[line_toolno(toolline)] = toolline
+
+    # tool numbers, for tooldb_tools()
+    def __iter__(self):    return iter(self.lines)
+    def __contains__(self, toolno): return toolno in self.lines
+    def __len__(self):     return len(self.lines)
+
+    def get_tool(self,toolno):
+        return self.lines[toolno]
+
+    def put_tool(self,toolno,toolline):
+        self.lines[toolno] = toolline
+        self.dirty.add(toolno)
+
+    def save(self):
+        if not self.dirty: return
+        changed = dict((t,self.lines[t]) for t in self.dirty)
+        self.dirty = set()
+        self.write(changed)
+
+    def write(self,changed):
+        # override to persist {toolno: toolline} for the changed tools
+        pass
+
+class SqliteToolStore(ToolStore):
+    # ToolStore kept in an sqlite database file.  The toollines are
+    # only used to fill a new (empty) database.
+    def __init__(self, filename, toollines=(), mmap_size=64<<20):
+        ToolStore.__init__(self)
+        self.db = sqlite3.connect(filename)
+        self.db.execute("PRAGMA mmap_size=%d"%mmap_size)
+        self.db.execute("CREATE TABLE IF NOT EXISTS tools"
+                        " (toolno INTEGER PRIMARY KEY, line TEXT)")
+        for toolno,toolline in self.db.execute(
+                "SELECT toolno,line FROM tools ORDER BY toolno"):
+            self.lines[toolno] = toolline
+        if not self.lines:
+            for toolline in toollines:
+                toolno = line_toolno(toolline)
+                self.lines[toolno] = toolline
+                self.dirty.add(toolno)
+            self.save()
+
+    def write(self,changed):
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO tools VALUES (?,?)",
+                                list(changed.items()))
+
 #-----------------------------------------------------------
 # Interface functions
 def do_reply(msg):
@@ -48,13 +119,17 @@ def tool_cmd(cmd,params):
     do_reply(get_tool(toolno))
 
 def get_cmd(cmd,params):
+    # one write for all tools
+    replies = []
     for tno in tools:
-        try: do_reply(get_tool(tno))
+        try: replies.append("%s\n"%get_tool(tno))
         except:
             if (tno==0):
                 if debug: sys.stderr.write("no tool in spindle\n")
                 pass
-    do_reply("FINI (get_cmd)")
+    replies.append("FINI (get_cmd)\n")
+    sys.stdout.write("".join(replies))
+    sys.stdout.flush()
 
 def put_cmd(cmd,params):
     # note: checks are mainly for commandline debugging,
@@ -90,14 +165,15 @@ def do_cmd(line):
     params = ""
     if len(linelist) > 1:
         params = line.strip()[line.index(" "):].strip()
-    switcher = {
-               "g": get_cmd,  # get (all tools)
-               "p": put_cmd,  # put (update one tool)
-               "t": tool_cmd, # debug usage
-               }
     thecmd = switcher.get(cmd) or unknown_cmd
     thecmd(cmd,params)
 
+switcher = {
+           "g": get_cmd,  # get (all tools)
+           "p": put_cmd,  # put (update one tool)
+           "t": tool_cmd, # debug usage
+           }
+
 def startup_ack():
     global debug
     debug = 0
@@ -108,13 +184,25 @@ def startup_ack():
 global get_tool
 global tools
 theline = ""
+thestore = None
+SAVE_DELAY = 0.1 # seconds
 
 def tooldb_loop():
     startup_ack()
     global theline
     while True:
         try:
-            theline=sys.stdin.readline().strip()
+            # save the changes of a burst of 'p' commands (G10 L1 ...)
+            # together once no command follows for SAVE_DELAY
+            if (thestore is not None and thestore.dirty
+                and not select.select([sys.stdin],[],[],SAVE_DELAY)[0]):
+                thestore.save()
+            theline=sys.stdin.readline()
+            if not theline:
+                # host closed the pipe
+                if thestore is not None: thestore.save()
+                return
+            theline=theline.strip()
             if (theline == ""): nak_reply("empty line")
             else:               do_cmd(theline)
         except Exception as e:
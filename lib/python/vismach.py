@@ -23,6 +23,8 @@ from math import *
 import itertools
 import glnav
 import hal
+import vismach_mesh
+import vismach_backplot
 
 class Collection(object):
     def __init__(self, parts):
@@ -65,6 +67,9 @@ class Translate(Collection):
         glPushMatrix()
         glTranslatef(*self.where)
 
+    def transform(self):
+        return "translate", self.where
+
     def unapply(self):
         glPopMatrix()
 
@@ -77,6 +82,9 @@ class Scale(Collection):
         glPushMatrix()
         glScalef(*self.scaleby)
 
+    def transform(self):
+        return "scale", self.scaleby
+
     def unapply(self):
         glPopMatrix()
 
@@ -94,6 +102,11 @@ class HalTranslate(Collection):
         glPushMatrix()
         glTranslatef(x*v, y*v, z*v)
 
+    def transform(self):
+        x, y, z = self.where
+        v = self.comp[self.var]
+        return "translate", (x*v, y*v, z*v)
+
     def unapply(self):
         glPopMatrix()
 
@@ -110,6 +123,10 @@ class HalRotate(Collection):
         glPushMatrix()
         glRotatef(th * self.comp[self.var], x, y, z)
 
+    def transform(self):
+        th, x, y, z = self.where
+        return "rotate", (th * self.comp[self.var], x, y, z)
+
     def unapply(self):
         glPopMatrix()
 
@@ -124,6 +141,9 @@ class Rotate(Collection):
         glPushMatrix()
         glRotatef(th, x, y, z)
 
+    def transform(self):
+        return "rotate", self.where
+
     def unapply(self):
         glPopMatrix()
 
@@ -181,6 +201,8 @@ class Track(Collection):
         glRotatef(az-90,0,0,1)
         glRotatef(el-90,1,0,0)
 
+    def transform(self):
+        return "track", (self.position, self.target)
 
     def unapply(self):
                 glPopMatrix()
@@ -241,6 +263,9 @@ class CylinderX(CoordsBase):
         #print "CylinderX.volume", vol
         return vol
 
+    def shape(self):
+        return "cylinder", [0] + self.coords()
+
 
 # give endpoint Y values and radii
 # resulting cylinder is on the Y axis
@@ -285,6 +310,9 @@ class CylinderY(CoordsBase):
         #print "CylinderY.volume", vol
         return vol
 
+    def shape(self):
+        return "cylinder", [1] + self.coords()
+
 
 class CylinderZ(CoordsBase):
     def draw(self):
@@ -319,6 +347,9 @@ class CylinderZ(CoordsBase):
         #print "CylinderZ.volume", vol
         return vol
 
+    def shape(self):
+        return "cylinder", [2] + self.coords()
+
 # give center and radius
 class Sphere(CoordsBase):
     def draw(self):
@@ -336,6 +367,9 @@ class Sphere(CoordsBase):
         #print "Sphere.volume", vol
         return vol
 
+    def shape(self):
+        return "sphere", self.coords()
+
 
 # triangular plate in XY plane
 # specify the corners Z values for each side
@@ -623,6 +657,9 @@ class Box(CoordsBase):
         #print "Box.volume", vol
         return vol
 
+    def shape(self):
+        return "box", self.coords()
+
 
 # specify the width in X and Y, and the height in Z
 # the box is centered on the origin
@@ -775,8 +812,7 @@ class O(rs274.OpenGLTk.Opengl):
         #self.q1 = gluNewQuadric()
         #self.q2 = gluNewQuadric()
         #self.q3 = gluNewQuadric()
-        self.plotdata = []
-        self.plotlen = 16000
+        self.backplot = vismach_backplot.Backplot()
         #does not show HUD by default
         self.hud = Hud()
 
@@ -829,11 +865,7 @@ class O(rs274.OpenGLTk.Opengl):
         wz = tx*view2work[2]+ty*view2work[6]+tz*view2work[10]+view2work[14]
         # wx, wy, wz are the values to use for backplot
         # so we save them in a buffer
-        if len(self.plotdata) == self.plotlen:
-            del self.plotdata[:self.plotlen / 10]
-        point = [ wx, wy, wz ]
-        if not self.plotdata or point != self.plotdata[-1]:
-            self.plotdata.append(point)
+        self.backplot.add(wx, wy, wz)
 
         # now lets draw something in the tool coordinate system
         #glPushMatrix()
@@ -873,10 +905,7 @@ class O(rs274.OpenGLTk.Opengl):
         glLineWidth(2)
         glColor3f(1.0,0.5,0.5)
 
-        glBegin(GL_LINE_STRIP)
-        for p in self.plotdata:
-            glVertex3f(*p)
-        glEnd()
+        self.backplot.draw()
 
         glEnable(GL_LIGHTING)
         glColor3f(1,1,1)
@@ -888,7 +917,7 @@ class O(rs274.OpenGLTk.Opengl):
         glPopMatrix()
 
     def plotclear(self):
-        del self.plotdata[:self.plotlen]
+        self.backplot.clear()
 
 class Color(Collection):
     def __init__(self, color, parts):
@@ -899,119 +928,50 @@ class Color(Collection):
         glPushAttrib(GL_LIGHTING_BIT)
         glMaterialfv(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE, self.color)
 
+    def transform(self):
+        return None
+
     def unapply(self):
         glPopAttrib()
 
 class AsciiSTL:
+    "A triangle mesh from an STL file, text or binary"
     def __init__(self, filename=None, data=None):
-        if data is None:
-            data = open(filename, "r")
-        elif isinstance(data, str):
-            data = data.split("\n")
-        self.list = None
-        t = []
-        n = [0,0,0]
-        self.d = d = []
-        for line in data:
-            if line.find("normal") != -1:
-                line = line.split()
-                x, y, z = list(map(float, line[-3:]))
-                n = [x,y,z] 
-            elif line.find("vertex") != -1:
-                line = line.split()
-                x, y, z = list(map(float, line[-3:]))
-                t.append([x,y,z])
-                if len(t) == 3:
-                    if n == [0,0,0]:
-                        dx1 = t[1][0] - t[0][0]
-                        dy1 = t[1][1] - t[0][1]
-                        dz1 = t[1][2] - t[0][2]
-                        dx2 = t[2][0] - t[0][0]
-                        dy2 = t[2][1] - t[0][1]
-                        dz2 = t[2][2] - t[0][2]
-                        n = [dy1*dz2 - dy2*dz1, dz1*dx2 - dz2*dx1, dy1*dx2 - dy2*dx1]
-                    d.append((n, t))
-                    t = []
-                    n = [0,0,0]
+        self.mesh = vismach_mesh.Mesh("stl", filename, data)
 
     def draw(self):
-        if self.list is None:
-            # OpenGL isn't ready yet in __init__ so the display list
-            # is created during the first draw
-            self.list = glGenLists(1)
-            glNewList(self.list, GL_COMPILE)
-            glBegin(GL_TRIANGLES)
-            for n, t in self.d:
-                glNormal3f(*n)
-                glVertex3f(*t[0])
-                glVertex3f(*t[1])
-                glVertex3f(*t[2])
-            glEnd()
-            glEndList()
-            del self.d
-        glCallList(self.list)
+        self.mesh.draw()
+
+    def shape(self):
+        return "mesh", self.mesh.triangles()
 
 class AsciiOBJ:
     def __init__(self, filename=None, data=None):
-        if data is None:
-            data = open(filename, "r")
-        elif isinstance(data, str):
-            data = data.split("\n")
-
-        self.v = v = []
-        self.vn = vn = []
-        self.f = f = []
-        for line in data:
-            if line.startswith("#"): continue
-            if line.startswith("vn"):
-                vn.append([float(w) for w in line.split()[1:]])
-            elif line.startswith("v"):
-                v.append([float(w) for w in line.split()[1:]])
-            elif line.startswith("f"):
-                f.append(self.parse_face(line))
-
-#        print v[:5]
-#        print vn[:5]
-#        print f[:5]
-
-        self.list = None
-
-
-    def parse_int(self, i):
-        if i == '': return None
-        return int(i)
-
-    def parse_slash(self, word):
-        return [self.parse_int(i) for i in word.split("/")]
-
-    def parse_face(self, line):
-        return [self.parse_slash(w) for w in line.split()[1:]]
+        self.mesh = vismach_mesh.Mesh("obj", filename, data)
 
     def draw(self):
-        if self.list is None:
-            # OpenGL isn't ready yet in __init__ so the display list
-            # is created during the first draw
-            self.list = glGenLists(1)
-            glNewList(self.list, GL_COMPILE)
-            glDisable(GL_CULL_FACE)
-            glBegin(GL_TRIANGLES)
-            #print "obj", len(self.f)
-            for f in self.f:
-                for v, t, n in f:
-                    if n:
-                        glNormal3f(*self.vn[n-1])
-                    glVertex3f(*self.v[v-1])
-            glEnd()
-            glEndList()
-            del self.v
-            del self.vn
-            del self.f
-        glCallList(self.list)
+        glDisable(GL_CULL_FACE)
+        self.mesh.draw()
+
+    def shape(self):
+        return "mesh", self.mesh.triangles()
 
 
 old_plotclear = False
 
-def main(model, tool, work, size=10, hud=0, rotation_vectors=None, lat=0, lon=0):
+def check_collisions(comp, collisions, model):
+    clearance = collisions.update(model)
+    tolerance = comp["collision-tolerance"]
+    for (a, b), d in clearance.items():
+        comp["%s-%s.clearance" % (a, b)] = min(d, 1e99)
+        comp["%s-%s.collision" % (a, b)] = d <= tolerance
+    nearest = min(clearance.values()) if clearance else 1e99
+    comp["clearance"] = min(nearest, 1e99)
+    comp["collision"] = nearest <= tolerance
+    comp["collision-time"] = collisions.elapsed * 1000
+
+def main(model, tool, work, size=10, hud=0, rotation_vectors=None, lat=0, lon=0,
+         collisions=None):
     app = tkinter.Tk()
 
     t = O(app, double=1, depth=1)
@@ -1024,7 +984,21 @@ def main(model, tool, work, size=10, hud=0, rotation_vectors=None, lat=0, lon=0)
 
     vcomp = hal.component("vismach")
     vcomp.newpin("plotclear",hal.HAL_BIT,hal.HAL_IN)
+    vcomp.newpin("plot-length", hal.HAL_U32, hal.HAL_IN)
+    vcomp.newpin("plot-decimation", hal.HAL_FLOAT, hal.HAL_IN)
+    if collisions:
+        vcomp.newpin("collision", hal.HAL_BIT, hal.HAL_OUT)
+        vcomp.newpin("clearance", hal.HAL_FLOAT, hal.HAL_OUT)
+        vcomp.newpin("collision-tolerance", hal.HAL_FLOAT, hal.HAL_IN)
+        vcomp.newpin("collision-time", hal.HAL_FLOAT, hal.HAL_OUT)
+        for a, b in collisions.pairs:
+            vcomp.newpin("%s-%s.clearance" % (a, b), hal.HAL_FLOAT, hal.HAL_OUT)
+            vcomp.newpin("%s-%s.collision" % (a, b), hal.HAL_BIT, hal.HAL_OUT)
     vcomp.ready()
+    vcomp["plot-length"] = t.backplot.length
+    vcomp["plot-decimation"] = t.backplot.decimation
+    if collisions:
+        vcomp["collision-tolerance"] = collisions.resolution
 
     #there's probably a better way of doing this
     global HUD
@@ -1051,6 +1025,12 @@ def main(model, tool, work, size=10, hud=0, rotation_vectors=None, lat=0, lon=0)
 
     def update():
         global old_plotclear
+        if collisions:
+            check_collisions(vcomp, collisions, t.model)
+        length = max(2, vcomp["plot-length"])
+        if length != t.backplot.length:
+            t.backplot.resize(length)
+        t.backplot.decimation = vcomp["plot-decimation"]
         t.tkRedraw()
         new_plotclear = vcomp["plotclear"]
         if new_plotclear and not old_plotclear:
@@ -0,0 +1,92 @@
+#    The tool path trail drawn by vismach
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# The points are kept in a float32 ring of fixed length.  Every point is
+# written twice, at its place in the ring and again one ring length
+# further on, so the newest points are always one contiguous run of the
+# array whatever the position of the ring, and the whole trail is drawn
+# with a single glDrawArrays.
+#
+# A point is only kept once the tool has moved at least the decimation
+# distance from the last one kept.  Until then the newest position is
+# drawn as the end of the trail but not counted, so the line still reaches
+# the tool.
+
+import numpy as np
+from OpenGL.GL import *
+
+class Backplot:
+    def __init__(self, length=16000, decimation=0.):
+        self.decimation = decimation
+        self.resize(length)
+
+    def __len__(self):
+        return self.count
+
+    def resize(self, length):
+        "Keep up to length points, dropping the oldest if there are more"
+        length = max(2, int(length))
+        old = self.points() if hasattr(self, "data") else np.zeros((0, 3), np.float32)
+        self.length = length
+        self.data = np.zeros((2 * length, 3), np.float32)
+        self.count = 0
+        self.end = 0
+        self.tip = None
+        # one slot is left for the tool position that isn't kept yet
+        for p in old[-(length - 1):]:
+            self._keep(p)
+
+    def clear(self):
+        self.count = 0
+        self.tip = None
+
+    def _keep(self, point):
+        self.data[self.end] = self.data[self.end + self.length] = point
+        self.end = (self.end + 1) % self.length
+        self.count = min(self.count + 1, self.length - 1)
+
+    def add(self, x, y, z):
+        "Move the end of the trail to x, y, z"
+        # rounded to float32 as stored, so a tool standing still compares
+        # equal to the last point kept
+        point = x, y, z = [float(np.float32(v)) for v in (x, y, z)]
+        if self.count:
+            last = self.data[self.end - 1]
+            dx, dy, dz = x - float(last[0]), y - float(last[1]), z - float(last[2])
+            d = dx * dx + dy * dy + dz * dz
+            if d == 0 or d < self.decimation * self.decimation:
+                self.tip = point
+                return
+        self._keep(point)
+        self.tip = None
+
+    def points(self):
+        "The points of the trail, oldest first, as an n x 3 array"
+        n = self.count
+        if self.tip is not None:
+            self.data[self.end] = self.data[self.end + self.length] = self.tip
+            n += 1
+        start = (self.end - self.count) % self.length
+        return self.data[start:start + n]
+
+    def draw(self):
+        points = self.points()
+        if len(points) < 2: return
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, points)
+        glDrawArrays(GL_LINE_STRIP, 0, len(points))
+        glPopClientAttrib()
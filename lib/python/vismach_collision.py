@@ -0,0 +1,340 @@
+#    Clearance and collision checking between parts of a vismach model
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# The surface of each primitive (Box, cylinders, Sphere, AsciiSTL,
+# AsciiOBJ) is sampled with points no farther apart than the resolution,
+# in the primitive's own coordinates.  The points are put in a kd-tree
+# whose nodes are bounding spheres, stored as flat arrays.  The tree is
+# built once, and again only when the primitive's coordinates change (as
+# for a tool cylinder that follows the tool length).
+#
+# Each update walks the model the way Collection.traverse does, but
+# multiplies the transforms itself instead of giving them to OpenGL.  A
+# primitive whose transform changed has the centres of its tree's nodes
+# moved to world coordinates; the points themselves are only moved for
+# the leaves that are compared.
+#
+# The distance between two trees is found by descending both at once,
+# all node pairs of a level at a time: a pair is dropped once the gap
+# between its spheres is larger than the best distance found so far,
+# which starts as the distance between one point of each node.  The
+# leaf pairs left are compared point by point, nearest first.
+#
+# Distances are between surface points, so they are accurate to about
+# the resolution, and a part entirely inside another is not noticed.
+
+import time
+import numpy as np
+
+LEAF = 16
+
+def _rotation(th, x, y, z):
+    "The matrix of glRotatef(th, x, y, z)"
+    m = np.eye(4)
+    n = np.sqrt(x * x + y * y + z * z)
+    if n == 0: return m
+    x, y, z = x / n, y / n, z / n
+    c = np.cos(np.radians(th))
+    s = np.sin(np.radians(th))
+    m[:3, :3] = [
+        [x * x * (1 - c) + c, x * y * (1 - c) - z * s, x * z * (1 - c) + y * s],
+        [y * x * (1 - c) + z * s, y * y * (1 - c) + c, y * z * (1 - c) - x * s],
+        [x * z * (1 - c) - y * s, y * z * (1 - c) + x * s, z * z * (1 - c) + c]]
+    return m
+
+def _translation(x, y, z):
+    m = np.eye(4)
+    m[:3, 3] = x, y, z
+    return m
+
+def _scaling(x, y, z):
+    return np.diag([x, y, z, 1.])
+
+def _steps(length, resolution):
+    return max(1, int(np.ceil(abs(length) / resolution)))
+
+def _box(x1, y1, z1, x2, y2, z2, resolution):
+    lo = np.minimum([x1, y1, z1], [x2, y2, z2])
+    hi = np.maximum([x1, y1, z1], [x2, y2, z2])
+    axes = [np.linspace(lo[i], hi[i], _steps(hi[i] - lo[i], resolution) + 1)
+            for i in range(3)]
+    faces = []
+    for i in range(3):
+        j, k = [a for a in range(3) if a != i]
+        u, v = np.meshgrid(axes[j], axes[k])
+        for w in lo[i], hi[i]:
+            face = np.empty((u.size, 3))
+            face[:, i] = w
+            face[:, j] = u.ravel()
+            face[:, k] = v.ravel()
+            faces.append(face)
+    return np.concatenate(faces)
+
+def _circles(radius, resolution):
+    "Points filling a disc, as (radius, angle) pairs"
+    rings = [(0., 0.)]
+    for r in np.linspace(0, radius, _steps(radius, resolution) + 1)[1:]:
+        a = np.linspace(0, 2 * np.pi, _steps(2 * np.pi * r, resolution),
+                        endpoint=False)
+        rings.extend(zip(np.full(len(a), r), a))
+    return np.array(rings)
+
+def _cylinder(axis, a1, r1, a2, r2, resolution):
+    "A frustum along axis 0, 1 or 2 from a1 with radius r1 to a2 with r2"
+    t = np.linspace(0, 1, _steps(a2 - a1, resolution) + 1)
+    around = np.linspace(0, 2 * np.pi,
+        max(8, _steps(2 * np.pi * max(r1, r2), resolution)), endpoint=False)
+    t, angle = np.meshgrid(t, around)
+    t, angle = t.ravel(), angle.ravel()
+    along = [a1 + (a2 - a1) * t]
+    radius = [r1 + (r2 - r1) * t]
+    for a, r in (a1, r1), (a2, r2):
+        disc = _circles(r, resolution)
+        along.append(np.full(len(disc), a))
+        radius.append(disc[:, 0])
+        angle = np.r_[angle, disc[:, 1]]
+    along = np.concatenate(along)
+    radius = np.concatenate(radius)
+    points = np.empty((len(along), 3))
+    j, k = [i for i in range(3) if i != axis]
+    points[:, axis] = along
+    points[:, j] = radius * np.cos(angle)
+    points[:, k] = radius * np.sin(angle)
+    return points
+
+def _sphere(x, y, z, r, resolution):
+    n = max(12, int(np.ceil(4 * np.pi * r * r / resolution ** 2)))
+    i = np.arange(n) + .5
+    polar = np.arccos(1 - 2 * i / n)
+    around = np.pi * (1 + 5 ** .5) * i
+    return np.c_[np.cos(around) * np.sin(polar), np.sin(around) * np.sin(polar),
+                 np.cos(polar)] * r + [x, y, z]
+
+def _mesh(triangles, resolution):
+    "Points covering triangles, an n x 3 x 3 array"
+    triangles = np.asarray(triangles, np.float64).reshape(-1, 3, 3)
+    edges = np.linalg.norm(triangles - np.roll(triangles, 1, axis=1), axis=2)
+    steps = np.ceil(edges.max(axis=1) / resolution).astype(int)
+    points = [triangles.reshape(-1, 3)]
+    for n in np.unique(steps[steps > 1]):
+        # barycentric grid of the triangles needing n steps along an edge
+        i, j = np.mgrid[0:n + 1, 0:n + 1]
+        keep = i + j <= n
+        weights = np.c_[i[keep], j[keep], n - i[keep] - j[keep]] / float(n)
+        points.append(np.einsum('pk,tkc->tpc', weights,
+                                triangles[steps == n]).reshape(-1, 3))
+    return np.unique(np.concatenate(points), axis=0)
+
+def surface(kind, params, resolution):
+    "Sample the surface of a primitive as given by its shape() method"
+    if kind == "box": return _box(*params, resolution=resolution)
+    if kind == "cylinder": return _cylinder(*params, resolution=resolution)
+    if kind == "sphere": return _sphere(*params, resolution=resolution)
+    if kind == "mesh": return _mesh(params, resolution)
+    raise ValueError("unknown shape %r" % kind)
+
+class Tree:
+    """A kd-tree of bounding spheres over points, as arrays indexed by
+    node.  The children of node i are first[i] and first[i]+1, or first[i]
+    is -1 for a leaf, whose points are points[start[i]:end[i]]."""
+    def __init__(self, points, leaf=LEAF):
+        points = np.asarray(points, np.float64).reshape(-1, 3)
+        order = np.arange(len(points))
+        nodes = [(0, len(points))]
+        first = [-1]
+        i = 0
+        while i < len(nodes):
+            s, e = nodes[i]
+            if e - s > leaf:
+                p = points[order[s:e]]
+                axis = np.argmax(p.max(axis=0) - p.min(axis=0))
+                m = (s + e) // 2
+                part = np.argpartition(p[:, axis], m - s)
+                order[s:e] = order[s:e][part]
+                first[i] = len(nodes)
+                nodes += [(s, m), (m, e)]
+                first += [-1, -1]
+            i += 1
+        self.points = points[order]
+        self.first = np.array(first, np.intp)
+        self.start, self.end = np.array(nodes, np.intp).reshape(-1, 2).T
+        n = len(nodes)
+        self.centers = np.empty((n, 3))
+        self.radii = np.empty(n)
+        for i, (s, e) in enumerate(nodes):
+            p = self.points[s:e]
+            c = (p.min(axis=0) + p.max(axis=0)) / 2
+            self.centers[i] = c
+            self.radii[i] = np.sqrt(((p - c) ** 2).sum(axis=1).max())
+        # the points of each leaf, padded to the same count by repeating
+        # its last point
+        leaves = np.flatnonzero(self.first < 0)
+        self.leaf_row = np.full(n, -1, np.intp)
+        self.leaf_row[leaves] = np.arange(len(leaves))
+        self.leaf_points = np.minimum(self.start[leaves, None] + np.arange(leaf),
+                                      self.end[leaves, None] - 1)
+
+class Body:
+    "A primitive's tree, placed in world coordinates"
+    def __init__(self, key, tree):
+        self.key = key
+        self.tree = tree
+        self.matrix = None
+
+    def place(self, matrix):
+        if self.matrix is not None and np.array_equal(matrix, self.matrix):
+            return
+        self.matrix = matrix
+        self.linear = matrix[:3, :3].T
+        self.offset = matrix[:3, 3]
+        tree = self.tree
+        self.centers = tree.centers.dot(self.linear) + self.offset
+        self.radii = tree.radii * np.linalg.norm(matrix[:3, :3], 2)
+        self.samples = tree.points[tree.start].dot(self.linear) + self.offset
+
+    def leaves(self, nodes):
+        rows = self.tree.leaf_points[self.tree.leaf_row[nodes]]
+        return self.tree.points[rows].dot(self.linear) + self.offset
+
+def distance(a, b, best=np.inf, chunk=256):
+    "The distance between the points of two placed bodies, if below best"
+    ia = np.zeros(1, np.intp)
+    ib = np.zeros(1, np.intp)
+    found_a, found_b, found_gap = [], [], []
+    while len(ia):
+        gap = (np.linalg.norm(a.centers[ia] - b.centers[ib], axis=1)
+               - a.radii[ia] - b.radii[ib])
+        best = min(best, np.linalg.norm(a.samples[ia] - b.samples[ib],
+                                        axis=1).min())
+        keep = gap <= best
+        ia, ib, gap = ia[keep], ib[keep], gap[keep]
+        ca, cb = a.tree.first[ia], b.tree.first[ib]
+        leaves = (ca < 0) & (cb < 0)
+        found_a.append(ia[leaves])
+        found_b.append(ib[leaves])
+        found_gap.append(gap[leaves])
+        more = ~leaves
+        ia, ib, ca, cb = ia[more], ib[more], ca[more], cb[more]
+        # split the larger sphere of each pair
+        split_a = (ca >= 0) & ((cb < 0) | (a.radii[ia] >= b.radii[ib]))
+        ia = np.r_[np.where(split_a, ca, ia), np.where(split_a, ca + 1, ia)]
+        ib = np.r_[np.where(split_a, ib, cb), np.where(split_a, ib, cb + 1)]
+    ia, ib, gap = map(np.concatenate, (found_a, found_b, found_gap))
+    order = np.argsort(gap)
+    for i in range(0, len(order), chunk):
+        pick = order[i:i + chunk]
+        if gap[pick[0]] > best: break
+        pa = a.leaves(ia[pick])
+        pb = b.leaves(ib[pick])
+        d = ((pa[:, :, None] - pb[:, None]) ** 2).sum(axis=3)
+        best = min(best, np.sqrt(d.min()))
+    return best
+
+class Collisions:
+    """Clearance between named parts of a vismach model.
+
+    parts maps names to parts (any Collection or primitive in the model),
+    pairs lists the (name, name) pairs to check, all pairs if None.
+    resolution is the largest spacing of the points sampling the surfaces,
+    in model units.  After update(model), clearance maps each pair to the
+    distance between the parts."""
+    def __init__(self, parts, pairs=None, resolution=1.):
+        self.parts = parts
+        names = sorted(parts)
+        if pairs is None:
+            pairs = [(a, b) for i, a in enumerate(names) for b in names[i + 1:]]
+        self.pairs = [tuple(p) for p in pairs]
+        self.resolution = resolution
+        self.bodies = {}
+        self.captures = {}
+        self.clearance = dict((p, np.inf) for p in self.pairs)
+        self.elapsed = 0
+
+    def body(self, index, primitive):
+        body = self.bodies.get(index)
+        if body is not None and body.key[0] is primitive and body.key[1] == "mesh":
+            # meshes don't change
+            return body
+        kind, params = primitive.shape()
+        key = (primitive, kind) if kind == "mesh" else (primitive, kind, tuple(params))
+        if body is None or body.key != key:
+            body = Body(key, Tree(surface(kind, params, self.resolution)))
+            self.bodies[index] = body
+        return body
+
+    def transform(self, node):
+        t = node.transform()
+        if t is None: return np.eye(4)
+        kind, params = t
+        if kind == "translate": return _translation(*params)
+        if kind == "rotate": return _rotation(*params)
+        if kind == "scale": return _scaling(*params)
+        if kind == "track":
+            position, target = params
+            if id(position) not in self.captures or id(target) not in self.captures:
+                return np.eye(4)
+            p = self.captures[id(position)][:3, 3]
+            dx, dy, dz = self.captures[id(target)][:3, 3] - p
+            azimuth = np.degrees(np.arctan2(dy, dx))
+            elevation = np.degrees(np.arctan2(dz, np.hypot(dx, dy)))
+            return (_translation(*p).dot(_rotation(azimuth - 90, 0, 0, 1))
+                    .dot(_rotation(elevation - 90, 1, 0, 0)))
+        raise ValueError("unknown transform %r" % kind)
+
+    def walk(self, model):
+        "Place the primitives of model, returning the bodies of each part"
+        owners = dict((id(p), name) for name, p in self.parts.items())
+        found = dict((name, []) for name in self.parts)
+        index = [0]
+        def visit(node, matrix, names):
+            if hasattr(node, "apply"):
+                if not hasattr(node, "transform"):
+                    # leaving its parts out would read as no collision
+                    raise ValueError("%s has apply() but no transform(), so its parts"
+                                     " can't be placed" % type(node).__name__)
+                matrix = matrix.dot(self.transform(node))
+            if id(node) in owners:
+                names = names + (owners[id(node)],)
+            if hasattr(node, "capture"):
+                self.captures[id(node)] = matrix
+            if hasattr(node, "shape") and names:
+                body = self.body(index[0], node)
+                body.place(matrix)
+                for name in names:
+                    found[name].append(body)
+            index[0] += 1
+            for p in getattr(node, "parts", ()):
+                visit(p, matrix, names)
+        visit(model, np.eye(4), ())
+        return found
+
+    def update(self, model):
+        "Measure the clearance of each pair in the current position of model"
+        t0 = time.time()
+        found = self.walk(model)
+        for a, b in self.pairs:
+            # nearest bodies first, so the distance found prunes the rest
+            pairs = sorted((np.linalg.norm(p.centers[0] - q.centers[0])
+                            - p.radii[0] - q.radii[0], i, j)
+                           for i, p in enumerate(found[a])
+                           for j, q in enumerate(found[b]))
+            best = np.inf
+            for gap, i, j in pairs:
+                if gap > best: break
+                best = distance(found[a][i], found[b][j], best)
+            self.clearance[a, b] = best
+        self.elapsed = time.time() - t0
+        return self.clearance
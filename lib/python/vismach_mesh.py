@@ -0,0 +1,210 @@
+#    Triangle meshes for vismach, loaded from STL and OBJ files
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# A mesh is held as two float32 arrays, one vertex and one normal per
+# corner, three corners per triangle, and drawn from a vertex buffer with
+# a single glDrawArrays.
+#
+# Binary STL is read straight into a structured array.  Text files are
+# parsed with regular expressions that pick out the numbers, which are
+# then converted all at once.  Parsed text files are cached as .npz files
+# under $XDG_CACHE_HOME/linuxcnc/vismach (~/.cache/linuxcnc/vismach),
+# named after a hash of the source's path, so nothing is written next to
+# the models.  An entry is used while the source has the size and time it
+# was made from.
+
+import os, re, sys, hashlib, itertools, ctypes
+import numpy as np
+from OpenGL.GL import *
+
+# Bump when the layout of a cache entry changes
+VERSION = 1
+
+_NUMBERS = rb'(\S+\s+\S+\s+\S+)'
+_FACET = re.compile(rb'facet\s+normal\s+' + _NUMBERS +
+    rb'\s+outer\s+loop\s+vertex\s+' + _NUMBERS +
+    rb'\s+vertex\s+' + _NUMBERS + rb'\s+vertex\s+' + _NUMBERS)
+_VERTEX = re.compile(rb'^v\s+' + _NUMBERS, re.M)
+_NORMAL = re.compile(rb'^vn\s+' + _NUMBERS, re.M)
+_FACE = re.compile(rb'^f\s+([^\r\n]*)', re.M)
+_CORNER = re.compile(rb'(\d+)(?:/(\d*))?(?:/(\d+))?')
+
+_BINARY = np.dtype([('normal', '<f4', 3), ('vertex', '<f4', (3, 3)),
+                    ('attribute', '<u2')])
+
+def _numbers(strings, dtype=np.float32):
+    return np.fromstring(b' '.join(strings), dtype=dtype, sep=' ')
+
+def _pieces(data, end, size=1 << 22):
+    """Split data into pieces of about size bytes, each ending with end,
+    so the strings found in one piece at a time stay few"""
+    start = 0
+    while start < len(data):
+        stop = data.find(end, start + size)
+        stop = len(data) if stop < 0 else stop + len(end)
+        yield data[start:stop]
+        start = stop
+
+def _all(pieces):
+    pieces = list(pieces)
+    return np.concatenate(pieces) if pieces else np.zeros(0, np.float32)
+
+def face_normals(vertices):
+    "The unit normal of each triangle of vertices, an n x 3 x 3 array"
+    n = np.cross(vertices[:, 1] - vertices[:, 0], vertices[:, 2] - vertices[:, 0])
+    length = np.sqrt((n * n).sum(axis=1))[:, None]
+    return n / np.where(length > 0, length, 1)
+
+def is_binary_stl(data):
+    "Whether data is a binary STL file: its size agrees with its count"
+    if len(data) < 84: return False
+    count = int(np.frombuffer(data, '<u4', 1, 80)[0])
+    return len(data) == 84 + count * _BINARY.itemsize
+
+def read_stl(data):
+    """Return the triangles (n x 3 x 3) and their normals (n x 3) of STL
+    data, binary or text.  Normals given as zero are computed."""
+    if is_binary_stl(data):
+        count = (len(data) - 84) // _BINARY.itemsize
+        facets = np.frombuffer(data, _BINARY, count, 84)
+        vertices = facets['vertex'].copy()
+        normals = facets['normal'].copy()
+    else:
+        facets = _all(_numbers(itertools.chain.from_iterable(_FACET.findall(piece)))
+                      for piece in _pieces(data, b'endfacet')).reshape(-1, 12)
+        vertices = facets[:, 3:].reshape(-1, 3, 3).copy()
+        normals = facets[:, :3].copy()
+    missing = ~normals.any(axis=1)
+    if missing.any():
+        normals[missing] = face_normals(vertices[missing])
+    return vertices, normals
+
+def read_obj(data):
+    """Return the triangles (n x 3 x 3) of OBJ data and a normal for each
+    corner (n x 3 x 3).  The corners of the faces are taken three at a
+    time; corners without a normal get their triangle's."""
+    points, given, v, n = [], [], [], []
+    for piece in _pieces(data, b'\n'):
+        points.append(_numbers(_VERTEX.findall(piece)))
+        given.append(_numbers(_NORMAL.findall(piece)))
+        corners = _CORNER.findall(b' '.join(_FACE.findall(piece)))
+        v.append(_numbers((c[0] for c in corners), np.int64))
+        n.append(_numbers((c[2] or b'0' for c in corners), np.int64))
+    points = _all(points).reshape(-1, 3)
+    given = _all(given).reshape(-1, 3)
+    v = _all(v).astype(np.intp)
+    n = _all(n).astype(np.intp)
+    usable = len(v) - len(v) % 3
+    v, n = v[:usable], n[:usable]
+    vertices = points[v - 1].reshape(-1, 3, 3)
+    normals = np.repeat(face_normals(vertices), 3, axis=0)
+    if len(given):
+        normals[n > 0] = given[n[n > 0] - 1]
+    return vertices, normals.reshape(-1, 3, 3)
+
+def cache_path(filename):
+    "Where the cache entry for filename is"
+    filename = os.path.abspath(filename)
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    digest = hashlib.sha1(filename.encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(base, 'linuxcnc', 'vismach', digest + '.npz')
+
+def _source(filename):
+    st = os.stat(filename)
+    return np.array([VERSION, st.st_size, st.st_mtime_ns], np.int64)
+
+def load_cached(filename):
+    "Return the vertices and normals cached for filename, or None"
+    source = _source(filename)
+    try:
+        with np.load(cache_path(filename)) as entry:
+            if np.array_equal(entry['source'], source):
+                return entry['vertices'], entry['normals']
+    except (IOError, OSError, KeyError, ValueError):
+        pass
+    return None
+
+def store_cached(filename, vertices, normals):
+    source = _source(filename)
+    path = cache_path(filename)
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            np.savez(f, source=source, vertices=vertices, normals=normals)
+        os.replace(tmp, path)
+    except (IOError, OSError):
+        try: os.unlink(tmp)
+        except OSError: pass
+        print("vismach: could not cache %s" % filename, file=sys.stderr)
+
+def load(kind, filename=None, data=None, cache=True):
+    """Load a mesh of kind "stl" or "obj" from filename, or from data (the
+    text of the file, or its lines).  Returns one vertex and one normal
+    per corner, as float32 arrays of n x 3."""
+    if data is None:
+        # only text files are cached, but looking costs just a stat
+        cached = cache and load_cached(filename)
+        if cached: return cached
+        with open(filename, "rb") as f:
+            data = f.read()
+    else:
+        filename = None
+        if isinstance(data, str):
+            data = data.encode()
+        elif not isinstance(data, bytes):
+            data = "\n".join(data).encode()
+    if kind == "stl":
+        vertices, normals = read_stl(data)
+        normals = np.repeat(normals, 3, axis=0)
+        binary = is_binary_stl(data)
+    else:
+        vertices, normals = read_obj(data)
+        binary = False
+    vertices = np.ascontiguousarray(vertices.reshape(-1, 3), np.float32)
+    normals = np.ascontiguousarray(normals.reshape(-1, 3), np.float32)
+    if filename is not None and cache and not binary:
+        store_cached(filename, vertices, normals)
+    return vertices, normals
+
+class Mesh:
+    "Triangles drawn from a vertex buffer"
+    def __init__(self, kind, filename=None, data=None, cache=True):
+        self.vertices, self.normals = load(kind, filename, data, cache)
+        self.buffer = None
+
+    def triangles(self):
+        return self.vertices.reshape(-1, 3, 3)
+
+    def draw(self):
+        if self.buffer is None:
+            # OpenGL isn't ready yet in __init__ so the buffer is
+            # filled during the first draw
+            self.buffer = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+            glBufferData(GL_ARRAY_BUFFER,
+                np.ascontiguousarray(np.hstack([self.normals, self.vertices])),
+                GL_STATIC_DRAW)
+        else:
+            glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glNormalPointer(GL_FLOAT, 24, None)
+        glVertexPointer(3, GL_FLOAT, 24, ctypes.c_void_p(12))
+        glDrawArrays(GL_TRIANGLES, 0, len(self.vertices))
+        glPopClientAttrib()
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
@@ -24,6 +24,7 @@ class HandlerClass:
     # widgets allows access to  widgets from the qtvcp files
     # at this point the widgets and hal pins are not instantiated
     def __init__(self, halcomp,widgets,paths):
+        self.h = halcomp
         self.w = widgets
 
 
@@ -36,6 +37,7 @@ class HandlerClass:
     # the HAL pins are built but HAL is not set ready
     def initialized__(self):
         machine = MILL.Window()
+        machine.glWidget.make_plot_pins(self.h)
         self.w.mainLayout.addWidget(machine)
 
 
@@ -1975,7 +1975,8 @@ struct logger_point {
 #define MAX_POINTS (10000)
 typedef struct {
     PyObject_HEAD
-    int npts, mpts, lpts;
+    int npts, mpts, lpts, max_points;
+    double min_dist2, epsilon;
     struct logger_point *p;
     struct color colors[NUMCOLORS];
     bool exit, clear, changed;
@@ -1988,7 +1989,7 @@ typedef struct {
 static const double epsilon = 1e-4; // 1-cos(1 deg) ~= 1e-4
 static const double tiny = 1e-10;
 
-static inline bool colinear(float xa, float ya, float za, float xb, float yb, float zb, float xc, float yc, float zc) {
+static inline bool colinear(float xa, float ya, float za, float xb, float yb, float zb, float xc, float yc, float zc, double epsilon=::epsilon) {
     double dx1 = xa-xb, dx2 = xb-xc;
     double dy1 = ya-yb, dy2 = yb-yc;
     double dz1 = za-zb, dz2 = zb-zc;
@@ -2009,7 +2010,10 @@ static int Logger_init(pyPositionLogger *self, PyObject *a, PyObject *k) {
     char *geometry;
     struct color *c = self->colors;
     self->p = (logger_point*)malloc(0);
-    self->npts = self->mpts = 0;
+    self->npts = self->mpts = self->lpts = 0;
+    self->max_points = MAX_POINTS;
+    self->min_dist2 = 0;
+    self->epsilon = epsilon;
     self->exit = self->clear = 0;
     self->changed = 1;
     self->st = 0;
@@ -2064,12 +2068,57 @@ static PyObject *Logger_set_colors(pyPositionLogger *s, PyObject *a) {
     return Py_None;
 }
 
+static PyObject *Logger_set_decimation(pyPositionLogger *s, PyObject *o) {
+    int max_points;
+    double min_dist = 0, angle = 1;
+    if(!PyArg_ParseTuple(o, "i|dd:logger.set_decimation",
+                &max_points, &min_dist, &angle)) return NULL;
+    if(max_points < 16) max_points = 16;
+    LOCK();
+    s->max_points = max_points;
+    s->min_dist2 = min_dist * min_dist;
+    s->epsilon = 1 - cos(angle * M_PI / 180);
+    UNLOCK();
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
 static double dist2(double x1, double y1, double x2, double y2) {
     double dx = x2-x1;
     double dy = y2-y1;
     return dx*dx + dy*dy;
 }
 
+static double dist2(double x1, double y1, double z1,
+        double x2, double y2, double z2) {
+    double dz = z2-z1;
+    return dist2(x1, y1, x2, y2) + dz*dz;
+}
+
+// Make room in a full plot by dropping every other point of its older
+// half, except where the color changes.  The whole trail stays on the
+// plot, its oldest parts with the fewest points.  Runs once per quarter
+// of max_points added, so adding a point stays O(1) on average.
+// Call with the lock held.
+static void Logger_decimate(pyPositionLogger *s) {
+    int n = s->npts, half = s->npts / 2, j = 1;
+    struct logger_point *p = s->p;
+    for(int i = 1; i < n; i++) {
+        bool keep = i >= half || !(i & 1)
+            || p[i].c != p[i-1].c || p[i].c != p[i+1].c;
+        if(keep) p[j++] = p[i];
+    }
+    if(n - j < 2) {
+        // nothing to thin out, drop the oldest points instead
+        int adjust = n / 10;
+        if(adjust < 2) adjust = 2;
+        memmove(p, p + adjust, sizeof(struct logger_point) * (n - adjust));
+        j = n - adjust;
+    }
+    s->npts = j;
+    if(s->lpts > j) s->lpts = j;
+}
+
 static PyObject *Logger_start(pyPositionLogger *s, PyObject *o) {
     double interval;
     struct timespec ts;
@@ -2116,10 +2165,10 @@ static PyObject *Logger_start(pyPositionLogger *s, PyObject *o) {
                     || (dist2(rx, ry, oop->rx, oop->ry) > .01);
                 add_point = add_point || !colinear( x, y, z,
                                 op->x, op->y, op->z,
-                                oop->x, oop->y, oop->z);
+                                oop->x, oop->y, oop->z, s->epsilon);
                 add_point = add_point || !colinear( rx, ry, rz,
                                 op->rx, op->ry, op->rz,
-                                oop->rx, oop->ry, oop->rz);
+                                oop->rx, oop->ry, oop->rz, s->epsilon);
             } else {
                 double pt[9] = {
                     status->motion.traj.position.tran.x - status->task.toolOffset.tran.x,
@@ -2137,24 +2186,25 @@ static PyObject *Logger_start(pyPositionLogger *s, PyObject *o) {
                 x = p[0]; y = p[1]; z = p[2];
                 rx = pt[3]; ry = -pt[4]; rz = pt[5];
 
-                add_point = add_point || !colinear( x, y, z,
+                // a turn closer than min_dist to the previous point
+                // moves that point instead of adding one
+                add_point = add_point || (!colinear( x, y, z,
                                 op->x, op->y, op->z,
-                                oop->x, oop->y, oop->z);
+                                oop->x, oop->y, oop->z, s->epsilon)
+                            && dist2(x, y, z, oop->x, oop->y, oop->z)
+                                >= s->min_dist2);
             }
             if(add_point) {
                 // 1 or 2 points may be added, make room whenever
                 // fewer than 2 are left
                 bool changed_color = s->npts && c != op->c;
-                if(s->npts+2 > s->mpts) {
+                if(s->npts+2 > s->mpts || s->npts+2 > s->max_points) {
                     LOCK();
-                    if(s->mpts >= MAX_POINTS) {
-                        int adjust = MAX_POINTS / 10;
-                        if(adjust < 2) adjust = 2;
-                        s->npts -= adjust;
-                        memmove(s->p, s->p + adjust,
-                                sizeof(struct logger_point) * s->npts);
+                    if(s->npts+2 > s->max_points) {
+                        Logger_decimate(s);
                     } else {
                         s->mpts = 2 * s->mpts + 2;
+                        if(s->mpts > s->max_points) s->mpts = s->max_points;
                         s->changed = 1;
                         s->p = (struct logger_point*) realloc(s->p,
                                     sizeof(struct logger_point) * s->mpts);
@@ -2267,8 +2317,25 @@ static PyObject *Logger_last(pyPositionLogger *s, PyObject *o) {
     return result;
 }
 
+static PyObject *Logger_positions(pyPositionLogger *s, PyObject *o) {
+    LOCK();
+    int n = s->npts;
+    PyObject *result = PyBytes_FromStringAndSize(NULL, n * 3 * sizeof(float));
+    if(result) {
+        float *f = (float *)PyBytes_AS_STRING(result);
+        for(int i = 0; i < n; i++) {
+            *f++ = s->p[i].x;
+            *f++ = s->p[i].y;
+            *f++ = s->p[i].z;
+        }
+    }
+    UNLOCK();
+    return result;
+}
+
 static PyMemberDef Logger_members[] = {
     {(char*)"npts", T_INT, offsetof(pyPositionLogger, npts), READONLY},
+    {(char*)"max_points", T_INT, offsetof(pyPositionLogger, max_points), READONLY},
     {0, 0, 0, 0},
 };
 
@@ -2287,6 +2354,12 @@ static PyMethodDef Logger_methods[] = {
         "set the plotting colors"},
     {"last", (PyCFunction)Logger_last, METH_VARARGS,
         "Return the most recent point on the plot or None"},
+    {"set_decimation", (PyCFunction)Logger_set_decimation, METH_VARARGS,
+        "set_decimation(max_points, min_dist=0, angle=1): keep at most max_points,"
+        " thinning out the oldest when full; add no point closer than min_dist"
+        " or turning less than angle degrees"},
+    {"positions", (PyCFunction)Logger_positions, METH_NOARGS,
+        "Return the plotted points as bytes of float32 x, y, z triples"},
     {NULL, NULL, 0, NULL},
 };
 
@@ -62,6 +62,7 @@ sys.setdlopenflags(old_flags)
 from rs274.OpenGLTk import *
 from rs274.interpret import StatMixin
 from rs274.glcanon import GLCanon, GlCanonDraw
+from rs274 import previewcache
 from hershey import Hershey
 from propertywindow import properties
 import rs274.options
@@ -70,6 +71,7 @@ import locale
 import bwidget
 from math import hypot, atan2, sin, cos, pi, sqrt
 import linuxcnc
+import status_broadcast
 from glnav import *
 
 if "AXIS_NO_HAL" in os.environ:
@@ -716,7 +718,7 @@ class LivePlotter:
         if not os.path.exists(linuxcnc.nmlfile):
             return False
         try:
-            self.stat = linuxcnc.stat()
+            self.stat = status_broadcast.stat()
         except linuxcnc.error:
             return False
         self.last_task_mode = self.stat.task_mode
@@ -735,6 +737,9 @@ class LivePlotter:
             C('backplotprobing'),
             geometry, foam
         )
+        self.logger.set_decimation(
+            int(inifile.find("DISPLAY", "LIVE_PLOT_POINTS") or 10000),
+            float(inifile.find("DISPLAY", "LIVE_PLOT_TOLERANCE") or 0))
         o.after_idle(lambda: _thread.start_new_thread(self.logger.start, (.01,)))
 
         global feedrate_blackout, rapidrate_blackout, spindlerate_blackout, maxvel_blackout
@@ -770,7 +775,7 @@ class LivePlotter:
         if not self.running.get():
             return
         try:
-            self.stat.poll()
+            status_broadcast.receive(self.stat)
         except linuxcnc.error as detail:
             print("error", detail)
             del self.stat
@@ -803,6 +808,9 @@ class LivePlotter:
 
         self.after = self.win.after(update_ms, self.update)
 
+        if o.poll_preview():
+            o.redraw_soon()
+
         self.win.set_current_line(self.stat.id or self.stat.motion_line)
 
         speed = self.stat.current_vel
@@ -992,6 +1000,8 @@ class Progress:
         self.lastcount = 0
         self.text = None
         self.old_focus = root_window.tk.call("focus", "-lastfor", ".")
+        # left by a background load that was replaced by this one
+        root_window.tk.call("destroy", ".info.progress")
         root_window.tk.call("canvas", ".info.progress",
                     "-width", 1, "-height", 1,
                     "-highlightthickness", 0,
@@ -1032,6 +1042,10 @@ class Progress:
 
     def done(self):
         root_window.tk.call("destroy", ".info.progress")
+        self.release()
+
+    def release(self):
+        "Give the input back to the window, leaving the bar showing"
         root_window.tk.call("grab", "release", ".info.progress")
         root_window.tk.call("focus", self.old_focus)
         root_window.configure(cursor="")
@@ -1052,13 +1066,14 @@ class Progress:
 
 class AxisCanon(GLCanon, StatMixin):
     def __init__(self, widget, text, linecount, progress, arcdivision):
-        GLCanon.__init__(self, widget.colors, geometry, foam)
+        GLCanon.__init__(self, widget.colors, geometry, foam, compact_preview)
         StatMixin.__init__(self, s, random_toolchanger)
         self.text = text
         self.linecount = linecount
         self.progress = progress
         self.aborted = False
         self.arcdivision = arcdivision
+        self.set_arc_tolerance(arc_tolerance)
 
     def change_tool(self, pocket):
         GLCanon.change_tool(self, pocket)
@@ -1077,9 +1092,12 @@ class AxisCanon(GLCanon, StatMixin):
         GLCanon.next_line(self, st)
         self.progress.update(self.lineno)
         if self.notify:
-            notifications.add("info",self.notify_message)
+            self.add_notification(self.notify_message)
             self.notify = 0
 
+    def add_notification(self, message):
+        notifications.add("info", message)
+
 
 progress_re = re.compile("^FILTER_PROGRESS=(\\d*)$")
 def filter_program(program_filter, infilename, outfilename):
@@ -1253,22 +1271,35 @@ def open_file_guts(f, filtered=False, addrecent=True):
                 if i in (0,1): continue
                 if m == -1: continue
                 initcodes.append("M%d" % m)
-        try:
-            result, seq = o.load_preview(f, canon, initcodes, interpname)
-        except KeyboardInterrupt:
-            result, seq = 0, 0
-        # According to the documentation, MIN_ERROR is the largest value that is
-        # not an error.  Crazy though that sounds...
-        if result > gcode.MIN_ERROR:
-            error_str = _(gcode.strerror(result))
-            root_window.tk.call("nf_dialog", ".error",
-                    _("G-Code error in %s") % os.path.basename(f),
-                    _("Near line %(seq)d of %(f)s:\n%(error_str)s") % {'seq': seq, 'f': f, 'error_str': error_str},
-                    "error",0,_("OK"))
+        def loaded(result, seq):
+            # According to the documentation, MIN_ERROR is the largest value that is
+            # not an error.  Crazy though that sounds...
+            if result > gcode.MIN_ERROR:
+                error_str = _(gcode.strerror(result))
+                root_window.tk.call("nf_dialog", ".error",
+                        _("G-Code error in %s") % os.path.basename(f),
+                        _("Near line %(seq)d of %(f)s:\n%(error_str)s") % {'seq': seq, 'f': f, 'error_str': error_str},
+                        "error",0,_("OK"))
+            o.lp.set_depth(from_internal_linear_unit(o.get_foam_z()),
+                           from_internal_linear_unit(o.get_foam_w()))
+
+        if background_preview:
+            # The moves arrive through o.poll_preview, called by LivePlotter,
+            # which also moves the progress bar on; it is taken down here
+            def background_loaded(result, seq):
+                canon.progress = DummyProgress()
+                progress.done()
+                loaded(result, seq)
+            o.load_preview_async(f, canon, initcodes, interpname,
+                                 done=background_loaded)
+        else:
+            try:
+                result, seq = o.load_preview(f, canon, initcodes, interpname)
+            except KeyboardInterrupt:
+                result, seq = 0, 0
+            loaded(result, seq)
 
         t.configure(state="disabled")
-        o.lp.set_depth(from_internal_linear_unit(o.get_foam_z()),
-                       from_internal_linear_unit(o.get_foam_w()))
 
     except Exception as e:
         notifications.add("error", str(e))
@@ -1282,14 +1313,18 @@ def open_file_guts(f, filtered=False, addrecent=True):
         # R-while-loading bug.
         #print "load_time", time.time() - t0
         root_window.update()
-        root_window.tk.call("destroy", ".info.progress")
-        root_window.tk.call("grab", "release", ".info.progress")
-        if canon:
-            canon.progress = DummyProgress()
-        try:
-            progress.done()
-        except UnboundLocalError:
-            pass
+        if canon and o.preview_loader is not None and o.preview_loader.canon is canon:
+            # still loading in the background: keep the bar, not the grab
+            progress.release()
+        else:
+            root_window.tk.call("destroy", ".info.progress")
+            root_window.tk.call("grab", "release", ".info.progress")
+            if canon:
+                canon.progress = DummyProgress()
+            try:
+                progress.done()
+            except UnboundLocalError:
+                pass
         o.tkRedraw()
         root_window.tk.call("set_mode_from_tab")
 
@@ -3683,6 +3718,9 @@ root_window.call(widgets.jogincr._w, "select", 0)
 vcp = inifile.find("DISPLAY", "PYVCP")
 
 arcdivision = int(inifile.find("DISPLAY", "ARCDIVISION") or 64)
+arc_tolerance = float(inifile.find("DISPLAY", "ARC_TOLERANCE") or 0)
+compact_preview = int(inifile.find("DISPLAY", "COMPACT_PREVIEW") or 0)
+background_preview = int(inifile.find("DISPLAY", "BACKGROUND_PREVIEW") or 0)
 
 del sys.argv[1:3]
 
@@ -3762,6 +3800,8 @@ c.set_optional_stop(vars.optional_stop.get())
 c.wait_complete()
 
 o = MyOpengl(widgets.preview_frame, width=400, height=300, double=1, depth=1)
+o.preview_cache = previewcache.from_ini(inifile)
+o.lod_preview = int(inifile.find("DISPLAY", "LOD_PREVIEW") or 0)
 o.last_line = 1
 o.pack(fill="both", expand=1)
 
@@ -30,10 +30,11 @@ try:
 except ImportError:
     import Image
 
-import numpy.core
-plus_inf = numpy.core.Inf
+import numpy
+plus_inf = numpy.inf
 
 from rs274.author import Gcode
+from rs274.dilate import dilate
 import rs274.options
 
 from math import *
@@ -230,8 +231,6 @@ class Converter:
         self.roughing_delta = roughing_delta
         self.roughing_feed = roughing_feed
 
-        self.cache = {}
-
         w, h = self.w, self.h = image.shape
         ts = self.ts = tool_shape.shape[0]
 
@@ -240,9 +239,15 @@ class Converter:
 
         self.tool_shape = tool_shape * self.pixelsize * ts / 2;
     
+    def set_image(self, image):
+        # height of the tool touching the image at each position
+        self.image = image
+        self.zmap = dilate(image, self.tool).astype(numpy.float64)
+
     def one_pass(self):
         g = self.g
         g.set_feed(self.feed)
+        self.z = numpy.minimum(0, numpy.maximum(self.rd, self.zmap) + self.ro)
 
         if self.convert_cols and self.cols_first_flag:
             self.g.set_plane(19)
@@ -279,11 +284,7 @@ class Converter:
             h1 = h + th
             nim1 = numpy.zeros((w1, h1), dtype=numpy.float32) + base_image.min()
             nim1[int(tw/2):int(tw/2+w), int(th/2):int(th/2+h)] = base_image
-            self.image = numpy.zeros((w,h), dtype=numpy.float32)
-            for j in range(0, w):
-                progress(j,w)
-                for i in range(0, h):
-                    self.image[j,i] = (nim1[j:j+tw,i:i+th] - rough).max()
+            self.set_image(dilate(nim1, rough, progress=progress)[:w, :h])
             self.feed = self.roughing_feed
             r = -self.roughing_delta
             m = self.image.min()
@@ -295,8 +296,9 @@ class Converter:
             if r < m + epsilon:
                 self.rd = m
                 self.one_pass()
-            self.image = base_image
-            self.cache.clear()
+            self.set_image(base_image)
+        else:
+            self.set_image(self.image)
         self.feed = self.base_feed
         self.ro = 0
         self.rd = self.image.min()
@@ -304,41 +306,47 @@ class Converter:
         g.end()
 
     def get_z(self, x, y):
-        try:
-            return min(0, max(self.rd, self.cache[x,y]) + self.ro)
-        except KeyError:
-            m1 = self.image[y:y+self.ts, x:x+self.ts]
-            self.cache[x,y] = d = (m1 - self.tool).max()
-            return min(0, max(self.rd, d) + self.ro)
-        
+        return float(self.z[y, x])
+
     def get_dz_dy(self, x, y):
         y1 = max(0, y-1)
         y2 = min(self.image.shape[0]-1, y+1)
         dy = self.pixelsize * (y2-y1)
         return (self.get_z(x, y2) - self.get_z(x, y1)) / dy
-        
+
     def get_dz_dx(self, x, y):
         x1 = max(0, x-1)
         x2 = min(self.image.shape[1]-1, x+1)
         dx = self.pixelsize * (x2-x1)
         return (self.get_z(x2, y) - self.get_z(x1, y)) / dx
 
+    def slopes(self, z, n, i):
+        """Return the slopes of z along its first n elements and across
+        them at i, the way get_dz_dx and get_dz_dy work them out"""
+        pixelsize = self.pixelsize
+        j = numpy.arange(n)
+        j1 = numpy.maximum(j - 1, 0)
+        j2 = numpy.minimum(j + 1, len(z[i]) - 1)
+        along = (z[i, j2] - z[i, j1]) / (pixelsize * (j2 - j1))
+        i1 = max(0, i-1)
+        i2 = min(len(z) - 1, i+1)
+        across = (z[i2, :n] - z[i1, :n]) / (pixelsize * (i2-i1))
+        return along, across
+
     def mill_rows(self, convert_scan, primary):
         w1 = self.w1; h1 = self.h1;
         pixelsize = self.pixelsize; pixelstep = self.pixelstep
         jrange = list(range(0, w1, pixelstep))
         if w1-1 not in jrange: jrange.append(w1-1)
         irange = list(range(h1))
+        xs = [i * pixelsize for i in irange]
 
         for j in jrange:
             progress(jrange.index(j), len(jrange))
             y = (w1-j) * pixelsize
-            scan = []
-            for i in irange:
-                x = i * pixelsize
-                milldata = (i, (x, y, self.get_z(i, j)),
-                    self.get_dz_dx(i, j), self.get_dz_dy(i, j))
-                scan.append(milldata)
+            dz_dx, dz_dy = self.slopes(self.z, h1, j)
+            scan = [(i, (x, y, z), dx, dy) for i, x, z, dx, dy in zip(irange,
+                xs, self.z[j, :h1].tolist(), dz_dx.tolist(), dz_dy.tolist())]
             for flag, points in convert_scan(primary, scan):
                 if flag:
                     self.entry_cut(self, points[0][0], j, points)
@@ -353,16 +361,15 @@ class Converter:
         irange = list(range(w1))
         if h1-1 not in jrange: jrange.append(h1-1)
         jrange.reverse()
+        ys = [(w1-i) * pixelsize for i in irange]
+        zt = self.z.T
 
         for j in jrange:
             progress(jrange.index(j), len(jrange))
             x = j * pixelsize
-            scan = []
-            for i in irange:
-                y = (w1-i) * pixelsize
-                milldata = (i, (x, y, self.get_z(j, i)),
-                    self.get_dz_dy(j, i), self.get_dz_dx(j, i))
-                scan.append(milldata)
+            dz_dy, dz_dx = self.slopes(zt, w1, j)
+            scan = [(i, (x, y, z), dy, dx) for i, y, z, dy, dx in zip(irange,
+                ys, zt[j, :w1].tolist(), dz_dy.tolist(), dz_dx.tolist())]
             for flag, points in convert_scan(primary, scan):
                 if flag:
                     self.entry_cut(self, j, points[0][0], points)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+#    Poll the LinuxCNC status once for all user interfaces
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# Started by linuxcnc when [DISPLAY]STATUS_BROADCAST is set.  The user
+# interfaces that use status_broadcast.stat() take the status from here
+# instead of each polling it.
+#
+# Usage: linuxcncstatd [-ini inifile] [-socket path]
+
+import sys, signal
+import linuxcnc
+import status_broadcast
+
+def usage():
+    print("Usage: linuxcncstatd [-ini inifile] [-socket path]", file=sys.stderr)
+    sys.exit(1)
+
+def main(argv):
+    cycle = 0.05
+    path = None
+    while argv:
+        if argv[0] == '-ini' and len(argv) > 1:
+            ini = linuxcnc.ini(argv[1])
+            linuxcnc.nmlfile = ini.find("EMC", "NML_FILE") or linuxcnc.nmlfile
+            cycle = float(ini.find("DISPLAY", "STATUS_BROADCAST_CYCLE") or 50) / 1000
+            del argv[:2]
+        elif argv[0] == '-socket' and len(argv) > 1:
+            path = argv[1]
+            del argv[:2]
+        else:
+            usage()
+
+    server = status_broadcast.Server(path, cycle)
+    # linuxcnc stops us with SIGTERM; leave no socket behind
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
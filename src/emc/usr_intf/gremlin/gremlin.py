@@ -63,6 +63,7 @@ import glnav
 
 import rs274.glcanon
 import rs274.interpret
+import rs274.previewcache
 import linuxcnc
 import gcode
 
@@ -79,8 +80,8 @@ class DummyProgress:
     def progress(self): pass
 
 class StatCanon(rs274.glcanon.GLCanon, rs274.interpret.StatMixin):
-    def __init__(self, colors, geometry, lathe_view_option, stat, random):
-        rs274.glcanon.GLCanon.__init__(self, colors, geometry)
+    def __init__(self, colors, geometry, lathe_view_option, stat, random, compact=0):
+        rs274.glcanon.GLCanon.__init__(self, colors, geometry, 0, compact)
         rs274.interpret.StatMixin.__init__(self, stat, random)
         self.progress = DummyProgress()
         self.lathe_view_option = lathe_view_option
@@ -158,6 +159,9 @@ class Gremlin(Gtk.DrawingArea,rs274.glcanon.GlCanonDraw,glnav.GlNavBase):
             C('backplotprobing'),
             self.get_geometry()
         )
+        self.logger.set_decimation(
+            int(inifile.find("DISPLAY", "LIVE_PLOT_POINTS") or 10000),
+            float(inifile.find("DISPLAY", "LIVE_PLOT_TOLERANCE") or 0))
         _thread.start_new_thread(self.logger.start, (.01,))
 
         rs274.glcanon.GlCanonDraw.__init__(self, linuxcnc.stat(), self.logger)
@@ -210,6 +214,9 @@ class Gremlin(Gtk.DrawingArea,rs274.glcanon.GlCanonDraw,glnav.GlNavBase):
         temp = inifile.find("DISPLAY", "LATHE")
         self.lathe_option = bool(temp == "1" or temp == "True" or temp == "true" )
         self.foam_option = bool(inifile.find("DISPLAY", "FOAM"))
+        self.background_preview = int(inifile.find("DISPLAY", "BACKGROUND_PREVIEW") or 0)
+        self.preview_cache = rs274.previewcache.from_ini(inifile)
+        self.lod_preview = int(inifile.find("DISPLAY", "LOD_PREVIEW") or 0)
         self.show_offsets = False
         self.use_default_controls = True
         self.mouse_btn_mode = 0
@@ -297,7 +304,15 @@ class Gremlin(Gtk.DrawingArea,rs274.glcanon.GlCanonDraw,glnav.GlNavBase):
             s.homed, s.g5x_offset, s.g92_offset, s.limit, s.tool_in_spindle,
             s.motion_mode, s.current_vel)
 
-        if fingerprint != self.fingerprint:
+        loading = False
+        if self.preview_loader is not None:
+            self.activate()
+            try:
+                loading = self.poll_preview()
+            finally:
+                self.deactivate()
+
+        if fingerprint != self.fingerprint or loading:
             self.fingerprint = fingerprint
             self.queue_draw()
 
@@ -342,7 +357,9 @@ class Gremlin(Gtk.DrawingArea,rs274.glcanon.GlCanonDraw,glnav.GlNavBase):
         self._current_file = filename
         try:
             random = int(self.inifile.find("EMCIO", "RANDOM_TOOLCHANGER") or 0)
-            canon = StatCanon(self.colors, self.get_geometry(),self.lathe_option, s, random)
+            compact = int(self.inifile.find("DISPLAY", "COMPACT_PREVIEW") or 0)
+            canon = StatCanon(self.colors, self.get_geometry(),self.lathe_option, s, random, compact)
+            canon.set_arc_tolerance(float(self.inifile.find("DISPLAY", "ARC_TOLERANCE") or 0))
             parameter = self.inifile.find("RS274NGC", "PARAMETER_FILE")
             temp_parameter = os.path.join(td, os.path.basename(parameter or "linuxcnc.var"))
             if parameter:
@@ -351,12 +368,24 @@ class Gremlin(Gtk.DrawingArea,rs274.glcanon.GlCanonDraw,glnav.GlNavBase):
 
             unitcode = "G%d" % (20 + (s.linear_units == 1))
             initcode = self.inifile.find("RS274NGC", "RS274NGC_STARTUP_CODE") or ""
-            result, seq = self.load_preview(filename, canon, unitcode, initcode)
-            if result > gcode.MIN_ERROR:
-                self.report_gcode_error(result, seq, filename)
+            if self.background_preview:
+                # the worker reads the parameter file, so td is removed
+                # once it is done or cancelled rather than here
+                def loaded(result, seq, td=td):
+                    shutil.rmtree(td)
+                    if result > gcode.MIN_ERROR:
+                        self.report_gcode_error(result, seq, filename)
+                self.load_preview_async(filename, canon, unitcode, initcode,
+                        done=loaded, cancelled=lambda td=td: shutil.rmtree(td))
+                td = None
+            else:
+                result, seq = self.load_preview(filename, canon, unitcode, initcode)
+                if result > gcode.MIN_ERROR:
+                    self.report_gcode_error(result, seq, filename)
 
         finally:
-            shutil.rmtree(td)
+            if td is not None:
+                shutil.rmtree(td)
 
         self.set_current_view()
 
@@ -33,6 +33,7 @@ import _thread
 import glnav
 from rs274 import glcanon
 from rs274 import interpret
+from rs274 import previewcache
 import linuxcnc
 import gcode
 
@@ -144,8 +145,8 @@ class Progress:
             print(".info.progress", text)
 
 class StatCanon(glcanon.GLCanon, interpret.StatMixin):
-    def __init__(self, colors, geometry, is_foam, lathe_view_option, stat, random, text, linecount, progress, arcdivision):
-        glcanon.GLCanon.__init__(self, colors, geometry, is_foam)
+    def __init__(self, colors, geometry, is_foam, lathe_view_option, stat, random, text, linecount, progress, arcdivision, compact=0):
+        glcanon.GLCanon.__init__(self, colors, geometry, is_foam, compact)
         interpret.StatMixin.__init__(self, stat, random)
         self.lathe_view_option = lathe_view_option
         self.text = text
@@ -174,9 +175,12 @@ class StatCanon(glcanon.GLCanon, interpret.StatMixin):
         self.progress.update(self.lineno)
         # not sure if this is used - copied from AXIS code
         if self.notify:
-            print("info",self.notify_message)
+            self.add_notification(self.notify_message)
             self.notify = 0
 
+    def add_notification(self, message):
+        print("info", message)
+
 ###############################
 # widget for graphics plotting
 ###############################
@@ -209,6 +213,9 @@ class Lcnc_3dGraphics(QGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
 
         self.inifile = linuxcnc.ini(inifile)
         self.foam_option = bool(self.inifile.find("DISPLAY", "FOAM"))
+        self.background_preview = int(self.inifile.find("DISPLAY", "BACKGROUND_PREVIEW") or 0)
+        self.preview_cache = previewcache.from_ini(self.inifile)
+        self.lod_preview = int(self.inifile.find("DISPLAY", "LOD_PREVIEW") or 0)
         self.logger = linuxcnc.positionlogger(linuxcnc.stat(),
             C('backplotjog'),
             C('backplottraverse'),
@@ -218,6 +225,9 @@ class Lcnc_3dGraphics(QGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
             C('backplotprobing'),
             self.get_geometry(), self.foam_option
         )
+        self.logger.set_decimation(
+            int(self.inifile.find("DISPLAY", "LIVE_PLOT_POINTS") or 10000),
+            float(self.inifile.find("DISPLAY", "LIVE_PLOT_TOLERANCE") or 0))
         # start tracking linuxcnc position so we can plot it
         _thread.start_new_thread(self.logger.start, (.01,))
         glcanon.GlCanonDraw.__init__(self, stat, self.logger)
@@ -303,7 +313,8 @@ class Lcnc_3dGraphics(QGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
             s.homed, s.g5x_offset, s.g92_offset, s.limit, s.tool_in_spindle,
             s.motion_mode, s.current_vel)
 
-        if fingerprint != self.fingerprint:
+        loading = self.poll_preview()
+        if fingerprint != self.fingerprint or loading:
             self.fingerprint = fingerprint
             self.update()
         return True
@@ -340,17 +351,20 @@ class Lcnc_3dGraphics(QGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
 
 
         td = tempfile.mkdtemp()
+        canon = None
         self._current_file = filename
         try:
             random = int(self.inifile.find("EMCIO", "RANDOM_TOOLCHANGER") or 0)
             arcdivision = int(self.inifile.find("DISPLAY", "ARCDIVISION") or 64)
+            compact = int(self.inifile.find("DISPLAY", "COMPACT_PREVIEW") or 0)
             text = ''
             canon = StatCanon(self.colors,
                                 self.get_geometry(),
                                 self.foam_option,
                                 self.lathe_option,
                                 s, text, random, i,
-                                progress, arcdivision)
+                                progress, arcdivision, compact)
+            canon.set_arc_tolerance(float(self.inifile.find("DISPLAY", "ARC_TOLERANCE") or 0))
             parameter = self.inifile.find("RS274NGC", "PARAMETER_FILE")
             temp_parameter = os.path.join(td, os.path.basename(parameter or "linuxcnc.var"))
             if parameter:
@@ -358,25 +372,46 @@ class Lcnc_3dGraphics(QGLWidget,  glcanon.GlCanonDraw, glnav.GlNavBase):
             canon.parameter_file = temp_parameter
             unitcode = "G%d" % (20 + (s.linear_units == 1))
             initcode = self.inifile.find("RS274NGC", "RS274NGC_STARTUP_CODE") or ""
+            if self.background_preview:
+                # the worker reads the parameter file, so td must outlive
+                # this call; it is removed when the worker is done or cancelled
+                def loaded(result, seq, td=td):
+                    try:
+                        self.preview_loaded(filename, canon, result, seq)
+                    finally:
+                        shutil.rmtree(td)
+                        progress.done()
+                self.load_preview_async(filename, canon, unitcode, initcode,
+                        done=loaded, cancelled=lambda td=td: shutil.rmtree(td))
+                td = None
+                return
             result, seq = self.load_preview(filename, canon, unitcode, initcode)
-            if result > gcode.MIN_ERROR:
-                self.report_gcode_error(result, seq, filename)
-            self.logger.set_depth(self.from_internal_linear_unit(self.get_foam_z()),
-                       self.from_internal_linear_unit(self.get_foam_w()))
-            self.calculate_gcode_properties(canon)
+            self.preview_loaded(filename, canon, result, seq)
         except Exception as e:
             print (e)
             self.gcode_properties = None
         finally:
-            shutil.rmtree(td)
-            if canon:
-                canon.progress = DummyProgress()
-            try:
-                progress.done()
-            except UnboundLocalError:
-                pass
+            if td is not None:
+                shutil.rmtree(td)
+                if canon:
+                    canon.progress = DummyProgress()
+                try:
+                    progress.done()
+                except UnboundLocalError:
+                    pass
         self._redraw()
 
+    def preview_loaded(self, filename, canon, result, seq):
+        if result > gcode.MIN_ERROR:
+            self.report_gcode_error(result, seq, filename)
+        self.logger.set_depth(self.from_internal_linear_unit(self.get_foam_z()),
+                   self.from_internal_linear_unit(self.get_foam_w()))
+        try:
+            self.calculate_gcode_properties(canon)
+        except Exception as e:
+            print (e)
+            self.gcode_properties = None
+
     def emit_percent(self, percent):
         self.percentLoaded.emit(percent)
 
@@ -11,6 +11,7 @@
 # GNU General Public License for more details.
 
 import math
+import status_broadcast
 
 
 class emc_control:
@@ -301,7 +302,7 @@ class emc_status:
             self.machine_units_mm=0
             self.unit_convert=[1]*9
             self.actual = 1
-            self.emcstat = emc.stat()
+            self.emcstat = status_broadcast.stat()
             self.emcerror = emc.error_channel()
 
         def get_feedrate(self):
@@ -362,7 +363,7 @@ class emc_status:
                 return 1
 
         def periodic(self):
-            self.emcstat.poll()
+            status_broadcast.receive(self.emcstat)
             am = self.emcstat.axis_mask
             lathe = not (self.emcstat.axis_mask & 2)
             dtg = self.emcstat.dtg
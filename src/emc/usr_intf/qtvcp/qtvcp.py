@@ -2,6 +2,8 @@
 
 import os
 import sys
+import time
+START = time.time()
 import shutil
 import traceback
 import hal
@@ -20,6 +22,8 @@ LOG = logger.initBaseLogger('QTvcp', log_file=None, log_level=logger.INFO)
 
 from qtvcp.core import Status, Info, QComponent, Path
 from qtvcp.lib import xembed
+from qtvcp.qt_startup import PROFILE
+PROFILE.begin(START)
 
 try:
     from PyQt5.QtWebEngineWidgets import QWebEngineView as QWebView
@@ -42,6 +46,7 @@ STATUS = Status()
 INFO = Info()
 PATH = Path()
 ERROR_COUNT = 0
+PROFILE.mark('imports')
 
 options = [ Option( '-c', dest='component', metavar='NAME'
                   , help="Set component name to NAME. Default is basename of UI file")
@@ -66,6 +71,8 @@ use -g WIDTHxHEIGHT for just setting size or -g +XOFFSET+YOFFSET for just positi
           , Option( '-u', dest='usermod', default="", help='file path of user defined handler file')
           , Option( '-o', dest='useropts', action='append', metavar='USEROPTS', default=[]
                   , help='pass USEROPTS strings to handler under self.w.USEROPTIONS_ list varible')
+          , Option( '--profile-startup', action='store_true', dest='profile_startup', default=False
+                  , help="print how long each phase of startup took")
           ]
 
 class QTVCP: 
@@ -94,11 +101,13 @@ class QTVCP:
 
         # initialize QApp so we can pop up dialogs now. 
         self.app = QtWidgets.QApplication(sys.argv)
+        PROFILE.mark('QApplication')
 
         # we import here so that the QApp is initialized before
         # the Notify library is loaded because it uses DBusQtMainLoop
         # DBusQtMainLoop must be initialized after to work properly
         from qtvcp import qt_makepins, qt_makegui
+        PROFILE.mark('qtvcp modules')
 
         # ToDo: pass specific log levels as an argument, or use an INI setting
         if opts.debug:
@@ -208,6 +217,8 @@ Pressing cancel will close linuxcnc.""" % target)
         if opts.component is None:
             opts.component = PATH.BASENAME
 
+        PROFILE.mark('paths')
+
         # initialize HAL
         try:
             self.halcomp = hal.component(opts.component)
@@ -216,6 +227,8 @@ Pressing cancel will close linuxcnc.""" % target)
             LOG.critical("Asking for a HAL component using a name that already exists?")
             raise Exception('"Asking for a HAL component using a name that already exists?')
 
+        PROFILE.mark('HAL component')
+
         # initialize the window
         window = qt_makegui.VCPWindow(self.hal, PATH)
  
@@ -241,6 +254,8 @@ Pressing cancel will close linuxcnc.""" % target)
             myFilter = qt_makegui.MyEventFilter(window)
             self.app.installEventFilter(myFilter)
 
+        PROFILE.mark('handler file')
+
         # actually build the widgets
         window.instance()
 
@@ -253,6 +268,7 @@ Pressing cancel will close linuxcnc.""" % target)
 
         # make QT widget HAL pins
         self.panel = qt_makepins.QTPanel(self.hal, PATH, window, opts.debug)
+        PROFILE.mark('HAL pins')
 
         # call handler file's initialized function
         if opts.usermod:
@@ -261,6 +277,7 @@ Pressing cancel will close linuxcnc.""" % target)
                 window.handler_instance.initialized__()
         # All Widgets should be added now - synch them to linuxcnc
         STATUS.forced_update()
+        PROFILE.mark('initialized')
 
         # call a HAL file after widgets built
         if opts.halfile:
@@ -276,6 +293,7 @@ Pressing cancel will close linuxcnc.""" % target)
         # User components are set up so report that we are ready
         LOG.debug('Set HAL ready')
         self.halcomp.ready()
+        PROFILE.mark('HAL file')
 
         # embed us into an X11 window (such as AXIS)
         if opts.parent:
@@ -326,6 +344,7 @@ Pressing cancel will close linuxcnc.""" % target)
         # appy qss file or default theme
         else:
             window.apply_styles()
+        PROFILE.mark('styles')
 
         LOG.debug('Show window')
         # maximize
@@ -337,8 +356,10 @@ Pressing cancel will close linuxcnc.""" % target)
         else:
             self.panel.set_preference_geometry()
         window.show()
+        PROFILE.mark('show')
         if INIPATH:
             self.postgui()
+            PROFILE.mark('postgui')
 
         # catch control c and terminate signals
         signal.signal(signal.SIGTERM, self.shutdown)
@@ -349,6 +370,12 @@ Pressing cancel will close linuxcnc.""" % target)
             window.handler_instance.before_loop__()
 
         LOG.info('Preference path: {}'.format(PATH.PREFS_FILENAME))
+        # the first pass of the event loop draws the window
+        if opts.profile_startup:
+            def report():
+                PROFILE.mark('first events')
+                print(PROFILE.report())
+            QtCore.QTimer.singleShot(0, report)
         # start loop
         self.app.exec_()
 
@@ -11,6 +11,7 @@
 # GNU General Public License for more details.
 
 import math
+import status_broadcast
 
 from __main__ import set_active, set_text
 
@@ -265,7 +266,7 @@ class emc_status:
                 self.machine_units_mm=0
                 self.unit_convert=[1]*9
                 self.actual = 0
-                self.emcstat = emc.stat()
+                self.emcstat = status_broadcast.stat()
                 self.emcerror = emc.error_channel()
 
         def dro_inch(self, b):
@@ -302,7 +303,7 @@ class emc_status:
                 return 1
 
         def periodic(self):
-                self.emcstat.poll()
+                status_broadcast.receive(self.emcstat)
                 am = self.emcstat.axis_mask
                 lathe = not (self.emcstat.axis_mask & 2)
                 dtg = self.emcstat.dtg
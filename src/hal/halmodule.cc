@@ -740,6 +740,70 @@ static PyObject * pyhal_pin_new(halitem * pin, const char * name) {
     return (PyObject *) pypin;
 }
 
+static bool read_double(halitem *item, double *d) {
+    if(item->is_pin) {
+        switch(item->type) {
+            case HAL_BIT: *d = *(item->u->pin.b); return true;
+            case HAL_U32: *d = *(item->u->pin.u32); return true;
+            case HAL_S32: *d = *(item->u->pin.s32); return true;
+            case HAL_FLOAT: *d = *(item->u->pin.f); return true;
+            default: break;
+        }
+    } else {
+        switch(item->type) {
+            case HAL_BIT: *d = item->u->param.b; return true;
+            case HAL_U32: *d = item->u->param.u32; return true;
+            case HAL_S32: *d = item->u->param.s32; return true;
+            case HAL_FLOAT: *d = item->u->param.f; return true;
+            default: break;
+        }
+    }
+    PyErr_Format(pyhal_error_type, "Invalid item type %d", item->type);
+    return false;
+}
+
+PyObject *read_values(PyObject *self, PyObject *args) {
+    PyObject *items, *out;
+    if(!PyArg_ParseTuple(args, "OO", &items, &out)) return NULL;
+
+    PyObject *seq = PySequence_Fast(items, "items must be a sequence");
+    if(!seq) return NULL;
+    Py_buffer view;
+    if(PyObject_GetBuffer(out, &view,
+            PyBUF_WRITABLE | PyBUF_FORMAT | PyBUF_C_CONTIGUOUS) < 0) {
+        Py_DECREF(seq);
+        return NULL;
+    }
+
+    Py_ssize_t n = PySequence_Fast_GET_SIZE(seq);
+    size_t flen = view.format ? strlen(view.format) : 0;
+    double *d = (double *)view.buf;
+    bool ok = true;
+    if(view.itemsize != sizeof(double) || !flen || view.format[flen-1] != 'd') {
+        PyErr_Format(PyExc_TypeError, "values must be a buffer of doubles");
+        ok = false;
+    } else if(view.len < n * (Py_ssize_t)sizeof(double)) {
+        PyErr_Format(PyExc_ValueError,
+                "values holds %zd items, %zd needed",
+                view.len / (Py_ssize_t)sizeof(double), n);
+        ok = false;
+    }
+    for(Py_ssize_t i = 0; ok && i < n; i++) {
+        PyObject *o = PySequence_Fast_GET_ITEM(seq, i);
+        if(!PyObject_TypeCheck(o, &halpin_type)) {
+            PyErr_Format(PyExc_TypeError, "item %zd is not a hal.item", i);
+            ok = false;
+        } else {
+            ok = read_double(&((pyhalitem *)o)->pin, &d[i]);
+        }
+    }
+
+    PyBuffer_Release(&view);
+    Py_DECREF(seq);
+    if(!ok) return NULL;
+    Py_RETURN_NONE;
+}
+
 PyObject *pin_has_writer(PyObject *self, PyObject *args) {
     char *name;
     if(!PyArg_ParseTuple(args, "s", &name)) return NULL;
@@ -1659,6 +1723,8 @@ PyMethodDef module_methods[] = {
 	"set pin value"},
     {"get_value", get_value, METH_VARARGS,
 	".get_value('name'}: Gets the pin, param or signal value"},
+    {"read_values", read_values, METH_VARARGS,
+	".read_values(items, values): Read the value of each hal.item in items into the buffer of doubles values"},
     {"get_info_pins", get_info_pins, METH_VARARGS,
 	".get_info_pins(): Get a list of dicts for all the pins; {NAME:, VALUE:, DIRECTION:}"},
     {"get_info_signals", get_info_signals, METH_VARARGS,
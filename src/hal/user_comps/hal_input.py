@@ -24,13 +24,26 @@ import select
 import time
 import glob
 import fnmatch
-import select
+import struct
 from hal import *
 
+# struct input_event: the time, then type, code and value
+EVENT = struct.Struct("llHHi")
+EVENT_SIZE = EVENT.size
+EV_SYN = linux_event.EV['EV_SYN']
+EV_KEY = linux_event.EV['EV_KEY']
+EV_REL = linux_event.EV['EV_REL']
+EV_ABS = linux_event.EV['EV_ABS']
+SYN_REPORT = 0
+SYN_DROPPED = 3
+
 
 def tohalname(s): return str(s).lower().replace("_", "-")
 
 
+def invert(d): return dict((v, k) for k, v in d.items())
+
+
 class HalWrapper:
     def __init__(self, comp):
         self._comp = comp
@@ -69,147 +82,209 @@ class HalWrapper:
 class HalInputDevice:
     def __init__(self, comp, idx, name, parts='KRAL'):
         self.device = linux_event.InputDevice(name)
+        fd = self.device.fileno()
+        fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
 
         self.idx = idx
-        self.codes = set()
-        self.last = {}
-        self.rel_items = []
-        self.abs_items = []
         self.comp = comp
         self.parts = parts
+        # pins by event code, looked up once here rather than by name for
+        # each event
+        self.keys = {}
+        self.key_codes = {}
+        self.rels = {}
+        self.abss = {}
+        self.leds = []
+        self.types = set()
+        # axis values waiting for the SYN_REPORT that ends their frame
+        self.rel_pending = {}
+        self.abs_pending = {}
+        self.dropping = False
+        self.latency = comp.newpin("%s.latency" % idx, HAL_FLOAT, HAL_OUT)
 
         if 'K' in parts:
-            for key in self.device.get_bits('EV_KEY'):
-                key = tohalname(key)
-                self.codes.add(key)
-                comp.newpin("%s.%s" % (idx, key), HAL_BIT, HAL_OUT)
-                comp.newpin("%s.%s-not" % (idx, key), HAL_BIT, HAL_OUT)
-                self.set(key + "-not", 1)
+            self.types.add(EV_KEY)
+            # get_bits adds names for codes that have none, so the names
+            # are inverted after it, here and for the axes below
+            bits = self.device.get_bits('EV_KEY')
+            codes = invert(linux_event.KEYBTN_invert)
+            for key in bits:
+                name = tohalname(key)
+                pin = comp.newpin("%s.%s" % (idx, name), HAL_BIT, HAL_OUT)
+                pin_not = comp.newpin("%s.%s-not" % (idx, name), HAL_BIT, HAL_OUT)
+                pin_not.set(1)
+                self.keys[codes[key]] = (pin, pin_not)
+            self.key_codes = codes
 
         if 'R' in parts:
-            for axis in self.device.get_bits('EV_REL'):
+            self.types.add(EV_REL)
+            bits = self.device.get_bits('EV_REL')
+            codes = invert(linux_event.REL_invert)
+            for axis in bits:
                 name = tohalname(axis)
-                self.codes.add(name)
-                comp.newpin("%s.%s-position" % (idx, name), HAL_FLOAT, HAL_OUT)
-                comp.newpin("%s.%s-counts" % (idx, name), HAL_S32, HAL_OUT)
-                comp.newpin("%s.%s-reset" % (idx, name), HAL_BIT, HAL_IN)
-                comp.newpin("%s.%s-scale" % (idx, name), HAL_FLOAT, HAL_IN)
-                self.set(name + '-scale', 1.)
-                self.rel_items.append(name)
+                rel = RelAxis(comp, "%s.%s" % (idx, name))
+                self.rels[codes[axis]] = rel
 
         if 'A' in parts:
-            for axis in self.device.get_bits('EV_ABS'):
+            self.types.add(EV_ABS)
+            bits = self.device.get_bits('EV_ABS')
+            codes = invert(linux_event.ABS_invert)
+            for axis in bits:
                 name = tohalname(axis)
-                self.codes.add(name)
                 absinfo = self.device.get_absinfo(axis)
-                comp.newpin("%s.%s-position" % (idx, name), HAL_FLOAT, HAL_OUT)
-                comp.newpin("%s.%s-counts" % (idx, name), HAL_S32, HAL_OUT)
-                comp.newpin("%s.%s-is-pos" % (idx, name), HAL_BIT, HAL_OUT)
-                comp.newpin("%s.%s-is-neg" % (idx, name), HAL_BIT, HAL_OUT)
-                comp.newpin("%s.%s-scale" % (idx, name), HAL_FLOAT, HAL_IN)
-                comp.newpin("%s.%s-offset" % (idx, name), HAL_FLOAT, HAL_IN)
-                comp.newpin("%s.%s-fuzz" % (idx, name), HAL_S32, HAL_IN)
-                comp.newpin("%s.%s-flat" % (idx, name), HAL_S32, HAL_IN)
-                comp.newparam("%s.%s-min" % (idx, name), HAL_S32, HAL_RO)
-                comp.newparam("%s.%s-max" % (idx, name), HAL_S32, HAL_RO)
-                center = (absinfo.minimum + absinfo.maximum)/2.
-                halfrange = (absinfo.maximum - absinfo.minimum)/2. or 1
-                self.set(name + "-counts", absinfo.value)
-                self.set(name + "-position",
-                         (absinfo.value - center) / halfrange)
-                self.set(name + "-scale", halfrange)
-                self.set(name + "-offset", center)
-                self.set(name + "-fuzz", absinfo.fuzz)
-                self.set(name + "-flat", absinfo.flat)
-                self.set(name + "-min", absinfo.minimum)
-                self.set(name + "-max", absinfo.maximum)
-                self.abs_items.append(name)
-
-        self.ledmap = {}
+                self.abss[codes[axis]] = AbsAxis(comp, "%s.%s" % (idx, name), absinfo)
+
         if 'L' in parts:
             for led in self.device.get_bits('EV_LED'):
                 name = tohalname(led)
-                self.ledmap[name] = led
-                comp.newpin("%s.%s" % (idx, name), HAL_BIT, HAL_IN)
-                comp.newpin("%s.%s-invert" % (idx, name), HAL_BIT, HAL_IN)
-                self.last[name] = 0
+                pin = comp.newpin("%s.%s" % (idx, name), HAL_BIT, HAL_IN)
+                invert_pin = comp.newpin("%s.%s-invert" % (idx, name), HAL_BIT, HAL_IN)
+                self.leds.append([led, pin, invert_pin, 0])
                 self.device.write_event('EV_LED', led, 0)
 
-    def get(self, name):
-        name = "%s.%s" % (self.idx, name)
-        return self.comp[name]
+    def read(self):
+        """Handle every event waiting on the device.  Keys are set as they
+        come; the axis events of a frame are added up and set once, when the
+        SYN_REPORT ending the frame arrives."""
+        fd = self.device.fileno()
+        latency = None
+        while 1:
+            try:
+                buf = os.read(fd, EVENT_SIZE * 64)
+            except BlockingIOError:
+                break
+            for sec, usec, type, code, value in EVENT.iter_unpack(buf):
+                if type == EV_SYN:
+                    if code == SYN_REPORT:
+                        if self.dropping:
+                            self.dropping = False
+                            self.resync()
+                        else:
+                            self.flush()
+                            latency = sec + usec * 1e-6
+                    elif code == SYN_DROPPED:
+                        # the kernel lost events; the rest of this frame
+                        # can't be trusted, the keys and axes are read
+                        # from the device once it is over
+                        self.rel_pending.clear()
+                        self.abs_pending.clear()
+                        self.dropping = True
+                elif self.dropping or type not in self.types:
+                    continue
+                elif type == EV_KEY:
+                    pins = self.keys.get(code)
+                    if pins is None:
+                        self.unexpected(type, code)
+                    else:
+                        pins[0].set(bool(value))
+                        pins[1].set(not value)
+                elif type == EV_REL:
+                    if code in self.rels:
+                        self.rel_pending[code] = self.rel_pending.get(code, 0) + value
+                    else:
+                        self.unexpected(type, code)
+                else:
+                    if code in self.abss:
+                        self.abs_pending[code] = value
+                    else:
+                        self.unexpected(type, code)
+            if len(buf) < EVENT_SIZE * 64:
+                break
+        if latency is not None:
+            self.latency.set((time.time() - latency) * 1000)
 
-    def set(self, name, value):
-        name = "%s.%s" % (self.idx, name)
-        self.comp[name] = value
+    def resync(self):
+        "Set the keys and absolute axes from the device, after lost events"
+        if self.keys:
+            down = set(self.key_codes.get(name) for name in self.device.get_keys())
+            for code, (pin, pin_not) in self.keys.items():
+                pin.set(code in down)
+                pin_not.set(code not in down)
+        for code, axis in self.abss.items():
+            axis.move(self.device.get_absinfo(code).value)
+        # relative motion that was lost can't be had back
+
+    def flush(self):
+        for code, value in self.rel_pending.items():
+            self.rels[code].add(value)
+        self.rel_pending.clear()
+        for code, value in self.abs_pending.items():
+            self.abss[code].move(value)
+        self.abs_pending.clear()
+
+    def unexpected(self, type, code):
+        print("Unexpected event", linux_event.EV_invert.get(type, type),
+              linux_event.mapcode(type, code), file=sys.stderr)
 
     def update(self):
-        while self.device.readable():
-            ev = self.device.read_event()
-            if ev.type == 'EV_SYN':
-                continue
-            elif ev.type == 'EV_SND':
-                continue
-            elif ev.type == 'EV_MSC':
-                continue
-            elif ev.type == 'EV_LED':
-                continue
-            elif ev.type == 'EV_KEY' and 'K' not in self.parts:
-                continue
-            elif ev.type == 'EV_REL' and 'R' not in self.parts:
-                continue
-            elif ev.type == 'EV_ABS' and 'A' not in self.parts:
-                continue
-            code = tohalname(ev.code)
-            if code not in self.codes:
-                print("Unexpected event", ev.type, ev.code, file=sys.stderr)
-                continue
-            if ev.type == 'EV_KEY':
-                if ev.value:
-                    self.set(code, 1)
-                    self.set(code + "-not", 0)
-                else:
-                    self.set(code, 0)
-                    self.set(code + "-not", 1)
-            elif ev.type == 'EV_REL':
-                self.set(code + "-counts",
-                         self.get(code + "-counts") + ev.value)
-            elif ev.type == 'EV_ABS':
-                flat = self.get(code + "-flat")
-                fuzz = self.get(code + "-fuzz")
-                center = int(self.get(code + "-offset"))
-                if ev.value < center-flat or ev.value > center+flat:
-                    value = ev.value
-                else:
-                    value = center
-                if abs(value - self.get(code + "-counts")) > fuzz:
-                    self.set(code + "-counts", value)
-
-        for a in self.abs_items:
-            value = self.get(a + "-counts")
-            scale = self.get(a + "-scale") or 1
-            offset = self.get(a + "-offset")
-            position = (value - offset) / scale
-            self.set(a + "-position", position)
-            # Use .01 because my Joystick isn't exactly zero at rest. maybe should be a parameter?
-            self.set(a + "-is-neg", (position < -.01))
-            self.set(a + "-is-pos", (position > .01))
-
-        for r in self.rel_items:
-            reset = self.get(r + "-reset")
-            scale = self.get(r + "-scale") or 1
-            if reset:
-                self.set(r + "-counts", 0)
-            self.set(r + "-position", self.get(r + "-counts") / scale)
-
-        for k, v in list(self.last.items()):
+        for a in self.abss.values():
+            a.update()
+
+        for r in self.rels.values():
+            r.update()
+
+        for led in self.leds:
             # Note: this is OK because the hal module always returns True or False for HAL_BIT values
-            u = self.comp["%s.%s" % (
-                self.idx, k)] != self.comp["%s.%s-invert" % (self.idx, k)]
-            if u != self.last[k]:
-                led = self.ledmap[k]
-                self.device.write_event('EV_LED', led, u)
-                self.last[k] = u
+            u = led[1].get() != led[2].get()
+            if u != led[3]:
+                self.device.write_event('EV_LED', led[0], u)
+                led[3] = u
+
+
+class RelAxis:
+    def __init__(self, comp, name):
+        self.position = comp.newpin(name + "-position", HAL_FLOAT, HAL_OUT)
+        self.counts = comp.newpin(name + "-counts", HAL_S32, HAL_OUT)
+        self.reset = comp.newpin(name + "-reset", HAL_BIT, HAL_IN)
+        self.scale = comp.newpin(name + "-scale", HAL_FLOAT, HAL_IN)
+        self.scale.set(1.)
+
+    def add(self, value):
+        self.counts.set(self.counts.get() + value)
+
+    def update(self):
+        scale = self.scale.get() or 1
+        if self.reset.get():
+            self.counts.set(0)
+        self.position.set(self.counts.get() / scale)
+
+
+class AbsAxis:
+    def __init__(self, comp, name, absinfo):
+        self.position = comp.newpin(name + "-position", HAL_FLOAT, HAL_OUT)
+        self.counts = comp.newpin(name + "-counts", HAL_S32, HAL_OUT)
+        self.is_pos = comp.newpin(name + "-is-pos", HAL_BIT, HAL_OUT)
+        self.is_neg = comp.newpin(name + "-is-neg", HAL_BIT, HAL_OUT)
+        self.scale = comp.newpin(name + "-scale", HAL_FLOAT, HAL_IN)
+        self.offset = comp.newpin(name + "-offset", HAL_FLOAT, HAL_IN)
+        self.fuzz = comp.newpin(name + "-fuzz", HAL_S32, HAL_IN)
+        self.flat = comp.newpin(name + "-flat", HAL_S32, HAL_IN)
+        comp.newparam(name + "-min", HAL_S32, HAL_RO).set(absinfo.minimum)
+        comp.newparam(name + "-max", HAL_S32, HAL_RO).set(absinfo.maximum)
+        center = (absinfo.minimum + absinfo.maximum)/2.
+        halfrange = (absinfo.maximum - absinfo.minimum)/2. or 1
+        self.counts.set(absinfo.value)
+        self.position.set((absinfo.value - center) / halfrange)
+        self.scale.set(halfrange)
+        self.offset.set(center)
+        self.fuzz.set(absinfo.fuzz)
+        self.flat.set(absinfo.flat)
+
+    def move(self, value):
+        flat = self.flat.get()
+        center = int(self.offset.get())
+        if center-flat <= value <= center+flat:
+            value = center
+        if abs(value - self.counts.get()) > self.fuzz.get():
+            self.counts.set(value)
+
+    def update(self):
+        scale = self.scale.get() or 1
+        position = (self.counts.get() - self.offset.get()) / scale
+        self.position.set(position)
+        # Use .01 because my Joystick isn't exactly zero at rest. maybe should be a parameter?
+        self.is_neg.set(position < -.01)
+        self.is_pos.set(position > .01)
 
 
 h = component("hal_input")
@@ -231,12 +306,17 @@ for f in sys.argv[1:]:
 w.drive()
 h.ready()
 
-fds = [dev.device.fileno() for dev in d]
+poll = select.epoll()
+devices = {}
+for dev in d:
+    devices[dev.device.fileno()] = dev
+    poll.register(dev.device.fileno(), select.EPOLLIN)
 try:
     while 1:
-        select.select(fds, [], [], .01)
-        for i in d:
-            i.update()
+        for fd, events in poll.poll(.01):
+            devices[fd].read()
+        for dev in d:
+            dev.update()
         w.drive()
 except KeyboardInterrupt:
     pass
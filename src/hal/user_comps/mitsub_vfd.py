@@ -38,16 +38,27 @@
 import time,hal
 import serial
 import traceback
+
+STX = b'\x02'
+ETX = b'\x03'
+ACK = b'\x06'
+NAK = b'\x15'
+
+# Monitor requests sent in turn to each drive with its monitor pin set:
+# 7A status bits, 6F running frequency, 70 amps, 71 volts, 72 special monitor
+MONITOR = ('7A','6F','70','71','72')
+
 class mitsubishi_serial:
 
-    def __init__(self,vfd_names=[['mitsub_vfd','00']],baudrate=9600,port='/dev/ttyUSB0'):
+    def __init__(self,vfd_names=[['mitsub_vfd','00']],baudrate=9600,port='/dev/ttyUSB0',timeout=.1):
         try:
             self.ser = serial.Serial(
             port,
             baudrate,
             parity=serial.PARITY_NONE,
             stopbits=serial.STOPBITS_TWO,
-            bytesize=serial.EIGHTBITS
+            bytesize=serial.EIGHTBITS,
+            timeout=timeout
             )
             self.ser.open()
             self.ser.isOpen()
@@ -94,6 +105,9 @@ class mitsubishi_serial:
             c.newpin("stat-bit-5", hal.HAL_BIT, hal.HAL_OUT)
             c.newpin("stat-bit-6", hal.HAL_BIT, hal.HAL_OUT)
             c.newpin("stat-bit-7", hal.HAL_BIT, hal.HAL_OUT)
+            c.newpin("refresh-rate", hal.HAL_FLOAT, hal.HAL_OUT)
+            c.newpin("latency", hal.HAL_FLOAT, hal.HAL_OUT)
+            c.newpin("comm-errors", hal.HAL_U32, hal.HAL_OUT)
             # set reasonable defaults
             c['scale-cmd'] = 1
             c['scale-fb'] = 1
@@ -108,203 +122,220 @@ class mitsubishi_serial:
             self['last_cmd%d'%index] = c['motor-cmd']
             self['last_monitor%d'%index] = c['monitor']
             self['last_estop%d'%index] = c['estop']
+            # next monitor request and start time of the current round of them
+            self['next_request%d'%index] = 0
+            self['last_round%d'%index] = None
             #add device to component reference variable
             self.h.append(c)
             print("Mitsubishi %s VFD: slave# %s added\n"%(name[0],name[1]))
 
+        # the device for the next monitor request and the last one sent to
+        self.next_device = 0
+        self.index = 0
+
         # only issue ready when all the components are ready
         for i in self.h:
             i.ready()
         self.set_special_monitor()
 
+    # The RS-485 bus carries one request at a time.  Rather than sleeping
+    # a fixed time after each request, the reply is read as soon as its
+    # last character arrives and the next request goes out straight away.
+    # Changed commands for any drive are sent before each monitor request,
+    # so they wait for at most one request on the bus, and the monitor
+    # requests go to the drives in turn, one request each.
     def loop(self):
-        cmd = data = out = temp=''
         while 1:
             try:
-              for index,ids in enumerate(self.comp_names):
-                self.slave_num = ids[1]
-                # MONITOR for up-to-speed, alarms and running frequency
-                # 7A is the address for 8 status bits ( b0 - b8 )
-                # These bits are configurable from the panel. We assume bit 3 is up to speed
-                # and bit 7 is alarm
-                # the returned data is 2 characters of hex
-                # we convert that to binary and the mask for the bits we want
-                if self.h[index]['monitor']:
-                    while self.ser.inWaiting() > 0:
-                        raw = self.ser.read(1)
-                    word = self.prepare_data("7A",None)
-                    out = temp = ''
-                    self.ser.write(word)
-                    time.sleep(.05)
-                    string,chr_list,chr_hex = self.poll_output()
-                    #print 'DEBUG: ',chr_list,chr_hex
-                    if chr_list != '':
-                        #print string
-                        try:
-                            binary = "{0:#010b}".format(int(string[3:5],16))
-                        except:
-                            binary = '0b000000'
-                        self.h[index]['stat-bit-0'] = int(binary,2) & 1
-                        self.h[index]['stat-bit-1'] = int(binary,2) & 2
-                        self.h[index]['stat-bit-2'] = int(binary,2) & 4
-                        self.h[index]['stat-bit-3'] = self.h[index]['up-to-speed'] = int(binary,2) & 8
-                        self.h[index]['stat-bit-4'] = int(binary,2) & 16
-                        self.h[index]['stat-bit-5'] = int(binary,2) & 32
-                        self.h[index]['stat-bit-6'] = int(binary,2) & 64
-                        self.h[index]['stat-bit-7'] = self.h[index]['alarm'] = int(binary,2) & 128
-                        if self.h[index]['debug'] and 1==2:
-                            print('monitor operation:',binary,temp,temp[3:5],len(temp))
+              for index in range(len(self.comp_names)):
+                self.send_commands(index)
+              if not self.monitor_next():
+                  # nothing to monitor, don't spin on the command pins
+                  time.sleep(.01)
+            except KeyboardInterrupt:
+                    self.kill_output()
+                    raise
+            except Exception as e:
+                    print("error",self.comp_names[self.index])
+                    print(sys.exc_info()[0])
+                    print (e)
 
-                    # 6F is the address for running motor frequency status
-                    # it returns 4 characters of hex
-                    # we convert to decimal and multiply by .01 for hertz and by user scale-fb
-                    # for arbrtrary units. This does require scale to be set to something besides 0!
-                    # we assume the inverter is set to show running hertz (it's configurable in the VFD)
-                    word = self.prepare_data("6F",None)
-                    out = temp = ''
-                    self.ser.write(word)
-                    time.sleep(.05)
-                    string,chr_list,chr_hex = self.poll_output()
-                    if self.h[index]['debug']:
-                        print('DEBUG: ',chr_list,chr_hex)
-                    if chr_list != '':
-                        decimal = int(string[3:7],16)
-                        self.h[index]["motor-fb"] = decimal *.01 * self.h[index]["scale-fb"]
-                        if self.h[index]['debug'] and 1==2:
-                            print('monitor frequency:',decimal,string,string[3:7], len(string))
+    # send the next monitor request, returns False if no drive is monitored
+    def monitor_next(self):
+        count = len(self.comp_names)
+        for i in range(count):
+            index = (self.next_device + i) % count
+            if self.h[index]['monitor']:
+                break
+            self['next_request%d'%index] = 0
+            self['last_round%d'%index] = None
+            self.h[index]['refresh-rate'] = 0
+        else:
+            return False
+        self.next_device = (index + 1) % count
+        request = self['next_request%d'%index]
+        self['next_request%d'%index] = (request + 1) % len(MONITOR)
+        # refresh rate of the drive, in rounds of all monitor requests per
+        # second, counting only rounds the drive answered in full
+        if request == 0:
+            now = time.time()
+            if self['last_round%d'%index] is not None:
+                self.h[index]['refresh-rate'] = 1. / max(now - self['last_round%d'%index], 1e-6)
+            self['last_round%d'%index] = now
+        code = MONITOR[request]
+        string = self.transact(index, code)
+        if self.h[index]['debug'] and code != '7A':
+            self.print_debug(string)
+        if string.startswith('\x02'):
+            self.update_monitor(index, code, string)
+        else:
+            self['last_round%d'%index] = None
+            self.h[index]['refresh-rate'] = 0
+        # Power
+        if code == '71':
+            self.h[index]["motor-power"] = self.h[index]["motor-volts"] * self.h[index]["motor-amps"] * 2.7
+        return True
 
-                # amps
-                    word = self.prepare_data("70",None)
-                    out = temp = ''
-                    self.ser.write(word)
-                    time.sleep(.05)
-                    string,chr_list,chr_hex = self.poll_output()
-                    if self.h[index]['debug']:
-                        print('DEBUG: ',chr_list,chr_hex)
-                    if chr_list != '':
-                        decimal = int(string[3:7],16)
-                        self.h[index]["motor-amps"] = decimal *.01 * self.h[index]["scale-amps"]
-                        if self.h[index]['debug'] and 1==2:
-                            print('monitor amps:',decimal,string,string[3:7], len(string))
+    def update_monitor(self, index, code, string):
+        # MONITOR for up-to-speed, alarms and running frequency
+        # 7A is the address for 8 status bits ( b0 - b8 )
+        # These bits are configurable from the panel. We assume bit 3 is up to speed
+        # and bit 7 is alarm
+        # the returned data is 2 characters of hex
+        # we convert that to binary and the mask for the bits we want
+        if code == '7A':
+            try:
+                binary = "{0:#010b}".format(int(string[3:5],16))
+            except:
+                binary = '0b000000'
+            self.h[index]['stat-bit-0'] = int(binary,2) & 1
+            self.h[index]['stat-bit-1'] = int(binary,2) & 2
+            self.h[index]['stat-bit-2'] = int(binary,2) & 4
+            self.h[index]['stat-bit-3'] = self.h[index]['up-to-speed'] = int(binary,2) & 8
+            self.h[index]['stat-bit-4'] = int(binary,2) & 16
+            self.h[index]['stat-bit-5'] = int(binary,2) & 32
+            self.h[index]['stat-bit-6'] = int(binary,2) & 64
+            self.h[index]['stat-bit-7'] = self.h[index]['alarm'] = int(binary,2) & 128
+            return
+        decimal = int(string[3:7],16)
+        # 6F is the address for running motor frequency status
+        # it returns 4 characters of hex
+        # we convert to decimal and multiply by .01 for hertz and by user scale-fb
+        # for arbrtrary units. This does require scale to be set to something besides 0!
+        # we assume the inverter is set to show running hertz (it's configurable in the VFD)
+        if code == '6F':
+            self.h[index]["motor-fb"] = decimal *.01 * self.h[index]["scale-fb"]
+        # amps
+        elif code == '70':
+            self.h[index]["motor-amps"] = decimal *.01 * self.h[index]["scale-amps"]
+        # volts
+        elif code == '71':
+            self.h[index]["motor-volts"] = decimal *.01 * self.h[index]["scale-volts"]
+        # special user selected monitor
+        elif code == '72':
+            self.h[index]["motor-user"] = decimal * self.h[index]["scale-user"]
 
-                # volts
-                    word = self.prepare_data("71",None)
-                    out = temp = ''
-                    self.ser.write(word)
-                    time.sleep(.05)
-                    string,chr_list,chr_hex = self.poll_output()
-                    if self.h[index]['debug']:
-                        print('DEBUG: ',chr_list,chr_hex)
-                    if chr_list != '':
-                        decimal = int(string[3:7],16)
-                        self.h[index]["motor-volts"] = decimal *.01 * self.h[index]["scale-volts"]
-                        if self.h[index]['debug'] and 1==2:
-                            print('monitor volts:',decimal,string,string[3:7], len(string))
-                # Power
-                    self.h[index]["motor-power"] = self.h[index]["motor-volts"] * self.h[index]["motor-amps"] * 2.7
+    # send the commands whose pins changed since they were last sent
+    def send_commands(self, index):
+        ids = self.comp_names[index]
+        # STOP ON ESTOP
+        # if ESTOP is false it stops the output
+        # when ESTOP is reset the run command must be re-issued (cycled false to true) to start motor 
+        if not self['last_estop%d'%index] == self.h[index]['estop']:
+            if not self.h[index]["estop"]:
+                self.transact(index, "FA", "00")
+                self['last_estop%d'%index] = self.h[index]['estop']
+                print("**** Mitsubishi VFD: %s stopped due to Estop Signal"% ids[0])
+                return
+            else:
+                # reset VFD after estop
+                self.transact(index, "FD")
 
-                # special user selected monitor
-                    word = self.prepare_data("72",None)
-                    out = temp = ''
-                    self.ser.write(word)
-                    time.sleep(.05)
-                    string,chr_list,chr_hex = self.poll_output()
-                    if self.h[index]['debug']:
-                        print('DEBUG: ',chr_list,chr_hex)
-                    if chr_list != '':
-                        decimal = int(string[3:7],16)
-                        self.h[index]["motor-user"] = decimal * self.h[index]["scale-user"]
-                        if self.h[index]['debug'] and 1==2:
-                            print('monitor user selectable:',decimal,string,string[3:7], len(string))
+            print("**** Mitsubishi VFD: Estop cleared - Must re-issue run command to start %s." % ids[0])
+            self['last_estop%d'%index] = self.h[index]['estop']
 
-                # STOP ON ESTOP
-                # if ESTOP is false it stops the output
-                # when ESTOP is reset the run command must be re-issued (cycled false to true) to start motor 
-                if not self['last_estop%d'%index] == self.h[index]['estop']:
-                    if not self.h[index]["estop"]:
-                        cmd = "FA";data ="00"
-                        word = self.prepare_data(cmd,data)
-                        self.ser.write(word)
-                        time.sleep(.05)
-                        self['last_estop%d'%index] = self.h[index]['estop']
-                        print("**** Mitsubishi VFD: %s stopped due to Estop Signal"% ids[0])
-                        continue
-                    else:
-                        # reset VFD after estop
-                        cmd = "FD";data = None
-                        word = self.prepare_data(cmd,data)
-                        self.ser.write(word)
-                        time.sleep(.05)
-                    
-                    print("**** Mitsubishi VFD: Estop cleared - Must re-issue run command to start %s." % ids[0])
-                    self['last_estop%d'%index] = self.h[index]['estop']
+        # SET RUN AND DIRECTION
+        # address FA sets the start and direction
+        # it expects a 2 character hex representing a 8 bit (b0 - b7) binary number
+        # bit 1 sets forward, 4 sets reverse, 0 stop
+        # depending on the inverter and options other bits are possible,
+        # but these three are consistant
+        if not self['last_run%d'%index] == self.h[index]['run'] or not self['last_fwd%d'%index] == self.h[index]['fwd']:
+            if self.h[index]['run']:
+                if self.h[index]['fwd']:
+                    data ="02"
+                else:
+                    data ="04"
+            else:
+                data ="00"
+            self['last_run%d'%index] = self.h[index]['run']
+            self['last_fwd%d'%index] = self.h[index]['fwd']
+            string = self.transact(index, "FA", data)
+            if self.h[index]['debug']:
+                self.print_debug(string)
 
-                # SET RUN AND DIRECTION
-                # address FA sets the start and direction
-                # it expects a 2 character hex representing a 8 bit (b0 - b7) binary number
-                # bit 1 sets forward, 4 sets reverse, 0 stop
-                # depending on the inverter and options other bits are possible,
-                # but these three are consistant
-                if not self['last_run%d'%index] == self.h[index]['run'] or not self['last_fwd%d'%index] == self.h[index]['fwd']:
-                    if self.h[index]['run']:
-                        if self.h[index]['fwd']:
-                            cmd = "FA";data ="02"
-                        else:
-                            cmd = "FA";data ="04"
-                    else:
-                        cmd = "FA";data ="00"
-                    word = self.prepare_data(cmd,data)
-                    self.ser.write(word)
-                    time.sleep(.05)
-                    self['last_run%d'%index] = self.h[index]['run']
-                    self['last_fwd%d'%index] = self.h[index]['fwd']
-                    if self.h[index]['debug']:
-                        string,chr_list,chr_hex = self.poll_output()
-                        print('DEBUG: ',chr_list,chr_hex)
+        # SET cmd
+        # address ED is for setting the running frequency
+        # it expects 4 characters of hex representing frequency in .01 hertz units
+        # we internally scale it by 100 to make it 1 hertz units and by user scale
+        # for arbrtrary units. This does require scale to be set to something besides 0!
+        if not self['last_cmd%d'%index] == self.h[index]['motor-cmd']:
+            freq = int(abs(self.h[index]['motor-cmd']*100*self.h[index]['scale-cmd']))
+            if freq > 40000: freq = 40000
+            if freq < 0: freq = 0
+            self['last_cmd%d'%index] = self.h[index]['motor-cmd']
+            # send frequency command
+            string = self.transact(index, "ED", "%0.4X"%freq)
+            if self.h[index]['debug']:
+                self.print_debug(string)
 
-                # SET cmd
-                # address ED is for setting the running frequency
-                # it expects 4 characters of hex representing frequency in .01 hertz units
-                # we internally scale it by 100 to make it 1 hertz units and by user scale
-                # for arbrtrary units. This does require scale to be set to something besides 0!
-                if not self['last_cmd%d'%index] == self.h[index]['motor-cmd']:
-                    freq = int(abs(self.h[index]['motor-cmd']*100*self.h[index]['scale-cmd']))
-                    if freq > 40000: freq = 40000
-                    if freq < 0: freq = 0
-                    self['last_cmd%d'%index] = self.h[index]['motor-cmd']
-                    # send frequency command
-                    cmd="ED";data="%0.4X"%freq
-                    word = self.prepare_data(cmd,data)
-                    self.ser.write(word)
-                    time.sleep(.05)
-                    if self.h[index]['debug']:
-                        string,chr_list,chr_hex = self.poll_output()
-                        print('DEBUG: ',chr_list,chr_hex)
+    # send one request and wait for its reply, which is returned as a string
+    # or '' if none came within the serial timeout
+    def transact(self, index, command, data=None):
+        self.index = index
+        self.slave_num = self.comp_names[index][1]
+        # drop anything left over from a late reply
+        self.ser.reset_input_buffer()
+        start = time.time()
+        self.ser.write(self.prepare_data(command,data))
+        reply = self.read_reply()
+        if reply:
+            self.h[index]['latency'] = (time.time() - start) * 1000
+        else:
+            self.h[index]['comm-errors'] += 1
+        return reply
 
-            except KeyboardInterrupt:
-                    self.kill_output()
-                    raise
-            except Exception as e:
-                    print("error",ids)
-                    print(sys.exc_info()[0])
-                    print (e)
+    # read one reply as soon as it is complete:
+    # STX station data ETX sum, ACK station or NAK station error-code
+    def read_reply(self):
+        first = self.ser.read(1)
+        if first == STX:
+            reply = first + self.ser.read_until(ETX)
+            if reply.endswith(ETX):
+                reply += self.ser.read(2)
+        elif first == ACK:
+            reply = first + self.ser.read(2)
+        elif first == NAK:
+            reply = first + self.ser.read(3)
+        else:
+            return ''
+        return reply.decode('ascii', 'replace')
+
+    def print_debug(self, string):
+        chr_list = ''.join(c + ',' for c in string)
+        chr_hex = ''.join(hex(ord(c)) + ' ' for c in string)
+        print('DEBUG: ',chr_list,chr_hex)
 
     # defaults to power in kw
     def set_special_monitor(self, option = '0E'):
         cmd="F3"
         for index,ids in enumerate(self.comp_names):
-            self.slave_num = ids[1]
-            word = self.prepare_data(cmd,option)
-            self.ser.write(word)
-            time.sleep(.05)
+            self.transact(index, cmd, option)
 
     def kill_output(self):
         cmd = "FA";data ="00"
         for index,ids in enumerate(self.comp_names):
-            self.slave_num = ids[1]
-            word = self.prepare_data(cmd,data)
-            self.ser.write(word)
-            time.sleep(.05)
+            self.transact(index, cmd, data)
             print('Mitsub VFD: Kill-> ', ids[0])
 
     def prepare_data(self,command ='E1',data= '07AD'):
@@ -318,26 +349,6 @@ class mitsubishi_serial:
         converted_data = chr(0x5) + combined + hex(s)[-2:-1].upper() + hex(s)[-1:].upper()
         return bytes(converted_data, 'utf-8')
 
-    def poll_output(self):
-        string = chr_list_out = hex_out = ''
-        while self.ser.inWaiting() > 0:
-            raw = self.ser.read(1).decode()
-            chr_list_out += raw+','
-            string += raw
-            hex_out += hex(ord(raw))
-            hex_out +=' '
-        if hex_out != '':
-            answ=''
-            if chr_list_out[0] == chr(0x6):
-                answ = 'ackg'
-            if chr_list_out[0] == chr(0x15):
-                answ = 'error'
-            if chr_list_out[0] == chr(0x2):
-                answ = 'checksome error'
-            #print 'slave:',chr_list_out[2]+chr_list_out[4],answ
-            return string,chr_list_out,hex_out
-        return '','',''
-
     def __getitem__(self, item):
         return getattr(self, item)
     def __setitem__(self, item, value):
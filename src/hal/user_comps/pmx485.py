@@ -24,12 +24,14 @@ import sys
 import hal
 import time
 import serial
+from functools import lru_cache
 
 print('Starting pmx485 communications')
 
 address      = '01'
 regRead      = '04'
 regWrite     = '06'
+regError     = '84'
 rCurrent     = '2094'
 rCurrentMax  = '209A'
 rCurrentMin  = '2099'
@@ -40,9 +42,24 @@ rPressureMax = '209D'
 rPressureMin = '209C'
 rArcTimeLow  = '209E'
 rArcTimeHigh = '209F'
-validRead    = '0402'
 started      = False
 errorCount   = 0
+exception    = 'exception'
+
+# options given after the port as name=value
+#   fault, cut, arctime, limits: seconds between reads of these registers
+#   batch:   1 to read consecutive registers with one request, 0 for one at a time
+#   timeout: seconds to wait for a reply, beyond the time taken to send it
+#   retries: number of times a request is repeated when its reply is bad or missing
+options = {'fault': 0.0, 'cut': 0.1, 'arctime': 1.0, 'limits': 5.0,
+           'batch': 1, 'timeout': 0.1, 'retries': 1}
+
+# registers read together, by the name of the option for their period
+polls = [['fault', [rFault]],
+         ['cut', [rMode, rCurrent, rPressure]],
+         ['arctime', [rArcTimeLow, rArcTimeHigh]],
+         ['limits', [rCurrentMin, rCurrentMax, rPressureMin, rPressureMax]]]
+nextPoll = {}
 
 # create pmx485 component
 pmx485 = hal.component('pmx485')
@@ -60,19 +77,43 @@ pmx485.newpin('current_max', hal.HAL_FLOAT, hal.HAL_OUT)  #maximum allowed curre
 pmx485.newpin('pressure_min', hal.HAL_FLOAT, hal.HAL_OUT) #minimum allowed gas pressure
 pmx485.newpin('pressure_max', hal.HAL_FLOAT, hal.HAL_OUT) #maximum allowed gas pressure
 pmx485.newpin('arcTime', hal.HAL_FLOAT, hal.HAL_OUT)     #arc on time feedback
+pmx485.newpin('retries', hal.HAL_U32, hal.HAL_OUT)       #requests repeated
+pmx485.newpin('errors', hal.HAL_U32, hal.HAL_OUT)        #requests failed after all retries
 pmx485.ready()
 
 enabled = pmx485.enable
 
 # connection setup
 comPort = sys.argv[1]
+for arg in sys.argv[2:]:
+    try:
+        name, value = arg.split('=')
+        options[name] = type(options[name])(value)
+    except:
+        print('\npmx485 ignored invalid option {}\n'.format(arg))
+batching = options['batch']
+batchFailures = 0
+# split registers into runs of consecutive ones, so that reading a run
+# with one request asks for no register between them
+def get_runs(regs):
+    runs = []
+    for number in sorted(int(r, 16) for r in regs):
+        if runs and number == runs[-1][-1] + 1:
+            runs[-1].append(number)
+        else:
+            runs.append([number])
+    return [['{:04X}'.format(number) for number in run] for run in runs]
+
+# the longest reply is to the longest run read at once, each character
+# has 8 data bits with start, parity and stop bits
+longest = 11 + 4 * max(len(run) for name, regs in polls for run in get_runs(regs))
 try:
     comms = serial.Serial(comPort,
                           baudrate = 19200,
                           bytesize = 8,
                           parity = 'E',
                           stopbits = 1,
-                          timeout = 0.1
+                          timeout = options['timeout'] + longest * 11 / 19200.0
                          )
 except:
     print('\nCould not open {} for Powermax communications\n'.format(comPort))
@@ -80,45 +121,90 @@ except:
 
 # get the checksum
 def get_lrc(data):
-    lrc = 0
-    for i in range(0, len(data), 2):
-        a, b = data[i:i+2]
-        try:
-            lrc = (lrc + int(a + b, 16)) & 255
-        except:
-            return '00'
-    lrc = ('{:02X}'.format((((lrc ^ 255) + 1) & 255))).upper()
-    return lrc
+    try:
+        return '{:02X}'.format(-sum(bytes.fromhex(data)) & 255)
+    except ValueError:
+        return '00'
+
+# the packets for requests, read requests are the same every time
+@lru_cache(maxsize=256)
+def get_packet(function, reg, value):
+    data = '{}{}{}{}'.format(address, function, reg, value)
+    return ':{}{}\r\n'.format(data, get_lrc(data)).encode()
+
+# send a request, returning the reply as soon as its last character is in,
+# or what came before the timeout
+def transact(packet, replyLength):
+    comms.reset_input_buffer()
+    comms.write(packet)
+    return comms.read_until(b'\n', replyLength).decode(errors='replace')
 
 # write data to register
 def write_register(reg, value):
-    data = '{}{}{}{}'.format(address, regWrite, reg, value)
-    if len(data) == 12:
-        lrc = get_lrc(data)
-        packet = ':{}{}\r\n'.format(data, lrc)
-        reply = ''
-        comms.write(packet.encode())
-        reply = comms.readline().decode()
-        if reply:
-            if reply == packet:
-                return 1
+    if len(reg) != 4 or len(value) != 4:
+        return 0
+    packet = get_packet(regWrite, reg, value)
+    for attempt in range(options['retries'] + 1):
+        if attempt:
+            pmx485.retries += 1
+        reply = transact(packet, len(packet))
+        if reply and reply == packet.decode():
+            return 1
+    pmx485.errors += 1
     return 0
 
-# read data from register
-def read_register(reg):
-    data = '{}{}{}0001'.format(address, regRead, reg)
-    if len(data) == 12:
-        lrc = get_lrc(data)
-        packet = ':{}{}\r\n'.format(data, lrc)
-        reply = ''
-        comms.write(packet.encode())
-        reply = comms.readline().decode()
-        if reply:
-            if len(reply) == 15 and reply[:7] == ':{}{}'.format(address, validRead):
-                lrc = get_lrc(reply[1:11])
-                if lrc == reply[11:13]:
-                    return reply[7:11]
-    return 0
+# read count registers from first, returning a list of values, exception
+# if the powermax refused the request or None if there was no valid reply
+def read_registers(first, count):
+    packet = get_packet(regRead, first, '{:04X}'.format(count))
+    length = 11 + 4 * count
+    for attempt in range(options['retries'] + 1):
+        if attempt:
+            pmx485.retries += 1
+        reply = transact(packet, length)
+        if len(reply) == 11 and reply[:5] == ':{}{}'.format(address, regError) and \
+           get_lrc(reply[1:7]) == reply[7:9]:
+            return exception
+        if len(reply) == length and reply[:7] == ':{}{}{:02X}'.format(address, regRead, 2 * count):
+            if get_lrc(reply[1:length - 4]) == reply[length - 4:length - 2]:
+                return [int(reply[i:i + 4], 16) for i in range(7, 7 + 4 * count, 4)]
+    pmx485.errors += 1
+    return None
+
+# read a group of registers, each run of consecutive ones as one request
+# if the powermax answers such requests, returns a dict of register values
+def read_group(regs):
+    result = {}
+    for run in get_runs(regs):
+        values = read_run(run)
+        if values is None:
+            return None
+        result.update(values)
+    return result
+
+def read_run(regs):
+    global batching, batchFailures
+    count = len(regs)
+    if batching and count > 1:
+        values = read_registers(regs[0], count)
+        if values is not None and values != exception:
+            batchFailures = 0
+            return dict(zip(regs, values))
+    else:
+        values = []
+    result = {}
+    for reg in regs:
+        value = read_registers(reg, 1)
+        if value is None or value == exception:
+            return None
+        result[reg] = value[0]
+    # single reads work where the batched one did not
+    if batching and count > 1:
+        batchFailures += 1
+        if values == exception or batchFailures > 2:
+            print('pmx485 reading one register at a time, Powermax does not answer multiple register reads')
+            batching = False
+    return result
 
 # set machine to local mode
 def close_machine():
@@ -139,25 +225,33 @@ def open_machine():
     else:
         return False
 
+# set the pins from the values read
+def set_values(values):
+    if rMode in values:
+        pmx485.mode = values[rMode]
+    if rCurrent in values:
+        pmx485.current = round(values[rCurrent] / 64.0, 1)
+    if rPressure in values:
+        pmx485.pressure = round(values[rPressure] / 128.0, 1)
+    if rFault in values:
+        pmx485.fault = values[rFault]
+    if rArcTimeLow in values and rArcTimeHigh in values:
+        pmx485.arcTime = (values[rArcTimeHigh] << 16) + values[rArcTimeLow]
+    if rCurrentMin in values:
+        pmx485.current_min = round(values[rCurrentMin] / 64.0, 1)
+    if rCurrentMax in values:
+        pmx485.current_max = round(values[rCurrentMax] / 64.0, 1)
+    if rPressureMin in values:
+        pmx485.pressure_min = round(values[rPressureMin] / 128.0, 1)
+    if rPressureMax in values:
+        pmx485.pressure_max = round(values[rPressureMax] / 128.0, 1)
+
 # get settings limits
 def get_limits():
-    # get minimum current setting
-    cMin = read_register(rCurrentMin)
-    if cMin:
-        pmx485.current_min = round(int(cMin, 16) / 64.0, 1)
-    # get maximum current setting
-    cMax = read_register(rCurrentMax)
-    if cMax:
-        pmx485.current_max = round(int(cMax, 16) / 64.0, 1)
-    # get minimum pressure setting
-    pMin = read_register(rPressureMin)
-    if pMin:
-        pmx485.pressure_min = round(int(pMin, 16) / 128.0, 1)
-    # get maximum pressure setting
-    pMax = read_register(rPressureMax)
-    if pMax:
-        pmx485.pressure_max = round(int(pMax, 16) / 128.0, 1)
-    if cMin and cMax and pMin and pMax:
+    values = read_group(polls[-1][1])
+    if values:
+        set_values(values)
+        nextPoll['limits'] = time.time() + options['limits']
 # debugging
         # print('\nPowermax Settings:')
         # print('    Mode Force = {}'.format(int(pmx485.mode_set)))
@@ -171,6 +265,51 @@ def get_limits():
     else:
         return False
 
+# send changed settings, returns False if one was not accepted
+def write_settings():
+    ok = True
+    # set mode
+    if pmx485.mode_set != pmx485.mode:
+        if write_register(rMode,  '{:04X}'.format(int(pmx485.mode_set))):
+            pmx485.mode = pmx485.mode_set
+            # the limits depend on the mode
+            nextPoll['limits'] = 0
+        else:
+            ok = False
+    # set current
+    if pmx485.current_set != round(pmx485.current, 1):
+        if write_register(rCurrent,  '{:04X}'.format(int(pmx485.current_set * 64))):
+            pmx485.current = pmx485.current_set
+        else:
+            ok = False
+    # set pressure
+    if pmx485.pressure_set != round(pmx485.pressure, 1):
+        if write_register(rPressure,  '{:04X}'.format(int(pmx485.pressure_set * 128))):
+            pmx485.pressure = pmx485.pressure_set
+        else:
+            ok = False
+    return ok
+
+# read the groups of registers that are due, fastest first
+def poll_registers():
+    ok = True
+    for name, regs in polls:
+        now = time.time()
+        if now < nextPoll.get(name, 0):
+            continue
+        # a setting written but not yet read back would be overwritten
+        if name == 'cut' and (pmx485.mode_set != pmx485.mode or \
+           pmx485.current_set != round(pmx485.current, 1) or \
+           pmx485.pressure_set != round(pmx485.pressure, 1)):
+            continue
+        values = read_group(regs)
+        if values:
+            set_values(values)
+            nextPoll[name] = now + options[name]
+        else:
+            ok = False
+    return ok
+
 # main loop
 try:
     while 1:
@@ -193,6 +332,7 @@ try:
                 if not started:
                     if not comms.isOpen():
                         comms.open()
+                    nextPoll.clear()
                     if open_machine():
                         started = True
                     if started and get_limits():
@@ -200,62 +340,17 @@ try:
                     else:
                         started = False
                 else:
-                    # set mode
-                    if pmx485.mode_set != pmx485.mode:
-                        mode = write_register(rMode,  '{:04X}'.format(int(pmx485.mode_set)))
-                        if mode:
-                            pmx485.mode = pmx485.mode_set
-                            get_limits()
-                    # get mode
-                    else:
-                        mode = read_register(rMode)
-                        if mode:
-                            pmx485.mode = int(mode, 16)
-                    # set current
-                    if pmx485.current_set != round(pmx485.current, 1):
-                        current = write_register(rCurrent,  '{:04X}'.format(int(pmx485.current_set * 64)))
-                        if current:
-                            pmx485.current = pmx485.current_set
-                    # get current
-                    else:
-                        current = read_register(rCurrent)
-                        if current:
-                            pmx485.current = round(int(current, 16) / 64.0, 1)
-                    # set pressure
-                    if pmx485.pressure_set != round(pmx485.pressure, 1):
-                        pressure = write_register(rPressure,  '{:04X}'.format(int(pmx485.pressure_set * 128)))
-                        if pressure:
-                            pmx485.pressure = pmx485.pressure_set
-                    # get pressure
-                    else:
-                        pressure = read_register(rPressure)
-                        if pressure:
-                            pmx485.pressure = round(int(pressure, 16) / 128.0, 1)
-                    # get fault code
-                    fault = read_register(rFault)
-                    if fault:
-                        pmx485.fault = int(fault, 16)
-                    # get arc on time
-                    arcTimeLow = read_register(rArcTimeLow)
-                    arcTimeHigh = read_register(rArcTimeHigh)
-                    if arcTimeLow and arcTimeHigh:
-                        pmx485.arcTime = int((arcTimeHigh + arcTimeLow), 16)
+                    # settings to write come before reading
+                    written = write_settings()
+                    polled = poll_registers()
                     # set status
-                    if mode and current and pressure and fault and arcTimeLow and arcTimeHigh:
+                    if written and polled:
                         pmx485.status = True
                         errorCount = 0
                     else:
                         errorCount += 1
 # debugging
                         # print('\nPMX485 STATUS ERROR #{}'.format(errorCount))
-                        # if not mode:
-                        #     print('    Mode: set={:5.1f}   get={:5.1f}'.format(pmx485.mode_set, pmx485.mode))
-                        # if not current:
-                        #     print(' Current: set={:5.1f}   get={:5.1f}'.format(pmx485.current_set, pmx485.current))
-                        # if not pressure:
-                        #     print('Pressure: set={:5.1f}   get={:5.1f}'.format(pmx485.pressure_set, pmx485.pressure))
-                        # if not fault:
-                        #     print('   Fault:             get={:5.1f}'.format(pmx485.fault))
                         if errorCount > 2:
                             print('Closing pmx485.py, error count exceeded')
                             errorCount = 0
@@ -263,6 +358,13 @@ try:
                             pmx485.status = False
                             started = False
                             comms.close()
+                    # nothing due yet, wait for the next read
+                    if written and polled and nextPoll:
+                        wait = min(nextPoll.get(name, 0) for name, regs in polls) - time.time()
+                        if wait > 0:
+                            time.sleep(min(wait, 0.01))
+            else:
+                time.sleep(0.01)
 except:
     print('Shutting down pmx485 communications, unknown error')
     if started:
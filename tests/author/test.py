@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import io, math, random, sys
+from rs274.author import douglas, dist_lseg, Gcode
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+def within(path, moves, tolerance):
+    "Whether the output is taken from path, in order, and stays near it"
+    points = [tuple(p) for m, p, c in moves]
+    if points[0] != tuple(path[0]) or points[-1] != tuple(path[-1]):
+        return False
+    index = [tuple(p) for p in path]
+    i = 0
+    for a, b in zip(points[:-1], points[1:]):
+        ia = index.index(a, i)
+        ib = index.index(b, ia)
+        for p in path[ia:ib + 1]:
+            if dist_lseg(a, b, p) > tolerance + 1e-12:
+                return False
+        i = ib
+    return True
+
+random.seed(6)
+for n in 10, 40, 200, 3000:
+    x = y = 0
+    path = []
+    for i in range(n):
+        x += random.uniform(0, .01); y += random.uniform(-.01, .01)
+        path.append([x, y, random.uniform(-.001, 0)])
+    moves = list(douglas(path, .002))
+    check("lines %d" % n, all(m == "G1" for m, p, c in moves)
+        and within(path, moves, .002) and len(moves) < n)
+
+check("single point", list(douglas([[1, 2, 3]])) == [("G1", [1, 2, 3], None)])
+
+# a quarter circle, counterclockwise in XY, is one G3
+quarter = [[math.cos(t), math.sin(t), 0]
+    for t in [math.pi / 2 * i / 100 for i in range(101)]]
+moves = list(douglas(quarter, .001, 17))
+check("arc", [m for m, p, c in moves] == ["G1", "G3"]
+    and moves[1][1] == quarter[-1] and moves[1][2] == "I-1.0000 J0.0000")
+moves = list(douglas(quarter[::-1], .001, 17))
+check("arc clockwise", [m for m, p, c in moves] == ["G1", "G2"])
+
+# back and forth, so every point is kept, far past the recursion limit
+zigzag = [[i * .01, i % 2, 0] for i in range(sys.getrecursionlimit() * 4)]
+moves = list(douglas(zigzag, .001))
+check("long path", [p for m, p, c in moves] == zigzag)
+
+lines = []
+g = Gcode(target=lines.append, max_cuts=100)
+g.begin()
+g.set_feed(10)
+most = 0
+for p in zigzag[:1000]:
+    g.cut(*p)
+    most = max(most, len(g.cuts))
+before_end = len(lines)
+g.end()
+check("max_cuts", most < 100 and before_end > 900 and lines[-1] == "M2")
+
+out = io.StringIO()
+g = Gcode(target=out)
+g.begin()
+g.rapid(0, 0)
+g.cut(z=-1)
+g.end()
+check("file target", out.getvalue().splitlines()[-4:]
+    == ["G0 X0.0000 Y0.0000", "G1 Z-1.0000", "G0 Z0.0400", "M2"])
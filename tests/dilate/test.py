@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import numpy
+from rs274.dilate import dilate
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+def brute_force(image, tool):
+    th, tw = tool.shape
+    h = image.shape[0] - th + 1
+    w = image.shape[1] - tw + 1
+    out = numpy.empty((h, w), numpy.float32)
+    for y in range(h):
+        for x in range(w):
+            out[y, x] = (image[y:y+th, x:x+tw] - tool).max()
+    return out
+
+def tool_shape(f, size):
+    "A round tool of diameter size, +inf outside of it"
+    r = (size - 1) / 2.
+    y, x = numpy.mgrid[:size, :size] - r
+    d = numpy.hypot(x, y)
+    return numpy.where(d <= r + .01, f(d, r), numpy.inf).astype(numpy.float32)
+
+tools = {
+    'ball': lambda d, r: r - numpy.sqrt(numpy.maximum(r * r - d * d, 0)),
+    'flat': lambda d, r: numpy.zeros_like(d),
+    'vee': lambda d, r: d * .5,
+}
+rng = numpy.random.RandomState(5)
+image = rng.uniform(-5, 0, (60, 70)).astype(numpy.float32)
+for name, f in sorted(tools.items()):
+    for size in 1, 6, 11:
+        tool = tool_shape(f, size)
+        expected = brute_force(image, tool)
+        calls = []
+        one = dilate(image, tool, threads=1)
+        several = dilate(image, tool, tile=200, threads=3,
+            progress=lambda done, total: calls.append((done, total)))
+        h = expected.shape[0]
+        ok = (numpy.array_equal(one, expected)
+            and numpy.array_equal(several, expected)
+            and calls[-1] == (h, h) and len(calls) > 1)
+        check("%s %d" % (name, size), ok)
+
+check("too small", dilate(image[:5], tool_shape(tools['flat'], 6)).shape == (0, 65))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import os, shutil, tempfile
+from gi.repository import GLib
+import filewatch
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+def run(ms=300):
+    "Run the main loop for a while"
+    loop = GLib.MainLoop()
+    GLib.timeout_add(ms, loop.quit)
+    loop.run()
+
+def write(filename, text, rename=False):
+    if rename:
+        with open(filename + '.tmp', 'w') as f: f.write(text)
+        os.rename(filename + '.tmp', filename)
+    else:
+        with open(filename, 'w') as f: f.write(text)
+
+tmp = tempfile.mkdtemp()
+try:
+    for polled in False, True:
+        name = "poll" if polled else "inotify"
+        watch = filewatch.FileWatch(interval=50, delay=20)
+        if polled: watch.inotify = None
+        filename = os.path.join(tmp, name + '.tbl')
+        write(filename, 'T1 P1\n')
+        calls = []
+        watch.subscribe(filename, calls.append)
+        write(filename, 'T1 P1 D1\n')
+        write(filename, 'T1 P1 D2\n', rename=True)
+        run()
+        check(name + " change", calls == [filename])
+        write(filename, 'T1 P1 D2\n', rename=True)
+        run()
+        check(name + " same contents", calls == [filename])
+        os.unlink(filename)
+        run()
+        check(name + " removed", calls == [filename] * 2)
+        watch.unsubscribe(filename, calls.append)
+        write(filename, 'T2 P2\n')
+        run()
+        check(name + " unsubscribed", calls == [filename] * 2)
+
+    filename = os.path.join(tmp, 'sim.var')
+    write(filename, '5161 1.000000\n5162 2.000000\n5220 1.000000\n')
+    var = filewatch.var_file(filename)
+    check("var_file shared", filewatch.var_file(filename) is var
+        and var.get(5162) == 2 and var.get(9999, 7) == 7)
+    changes = []
+    var.subscribe(changes.append)
+    write(filename, '5161 1.000000\n5162 2.500000\n5220 1.000000\n5221 3.000000\n',
+        rename=True)
+    run()
+    write(filename, '5162 2.500000\n5220 1.000000\n5221 3.000000\n', rename=True)
+    run()
+    check("var changes", changes == [{5162: 2.5, 5221: 3.0}, {5161: None}]
+        and var.get(5161, None) is None)
+finally:
+    shutil.rmtree(tmp)
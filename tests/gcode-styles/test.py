@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import random
+from qtvcp.lib.gcode_styles import styles, DEFAULT, COMMENT, KEY, ASSIGNMENT, VALUE
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+def reference(source):
+    "The styles the lexer set one character at a time, for ascii text"
+    result = []
+    for line in source.decode().splitlines(True):
+        graymode = False
+        msg = 'msg' in line.lower() or 'debug' in line.lower()
+        for char in line:
+            if char in '()':
+                graymode = char == '('
+                style = COMMENT
+            elif graymode:
+                if msg and char.lower() in 'msgdebu,':
+                    style = ASSIGNMENT
+                    if char == ',': msg = False
+                else:
+                    style = COMMENT
+            elif char in '%<>#=':
+                style = ASSIGNMENT
+            elif char in '[]':
+                style = VALUE
+            elif char.isalpha():
+                style = KEY
+            else:
+                style = DEFAULT
+            result.append(style)
+    return bytes(result)
+
+check("code", styles(b'G0 X#<_x> Y[1+2]\n') == bytes([KEY, DEFAULT, DEFAULT,
+    KEY, ASSIGNMENT, ASSIGNMENT, DEFAULT, KEY, ASSIGNMENT, DEFAULT,
+    KEY, VALUE, DEFAULT, DEFAULT, DEFAULT, VALUE, DEFAULT]))
+check("comment", styles(b'g1 (x1) x2') == bytes([KEY, DEFAULT, DEFAULT]
+    + [COMMENT] * 4 + [DEFAULT, KEY, DEFAULT]))
+check("message", styles(b'(MSG, go)') == bytes([COMMENT] + [ASSIGNMENT] * 4
+    + [COMMENT] * 4))
+check("non-ascii", styles('(é)é\n'.encode()) == bytes([COMMENT] * 4
+    + [KEY, KEY, DEFAULT]))
+
+random.seed(4)
+words = ['G0', 'g1', 'X1.5', 'y-2', '#<_a>=3', '[#1*2]', '(comment)',
+    '(MSG, x=1)', '(debug,#1)', '(msg', 'msg', ')', '(unclosed', '%', 'o100',
+    '(a)(b)', ' ', '\t', '\n', '\r\n', '\n']
+lines = []
+for i in range(2000):
+    lines.append(''.join(random.choice(words) for j in range(random.randint(0, 8)))
+        + random.choice(['\n', '\r\n']))
+source = ''.join(lines).encode()
+check("program", styles(source) == reference(source))
+
+# any range of whole lines styles as it would within the whole program
+whole = styles(source)
+ok = True
+offsets = [0]
+for line in lines: offsets.append(offsets[-1] + len(line))
+for i in range(200):
+    first, last = sorted(random.sample(range(len(offsets)), 2))
+    a, b = offsets[first], offsets[last]
+    ok = ok and styles(source[a:b]) == whole[a:b]
+check("ranges", ok)
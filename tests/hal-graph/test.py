@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+import importlib.util, sys
+import numpy as np
+
+# the gladevcp package imports every widget, so take the module from its
+# directory, as hal_graph does when run on its own
+sys.path.insert(0, importlib.util.find_spec('gladevcp').submodule_search_locations[0])
+from sample_ring import SampleRing, downsample
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+ring = SampleRing(channels=2, length=10)
+for i in range(25):
+    ring.add(i * .1, (i, -i))
+times, values = ring.samples()
+check("wrap", len(ring) == 10 and np.allclose(times, np.arange(15, 25) * .1)
+    and values[:, 0].tolist() == list(range(15, 25))
+    and values[:, 1].tolist() == [-i for i in range(15, 25)])
+
+times, values = ring.window(1.85, 2.15)
+check("window", values[:, 0].tolist() == [18, 19, 20, 21])
+times, values = ring.window(0, .5)
+check("window before", len(times) == 0)
+times, values = ring.window(0, 5)
+check("window all", len(times) == 10)
+
+ring.resize(4)
+check("shrink", ring.samples()[1][:, 0].tolist() == [21, 22, 23, 24])
+ring.resize(100)
+for i in range(25, 30):
+    ring.add(i * .1, (i, -i))
+check("grow", ring.samples()[1][:, 0].tolist() == list(range(21, 30)))
+ring.clear()
+check("clear", len(ring) == 0 and len(ring.samples()[0]) == 0)
+
+times = np.linspace(0, 10, 10001)[:-1]
+values = np.c_[np.sin(times), np.cos(times)]
+values[5000, 0] = 9
+values[7000, 1] = -9
+columns = 100
+t, v = downsample(times, values, 0, 10, columns)
+column = (times * (columns / 10.)).astype(int)
+ok = len(t) == 2 * columns and v.shape == (2 * columns, 2)
+for c in range(columns):
+    low = values[column == c].min(axis=0)
+    high = values[column == c].max(axis=0)
+    pair = v[2 * c:2 * c + 2]
+    ok = ok and np.allclose(np.sort(pair, axis=0), [low, high])
+    ok = ok and np.allclose(t[2 * c:2 * c + 2], (c + .5) * 10 / columns)
+check("downsample", ok and v[:, 0].max() == 9 and v[:, 1].min() == -9)
+# the first column of a rising sine is passed low then high
+check("downsample order", v[0, 0] < v[1, 0])
+few = times[:150], values[:150]
+t, v = downsample(few[0], few[1], 0, .15, 100)
+check("downsample few", t is few[0] and v is few[1])
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Mitsubishi inverters on an RS-485 bus, answering computer link requests
+# on a pseudo terminal, for testing mitsub_vfd without hardware
+import time
+from pty_device import PtyDevice
+
+ENQ, STX, ETX, ACK, NAK = '\x05', '\x02', '\x03', '\x06', '\x15'
+
+# length of the data sent with each request the inverters know
+DATA = {'7A': 0, '6F': 0, '70': 0, '71': 0, '72': 0,
+        'FA': 2, 'ED': 4, 'F3': 2, 'FD': 0}
+
+class Inverter:
+    def __init__(self):
+        self.run = 0
+        self.freq = 0
+        self.special = None
+        self.resets = 0
+        self.requests = 0
+
+    def read(self, code):
+        if code == '7A':
+            # bit 1 forward, 2 reverse, 3 up to speed
+            bits = {2: 2, 4: 4}.get(self.run, 0)
+            if self.run and self.freq:
+                bits |= 8
+            return '%02X' % bits
+        if code == '6F':
+            return '%04X' % (self.freq if self.run else 0)
+        if code == '70':
+            return '%04X' % (1250 if self.run else 0)
+        if code == '71':
+            return '%04X' % 23000
+        return '%04X' % 42
+
+    def write(self, code, data):
+        if code == 'FA':
+            self.run = int(data, 16)
+        elif code == 'ED':
+            self.freq = int(data, 16)
+        elif code == 'F3':
+            self.special = data
+        elif code == 'FD':
+            self.resets += 1
+
+class FakeBus(PtyDevice):
+    """Inverters by station number, answering requests written to port
+    after delay seconds; stations not in inverters never answer"""
+    def __init__(self, inverters, delay=.01):
+        self.inverters = inverters
+        self.delay = delay
+        PtyDevice.__init__(self)
+
+    def received(self):
+        while self.frame():
+            pass
+
+    def frame(self):
+        start = self.buffer.find(ENQ)
+        if start < 0:
+            self.buffer = ''
+            return False
+        self.buffer = self.buffer[start:]
+        # ENQ station(2) code(2) wait(1) data sum(2)
+        if len(self.buffer) < 6:
+            return False
+        station, code = self.buffer[1:3], self.buffer[3:5]
+        end = 6 + DATA.get(code, 0) + 2
+        if len(self.buffer) < end:
+            return False
+        data = self.buffer[6:end - 2]
+        self.buffer = self.buffer[end:]
+        inverter = self.inverters.get(station)
+        if inverter is None:
+            return True
+        inverter.requests += 1
+        time.sleep(self.delay)
+        if code in DATA and DATA[code] == 0 and code != 'FD':
+            body = station + inverter.read(code)
+            reply = STX + body + ETX + '%02X' % (sum(map(ord, body)) & 0xff)
+        elif code in DATA:
+            inverter.write(code, data)
+            reply = ACK + station
+        else:
+            # 1: instruction code error
+            reply = NAK + station + '1'
+        self.write(reply)
+        return True
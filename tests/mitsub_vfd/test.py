@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# Drive mitsub_vfd against fake inverters on a pseudo terminal
+import hal, os, signal, subprocess, sys
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [here, os.path.join(here, "..")]
+from fake_inverter import FakeBus, Inverter
+from pty_device import check
+
+spindle, coolant = Inverter(), Inverter()
+bus = FakeBus({'02': spindle, '01': coolant})
+vfd = subprocess.Popen(['mitsub_vfd', '--port', bus.port,
+                        'spindle=02', 'coolant=01', 'missing=05'],
+                       stdout=subprocess.DEVNULL)
+try:
+    check("ready", lambda: all(hal.component_exists(n) and hal.component_is_ready(n)
+                               for n in ('spindle', 'coolant', 'missing')), 20)
+    check("special monitor", lambda: spindle.special == '0E' and coolant.special == '0E')
+
+    hal.set_p('spindle.motor-cmd', '50')
+    hal.set_p('spindle.run', '1')
+    check("spindle command", lambda: spindle.run == 2 and spindle.freq == 5000)
+    check("coolant untouched", lambda: coolant.run == 0 and coolant.freq == 0, 0)
+
+    for name in ('spindle', 'coolant', 'missing'):
+        hal.set_p(name + '.monitor', '1')
+    check("spindle feedback", lambda: abs(hal.get_value('spindle.motor-fb') - 50) < 1e-6)
+    check("spindle amps", lambda: abs(hal.get_value('spindle.motor-amps') - 12.5) < 1e-6)
+    check("spindle up-to-speed", lambda: hal.get_value('spindle.up-to-speed'))
+    check("spindle refresh-rate", lambda: hal.get_value('spindle.refresh-rate') > 0)
+    check("spindle latency", lambda: hal.get_value('spindle.latency') > 0)
+    check("coolant stopped", lambda: hal.get_value('coolant.motor-fb') == 0
+                                     and not hal.get_value('coolant.up-to-speed'))
+    check("missing drive errors", lambda: hal.get_value('missing.comm-errors') > 0)
+    check("missing drive refresh-rate", lambda: hal.get_value('missing.refresh-rate') == 0, 0)
+
+    hal.set_p('spindle.fwd', '0')
+    check("spindle reverse", lambda: spindle.run == 4)
+    hal.set_p('spindle.estop', '1')
+    check("spindle estop reset", lambda: spindle.resets == 1)
+    hal.set_p('spindle.estop', '0')
+    check("spindle estop", lambda: spindle.run == 0)
+finally:
+    vfd.send_signal(signal.SIGINT)
+    vfd.wait()
@@ -0,0 +1,4 @@
+#!/bin/sh
+$REALTIME start
+./test.py
+$REALTIME stop
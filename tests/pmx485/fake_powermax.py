@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# A Powermax answering Modbus ASCII requests on a pseudo terminal, for
+# testing pmx485 without hardware
+import time
+from pty_device import PtyDevice
+
+def lrc(data):
+    return '{:02X}'.format(-sum(bytes.fromhex(data)) & 255)
+
+class FakePowermax(PtyDevice):
+    """Registers by number; multiple register reads are refused with an
+    exception reply unless batch is true"""
+    def __init__(self, batch=True, delay=.005, address='01'):
+        self.registers = {0x2093: 0, 0x2094: 0, 0x2096: 0, 0x2098: 0,
+                          0x2099: 10 * 64, 0x209A: 45 * 64,
+                          0x209C: 60 * 128, 0x209D: 90 * 128,
+                          0x209E: 0x5678, 0x209F: 0x0001}
+        self.batch = batch
+        self.delay = delay
+        self.address = address
+        self.reads = {}
+        PtyDevice.__init__(self)
+
+    def received(self):
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            reply = self.answer(line.strip('\r'))
+            if reply:
+                time.sleep(self.delay)
+                self.write(':' + reply + lrc(reply) + '\r\n')
+
+    def answer(self, line):
+        if not line.startswith(':') or len(line) != 15 or lrc(line[1:13]) != line[13:]:
+            return None
+        address, function, reg, value = line[1:3], line[3:5], int(line[5:9], 16), int(line[9:13], 16)
+        if address != self.address:
+            return None
+        if function == '06':
+            self.registers[reg] = value
+            return line[1:13]
+        if function == '04':
+            if value > 1 and not self.batch:
+                # 02: illegal data address
+                return address + '8402'
+            for r in range(reg, reg + value):
+                self.reads[r] = self.reads.get(r, 0) + 1
+            data = ''.join('{:04X}'.format(self.registers.get(r, 0)) for r in range(reg, reg + value))
+            return address + function + '{:02X}'.format(2 * value) + data
+        # 01: illegal function
+        return address + '{:02X}'.format(int(function, 16) | 0x80) + '01'
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# Drive pmx485 against a simulated Powermax on a pseudo terminal
+import hal, os, signal, subprocess, sys, time
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [here, os.path.join(here, "..")]
+from fake_powermax import FakePowermax
+from pty_device import check
+
+def run(powermax, *options):
+    pmx = subprocess.Popen(['pmx485', powermax.port] + list(options),
+                           stdout=subprocess.DEVNULL)
+    check("ready", lambda: hal.component_exists('pmx485') and hal.component_is_ready('pmx485'), 20)
+    hal.set_p('pmx485.mode_set', '1')
+    hal.set_p('pmx485.current_set', '40')
+    hal.set_p('pmx485.pressure_set', '0')
+    hal.set_p('pmx485.enable', '1')
+    return pmx
+
+def stop(pmx):
+    pmx.send_signal(signal.SIGINT)
+    pmx.wait()
+    check("unloaded", lambda: not hal.component_exists('pmx485'))
+
+powermax = FakePowermax()
+pmx = run(powermax, 'limits=1')
+try:
+    check("status", lambda: hal.get_value('pmx485.status'))
+    check("settings written", lambda: powermax.registers[0x2093] == 1
+                                      and powermax.registers[0x2094] == 40 * 64)
+    check("current feedback", lambda: hal.get_value('pmx485.current') == 40)
+    check("limits", lambda: hal.get_value('pmx485.current_min') == 10
+                            and hal.get_value('pmx485.current_max') == 45
+                            and hal.get_value('pmx485.pressure_min') == 60
+                            and hal.get_value('pmx485.pressure_max') == 90)
+    check("arc time", lambda: hal.get_value('pmx485.arcTime') == 0x15678)
+    powermax.registers[0x2098] = 221
+    check("fault", lambda: hal.get_value('pmx485.fault') == 221)
+    hal.set_p('pmx485.current_set', '30')
+    check("current changed", lambda: powermax.registers[0x2094] == 30 * 64
+                                     and hal.get_value('pmx485.current') == 30)
+    time.sleep(1)
+    check("fault read more often than limits",
+          lambda: powermax.reads[0x2098] > 5 * powermax.reads[0x2099], 0)
+    check("no retries", lambda: hal.get_value('pmx485.retries') == 0, 0)
+    check("only documented registers read",
+          lambda: 0x2095 not in powermax.reads and 0x209B not in powermax.reads, 0)
+finally:
+    stop(pmx)
+check("local mode on exit", lambda: powermax.registers[0x2093] == 0
+                                    and powermax.registers[0x2094] == 0, 0)
+
+powermax = FakePowermax(batch=False)
+pmx = run(powermax)
+try:
+    check("single register status", lambda: hal.get_value('pmx485.status'))
+    check("single register limits", lambda: hal.get_value('pmx485.current_max') == 45)
+    check("single register arc time", lambda: hal.get_value('pmx485.arcTime') == 0x15678)
+finally:
+    stop(pmx)
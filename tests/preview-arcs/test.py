@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+import math, random
+from rs274 import interpret, segments
+
+class Canon(interpret.Translated):
+    lineno = 1
+    feedrate = 1.
+    xo = yo = zo = 0.
+
+    def __init__(self, plane=1):
+        self.plane = plane
+        self.lo = (0.,) * 9
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+def close(a, b):
+    return all(abs(p - q) < 1e-9 for p, q in zip(a, b))
+
+def arcs(count, rmin, rmax, seed=1):
+    "Arguments to arc_feed for a chain of arcs, each starting where the last ended"
+    rng = random.Random(seed)
+    x = y = 0.
+    result = []
+    for i in range(count):
+        r = rng.uniform(rmin, rmax)
+        start = rng.uniform(0, 2 * math.pi)
+        sweep = rng.uniform(.1, 2 * math.pi)
+        cx = x - r * math.cos(start)
+        cy = y - r * math.sin(start)
+        x = cx + r * math.cos(start + sweep)
+        y = cy + r * math.sin(start + sweep)
+        result.append((x, y, cx, cy, 1, rng.uniform(-1, 1),
+            0., 0., 0., 0., 0., 0.))
+    return result
+
+def reference(canon, x1, y1, cx, cy, rot, z1, *rest, max_segments=128):
+    "The points of a counterclockwise XY arc, as gcode.arc_to_segments makes them"
+    x0, y0, z0 = canon.lo[:3]
+    theta1 = math.atan2(y0 - cy, x0 - cx)
+    theta2 = math.atan2(y1 - cy, x1 - cx)
+    while theta2 - theta1 < 1e-6: theta2 += 2 * math.pi
+    r = math.hypot(x0 - cx, y0 - cy)
+    steps = max(3, int(max_segments * (theta2 - theta1) / math.pi))
+    points = []
+    for i in range(1, steps):
+        f = i / steps
+        t = theta1 + (theta2 - theta1) * f
+        points.append([cx + r * math.cos(t), cy + r * math.sin(t),
+            z0 + (z1 - z0) * f])
+    points.append([x1, y1, z1])
+    return points
+
+args = arcs(200, .01, 5)
+
+canon = Canon()
+ok = True
+for a in args:
+    plan = segments.arc_plan(canon, *a, max_segments=64)
+    points, counts = segments.arc_points(plan)
+    expected = reference(canon, *a, max_segments=64)
+    ok = ok and counts.tolist() == [len(expected)] and all(
+        close(p[:3], q) for p, q in zip(points, expected))
+    canon.lo = plan[segments.ARC_END]
+check("arcdivision", ok)
+
+def split(args, tolerance, batched):
+    canon = Canon()
+    store = segments.SegmentStore()
+    for a in args:
+        plan = segments.arc_plan(canon, *a, max_segments=64,
+            tolerance=tolerance)
+        if batched:
+            store.append_arc(plan)
+        else:
+            points, counts = segments.arc_points(plan)
+            store.extend_path(1, canon.lo, points, 1., [0., 0., 0.])
+        canon.lo = plan[segments.ARC_END]
+    return store
+
+batched = split(args, 0, True)
+length = len(batched)
+one_by_one = split(args, 0, False)
+check("batched", length == len(one_by_one) and list(batched) == list(one_by_one))
+
+tolerance = .001
+coarse = split(args, tolerance, True)
+ok = len(coarse) < len(batched)
+# every chord stays within tolerance of its arc,
+start = coarse.start; end = coarse.end
+canon = Canon()
+row = 0
+for a in args:
+    plan = segments.arc_plan(canon, *a, max_segments=64, tolerance=tolerance)
+    cx, cy = a[2:4]
+    r = plan[segments.ARC_RADIUS]
+    steps = int(plan[segments.ARC_STEPS])
+    most = segments.arc_plan(canon, *a, max_segments=64)[segments.ARC_STEPS]
+    ok = ok and 3 <= steps <= most
+    # unless ARCDIVISION already limits it to fewer segments
+    if steps < most:
+        for i in range(row, row + steps):
+            mx = (start[i, 0] + end[i, 0]) / 2 - cx
+            my = (start[i, 1] + end[i, 1]) / 2 - cy
+            ok = ok and r - math.hypot(mx, my) <= tolerance + 1e-9
+    row += steps
+    canon.lo = plan[segments.ARC_END]
+check("tolerance", ok and row == len(coarse))
+
+# in the XZ plane the arc arguments are z, x of the end and the center
+canon = Canon(plane=3)
+plan = segments.arc_plan(canon, 0., 2., 0., 1., 1, 0., 0., 0., 0., 0., 0., 0.)
+points, counts = segments.arc_points(plan)
+check("xz plane", all(abs(math.hypot(p[0] - 1, p[2]) - 1) < 1e-9 for p in points)
+    and not points[:, 1].any() and close(points[-1][:3], [2., 0., 0.]))
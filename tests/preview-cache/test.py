@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import os, shutil, tempfile, time
+from rs274.segments import SegmentStore
+from rs274.previewcache import PreviewCache
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+tmp = tempfile.mkdtemp()
+try:
+    os.environ.pop('INI_FILE_NAME', None)
+    def write(name, text):
+        path = os.path.join(tmp, name)
+        with open(path, 'w') as f: f.write(text)
+        return path
+
+    program = write('program.ngc', 'g0 x1\nm2\n')
+    write('vars1', '5220 1\n')
+    write('vars2', '5220 1\n')
+    subroutines = os.path.join(tmp, 'subroutines')
+    os.mkdir(subroutines)
+
+    class Canon:
+        colors = {}
+        geometry = 'XYZ'
+        is_foam = False
+        arcdivision = 64
+        arc_tolerance = 0
+        parameter_file = os.path.join(tmp, 'vars1')
+        compact = True
+        dwell_time = 0
+        foam_z = 0
+        foam_w = 1.5
+
+    canon = Canon()
+    cache = PreviewCache(os.path.join(tmp, 'cache'), search=[subroutines])
+    key = cache.key(program, canon, ('', None))
+    check("key stable", key == cache.key(program, canon, ('', None)))
+    check("key args", key != cache.key(program, canon, ('G20', None)))
+    canon.parameter_file = os.path.join(tmp, 'vars2')
+    check("key parameter file name", key == cache.key(program, canon, ('', None)))
+    write('vars2', '5220 2\n')
+    check("key parameter file", key != cache.key(program, canon, ('', None)))
+    canon.parameter_file = os.path.join(tmp, 'vars1')
+    canon.arcdivision = 32
+    check("key canon", key != cache.key(program, canon, ('', None)))
+    canon.arcdivision = 64
+    write('subroutines/sub.ngc', 'o<sub> sub\no<sub> endsub\n')
+    check("key subroutines", key != cache.key(program, canon, ('', None)))
+    key = cache.key(program, canon, ('', None))
+    write('program.ngc', 'g0 x2\nm2\n')
+    check("key program", key != cache.key(program, canon, ('', None)))
+
+    tlo = [0., 0., 0.]
+    traverse = [(1, [0.] * 9, [1.] + [0.] * 8, tlo)]
+    feed = [(2, [1.] + [0.] * 8, [1., 1.] + [0.] * 7, 10., tlo),
+            (3, [1., 1.] + [0.] * 7, [0., 1.] + [0.] * 7, 20., [0., 0., .5])]
+    canon.traverse = traverse
+    canon.feed = SegmentStore()
+    for move in feed: canon.feed.append(move)
+    canon.arcfeed = []
+    canon.dwells = [(4, 0, 0., 1., 0., 0)]
+    canon.dwell_time = 2.5
+    cache.store(key, canon, 0, 7)
+
+    for compact in True, False:
+        loaded = Canon()
+        loaded.compact = compact
+        result = cache.load(key, loaded)
+        name = "load compact" if compact else "load lists"
+        check(name, result == (0, 7)
+            and list(loaded.traverse) == traverse and list(loaded.feed) == feed
+            and list(loaded.arcfeed) == [] and loaded.dwells == canon.dwells
+            and loaded.dwell_time == 2.5 and loaded.foam_w == 1.5
+            and isinstance(loaded.feed, SegmentStore) == compact)
+    check("load missing", cache.load('0' * 64, Canon()) is None)
+
+    size = sum(e[1] for e in cache.entries())
+    cache.size = size * 2
+    os.utime(os.path.join(cache.directory, key), (0, 0))
+    time.sleep(.01)
+    cache.store('1' * 64, canon, 0, 7)
+    time.sleep(.01)
+    cache.store('2' * 64, canon, 0, 7)
+    names = [os.path.basename(e[2]) for e in cache.entries()]
+    check("evict", names == ['1' * 64, '2' * 64])
+finally:
+    shutil.rmtree(tmp)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import random
+import numpy as np
+from rs274.segments import SegmentStore
+from rs274.previewindex import PreviewIndex, geometry_matrix
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+m = geometry_matrix("XYZ")
+check("geometry", (m[:, :3] == np.eye(3)).all() and not m[:, 3:].any())
+m = geometry_matrix("-X-Z Y")
+check("geometry sign", m[0, 0] == -1 and m[2, 2] == -1 and m[1, 1] == 1)
+m = geometry_matrix("X- Y")
+check("geometry sign kept", m[1, 1] == -1)
+check("geometry rotation", geometry_matrix("XYZA", "XYZA") is None
+    and geometry_matrix("XYZA", "XYZ") is not None)
+
+class Canon:
+    pass
+
+def p(x, y, z=0):
+    return [x, y, z, 0, 0, 0, 0, 0, 0]
+
+def make_canon(store):
+    random.seed(2)
+    canon = Canon()
+    tlo = [0, 0, 0]
+    traverse = [(1, p(-1, .9), p(-.5, .9), tlo)]
+    feed = [(i % 50 + 10, p(random.uniform(-.9, -.2), random.uniform(-.9, -.2)),
+        p(random.uniform(-.9, -.2), random.uniform(-.9, -.2)), 10, tlo)
+        for i in range(500)]
+    feed.append((7, p(-.5, .5), p(.5, .5), 10, tlo))
+    arcfeed = [(8, p(.5, -.5), p(.6, -.4), 10, tlo)]
+    canon.dwells = [(9, 0, .8, .8, 0, 0)]
+    if store:
+        canon.traverse = SegmentStore(has_feed=False)
+        canon.feed = SegmentStore()
+        canon.arcfeed = SegmentStore()
+        for move in traverse: canon.traverse.append(move)
+        for move in feed: canon.feed.append(move)
+        for move in arcfeed: canon.arcfeed.append(move)
+    else:
+        canon.traverse, canon.feed, canon.arcfeed = traverse, feed, arcfeed
+    return canon
+
+# identity transforms and a 200x200 window: x = -1..1 maps to 0..200,
+# and the mouse y counts down from the top of the window
+identity = np.eye(4).ravel().tolist()
+viewport = [0, 0, 200, 200]
+matrix = geometry_matrix("XYZ")
+
+for kind, store in ("list", False), ("store", True):
+    canon = make_canon(store)
+    index = PreviewIndex(canon)
+    rows = index.line_rows('feed', 12)
+    check(kind + " line_rows", rows.tolist()
+        == [i for i, l in enumerate(canon.feed) if l[0] == 12])
+    check(kind + " line_rows missing", len(index.line_rows('feed', 3)) == 0)
+
+    def pick(x, y, rapids=True):
+        return index.pick(x, y, identity, identity, viewport, matrix, rapids)
+    check(kind + " pick feed", pick(100, 50) == 7)
+    check(kind + " pick arc", pick(155, 145) == 8)
+    check(kind + " pick dwell", pick(180, 21) == 9)
+    check(kind + " pick rapid", pick(25, 10) == 1 and pick(25, 10, False) is None)
+    check(kind + " pick nothing", pick(190, 100) is None)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+import numpy as np
+from rs274.previewlod import douglas_peucker, polylines, line_indices
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+# two connected moves, a gap, then one more move
+start = np.array([[0., 0, 0], [1, 0, 0], [5, 5, 0]])
+end = np.array([[1., 0, 0], [1, 1, 0], [6, 5, 0]])
+vertices, first = polylines(start, end)
+check("polylines", vertices.tolist() == [[0, 0, 0], [1, 0, 0], [1, 1, 0],
+    [5, 5, 0], [6, 5, 0]] and first.tolist() == [0, 3])
+check("polylines empty", len(polylines(np.zeros((0, 3)), np.zeros((0, 3)))[0]) == 0)
+
+keep = np.ones(len(vertices), bool)
+check("line_indices", line_indices(keep, first).tolist() == [0, 1, 1, 2, 3, 4])
+keep[1] = False
+check("line_indices dropped", line_indices(keep, first).tolist() == [0, 2, 3, 4])
+
+def distance(p, a, b):
+    d = b - a
+    dd = d.dot(d)
+    t = np.clip((p - a).dot(d) / dd, 0, 1) if dd else 0
+    return np.linalg.norm(p - a - t * d)
+
+def within(points, starts, keep, tolerance):
+    "Whether every dropped point is within tolerance of its kept neighbours' chord"
+    ends = np.r_[starts[1:], len(points)] - 1
+    for s, e in zip(starts, ends):
+        if not (keep[s] and keep[e]): return False
+        kept = np.flatnonzero(keep[s:e + 1]) + s
+        for a, b in zip(kept[:-1], kept[1:]):
+            for i in range(a + 1, b):
+                if distance(points[i], points[a], points[b]) > tolerance:
+                    return False
+    return True
+
+line = np.c_[np.linspace(0, 10, 50), np.zeros(50), np.zeros(50)]
+check("douglas_peucker line", np.flatnonzero(
+    douglas_peucker(line, [0], .01)).tolist() == [0, 49])
+
+rng = np.random.RandomState(3)
+t = np.linspace(0, 20 * np.pi, 5000)
+spiral = np.c_[t * np.cos(t), t * np.sin(t), rng.uniform(0, .01, len(t))]
+zigzag = np.c_[np.arange(3000) % 2, np.arange(3000) * .001, np.zeros(3000)]
+points = np.r_[spiral, zigzag]
+starts = np.array([0, len(spiral)])
+ok = True
+last = len(points) + 1
+for tolerance in .001, .01, .1, 1:
+    keep = douglas_peucker(points, starts, tolerance, piece=700)
+    ok = ok and within(points, starts, keep, tolerance) and keep.sum() < last
+    last = keep.sum()
+check("douglas_peucker tolerance", ok)
+check("douglas_peucker empty", len(douglas_peucker(np.zeros((0, 3)), [], 1)) == 0)
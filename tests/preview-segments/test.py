@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import random
+from rs274.segments import SegmentStore, calc_extents
+
+random.seed(1)
+
+def position():
+    return [round(random.uniform(-10, 10), 3) for i in range(9)]
+
+def move(lineno, feed=True):
+    row = [lineno, position(), position()]
+    if feed: row.append(round(random.uniform(1, 100), 3))
+    row.append([round(random.uniform(0, 1), 3) for i in range(3)])
+    return tuple(row)
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+# a small chunk and batch, so the arrays are grown and flushed many times
+feed = SegmentStore(chunk=16)
+feed.batch = 7
+traverse = SegmentStore(has_feed=False, chunk=16)
+feed_rows = [move(i // 3) for i in range(200)]
+traverse_rows = [move(i, False) for i in range(50)]
+for row in feed_rows: feed.append(row)
+for row in traverse_rows: traverse.append(row)
+
+check("len", len(feed) == len(feed_rows) and len(traverse) == len(traverse_rows))
+check("iter", list(feed) == feed_rows and list(traverse) == traverse_rows)
+check("index", feed[0] == feed_rows[0] and feed[-1] == feed_rows[-1]
+    and feed[57] == feed_rows[57])
+check("slice", feed[10:20] == feed_rows[10:20] and feed[::50] == feed_rows[::50])
+try:
+    feed[len(feed_rows)]
+except IndexError:
+    check("range", True)
+else:
+    check("range", False)
+check("chunks", sum(feed.chunks(33), []) == feed_rows
+    and max(len(c) for c in feed.chunks(33)) == 33)
+check("line_rows", feed.line_rows(5).tolist() == [15, 16, 17])
+
+lo = position()
+points = [position() for i in range(5)]
+tlo = [0.5, 0, 0.25]
+path = SegmentStore(chunk=4)
+path.append(move(0))
+path.extend_path(1, lo, points, 42., tlo)
+rows = path[1:]
+check("extend_path", [r[1] for r in rows] == [lo] + points[:-1]
+    and [r[2] for r in rows] == points
+    and all(r[0] == 1 and r[3] == 42 and r[4] == tlo for r in rows))
+
+feed.trim()
+check("trim", feed.capacity == len(feed_rows) and list(feed) == feed_rows)
+
+def reference_extents(*lists):
+    rows = [r for l in lists for r in l]
+    ends = [(p, r[-1]) for r in rows for p in (r[1], r[2])]
+    lo = [min(p[i] for p, t in ends) for i in range(3)]
+    hi = [max(p[i] for p, t in ends) for i in range(3)]
+    lot = [min(p[i] + t[i] for p, t in ends) for i in range(3)]
+    hit = [max(p[i] + t[i] for p, t in ends) for i in range(3)]
+    return lo, hi, lot, hit
+
+extents = calc_extents(feed, traverse, SegmentStore())
+reference = reference_extents(feed_rows, traverse_rows)
+check("calc_extents", all(abs(a - b) < 1e-9
+    for e, r in zip(extents, reference) for a, b in zip(e, r)))
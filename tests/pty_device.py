@@ -0,0 +1,40 @@
+# Shared by the tests of the serial drivers (mitsub_vfd, pmx485): a fake
+# device on a pseudo terminal, and checks that print "<name> ok|fail"
+# for the test's expected output.
+import os, threading, time, tty
+
+def wait(condition, timeout=5):
+    end = time.time() + timeout
+    while not condition():
+        if time.time() > end:
+            return False
+        time.sleep(.01)
+    return True
+
+def check(name, condition, timeout=5):
+    print("{} {}".format(name, "ok" if wait(condition, timeout) else "fail"))
+
+class PtyDevice:
+    """The far end of a pseudo terminal the driver opens as port.
+    received() is called with what the driver wrote so far in buffer;
+    subclasses set their own state before calling __init__"""
+    def __init__(self):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        self.port = os.ttyname(self.slave)
+        self.buffer = ''
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                self.buffer += os.read(self.master, 256).decode('ascii')
+            except OSError:
+                return
+            self.received()
+
+    def received(self):
+        raise NotImplementedError
+
+    def write(self, reply):
+        os.write(self.master, reply.encode('ascii'))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+import errno, io, os, pickle, shutil, stat as st, tempfile, threading, time
+import linuxcnc
+import status_broadcast
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+def tool(number):
+    return linuxcnc.tool((number, .1 * number) + (0,) * (linuxcnc.tool.n_fields - 2))
+
+class FakeStat:
+    "Stands in for linuxcnc.stat, which needs LinuxCNC running"
+    def __init__(self, failing=None):
+        self.position = (0.,) * 9
+        self.task_state = 1
+        self.file = ''
+        self.tool_table = tuple(tool(i) for i in range(4))
+        self._failing = failing
+    def poll(self):
+        if self._failing:
+            raise linuxcnc.error(self._failing)
+
+tmp = tempfile.mkdtemp()
+try:
+    path = os.path.join(tmp, 'run', 'linuxcnc-status')
+    fake = FakeStat()
+    server = status_broadcast.Server(path, cycle=.05, stat=fake)
+    threading.Thread(target=server.serve, daemon=True).start()
+    check("private socket", not os.stat(os.path.dirname(path)).st_mode & 0o077
+        and st.S_ISSOCK(os.stat(path).st_mode) and not os.stat(path).st_mode & 0o077)
+
+    s = status_broadcast.Stat(path)
+    check("status", s.position == fake.position and s.task_state == 1
+        and s.file == '')
+    check("tool_table", [tuple(t) for t in s.tool_table]
+        == [tuple(t) for t in fake.tool_table]
+        and all(isinstance(t, linuxcnc.tool) for t in s.tool_table))
+
+    fake.position = (1.,) + (0.,) * 8
+    s.poll()
+    check("poll", s.position[0] == 1.)
+    fake.position = (2.,) + (0.,) * 8
+    fake.tool_table = fake.tool_table + (tool(9),)
+    time.sleep(.3)
+    s.receive()
+    check("receive", s.position[0] == 2. and s.tool_table[-1][0] == 9)
+
+    fake._failing = 'emcStatusBuffer invalid'
+    try:
+        s.poll()
+    except linuxcnc.error as e:
+        check("error", str(e) == 'emcStatusBuffer invalid')
+    else:
+        check("error", False)
+    fake._failing = None
+    fake.task_state = 2
+    s.poll()
+    check("error cleared", s.task_state == 2)
+
+    try:
+        status_broadcast.Server(path, stat=FakeStat())
+    except OSError as e:
+        check("one server", e.errno == errno.EADDRINUSE)
+    else:
+        check("one server", False)
+
+    class Something:
+        pass
+    try:
+        status_broadcast._Unpickler(io.BytesIO(
+            pickle.dumps(('changes', {'x': Something()})))).load()
+    except pickle.UnpicklingError:
+        check("no classes", True)
+    else:
+        check("no classes", False)
+
+    shared = os.path.join(tmp, 'shared')
+    os.mkdir(shared, 0o755)
+    os.chmod(shared, 0o755)
+    try:
+        status_broadcast.Server(os.path.join(shared, 's'), stat=FakeStat())
+    except OSError as e:
+        check("shared directory", e.errno == errno.EACCES)
+    else:
+        check("shared directory", False)
+
+    # a server that could never poll gives no status to stand in for one
+    failing = os.path.join(tmp, 'run', 'failing')
+    server = status_broadcast.Server(failing, stat=FakeStat('not running'))
+    threading.Thread(target=server.serve, daemon=True).start()
+    try:
+        status_broadcast.Stat(failing)
+    except linuxcnc.error as e:
+        check("no status", str(e) == 'not running')
+    else:
+        check("no status", False)
+finally:
+    shutil.rmtree(tmp)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import numpy as np
+from vismach_backplot import Backplot
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+def trail(plot):
+    return plot.points().tolist()
+
+plot = Backplot(length=10)
+for i in range(25):
+    plot.add(i, 0, 0)
+check("wrap", len(plot) == 9 and trail(plot) == [[i, 0, 0] for i in range(16, 25)])
+
+plot = Backplot(length=100)
+for i in range(20):
+    plot.add(.1, .2, .3)
+# the trail still ends at the tool, but no more points are kept
+check("standing still", len(plot) == 1
+    and (plot.points() == np.float32([.1, .2, .3])).all())
+
+plot = Backplot(length=100, decimation=1.)
+for i in range(26):
+    plot.add(i * .2, 0, 0)
+points = trail(plot)
+check("decimation", len(plot) == 6
+    and [round(p[0], 4) for p in points] == [0, 1, 2, 3, 4, 5])
+plot.add(5.2, 0, 0)
+check("tip", len(plot) == 6 and round(trail(plot)[-1][0], 4) == 5.2)
+
+plot = Backplot(length=10)
+for i in range(25):
+    plot.add(0, i, 0)
+plot.resize(5)
+check("shrink", trail(plot) == [[0, i, 0] for i in range(21, 25)])
+plot.resize(50)
+for i in range(25, 30):
+    plot.add(0, i, 0)
+check("grow", trail(plot) == [[0, i, 0] for i in range(21, 30)])
+
+plot.clear()
+plot.add(1, 1, 1)
+check("clear", trail(plot) == [[1, 1, 1]])
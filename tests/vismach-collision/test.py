@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import numpy as np
+from vismach_collision import Collisions, Tree, Body, distance
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+class Collection:
+    def __init__(self, parts):
+        self.parts = parts
+
+class Translate(Collection):
+    def __init__(self, parts, x, y, z):
+        self.parts = parts
+        self.where = x, y, z
+    def apply(self): pass
+    def unapply(self): pass
+    def transform(self): return "translate", self.where
+
+class Rotate(Collection):
+    def __init__(self, parts, th, x, y, z):
+        self.parts = parts
+        self.where = th, x, y, z
+    def apply(self): pass
+    def unapply(self): pass
+    def transform(self): return "rotate", self.where
+
+class Box:
+    def __init__(self, *coords): self.coords = list(coords)
+    def shape(self): return "box", self.coords
+
+class Sphere:
+    def __init__(self, *coords): self.coords = list(coords)
+    def shape(self): return "sphere", self.coords
+
+class CylinderZ:
+    def __init__(self, *coords): self.coords = list(coords)
+    def shape(self): return "cylinder", [2] + self.coords
+
+rng = np.random.RandomState(7)
+ok = True
+for n, m in (5, 7), (300, 2000), (4000, 3000):
+    a = rng.uniform(0, 10, (n, 3))
+    b = rng.uniform(0, 10, (m, 3)) + rng.uniform(-5, 15, 3)
+    ba = Body(0, Tree(a)); ba.place(np.eye(4))
+    bb = Body(1, Tree(b)); bb.place(np.eye(4))
+    expected = np.sqrt(((a[:, None] - b[None]) ** 2).sum(axis=2)).min()
+    ok = ok and abs(distance(ba, bb) - expected) < 1e-9
+check("distance", ok)
+
+# a box and a tool moving toward it along X
+tool = CylinderZ(0, 1, 20, 1)
+carriage = Translate([tool], 20, 0, 0)
+table = Box(-5, -5, 0, 5, 5, 2)
+ball = Sphere(0, 0, 0, 2)
+arm = Rotate([Translate([ball], 10, 0, 0)], 0, 0, 0, 1)
+model = Collection([table, carriage, arm])
+c = Collisions({"table": table, "tool": carriage, "ball": arm},
+    pairs=[("table", "tool"), ("table", "ball")], resolution=.25)
+clearance = c.update(model)
+check("clearance", abs(clearance["table", "tool"] - 14) < .25
+    and abs(clearance["table", "ball"] - 3) < .25)
+carriage.where = 6.5, 0, 0
+check("moved", abs(c.update(model)["table", "tool"] - .5) < .25)
+carriage.where = 3, 0, 0
+check("collision", c.update(model)["table", "tool"] < .25)
+# a quarter turn takes the ball to 10 along Y
+arm.where = 90, 0, 0, 1
+check("rotated", abs(c.update(model)["table", "ball"] - 3) < .25)
+arm.where = 45, 0, 0, 1
+check("rotated 45", abs(c.update(model)["table", "ball"]
+    - (np.hypot(10 / 2 ** .5 - 5, 10 / 2 ** .5 - 5) - 2)) < .25)
+
+trees = dict((i, b.tree) for i, b in c.bodies.items())
+c.update(model)
+same = all(c.bodies[i].tree is t for i, t in trees.items())
+tool.coords[2] = 30
+c.update(model)
+check("trees kept", same and sum(c.bodies[i].tree is not t
+    for i, t in trees.items()) == 1)
+
+check("all pairs", Collisions({"a": table, "b": ball, "c": tool}).pairs
+    == [("a", "b"), ("a", "c"), ("b", "c")])
+
+class Color(Collection):
+    def apply(self): pass
+
+try:
+    Collisions({"table": table, "ball": ball}).update(
+        Collection([table, Color([ball])]))
+except ValueError:
+    check("no transform", True)
+else:
+    check("no transform", False)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import os, shutil, struct, tempfile
+import numpy as np
+import vismach_mesh
+
+def check(name, ok):
+    print(name, "ok" if ok else "FAIL")
+
+triangles = np.array([
+    [[0, 0, 0], [1, 0, 0], [0, 1, 0]],
+    [[0, 0, 0], [0, 0, 1], [1, 0, 0]],
+    [[1.5, -2, 3.25], [4, 5, 6], [-7, 8, 9.5]]], np.float32)
+normals = vismach_mesh.face_normals(triangles.astype(np.float64))
+
+text = ["solid test"]
+for i, t in enumerate(triangles):
+    # the first facet gives its normal, the others leave it to be computed
+    n = normals[i] if i == 0 else (0, 0, 0)
+    text.append("  facet normal %g %g %g" % tuple(n))
+    text.append("    outer loop")
+    for v in t:
+        text.append("      vertex %r %r %r" % tuple(float(c) for c in v))
+    text.append("    endloop")
+    text.append("  endfacet")
+text.append("endsolid test")
+binary = b'\0' * 80 + struct.pack('<I', len(triangles))
+for t in triangles:
+    binary += struct.pack('<12fH', *([0, 0, 0] + t.ravel().tolist() + [0]))
+
+def same(a, b):
+    return a.shape == b.shape and np.allclose(a, b, atol=1e-6)
+
+vertices, corner_normals = vismach_mesh.load("stl", data=text)
+check("text stl", same(vertices, triangles.reshape(-1, 3))
+    and same(corner_normals, np.repeat(normals, 3, axis=0)))
+check("binary stl", vismach_mesh.is_binary_stl(binary)
+    and not vismach_mesh.is_binary_stl("\n".join(text).encode())
+    and same(vismach_mesh.read_stl(binary)[0], triangles))
+
+obj = """# a square and a triangle
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+v 0 0 2
+vn 0 0 -1
+f 1//1 2//1 3//1
+f 1/5/1 3/6/1 4/7/1
+f 1 2 5
+"""
+vertices, corner_normals = vismach_mesh.read_obj(obj.encode())
+check("obj", vertices.shape == (3, 3, 3)
+    and vertices[2].tolist() == [[0, 0, 0], [1, 0, 0], [0, 0, 2]]
+    and (corner_normals[:2] == [0, 0, -1]).all()
+    and same(corner_normals[2], np.tile([0, -1, 0], (3, 1))))
+
+tmp = tempfile.mkdtemp()
+try:
+    os.environ['XDG_CACHE_HOME'] = os.path.join(tmp, 'cache')
+    models = os.path.join(tmp, 'models')
+    os.mkdir(models)
+    stl = os.path.join(models, 'part.stl')
+    with open(stl, 'w') as f: f.write("\n".join(text))
+    loaded = vismach_mesh.load("stl", stl)
+    cached = vismach_mesh.load_cached(stl)
+    check("cache", cached is not None and same(cached[0], loaded[0])
+        and same(cached[1], loaded[1])
+        and os.listdir(models) == ['part.stl']
+        and vismach_mesh.cache_path(stl).startswith(os.environ['XDG_CACHE_HOME']))
+    st = os.stat(stl)
+    os.utime(stl, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    check("cache stale", vismach_mesh.load_cached(stl) is None)
+
+    part = os.path.join(models, 'binary.stl')
+    with open(part, 'wb') as f: f.write(binary)
+    vismach_mesh.load("stl", part)
+    check("binary not cached", vismach_mesh.load_cached(part) is None)
+finally:
+    shutil.rmtree(tmp)